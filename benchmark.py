@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+BLE Codec Benchmark Runner
+Compiles the generated C micro-benchmark at several optimisation levels,
+reports ns/op and bytes/s, and checks results against a stored baseline
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+
+def compiler_version(compiler: str) -> str:
+    result = subprocess.run([compiler, '--version'], capture_output=True, text=True)
+    return result.stdout.splitlines()[0] if result.stdout else compiler
+
+
+def run_benchmark(source: str, compiler: str, opt_level: str, build_dir: str) -> Dict[str, Dict[str, float]]:
+    """Build and run the benchmark at one optimisation level"""
+    binary = os.path.join(build_dir, f"ble_benchmark{opt_level}")
+    subprocess.run([compiler, '-std=c99', opt_level, '-o', binary, source], check=True)
+    output = subprocess.run([binary], check=True, capture_output=True, text=True).stdout
+    results = {}
+    for entry in json.loads(output)['benchmarks']:
+        ns_per_op = entry['ns_per_op']
+        results[entry['name']] = {
+            'ns_per_op': ns_per_op,
+            'bytes_per_s': entry['bytes_per_op'] * 1e9 / ns_per_op if ns_per_op > 0 else 0.0,
+        }
+    return results
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return a line for every benchmark slower than baseline by more than threshold"""
+    regressions = []
+    for opt_level, results in report['results'].items():
+        baseline_results = baseline['results'].get(opt_level, {})
+        for name, result in results.items():
+            reference = baseline_results.get(name)
+            if reference is None or reference['ns_per_op'] <= 0:
+                continue
+            ratio = result['ns_per_op'] / reference['ns_per_op']
+            if ratio > 1.0 + threshold:
+                regressions.append(f"{opt_level} {name}: {reference['ns_per_op']:.2f} -> "
+                                   f"{result['ns_per_op']:.2f} ns/op ({ratio - 1.0:+.1%})")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"Compiler: {report['compiler']}")
+    for opt_level, results in report['results'].items():
+        print(f"{opt_level}:")
+        for name, result in results.items():
+            print(f"  {name:<40} {result['ns_per_op']:>10.2f} ns/op {result['bytes_per_s'] / 1e6:>10.1f} MB/s")
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(
+        description='Compile and run the generated C micro-benchmark',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Generate the benchmark, then run it and store a baseline
+  python generate.py --lang c --benchmark
+  python benchmark.py --output bench_baseline.json
+
+  # Fail (exit 1) if anything got more than 15% slower than the baseline
+  python benchmark.py --baseline bench_baseline.json --threshold 0.15
+
+  # Only measure -O2 and -Os
+  python benchmark.py --opt 2 s
+        """
+    )
+
+    parser.add_argument(
+        '--source',
+        default=os.path.join(script_dir, 'generated', 'c', 'ble_benchmark.c'),
+        help='Benchmark source (default: generated/c/ble_benchmark.c)'
+    )
+
+    parser.add_argument(
+        '--cc',
+        default='gcc',
+        help='C compiler (default: gcc)'
+    )
+
+    parser.add_argument(
+        '--opt',
+        nargs='+',
+        default=['0', '2', '3', 's'],
+        help='Optimisation levels to build, as passed to -O (default: 0 2 3 s)'
+    )
+
+    parser.add_argument(
+        '--output',
+        help='Write results as JSON to this path (usable as a baseline)'
+    )
+
+    parser.add_argument(
+        '--baseline',
+        help='Compare against a previous --output file'
+    )
+
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.10,
+        help='Allowed slowdown relative to the baseline (default: 0.10)'
+    )
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"Error: Benchmark source not found: {args.source}")
+        print("Generate it with: python generate.py --lang c --benchmark")
+        sys.exit(1)
+
+    build_dir = tempfile.mkdtemp(prefix='ble_benchmark_')
+    try:
+        report = {
+            'compiler': compiler_version(args.cc),
+            'results': {
+                f"-O{level}": run_benchmark(args.source, args.cc, f"-O{level}", build_dir)
+                for level in args.opt
+            },
+        }
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('compiler') != report['compiler']:
+            print(f"Warning: baseline was built with {baseline.get('compiler')}")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+BLE Code Generator Benchmark
+Times C, Dart and Python generation on synthetic schemas of increasing size
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Tuple
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Add generators and tools directories to path
+sys.path.insert(0, os.path.join(script_dir, 'generators'))
+sys.path.insert(0, os.path.join(script_dir, 'tools'))
+
+from c_generator import generate_c_code
+from dart_generator import generate_dart_code
+from python_generator import generate_python_code
+from synthetic_schema import write_synthetic_schemas
+
+
+GENERATORS = [
+    ('c', generate_c_code),
+    ('dart', generate_dart_code),
+    ('python', generate_python_code),
+]
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    """Parse MESSAGESxFIELDS"""
+    messages, _, fields = value.lower().partition('x')
+    try:
+        return int(messages), int(fields)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected MESSAGESxFIELDS, got '{value}'")
+
+
+def time_generation(protocol_path: str, messages_path: str, output_dir: str,
+                    repeats: int, memory: bool) -> Dict[str, Any]:
+    """Best-of-repeats wall time per generator (schema load and file writes included)"""
+    results = {}
+    for name, generate in GENERATORS:
+        language_dir = os.path.join(output_dir, name)
+        os.makedirs(language_dir, exist_ok=True)
+        best = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            generate(protocol_path, messages_path, language_dir)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        entry = {
+            'seconds': best,
+            'output_bytes': sum(entry.stat().st_size for entry in os.scandir(language_dir)),
+        }
+        if memory:
+            tracemalloc.start()
+            generate(protocol_path, messages_path, language_dir)
+            entry['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results[name] = entry
+    return results
+
+
+def run(sizes: List[Tuple[int, int]], protocol_schema: str, repeats: int, memory: bool) -> List[Dict[str, Any]]:
+    report = []
+    with tempfile.TemporaryDirectory(prefix='ble_generator_bench_') as work_dir:
+        for messages, fields in sizes:
+            size_dir = os.path.join(work_dir, f"{messages}x{fields}")
+            protocol_path, messages_path = write_synthetic_schemas(protocol_schema, size_dir, messages, fields)
+            # Generators print each file they write; keep the report readable
+            stdout = sys.stdout
+            with open(os.devnull, 'w') as devnull:
+                sys.stdout = devnull
+                try:
+                    results = time_generation(protocol_path, messages_path, os.path.join(size_dir, 'out'),
+                                              repeats, memory)
+                finally:
+                    sys.stdout = stdout
+            report.append({
+                'messages': messages,
+                'fields': fields,
+                'generators': results,
+                'total_seconds': sum(entry['seconds'] for entry in results.values()),
+            })
+    return report
+
+
+def print_report(report: List[Dict[str, Any]]):
+    for entry in report:
+        size = f"{entry['messages']}x{entry['fields']}"
+        timings = ', '.join(
+            f"{name} {result['seconds'] * 1000:.0f} ms ({result['output_bytes'] / 1e6:.1f} MB"
+            + (f", peak {result['peak_bytes'] / 1e6:.1f} MB" if 'peak_bytes' in result else '') + ')'
+            for name, result in entry['generators'].items()
+        )
+        per_field_us = entry['total_seconds'] * 1e6 / (entry['messages'] * entry['fields'])
+        print(f"{size:>9}: total {entry['total_seconds'] * 1000:.0f} ms ({per_field_us:.1f} us/field) - {timings}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark code generation on synthetic schemas',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Default sizes up to 250 messages x 100 fields
+  python benchmark_generator.py
+
+  # Custom sizes, peak memory, and fail if the largest size exceeds 1 second
+  python benchmark_generator.py --size 100x50 --size 250x100 --memory --max-seconds 1.0
+        """
+    )
+
+    parser.add_argument(
+        '--size',
+        action='append',
+        type=parse_size,
+        metavar='MESSAGESxFIELDS',
+        help='Schema size to generate (default: 25x100, 50x100, 125x100, 250x100)'
+    )
+
+    parser.add_argument(
+        '--protocol',
+        default=os.path.join(script_dir, 'schema', 'protocol.json'),
+        help='Protocol schema providing frame format and types (default: schema/protocol.json)'
+    )
+
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=3,
+        help='Runs per generator, best time is reported (default: 3)'
+    )
+
+    parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='Also measure peak Python allocation per generator'
+    )
+
+    parser.add_argument(
+        '--max-seconds',
+        type=float,
+        help='Exit with status 1 if the largest size takes longer than this in total'
+    )
+
+    parser.add_argument(
+        '--json',
+        help='Write the report as JSON to this path'
+    )
+
+    args = parser.parse_args()
+
+    sizes = args.size or [(25, 100), (50, 100), (125, 100), (250, 100)]
+    report = run(sizes, args.protocol, args.repeats, args.memory)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written: {args.json}")
+
+    if args.max_seconds is not None:
+        largest = max(report, key=lambda entry: entry['messages'] * entry['fields'])
+        if largest['total_seconds'] > args.max_seconds:
+            print(f"Generation of {largest['messages']}x{largest['fields']} took "
+                  f"{largest['total_seconds']:.2f} s (limit {args.max_seconds:.2f} s)")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+BLE Capture Log Decoder
+Decodes capture files across a process pool and reports per-message statistics
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Tuple
+
+# Add tools directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+
+from capture import CaptureReader, CONTINUATION_MSG_ID
+
+
+def _new_message_stats() -> Dict[str, Any]:
+    return {'count': 0, 'checksum_failures': 0, 'malformed': 0, 'fields': {}}
+
+
+def _decode_segment(reader: CaptureReader, segment_number: int, stats: Dict[str, Dict]):
+    """Decode one segment into stats, one message type at a time"""
+    layout = reader.layout
+    header = layout.first_header_size
+    records = reader.segment_records(segment_number)
+    for msg_id, group in itertools.groupby(records, key=lambda record: record.msg_id):
+        message = layout.messages.get(msg_id)
+        if msg_id == CONTINUATION_MSG_ID:
+            name = 'fragments'
+        elif message is None:
+            name = f"unknown_0x{msg_id:02x}"
+        else:
+            name = message.name
+        entry = stats.setdefault(name, _new_message_stats())
+
+        rows = []
+        for record in group:
+            frame = record.frame
+            entry['count'] += 1
+            if message is None:
+                continue
+            length = frame[1]
+            if length != message.payload_size or len(frame) != header + length + 1:
+                entry['malformed'] += 1
+                continue
+            payload = frame[header:header + length]
+            if sum(payload) & 0xFF != frame[header + length]:
+                entry['checksum_failures'] += 1
+                continue
+            rows.append(message.unpack(payload))
+        if not rows:
+            continue
+
+        # Column-wise reduction keeps the per-value work in C builtins
+        for field, column in zip(message.fields, zip(*rows)):
+            if field.is_string:
+                continue
+            field_stats = entry['fields'].get(field.name)
+            low, high, total = min(column), max(column), sum(column)
+            if field_stats is None:
+                entry['fields'][field.name] = [low, high, total, len(column)]
+            else:
+                field_stats[0] = min(field_stats[0], low)
+                field_stats[1] = max(field_stats[1], high)
+                field_stats[2] += total
+                field_stats[3] += len(column)
+
+
+def decode_shard(task: Tuple[str, int, int]) -> Dict[str, Dict]:
+    """Worker: decode segments [first, last) of one capture file"""
+    path, first, last = task
+    stats: Dict[str, Dict] = {}
+    with CaptureReader(path) as reader:
+        for segment_number in range(first, last):
+            _decode_segment(reader, segment_number, stats)
+    return stats
+
+
+def merge_stats(total: Dict[str, Dict], partial: Dict[str, Dict]):
+    """Reduce step: fold one worker's stats into the running total"""
+    for name, entry in partial.items():
+        target = total.setdefault(name, _new_message_stats())
+        target['count'] += entry['count']
+        target['checksum_failures'] += entry['checksum_failures']
+        target['malformed'] += entry['malformed']
+        for field_name, (low, high, field_sum, count) in entry['fields'].items():
+            field_stats = target['fields'].get(field_name)
+            if field_stats is None:
+                target['fields'][field_name] = [low, high, field_sum, count]
+            else:
+                field_stats[0] = min(field_stats[0], low)
+                field_stats[1] = max(field_stats[1], high)
+                field_stats[2] += field_sum
+                field_stats[3] += count
+
+
+def plan_tasks(paths: List[str], segments_per_task: int) -> List[Tuple[str, int, int]]:
+    """Split every capture into contiguous runs of segments"""
+    tasks = []
+    for path in paths:
+        with CaptureReader(path) as reader:
+            segment_count = len(reader.segments)
+        for first in range(0, segment_count, segments_per_task):
+            tasks.append((path, first, min(first + segments_per_task, segment_count)))
+    return tasks
+
+
+def finalize(stats: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Convert running sums to min/max/mean per field"""
+    report = {}
+    for name in sorted(stats):
+        entry = stats[name]
+        report[name] = {
+            'count': entry['count'],
+            'checksum_failures': entry['checksum_failures'],
+            'malformed': entry['malformed'],
+            'fields': {
+                field_name: {'min': low, 'max': high, 'mean': field_sum / count}
+                for field_name, (low, high, field_sum, count) in entry['fields'].items()
+            },
+        }
+    return report
+
+
+def print_report(report: Dict[str, Dict]):
+    for name, entry in report.items():
+        print(f"{name}: {entry['count']} frames, {entry['checksum_failures']} checksum failures, "
+              f"{entry['malformed']} malformed")
+        for field_name, field in entry['fields'].items():
+            print(f"  {field_name:<24} min {field['min']:<12} max {field['max']:<12} mean {field['mean']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Decode BLE capture logs in parallel and report per-message statistics',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Decode a night of captures on every core
+  python decode_logs.py captures/*.blecap
+
+  # Limit workers and write a JSON report
+  python decode_logs.py captures/*.blecap --jobs 8 --json report.json
+        """
+    )
+
+    parser.add_argument('captures', nargs='+', help='Capture files (.blecap) to decode')
+
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Worker processes (default: CPU count)'
+    )
+
+    parser.add_argument(
+        '--segments-per-task',
+        type=int,
+        default=8,
+        help='Capture segments decoded per task (default: 8)'
+    )
+
+    parser.add_argument(
+        '--json',
+        help='Write the report as JSON to this path'
+    )
+
+    args = parser.parse_args()
+
+    for path in args.captures:
+        if not os.path.exists(path):
+            print(f"Error: Capture file not found: {path}")
+            sys.exit(1)
+
+    tasks = plan_tasks(args.captures, args.segments_per_task)
+    print(f"Decoding {len(args.captures)} capture(s) in {len(tasks)} task(s) on {args.jobs} worker(s)")
+
+    stats: Dict[str, Dict] = {}
+    if args.jobs <= 1:
+        for task in tasks:
+            merge_stats(stats, decode_shard(task))
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(decode_shard, task) for task in tasks]
+            for future in as_completed(futures):
+                merge_stats(stats, future.result())
+
+    report = finalize(stats)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+BLE Capture Columnar Exporter
+Streams capture files into one .npy column per message field
+"""
+
+import argparse
+import os
+import sys
+
+# Add tools directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+
+from capture import CaptureReader
+from columnar import ColumnarExporter
+
+
+def _export_frames(reader: CaptureReader, exporter: ColumnarExporter, msg_id) -> int:
+    rows = 0
+    layout = reader.layout
+    for record in reader.frames():
+        if msg_id is not None and record.msg_id != msg_id:
+            continue
+        message_layout = layout.messages.get(record.msg_id)
+        payload = layout.frame_payload(record.frame)
+        if message_layout is None or payload is None or len(payload) != message_layout.payload_size:
+            continue
+        exporter.append(message_layout, record.timestamp_ms, payload)
+        rows += 1
+    return rows
+
+
+def export_capture(path: str, exporter: ColumnarExporter, message=None) -> int:
+    """Append the valid frames of one capture in recording order; returns rows exported"""
+    with CaptureReader(path) as reader:
+        msg_id = reader.layout.resolve_msg_id(message) if message is not None else None
+        return _export_frames(reader, exporter, msg_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export BLE capture logs as per-field .npy columns',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Append a day of captures to the column store
+  python export_columns.py captures/2024-06-01/*.blecap --output columns
+
+  # Export only one message
+  python export_columns.py captures/*.blecap --output columns --message bms_status
+
+Load a column with numpy:
+  numpy.load('columns/bms_status/packCurrent_ma.npy', mmap_mode='r')
+        """
+    )
+
+    parser.add_argument('captures', nargs='+', help='Capture files (.blecap), in time order')
+
+    parser.add_argument(
+        '--output',
+        default='columns',
+        help='Column store directory (default: columns)'
+    )
+
+    parser.add_argument(
+        '--message',
+        help='Only export this message (name or ID)'
+    )
+
+    parser.add_argument(
+        '--chunk-rows',
+        type=int,
+        default=65536,
+        help='Rows buffered per message before appending to disk (default: 65536)'
+    )
+
+    args = parser.parse_args()
+
+    total = 0
+    with ColumnarExporter(args.output, args.chunk_rows) as exporter:
+        for path in args.captures:
+            if not os.path.exists(path):
+                print(f"Error: Capture file not found: {path}")
+                sys.exit(1)
+            try:
+                rows = export_capture(path, exporter, args.message)
+            except ValueError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            total += rows
+            print(f"Exported: {path} ({rows} rows)")
+
+    print(f"Export complete: {total} rows in {args.output}")
+
+
+if __name__ == '__main__':
+    main()
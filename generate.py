@@ -1,24 +1,159 @@
 #!/usr/bin/env python3
 """
 BLE Protocol Code Generator
-Generates C and Dart code from protocol and message schemas
+Generates C, Dart and Python code from protocol and message schemas
 """
 
 import argparse
+import json
 import os
 import sys
+import tempfile
+import time
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
-# Add generators directory to path
+# Add generators and tools directories to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'generators'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tools'))
 
-from c_generator import generate_c_code
-from dart_generator import generate_dart_code
+from c_generator import CGenerator, generate_c_code
+from dart_generator import DartGenerator, generate_dart_code
+from python_generator import PythonGenerator, generate_python_code
+from handshake import schema_hash32
+from message_selection import get_profile_messages, select_messages
+import footprint
+from bandwidth import LinkProfile, bandwidth_report, format_report
+from schema_layout import SchemaLayout
+
+
+# Output files per language: generator class and (file name, generator method)
+LANGUAGE_OUTPUTS = {
+    'c': (CGenerator, [('ble_protocol.h', 'generate_header'), ('ble_protocol.c', 'generate_implementation')]),
+    'dart': (DartGenerator, [('ble_messages.dart', 'generate_messages'), ('ble_codec.dart', 'generate_codec'),
+                             ('ble_isolate.dart', 'generate_isolate')]),
+    'python': (PythonGenerator, [('ble_protocol.py', 'generate_protocol'), ('ble_gateway.py', 'generate_gateway')]),
+}
+
+
+def resolve_enabled_messages(messages_schema: Dict[str, Any], only: Optional[List[str]],
+                             profile: Optional[str], lang: str) -> Optional[List[str]]:
+    """Messages to generate for a language from --only or --profile (None means all)"""
+    if only:
+        return only
+    if profile:
+        return get_profile_messages(messages_schema, profile, lang)
+    return None
+
+
+class WatchSession:
+    """Regenerates code in-process whenever a schema file changes
+
+    Parsed schemas and the last written contents stay in memory between runs.
+    Output files are only rewritten when their content changes, so firmware
+    and Flutter incremental builds only see real changes.
+    """
+
+    def __init__(self, protocol_path: str, messages_path: str, output_dirs: Dict[str, str], benchmark: bool = False,
+                 only: Optional[List[str]] = None, profile: Optional[str] = None):
+        self.protocol_path = protocol_path
+        self.messages_path = messages_path
+        self.only = only
+        self.profile = profile
+        self.languages: Dict[str, Tuple[type, List[Tuple[str, str]]]] = {}
+        for lang, (generator_class, files) in LANGUAGE_OUTPUTS.items():
+            if lang in output_dirs:
+                if lang == 'c' and benchmark:
+                    files = files + [('ble_benchmark.c', 'generate_benchmark')]
+                self.languages[lang] = (generator_class, [(os.path.join(output_dirs[lang], name), method)
+                                                          for name, method in files])
+        self._schemas = None
+        self._mtimes = None
+
+        # Seed the content cache from disk so the first run only writes changes
+        self._contents: Dict[str, str] = {}
+        for _, files in self.languages.values():
+            for path, _ in files:
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        self._contents[path] = f.read()
+
+    def _schema_mtimes(self) -> Tuple[int, int]:
+        return os.stat(self.protocol_path).st_mtime_ns, os.stat(self.messages_path).st_mtime_ns
+
+    def regenerate(self):
+        """Parse the schemas and rewrite the outputs whose content changed"""
+        start = time.perf_counter()
+        try:
+            with open(self.protocol_path, 'r') as f:
+                protocol_schema = json.load(f)
+            with open(self.messages_path, 'r') as f:
+                messages_schema = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e} - waiting for the next change")
+            return
+        stages = [f"parse {(time.perf_counter() - start) * 1000:.1f} ms"]
+
+        schemas = (protocol_schema, messages_schema)
+        if schemas == self._schemas:
+            print(f"Schemas unchanged ({stages[0]})")
+            return
+
+        written = []
+        schema_hash = schema_hash32(protocol_schema, messages_schema)
+        for lang, (generator_class, files) in self.languages.items():
+            lang_start = time.perf_counter()
+            try:
+                enabled = resolve_enabled_messages(messages_schema, self.only, self.profile, lang)
+                generator = generator_class(protocol_schema, select_messages(messages_schema, enabled),
+                                            schema_hash=schema_hash)
+                contents = [(path, getattr(generator, method)()) for path, method in files]
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Error: {lang} generation failed: {e!r} - waiting for the next change")
+                return
+            generate_ms = (time.perf_counter() - lang_start) * 1000
+
+            write_start = time.perf_counter()
+            lang_written = 0
+            for path, content in contents:
+                if self._contents.get(path) == content:
+                    continue
+                with open(path, 'w') as f:
+                    f.write(content)
+                self._contents[path] = content
+                written.append(path)
+                lang_written += 1
+            write_ms = (time.perf_counter() - write_start) * 1000
+            stages.append(f"{lang} {generate_ms:.1f} ms + write {write_ms:.1f} ms ({lang_written}/{len(files)} files)")
+
+        self._schemas = schemas
+        total_ms = (time.perf_counter() - start) * 1000
+        print(f"[{time.strftime('%H:%M:%S')}] Regenerated in {total_ms:.1f} ms: " + ', '.join(stages))
+        for path in written:
+            print(f"  Updated: {path}")
+
+    def run(self, interval: float):
+        """Poll the schema files and regenerate on every change (Ctrl+C to stop)"""
+        self._mtimes = self._schema_mtimes()
+        self.regenerate()
+        print(f"Watching {self.protocol_path} and {self.messages_path} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(interval)
+                try:
+                    mtimes = self._schema_mtimes()
+                except FileNotFoundError:
+                    continue  # Editor is replacing the file
+                if mtimes != self._mtimes:
+                    self._mtimes = mtimes
+                    self.regenerate()
+        except KeyboardInterrupt:
+            print()
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description='Generate C and Dart code from BLE protocol schemas',
+        description='Generate C, Dart and Python code from BLE protocol schemas',
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
@@ -31,6 +166,25 @@ Examples:
   # Generate only Dart code
   python generate.py --lang dart
 
+  # Generate only the Python host codec and gateway
+  python generate.py --lang python
+
+  # Also emit the C micro-benchmark (generated/c/ble_benchmark.c)
+  python generate.py --lang c --benchmark
+
+  # Regenerate on every schema save, writing only files that changed
+  python generate.py --watch
+
+  # Only the messages a build needs: explicit list, or a profile from messages.json
+  python generate.py --only heartbeat,bms_status,config_set
+  python generate.py --profile dashboard_lite
+
+  # Check the schema's link budget (exit status 1 if it does not fit)
+  python generate.py --report bandwidth --mtu 20 --interval-ms 30 --notifications 4
+
+  # RAM/flash per message and field, compared with the report from main
+  python generate.py --report footprint --footprint-json pr.json --footprint-baseline main.json
+
   # Use custom schemas and output directory
   python generate.py --protocol custom_protocol.json --messages custom_messages.json --output my_output
         """
@@ -56,11 +210,73 @@ Examples:
 
     parser.add_argument(
         '--lang',
-        choices=['c', 'dart', 'all'],
+        choices=['c', 'dart', 'python', 'all'],
         default='all',
         help='Language to generate (default: all)'
     )
 
+    parser.add_argument(
+        '--benchmark',
+        action='store_true',
+        help='Also generate the C micro-benchmark (run it with benchmark.py)'
+    )
+
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Keep running and regenerate whenever a schema file changes'
+    )
+
+    parser.add_argument(
+        '--watch-interval',
+        type=float,
+        default=0.1,
+        help='Schema polling interval in seconds for --watch (default: 0.1)'
+    )
+
+    parser.add_argument(
+        '--only',
+        type=lambda value: [name.strip() for name in value.split(',') if name.strip()],
+        metavar='MSG[,MSG...]',
+        help='Only generate these messages (comma-separated, at least one per direction)'
+    )
+
+    parser.add_argument(
+        '--profile',
+        help='Only generate the messages of this profile from messages.json "profiles"'
+    )
+
+    parser.add_argument(
+        '--report',
+        choices=['bandwidth', 'footprint'],
+        help='Print a schema report instead of generating code (for the C message selection)'
+    )
+
+    report_group = parser.add_argument_group('bandwidth report')
+    report_group.add_argument('--mtu', type=int, default=20,
+                              help='Bytes per notification (default: 20)')
+    report_group.add_argument('--interval-ms', type=float, default=30.0,
+                              help='Connection interval in ms (default: 30)')
+    report_group.add_argument('--notifications', type=int, default=4,
+                              help='Notifications per connection interval (default: 4)')
+    report_group.add_argument('--sends-per-max-age', type=float, default=1.0,
+                              help='How often each message is sent within its maxAge (default: 1)')
+    report_group.add_argument('--warn-utilisation', type=float, default=0.8,
+                              help='Warn above this link utilisation (default: 0.8)')
+
+    footprint_group = parser.add_argument_group('footprint report')
+    footprint_group.add_argument('--cc', default='gcc',
+                                 help='C compiler; size/nm are taken from the same toolchain (default: gcc)')
+    footprint_group.add_argument('--cflags', default='',
+                                 help='Extra compiler flags, e.g. "-mcpu=cortex-m4 -mthumb" (write a single '
+                                      'flag as --cflags=-Os, since argparse reads "-Os" as an option)')
+    footprint_group.add_argument('-D', dest='defines', action='append', default=[], metavar='NAME[=VALUE]',
+                                 help='Define a macro for the build, e.g. -D BLE_ENABLE_STATS=1 (repeatable)')
+    footprint_group.add_argument('--footprint-json',
+                                 help='Write the footprint report as JSON to this path')
+    footprint_group.add_argument('--footprint-baseline',
+                                 help='Show deltas against a previous --footprint-json report')
+
     args = parser.parse_args()
 
     # Verify schemas exist
@@ -72,9 +288,62 @@ Examples:
         print(f"Error: Messages schema file not found: {args.messages}")
         sys.exit(1)
 
+    with open(args.protocol, 'r') as f:
+        protocol_schema = json.load(f)
+    with open(args.messages, 'r') as f:
+        messages_schema = json.load(f)
+
+    # Resolve and validate the message selection for every language up front
+    enabled: Dict[str, Optional[List[str]]] = {}
+    try:
+        for lang in LANGUAGE_OUTPUTS:
+            enabled[lang] = resolve_enabled_messages(messages_schema, args.only, args.profile, lang)
+            select_messages(messages_schema, enabled[lang])
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.report == 'bandwidth':
+        layout = SchemaLayout(protocol_schema, select_messages(messages_schema, enabled['c']))
+        profile = LinkProfile(args.mtu, args.interval_ms, args.notifications)
+        try:
+            report = bandwidth_report(layout, profile, args.sends_per_max_age, args.warn_utilisation)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print('\n'.join(format_report(report)))
+        if report['errors']:
+            sys.exit(1)
+        return
+
+    if args.report == 'footprint':
+        c_messages_schema = select_messages(messages_schema, enabled['c'])
+        layout = SchemaLayout(protocol_schema, c_messages_schema)
+        baseline = None
+        if args.footprint_baseline:
+            with open(args.footprint_baseline, 'r') as f:
+                baseline = json.load(f)
+        with tempfile.TemporaryDirectory(prefix='ble_footprint_') as build_dir:
+            generator = CGenerator(protocol_schema, c_messages_schema,
+                                   schema_hash=schema_hash32(protocol_schema, messages_schema))
+            with open(os.path.join(build_dir, 'ble_protocol.h'), 'w') as f:
+                f.write(generator.generate_header())
+            with open(os.path.join(build_dir, 'ble_protocol.c'), 'w') as f:
+                f.write(generator.generate_implementation())
+            cflags = args.cflags.split() + [f'-D{define}' for define in args.defines]
+            object_path = footprint.compile_object(build_dir, args.cc, cflags)
+            report = footprint.footprint_report(layout, object_path, args.cc)
+        print('\n'.join(footprint.format_report(report, baseline)))
+        if args.footprint_json:
+            with open(args.footprint_json, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written: {args.footprint_json}")
+        return
+
     # Create output directories
     c_output = os.path.join(args.output, 'c')
     dart_output = os.path.join(args.output, 'dart')
+    python_output = os.path.join(args.output, 'python')
 
     if args.lang in ['c', 'all']:
         os.makedirs(c_output, exist_ok=True)
@@ -82,20 +351,40 @@ Examples:
     if args.lang in ['dart', 'all']:
         os.makedirs(dart_output, exist_ok=True)
 
+    if args.lang in ['python', 'all']:
+        os.makedirs(python_output, exist_ok=True)
+
+    if args.watch:
+        output_dirs = {'c': c_output, 'dart': dart_output, 'python': python_output}
+        if args.lang != 'all':
+            output_dirs = {args.lang: output_dirs[args.lang]}
+        WatchSession(args.protocol, args.messages, output_dirs, args.benchmark,
+                     args.only, args.profile).run(args.watch_interval)
+        return
+
     # Generate code
     print(f"Reading schemas:")
     print(f"  Protocol: {args.protocol}")
     print(f"  Messages: {args.messages}")
+    if args.only or args.profile:
+        for lang, names in enabled.items():
+            print(f"  {lang} messages: {', '.join(names)}")
     print()
 
     if args.lang in ['c', 'all']:
         print("Generating C code...")
-        generate_c_code(args.protocol, args.messages, c_output)
+        generate_c_code(args.protocol, args.messages, c_output, benchmark=args.benchmark,
+                        enabled_messages=enabled['c'])
         print()
 
     if args.lang in ['dart', 'all']:
         print("Generating Dart code...")
-        generate_dart_code(args.protocol, args.messages, dart_output)
+        generate_dart_code(args.protocol, args.messages, dart_output, enabled_messages=enabled['dart'])
+        print()
+
+    if args.lang in ['python', 'all']:
+        print("Generating Python code...")
+        generate_python_code(args.protocol, args.messages, python_output, enabled_messages=enabled['python'])
         print()
 
     print("Code generation complete!")
@@ -9,21 +9,46 @@
 
 // Protocol constants
 #define BLE_SYNC_FIRST 0xAA
+#define BLE_FIRST_HEADER_SIZE 3
+#define BLE_CONTINUATION_HEADER_SIZE 0
+
+// Multi-frame reassembly
+#define BLE_REASSEMBLY_SLOTS 1
+#define BLE_REASSEMBLY_TIMEOUT_MS 1000
+
+// Lock-free reads of decoded messages (seqlock). Override the barrier for
+// compilers without GCC builtins; on a single core a compiler barrier is enough
+#ifndef BLE_MEMORY_BARRIER
+#define BLE_MEMORY_BARRIER() __sync_synchronize()
+#endif
+#ifndef BLE_DECODE_SNAPSHOT_RETRIES
+#define BLE_DECODE_SNAPSHOT_RETRIES 4
+#endif
+
+// Trace hook called at every decode and transmit stage (see ble_trace_event_t)
+#ifndef BLE_TRACE
+#define BLE_TRACE(event, msg_id) ((void)0)
+#endif
 
 // ============================================================================
 // Private message structures - Server messages
 // ============================================================================
 
+#if BLE_ENABLE_HEARTBEAT
 typedef struct {
     uint32_t uptime_ms;
     uint32_t lvBattery_mv;
     uint8_t vehicle_state;
 } __attribute__((packed)) heartbeat_t;
+#endif
 
+#if BLE_ENABLE_SERVER_MESSAGE
 typedef struct {
     char data[128];
 } __attribute__((packed)) server_message_t;
+#endif
 
+#if BLE_ENABLE_BMS_DATA
 typedef struct {
     uint16_t cellVoltage1_mv;
     uint16_t cellVoltage2_mv;
@@ -51,7 +76,9 @@ typedef struct {
     uint16_t cellVoltage24_mv;
     int16_t packTemp_c;
 } __attribute__((packed)) bms_data_t;
+#endif
 
+#if BLE_ENABLE_BMS_STATUS
 typedef struct {
     uint8_t soc_percent;
     uint8_t soh_percent;
@@ -66,7 +93,9 @@ typedef struct {
     uint8_t minCellIndex;
     uint8_t maxCellIndex;
 } __attribute__((packed)) bms_status_t;
+#endif
 
+#if BLE_ENABLE_MOTOR_DATA
 typedef struct {
     int16_t motorTemp_c;
     int16_t controllerTemp_c;
@@ -76,7 +105,9 @@ typedef struct {
     uint8_t throttle_percent;
     uint8_t regenLevel_percent;
 } __attribute__((packed)) motor_data_t;
+#endif
 
+#if BLE_ENABLE_SAFETY_STATUS
 typedef struct {
     uint16_t faultCodes;
     uint32_t warning_flags;
@@ -85,7 +116,9 @@ typedef struct {
     uint8_t frontBrake_engaged;
     uint8_t rearBrake_engaged;
 } __attribute__((packed)) safety_status_t;
+#endif
 
+#if BLE_ENABLE_PERFORMANCE_DATA
 typedef struct {
     uint32_t odometer_km;
     uint32_t trip_km;
@@ -94,45 +127,261 @@ typedef struct {
     uint16_t energy_wh_per_km;
     uint16_t accel_0_60_ms;
 } __attribute__((packed)) performance_data_t;
+#endif
+
+#if BLE_ENABLE_HANDSHAKE_RESPONSE
+typedef struct {
+    uint16_t protocol_version;
+    uint32_t schema_hash;
+    uint16_t max_reassembly;
+    uint16_t mtu;
+    uint32_t features;
+} __attribute__((packed)) handshake_response_t;
+#endif
 
 // ============================================================================
 // Private message structures - Client messages
 // ============================================================================
 
+#if BLE_ENABLE_CONFIG_SET
 typedef struct {
     uint8_t param_id;
     uint32_t value;
 } __attribute__((packed)) config_set_t;
+#endif
+
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+typedef struct {
+    uint16_t protocol_version;
+    uint32_t schema_hash;
+    uint16_t max_reassembly;
+    uint16_t mtu;
+    uint32_t features;
+} __attribute__((packed)) handshake_request_t;
+#endif
 
 // ============================================================================
 // Private frame buffers
 // ============================================================================
 
+#if BLE_ENABLE_HEARTBEAT
 static uint8_t heartbeat_encode_buffer[13];
 static uint16_t heartbeat_encode_len;
+#endif
+#if BLE_ENABLE_SERVER_MESSAGE
 static uint8_t server_message_encode_buffer[132];
 static uint16_t server_message_encode_len;
+#endif
+#if BLE_ENABLE_BMS_DATA
 static uint8_t bms_data_encode_buffer[54];
 static uint16_t bms_data_encode_len;
+#endif
+#if BLE_ENABLE_BMS_STATUS
 static uint8_t bms_status_encode_buffer[28];
 static uint16_t bms_status_encode_len;
+#endif
+#if BLE_ENABLE_MOTOR_DATA
 static uint8_t motor_data_encode_buffer[20];
 static uint16_t motor_data_encode_len;
+#endif
+#if BLE_ENABLE_SAFETY_STATUS
 static uint8_t safety_status_encode_buffer[14];
 static uint16_t safety_status_encode_len;
+#endif
+#if BLE_ENABLE_PERFORMANCE_DATA
 static uint8_t performance_data_encode_buffer[20];
 static uint16_t performance_data_encode_len;
+#endif
+#if BLE_ENABLE_HANDSHAKE_RESPONSE
+static uint8_t handshake_response_encode_buffer[18];
+static uint16_t handshake_response_encode_len;
+#endif
+
+#if BLE_TX_MESSAGE_COUNT == 0
+#error "At least one server message must be enabled"
+#endif
+static uint8_t * const tx_buffers[BLE_TX_MESSAGE_COUNT] = {
+#if BLE_ENABLE_HEARTBEAT
+    heartbeat_encode_buffer,
+#endif
+#if BLE_ENABLE_SERVER_MESSAGE
+    server_message_encode_buffer,
+#endif
+#if BLE_ENABLE_BMS_DATA
+    bms_data_encode_buffer,
+#endif
+#if BLE_ENABLE_BMS_STATUS
+    bms_status_encode_buffer,
+#endif
+#if BLE_ENABLE_MOTOR_DATA
+    motor_data_encode_buffer,
+#endif
+#if BLE_ENABLE_SAFETY_STATUS
+    safety_status_encode_buffer,
+#endif
+#if BLE_ENABLE_PERFORMANCE_DATA
+    performance_data_encode_buffer,
+#endif
+#if BLE_ENABLE_HANDSHAKE_RESPONSE
+    handshake_response_encode_buffer,
+#endif
+};
+static uint16_t * const tx_lengths[BLE_TX_MESSAGE_COUNT] = {
+#if BLE_ENABLE_HEARTBEAT
+    &heartbeat_encode_len,
+#endif
+#if BLE_ENABLE_SERVER_MESSAGE
+    &server_message_encode_len,
+#endif
+#if BLE_ENABLE_BMS_DATA
+    &bms_data_encode_len,
+#endif
+#if BLE_ENABLE_BMS_STATUS
+    &bms_status_encode_len,
+#endif
+#if BLE_ENABLE_MOTOR_DATA
+    &motor_data_encode_len,
+#endif
+#if BLE_ENABLE_SAFETY_STATUS
+    &safety_status_encode_len,
+#endif
+#if BLE_ENABLE_PERFORMANCE_DATA
+    &performance_data_encode_len,
+#endif
+#if BLE_ENABLE_HANDSHAKE_RESPONSE
+    &handshake_response_encode_len,
+#endif
+};
+static const uint8_t tx_priority[BLE_TX_MESSAGE_COUNT] = {
+#if BLE_ENABLE_HEARTBEAT
+    1,
+#endif
+#if BLE_ENABLE_SERVER_MESSAGE
+    0,
+#endif
+#if BLE_ENABLE_BMS_DATA
+    1,
+#endif
+#if BLE_ENABLE_BMS_STATUS
+    1,
+#endif
+#if BLE_ENABLE_MOTOR_DATA
+    2,
+#endif
+#if BLE_ENABLE_SAFETY_STATUS
+    3,
+#endif
+#if BLE_ENABLE_PERFORMANCE_DATA
+    1,
+#endif
+#if BLE_ENABLE_HANDSHAKE_RESPONSE
+    3,
+#endif
+};
+static bool tx_pending[BLE_TX_MESSAGE_COUNT];
+static uint16_t tx_offset[BLE_TX_MESSAGE_COUNT];
+
+// Negotiated mode of the current connection (baseline until a handshake)
+static ble_link_t ble_link = {
+    .compatible = true,
+    .mtu = BLE_DEFAULT_MTU,
+    .peer_max_reassembly = 255,
+};
+
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+#define BLE_DECODE_MAX_PAYLOAD 14
+#elif BLE_ENABLE_CONFIG_SET
+#define BLE_DECODE_MAX_PAYLOAD 5
+#else
+#error "At least one client message must be enabled"
+#endif
 
-static uint8_t decode_payload_buffer[5];
-static uint8_t decode_expected_size;
-static uint8_t decode_bytes_received;
-static uint8_t decode_msg_id;
-static bool decode_valid;
-
+typedef struct {
+    bool active;
+    uint8_t stream_id;
+    uint8_t msg_id;
+    uint8_t expected_size;
+    uint8_t bytes_received;
+    uint32_t last_frame_ms;
+    uint8_t payload[BLE_DECODE_MAX_PAYLOAD];
+} ble_reassembly_slot_t;
+
+static ble_reassembly_slot_t decode_slots[BLE_REASSEMBLY_SLOTS];
+
+#if BLE_ENABLE_CONFIG_SET
 static config_set_t config_set_decoded;
-static bool config_set_available;
-static uint32_t config_set_timestamp_ms;
-static bool config_set_unread;
+#endif
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+static handshake_request_t handshake_request_decoded;
+#endif
+static const void * const decode_storage[BLE_DECODE_MESSAGE_COUNT] = {
+#if BLE_ENABLE_CONFIG_SET
+    &config_set_decoded,
+#endif
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+    &handshake_request_decoded,
+#endif
+};
+
+static bool decode_available[BLE_DECODE_MESSAGE_COUNT];
+static bool decode_unread[BLE_DECODE_MESSAGE_COUNT];
+static uint32_t decode_timestamp_ms[BLE_DECODE_MESSAGE_COUNT];
+static volatile uint32_t decode_seq[BLE_DECODE_MESSAGE_COUNT];
+static const uint32_t decode_max_age_ms[BLE_DECODE_MESSAGE_COUNT] = {
+#if BLE_ENABLE_CONFIG_SET
+    1000,
+#endif
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+    60000,
+#endif
+};
+
+// Health counters; BLE_EVENT counts a stage and passes it to BLE_TRACE
+#if BLE_ENABLE_STATS
+const uint32_t ble_stats_interarrival_bounds_ms[BLE_STATS_INTERARRIVAL_BUCKETS - 1] = {10, 20, 50, 100, 200, 500, 1000, 2000};
+static ble_stats_t ble_stats;
+static uint32_t stats_last_arrival_ms[BLE_DECODE_MESSAGE_COUNT];
+
+// Count a frame against its client message (unknown IDs only count in frames_in)
+static void ble_stats_count_frame(uint8_t msg_id) {
+    switch (msg_id) {
+#if BLE_ENABLE_CONFIG_SET
+        case 0x10:
+            ble_stats.rx_frames[BLE_DECODE_INDEX_CONFIG_SET]++;
+            break;
+#endif
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+        case 0x7F:
+            ble_stats.rx_frames[BLE_DECODE_INDEX_HANDSHAKE_REQUEST]++;
+            break;
+#endif
+        default:
+            break;
+    }
+}
+
+// Count a stored message and bucket the time since its previous arrival
+static void ble_stats_record_arrival(uint8_t index, uint32_t time_ms) {
+    if (ble_stats.rx_messages[index]++ > 0) {
+        uint32_t interval_ms = time_ms - stats_last_arrival_ms[index];
+        uint8_t bucket = 0;
+        while (bucket < BLE_STATS_INTERARRIVAL_BUCKETS - 1 && interval_ms > ble_stats_interarrival_bounds_ms[bucket]) {
+            bucket++;
+        }
+        ble_stats.rx_interarrival[index][bucket]++;
+    }
+    stats_last_arrival_ms[index] = time_ms;
+}
+
+#define BLE_STATS_INC(counter) (ble_stats.counter++)
+#define BLE_STATS_FRAME(msg_id) ble_stats_count_frame(msg_id)
+#define BLE_STATS_ARRIVAL(index, time_ms) ble_stats_record_arrival(index, time_ms)
+#else
+#define BLE_STATS_INC(counter) ((void)0)
+#define BLE_STATS_FRAME(msg_id) ((void)0)
+#define BLE_STATS_ARRIVAL(index, time_ms) ((void)0)
+#endif
+#define BLE_EVENT(counter, event, msg_id) do { BLE_STATS_INC(counter); BLE_TRACE(event, msg_id); } while (0)
 
 // ============================================================================
 // Protocol layer helper functions
@@ -147,10 +396,23 @@ static uint8_t ble_calculate_checksum(const uint8_t *data, uint16_t length) {
     return (uint8_t)(sum & 0xFF);
 }
 
+// Split an encoded frame into MTU-sized fragments
+uint16_t ble_encode_fragment(ble_frame_t frame, uint16_t *offset, uint8_t *out, uint16_t mtu) {
+    if (offset == NULL || out == NULL || *offset >= frame.length) return 0;
+
+    // Continuation frames are raw payload, so every fragment is a plain slice
+    uint16_t chunk = frame.length - *offset;
+    if (chunk > mtu) chunk = mtu;
+    memcpy(out, &frame.data[*offset], chunk);
+    *offset += chunk;
+    return chunk;
+}
+
 // ============================================================================
 // Server message encoding functions (messages server sends)
 // ============================================================================
 
+#if BLE_ENABLE_HEARTBEAT
 // Begin encoding heartbeat message
 void ble_encode_heartbeat_begin(void) {
     const uint16_t payload_size = sizeof(heartbeat_t);
@@ -161,27 +423,27 @@ void ble_encode_heartbeat_begin(void) {
     heartbeat_encode_buffer[2] = 0x01;
     
     // Zero out payload area
-    memset(&heartbeat_encode_buffer[3], 0, payload_size);
+    memset(&heartbeat_encode_buffer[BLE_FIRST_HEADER_SIZE], 0, payload_size);
     
     // Frame length includes header, payload, and checksum
-    heartbeat_encode_len = 3 + payload_size + 1;
+    heartbeat_encode_len = BLE_FIRST_HEADER_SIZE + payload_size + 1;
 }
 
 // Set uptime_ms in heartbeat message
 void ble_encode_heartbeat_set_uptime_ms(uint32_t value) {
-    heartbeat_t *msg = (heartbeat_t*)&heartbeat_encode_buffer[3];
+    heartbeat_t *msg = (heartbeat_t*)&heartbeat_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->uptime_ms = value;
 }
 
 // Set lvBattery_mv in heartbeat message
 void ble_encode_heartbeat_set_lvBattery_mv(uint32_t value) {
-    heartbeat_t *msg = (heartbeat_t*)&heartbeat_encode_buffer[3];
+    heartbeat_t *msg = (heartbeat_t*)&heartbeat_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->lvBattery_mv = value;
 }
 
 // Set vehicle_state in heartbeat message
 void ble_encode_heartbeat_set_vehicle_state(uint8_t value) {
-    heartbeat_t *msg = (heartbeat_t*)&heartbeat_encode_buffer[3];
+    heartbeat_t *msg = (heartbeat_t*)&heartbeat_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->vehicle_state = value;
 }
 
@@ -189,7 +451,7 @@ void ble_encode_heartbeat_set_vehicle_state(uint8_t value) {
 ble_frame_t ble_encode_heartbeat_get_frame(void) {
     // Calculate checksum before returning frame
     uint8_t payload_size = heartbeat_encode_buffer[1];
-    heartbeat_encode_buffer[3 + payload_size] = ble_calculate_checksum(&heartbeat_encode_buffer[3], payload_size);
+    heartbeat_encode_buffer[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&heartbeat_encode_buffer[BLE_FIRST_HEADER_SIZE], payload_size);
     
     ble_frame_t frame = {
         .data = heartbeat_encode_buffer,
@@ -198,6 +460,22 @@ ble_frame_t ble_encode_heartbeat_get_frame(void) {
     return frame;
 }
 
+// Queue encoded heartbeat frame for transmission
+bool ble_encode_heartbeat_enqueue(void) {
+    if (heartbeat_encode_buffer[1] > ble_link.peer_max_reassembly) return false;  // Peer cannot reassemble it
+    ble_encode_heartbeat_get_frame();
+    tx_offset[BLE_TX_INDEX_HEARTBEAT] = 0;
+    tx_pending[BLE_TX_INDEX_HEARTBEAT] = true;
+    return true;
+}
+
+// Check if the heartbeat frame is still queued or being sent
+bool ble_encode_heartbeat_is_queued(void) {
+    return tx_pending[BLE_TX_INDEX_HEARTBEAT];
+}
+#endif
+
+#if BLE_ENABLE_SERVER_MESSAGE
 // Begin encoding server_message message
 void ble_encode_server_message_begin(void) {
     const uint16_t payload_size = sizeof(server_message_t);
@@ -208,15 +486,15 @@ void ble_encode_server_message_begin(void) {
     server_message_encode_buffer[2] = 0x04;
     
     // Zero out payload area
-    memset(&server_message_encode_buffer[3], 0, payload_size);
+    memset(&server_message_encode_buffer[BLE_FIRST_HEADER_SIZE], 0, payload_size);
     
     // Frame length includes header, payload, and checksum
-    server_message_encode_len = 3 + payload_size + 1;
+    server_message_encode_len = BLE_FIRST_HEADER_SIZE + payload_size + 1;
 }
 
 // Set data in server_message message
 void ble_encode_server_message_set_data(const uint8_t* value) {
-    server_message_t *msg = (server_message_t*)&server_message_encode_buffer[3];
+    server_message_t *msg = (server_message_t*)&server_message_encode_buffer[BLE_FIRST_HEADER_SIZE];
     if (value != NULL) {
         strncpy(msg->data, (const char*)value, sizeof(msg->data) - 1);
         msg->data[sizeof(msg->data) - 1] = '\0';
@@ -229,7 +507,7 @@ void ble_encode_server_message_set_data(const uint8_t* value) {
 ble_frame_t ble_encode_server_message_get_frame(void) {
     // Calculate checksum before returning frame
     uint8_t payload_size = server_message_encode_buffer[1];
-    server_message_encode_buffer[3 + payload_size] = ble_calculate_checksum(&server_message_encode_buffer[3], payload_size);
+    server_message_encode_buffer[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&server_message_encode_buffer[BLE_FIRST_HEADER_SIZE], payload_size);
     
     ble_frame_t frame = {
         .data = server_message_encode_buffer,
@@ -238,6 +516,22 @@ ble_frame_t ble_encode_server_message_get_frame(void) {
     return frame;
 }
 
+// Queue encoded server_message frame for transmission
+bool ble_encode_server_message_enqueue(void) {
+    if (server_message_encode_buffer[1] > ble_link.peer_max_reassembly) return false;  // Peer cannot reassemble it
+    ble_encode_server_message_get_frame();
+    tx_offset[BLE_TX_INDEX_SERVER_MESSAGE] = 0;
+    tx_pending[BLE_TX_INDEX_SERVER_MESSAGE] = true;
+    return true;
+}
+
+// Check if the server_message frame is still queued or being sent
+bool ble_encode_server_message_is_queued(void) {
+    return tx_pending[BLE_TX_INDEX_SERVER_MESSAGE];
+}
+#endif
+
+#if BLE_ENABLE_BMS_DATA
 // Begin encoding bms_data message
 void ble_encode_bms_data_begin(void) {
     const uint16_t payload_size = sizeof(bms_data_t);
@@ -248,159 +542,159 @@ void ble_encode_bms_data_begin(void) {
     bms_data_encode_buffer[2] = 0x02;
     
     // Zero out payload area
-    memset(&bms_data_encode_buffer[3], 0, payload_size);
+    memset(&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE], 0, payload_size);
     
     // Frame length includes header, payload, and checksum
-    bms_data_encode_len = 3 + payload_size + 1;
+    bms_data_encode_len = BLE_FIRST_HEADER_SIZE + payload_size + 1;
 }
 
 // Set cellVoltage1_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage1_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage1_mv = value;
 }
 
 // Set cellVoltage2_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage2_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage2_mv = value;
 }
 
 // Set cellVoltage3_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage3_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage3_mv = value;
 }
 
 // Set cellVoltage4_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage4_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage4_mv = value;
 }
 
 // Set cellVoltage5_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage5_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage5_mv = value;
 }
 
 // Set cellVoltage6_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage6_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage6_mv = value;
 }
 
 // Set cellVoltage7_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage7_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage7_mv = value;
 }
 
 // Set cellVoltage8_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage8_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage8_mv = value;
 }
 
 // Set cellVoltage9_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage9_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage9_mv = value;
 }
 
 // Set cellVoltage10_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage10_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage10_mv = value;
 }
 
 // Set cellVoltage11_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage11_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage11_mv = value;
 }
 
 // Set cellVoltage12_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage12_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage12_mv = value;
 }
 
 // Set cellVoltage13_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage13_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage13_mv = value;
 }
 
 // Set cellVoltage14_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage14_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage14_mv = value;
 }
 
 // Set cellVoltage15_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage15_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage15_mv = value;
 }
 
 // Set cellVoltage16_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage16_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage16_mv = value;
 }
 
 // Set cellVoltage17_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage17_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage17_mv = value;
 }
 
 // Set cellVoltage18_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage18_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage18_mv = value;
 }
 
 // Set cellVoltage19_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage19_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage19_mv = value;
 }
 
 // Set cellVoltage20_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage20_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage20_mv = value;
 }
 
 // Set cellVoltage21_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage21_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage21_mv = value;
 }
 
 // Set cellVoltage22_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage22_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage22_mv = value;
 }
 
 // Set cellVoltage23_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage23_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage23_mv = value;
 }
 
 // Set cellVoltage24_mv in bms_data message
 void ble_encode_bms_data_set_cellVoltage24_mv(uint16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellVoltage24_mv = value;
 }
 
 // Set packTemp_c in bms_data message
 void ble_encode_bms_data_set_packTemp_c(int16_t value) {
-    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[3];
+    bms_data_t *msg = (bms_data_t*)&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->packTemp_c = value;
 }
 
@@ -408,7 +702,7 @@ void ble_encode_bms_data_set_packTemp_c(int16_t value) {
 ble_frame_t ble_encode_bms_data_get_frame(void) {
     // Calculate checksum before returning frame
     uint8_t payload_size = bms_data_encode_buffer[1];
-    bms_data_encode_buffer[3 + payload_size] = ble_calculate_checksum(&bms_data_encode_buffer[3], payload_size);
+    bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&bms_data_encode_buffer[BLE_FIRST_HEADER_SIZE], payload_size);
     
     ble_frame_t frame = {
         .data = bms_data_encode_buffer,
@@ -417,6 +711,22 @@ ble_frame_t ble_encode_bms_data_get_frame(void) {
     return frame;
 }
 
+// Queue encoded bms_data frame for transmission
+bool ble_encode_bms_data_enqueue(void) {
+    if (bms_data_encode_buffer[1] > ble_link.peer_max_reassembly) return false;  // Peer cannot reassemble it
+    ble_encode_bms_data_get_frame();
+    tx_offset[BLE_TX_INDEX_BMS_DATA] = 0;
+    tx_pending[BLE_TX_INDEX_BMS_DATA] = true;
+    return true;
+}
+
+// Check if the bms_data frame is still queued or being sent
+bool ble_encode_bms_data_is_queued(void) {
+    return tx_pending[BLE_TX_INDEX_BMS_DATA];
+}
+#endif
+
+#if BLE_ENABLE_BMS_STATUS
 // Begin encoding bms_status message
 void ble_encode_bms_status_begin(void) {
     const uint16_t payload_size = sizeof(bms_status_t);
@@ -427,81 +737,81 @@ void ble_encode_bms_status_begin(void) {
     bms_status_encode_buffer[2] = 0x03;
     
     // Zero out payload area
-    memset(&bms_status_encode_buffer[3], 0, payload_size);
+    memset(&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE], 0, payload_size);
     
     // Frame length includes header, payload, and checksum
-    bms_status_encode_len = 3 + payload_size + 1;
+    bms_status_encode_len = BLE_FIRST_HEADER_SIZE + payload_size + 1;
 }
 
 // Set soc_percent in bms_status message
 void ble_encode_bms_status_set_soc_percent(uint8_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->soc_percent = value;
 }
 
 // Set soh_percent in bms_status message
 void ble_encode_bms_status_set_soh_percent(uint8_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->soh_percent = value;
 }
 
 // Set packVoltage_mv in bms_status message
 void ble_encode_bms_status_set_packVoltage_mv(uint32_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->packVoltage_mv = value;
 }
 
 // Set packCurrent_ma in bms_status message
 void ble_encode_bms_status_set_packCurrent_ma(int32_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->packCurrent_ma = value;
 }
 
 // Set remainingRange_km in bms_status message
 void ble_encode_bms_status_set_remainingRange_km(uint16_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->remainingRange_km = value;
 }
 
 // Set timeToEmpty_min in bms_status message
 void ble_encode_bms_status_set_timeToEmpty_min(uint16_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->timeToEmpty_min = value;
 }
 
 // Set timeToFull_min in bms_status message
 void ble_encode_bms_status_set_timeToFull_min(uint16_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->timeToFull_min = value;
 }
 
 // Set cellDelta_mv in bms_status message
 void ble_encode_bms_status_set_cellDelta_mv(uint16_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->cellDelta_mv = value;
 }
 
 // Set minCellVoltage_mv in bms_status message
 void ble_encode_bms_status_set_minCellVoltage_mv(uint16_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->minCellVoltage_mv = value;
 }
 
 // Set maxCellVoltage_mv in bms_status message
 void ble_encode_bms_status_set_maxCellVoltage_mv(uint16_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->maxCellVoltage_mv = value;
 }
 
 // Set minCellIndex in bms_status message
 void ble_encode_bms_status_set_minCellIndex(uint8_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->minCellIndex = value;
 }
 
 // Set maxCellIndex in bms_status message
 void ble_encode_bms_status_set_maxCellIndex(uint8_t value) {
-    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[3];
+    bms_status_t *msg = (bms_status_t*)&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->maxCellIndex = value;
 }
 
@@ -509,7 +819,7 @@ void ble_encode_bms_status_set_maxCellIndex(uint8_t value) {
 ble_frame_t ble_encode_bms_status_get_frame(void) {
     // Calculate checksum before returning frame
     uint8_t payload_size = bms_status_encode_buffer[1];
-    bms_status_encode_buffer[3 + payload_size] = ble_calculate_checksum(&bms_status_encode_buffer[3], payload_size);
+    bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&bms_status_encode_buffer[BLE_FIRST_HEADER_SIZE], payload_size);
     
     ble_frame_t frame = {
         .data = bms_status_encode_buffer,
@@ -518,6 +828,22 @@ ble_frame_t ble_encode_bms_status_get_frame(void) {
     return frame;
 }
 
+// Queue encoded bms_status frame for transmission
+bool ble_encode_bms_status_enqueue(void) {
+    if (bms_status_encode_buffer[1] > ble_link.peer_max_reassembly) return false;  // Peer cannot reassemble it
+    ble_encode_bms_status_get_frame();
+    tx_offset[BLE_TX_INDEX_BMS_STATUS] = 0;
+    tx_pending[BLE_TX_INDEX_BMS_STATUS] = true;
+    return true;
+}
+
+// Check if the bms_status frame is still queued or being sent
+bool ble_encode_bms_status_is_queued(void) {
+    return tx_pending[BLE_TX_INDEX_BMS_STATUS];
+}
+#endif
+
+#if BLE_ENABLE_MOTOR_DATA
 // Begin encoding motor_data message
 void ble_encode_motor_data_begin(void) {
     const uint16_t payload_size = sizeof(motor_data_t);
@@ -528,51 +854,51 @@ void ble_encode_motor_data_begin(void) {
     motor_data_encode_buffer[2] = 0x05;
     
     // Zero out payload area
-    memset(&motor_data_encode_buffer[3], 0, payload_size);
+    memset(&motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE], 0, payload_size);
     
     // Frame length includes header, payload, and checksum
-    motor_data_encode_len = 3 + payload_size + 1;
+    motor_data_encode_len = BLE_FIRST_HEADER_SIZE + payload_size + 1;
 }
 
 // Set motorTemp_c in motor_data message
 void ble_encode_motor_data_set_motorTemp_c(int16_t value) {
-    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[3];
+    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->motorTemp_c = value;
 }
 
 // Set controllerTemp_c in motor_data message
 void ble_encode_motor_data_set_controllerTemp_c(int16_t value) {
-    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[3];
+    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->controllerTemp_c = value;
 }
 
 // Set motorRpm in motor_data message
 void ble_encode_motor_data_set_motorRpm(uint32_t value) {
-    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[3];
+    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->motorRpm = value;
 }
 
 // Set power_w in motor_data message
 void ble_encode_motor_data_set_power_w(uint32_t value) {
-    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[3];
+    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->power_w = value;
 }
 
 // Set torque_nm in motor_data message
 void ble_encode_motor_data_set_torque_nm(uint16_t value) {
-    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[3];
+    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->torque_nm = value;
 }
 
 // Set throttle_percent in motor_data message
 void ble_encode_motor_data_set_throttle_percent(uint8_t value) {
-    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[3];
+    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->throttle_percent = value;
 }
 
 // Set regenLevel_percent in motor_data message
 void ble_encode_motor_data_set_regenLevel_percent(uint8_t value) {
-    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[3];
+    motor_data_t *msg = (motor_data_t*)&motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->regenLevel_percent = value;
 }
 
@@ -580,7 +906,7 @@ void ble_encode_motor_data_set_regenLevel_percent(uint8_t value) {
 ble_frame_t ble_encode_motor_data_get_frame(void) {
     // Calculate checksum before returning frame
     uint8_t payload_size = motor_data_encode_buffer[1];
-    motor_data_encode_buffer[3 + payload_size] = ble_calculate_checksum(&motor_data_encode_buffer[3], payload_size);
+    motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&motor_data_encode_buffer[BLE_FIRST_HEADER_SIZE], payload_size);
     
     ble_frame_t frame = {
         .data = motor_data_encode_buffer,
@@ -589,6 +915,22 @@ ble_frame_t ble_encode_motor_data_get_frame(void) {
     return frame;
 }
 
+// Queue encoded motor_data frame for transmission
+bool ble_encode_motor_data_enqueue(void) {
+    if (motor_data_encode_buffer[1] > ble_link.peer_max_reassembly) return false;  // Peer cannot reassemble it
+    ble_encode_motor_data_get_frame();
+    tx_offset[BLE_TX_INDEX_MOTOR_DATA] = 0;
+    tx_pending[BLE_TX_INDEX_MOTOR_DATA] = true;
+    return true;
+}
+
+// Check if the motor_data frame is still queued or being sent
+bool ble_encode_motor_data_is_queued(void) {
+    return tx_pending[BLE_TX_INDEX_MOTOR_DATA];
+}
+#endif
+
+#if BLE_ENABLE_SAFETY_STATUS
 // Begin encoding safety_status message
 void ble_encode_safety_status_begin(void) {
     const uint16_t payload_size = sizeof(safety_status_t);
@@ -599,45 +941,45 @@ void ble_encode_safety_status_begin(void) {
     safety_status_encode_buffer[2] = 0x06;
     
     // Zero out payload area
-    memset(&safety_status_encode_buffer[3], 0, payload_size);
+    memset(&safety_status_encode_buffer[BLE_FIRST_HEADER_SIZE], 0, payload_size);
     
     // Frame length includes header, payload, and checksum
-    safety_status_encode_len = 3 + payload_size + 1;
+    safety_status_encode_len = BLE_FIRST_HEADER_SIZE + payload_size + 1;
 }
 
 // Set faultCodes in safety_status message
 void ble_encode_safety_status_set_faultCodes(uint16_t value) {
-    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[3];
+    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->faultCodes = value;
 }
 
 // Set warning_flags in safety_status message
 void ble_encode_safety_status_set_warning_flags(uint32_t value) {
-    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[3];
+    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->warning_flags = value;
 }
 
 // Set charging_status in safety_status message
 void ble_encode_safety_status_set_charging_status(uint8_t value) {
-    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[3];
+    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->charging_status = value;
 }
 
 // Set ride_mode in safety_status message
 void ble_encode_safety_status_set_ride_mode(uint8_t value) {
-    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[3];
+    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->ride_mode = value;
 }
 
 // Set frontBrake_engaged in safety_status message
 void ble_encode_safety_status_set_frontBrake_engaged(uint8_t value) {
-    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[3];
+    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->frontBrake_engaged = value;
 }
 
 // Set rearBrake_engaged in safety_status message
 void ble_encode_safety_status_set_rearBrake_engaged(uint8_t value) {
-    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[3];
+    safety_status_t *msg = (safety_status_t*)&safety_status_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->rearBrake_engaged = value;
 }
 
@@ -645,7 +987,7 @@ void ble_encode_safety_status_set_rearBrake_engaged(uint8_t value) {
 ble_frame_t ble_encode_safety_status_get_frame(void) {
     // Calculate checksum before returning frame
     uint8_t payload_size = safety_status_encode_buffer[1];
-    safety_status_encode_buffer[3 + payload_size] = ble_calculate_checksum(&safety_status_encode_buffer[3], payload_size);
+    safety_status_encode_buffer[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&safety_status_encode_buffer[BLE_FIRST_HEADER_SIZE], payload_size);
     
     ble_frame_t frame = {
         .data = safety_status_encode_buffer,
@@ -654,6 +996,22 @@ ble_frame_t ble_encode_safety_status_get_frame(void) {
     return frame;
 }
 
+// Queue encoded safety_status frame for transmission
+bool ble_encode_safety_status_enqueue(void) {
+    if (safety_status_encode_buffer[1] > ble_link.peer_max_reassembly) return false;  // Peer cannot reassemble it
+    ble_encode_safety_status_get_frame();
+    tx_offset[BLE_TX_INDEX_SAFETY_STATUS] = 0;
+    tx_pending[BLE_TX_INDEX_SAFETY_STATUS] = true;
+    return true;
+}
+
+// Check if the safety_status frame is still queued or being sent
+bool ble_encode_safety_status_is_queued(void) {
+    return tx_pending[BLE_TX_INDEX_SAFETY_STATUS];
+}
+#endif
+
+#if BLE_ENABLE_PERFORMANCE_DATA
 // Begin encoding performance_data message
 void ble_encode_performance_data_begin(void) {
     const uint16_t payload_size = sizeof(performance_data_t);
@@ -664,45 +1022,45 @@ void ble_encode_performance_data_begin(void) {
     performance_data_encode_buffer[2] = 0x07;
     
     // Zero out payload area
-    memset(&performance_data_encode_buffer[3], 0, payload_size);
+    memset(&performance_data_encode_buffer[BLE_FIRST_HEADER_SIZE], 0, payload_size);
     
     // Frame length includes header, payload, and checksum
-    performance_data_encode_len = 3 + payload_size + 1;
+    performance_data_encode_len = BLE_FIRST_HEADER_SIZE + payload_size + 1;
 }
 
 // Set odometer_km in performance_data message
 void ble_encode_performance_data_set_odometer_km(uint32_t value) {
-    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[3];
+    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->odometer_km = value;
 }
 
 // Set trip_km in performance_data message
 void ble_encode_performance_data_set_trip_km(uint32_t value) {
-    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[3];
+    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->trip_km = value;
 }
 
 // Set avgSpeed_kph in performance_data message
 void ble_encode_performance_data_set_avgSpeed_kph(uint16_t value) {
-    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[3];
+    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->avgSpeed_kph = value;
 }
 
 // Set topSpeed_kph in performance_data message
 void ble_encode_performance_data_set_topSpeed_kph(uint16_t value) {
-    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[3];
+    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->topSpeed_kph = value;
 }
 
 // Set energy_wh_per_km in performance_data message
 void ble_encode_performance_data_set_energy_wh_per_km(uint16_t value) {
-    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[3];
+    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->energy_wh_per_km = value;
 }
 
 // Set accel_0_60_ms in performance_data message
 void ble_encode_performance_data_set_accel_0_60_ms(uint16_t value) {
-    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[3];
+    performance_data_t *msg = (performance_data_t*)&performance_data_encode_buffer[BLE_FIRST_HEADER_SIZE];
     msg->accel_0_60_ms = value;
 }
 
@@ -710,7 +1068,7 @@ void ble_encode_performance_data_set_accel_0_60_ms(uint16_t value) {
 ble_frame_t ble_encode_performance_data_get_frame(void) {
     // Calculate checksum before returning frame
     uint8_t payload_size = performance_data_encode_buffer[1];
-    performance_data_encode_buffer[3 + payload_size] = ble_calculate_checksum(&performance_data_encode_buffer[3], payload_size);
+    performance_data_encode_buffer[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&performance_data_encode_buffer[BLE_FIRST_HEADER_SIZE], payload_size);
     
     ble_frame_t frame = {
         .data = performance_data_encode_buffer,
@@ -719,22 +1077,284 @@ ble_frame_t ble_encode_performance_data_get_frame(void) {
     return frame;
 }
 
+// Queue encoded performance_data frame for transmission
+bool ble_encode_performance_data_enqueue(void) {
+    if (performance_data_encode_buffer[1] > ble_link.peer_max_reassembly) return false;  // Peer cannot reassemble it
+    ble_encode_performance_data_get_frame();
+    tx_offset[BLE_TX_INDEX_PERFORMANCE_DATA] = 0;
+    tx_pending[BLE_TX_INDEX_PERFORMANCE_DATA] = true;
+    return true;
+}
+
+// Check if the performance_data frame is still queued or being sent
+bool ble_encode_performance_data_is_queued(void) {
+    return tx_pending[BLE_TX_INDEX_PERFORMANCE_DATA];
+}
+#endif
+
+#if BLE_ENABLE_HANDSHAKE_RESPONSE
+// Begin encoding handshake_response message
+void ble_encode_handshake_response_begin(void) {
+    const uint16_t payload_size = sizeof(handshake_response_t);
+    
+    // Frame: [0xAA][Length][MsgID][Payload][Checksum]
+    handshake_response_encode_buffer[0] = BLE_SYNC_FIRST;
+    handshake_response_encode_buffer[1] = payload_size;
+    handshake_response_encode_buffer[2] = 0x7E;
+    
+    // Zero out payload area
+    memset(&handshake_response_encode_buffer[BLE_FIRST_HEADER_SIZE], 0, payload_size);
+    
+    // Frame length includes header, payload, and checksum
+    handshake_response_encode_len = BLE_FIRST_HEADER_SIZE + payload_size + 1;
+}
+
+// Set protocol_version in handshake_response message
+void ble_encode_handshake_response_set_protocol_version(uint16_t value) {
+    handshake_response_t *msg = (handshake_response_t*)&handshake_response_encode_buffer[BLE_FIRST_HEADER_SIZE];
+    msg->protocol_version = value;
+}
+
+// Set schema_hash in handshake_response message
+void ble_encode_handshake_response_set_schema_hash(uint32_t value) {
+    handshake_response_t *msg = (handshake_response_t*)&handshake_response_encode_buffer[BLE_FIRST_HEADER_SIZE];
+    msg->schema_hash = value;
+}
+
+// Set max_reassembly in handshake_response message
+void ble_encode_handshake_response_set_max_reassembly(uint16_t value) {
+    handshake_response_t *msg = (handshake_response_t*)&handshake_response_encode_buffer[BLE_FIRST_HEADER_SIZE];
+    msg->max_reassembly = value;
+}
+
+// Set mtu in handshake_response message
+void ble_encode_handshake_response_set_mtu(uint16_t value) {
+    handshake_response_t *msg = (handshake_response_t*)&handshake_response_encode_buffer[BLE_FIRST_HEADER_SIZE];
+    msg->mtu = value;
+}
+
+// Set features in handshake_response message
+void ble_encode_handshake_response_set_features(uint32_t value) {
+    handshake_response_t *msg = (handshake_response_t*)&handshake_response_encode_buffer[BLE_FIRST_HEADER_SIZE];
+    msg->features = value;
+}
+
+// Get encoded handshake_response frame
+ble_frame_t ble_encode_handshake_response_get_frame(void) {
+    // Calculate checksum before returning frame
+    uint8_t payload_size = handshake_response_encode_buffer[1];
+    handshake_response_encode_buffer[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&handshake_response_encode_buffer[BLE_FIRST_HEADER_SIZE], payload_size);
+    
+    ble_frame_t frame = {
+        .data = handshake_response_encode_buffer,
+        .length = handshake_response_encode_len
+    };
+    return frame;
+}
+
+// Queue encoded handshake_response frame for transmission
+bool ble_encode_handshake_response_enqueue(void) {
+    ble_encode_handshake_response_get_frame();
+    tx_offset[BLE_TX_INDEX_HANDSHAKE_RESPONSE] = 0;
+    tx_pending[BLE_TX_INDEX_HANDSHAKE_RESPONSE] = true;
+    return true;
+}
+
+// Check if the handshake_response frame is still queued or being sent
+bool ble_encode_handshake_response_is_queued(void) {
+    return tx_pending[BLE_TX_INDEX_HANDSHAKE_RESPONSE];
+}
+#endif
+
+// Number of encoded fragments still owed for a message that has started sending
+static uint8_t ble_tx_in_flight(void) {
+    uint8_t count = 0;
+    for (uint8_t i = 0; i < BLE_TX_MESSAGE_COUNT; i++) {
+        if (tx_pending[i] && tx_offset[i] > 0) count++;
+    }
+    return count;
+}
+
+// Append whole queued frames to a notification, highest priority first
+// (packed_frames: the receiver splits them at each frame's length)
+static uint16_t ble_tx_pack(uint8_t *out, uint16_t space) {
+    uint16_t used = 0;
+    for (;;) {
+        int16_t selected = -1;
+        for (uint8_t i = 0; i < BLE_TX_MESSAGE_COUNT; i++) {
+            if (!tx_pending[i] || tx_offset[i] > 0 || *tx_lengths[i] > space - used) continue;
+            if (selected < 0 || tx_priority[i] > tx_priority[selected]) {
+                selected = i;
+            }
+        }
+        if (selected < 0) return used;
+        memcpy(&out[used], tx_buffers[selected], *tx_lengths[selected]);
+        used += *tx_lengths[selected];
+        tx_pending[selected] = false;
+        BLE_EVENT(tx_frames[selected], BLE_TRACE_TX_FRAGMENT, tx_buffers[selected][2]);
+        BLE_EVENT(tx_messages[selected], BLE_TRACE_TX_COMPLETE, tx_buffers[selected][2]);
+    }
+}
+
+// Get the next fragment to transmit, at most mtu bytes
+// Returns the fragment length written to out, or 0 when nothing is queued
+uint16_t ble_tx_next_fragment(uint8_t *out, uint16_t mtu) {
+    if (out == NULL) return 0;
+    
+    // Pick the highest priority message that may send now. A message that has
+    // not started may only interleave with partially sent ones if it fits in
+    // a single frame, since continuation frames carry no stream ID.
+    uint8_t in_flight = ble_tx_in_flight();
+    int16_t selected = -1;
+    for (uint8_t i = 0; i < BLE_TX_MESSAGE_COUNT; i++) {
+        if (!tx_pending[i]) continue;
+        if (tx_offset[i] == 0 && in_flight > 0 && *tx_lengths[i] > mtu) {
+            continue;
+        }
+        if (selected < 0 || tx_priority[i] > tx_priority[selected]) {
+            selected = i;
+        }
+    }
+    if (selected < 0) return 0;
+    
+    ble_frame_t frame = {
+        .data = tx_buffers[selected],
+        .length = *tx_lengths[selected]
+    };
+    uint16_t fragment_len = ble_encode_fragment(frame, &tx_offset[selected], out, mtu);
+    if (fragment_len > 0) {
+        BLE_EVENT(tx_frames[selected], BLE_TRACE_TX_FRAGMENT, frame.data[2]);
+        if (tx_offset[selected] >= frame.length) {
+            BLE_EVENT(tx_messages[selected], BLE_TRACE_TX_COMPLETE, frame.data[2]);
+        }
+    }
+    if (fragment_len == 0 || tx_offset[selected] >= frame.length) {
+        tx_pending[selected] = false;
+        tx_offset[selected] = 0;
+    }
+    // A notification that carried a whole frame is filled up with other
+    // whole frames when the peer accepts packed frames
+    if (fragment_len == frame.length && (ble_link.features & BLE_FEATURE_PACKED_FRAMES)) {
+        fragment_len += ble_tx_pack(&out[fragment_len], mtu - fragment_len);
+    }
+    return fragment_len;
+}
+
+// Check if every queued message has been fully sent
+bool ble_tx_is_idle(void) {
+    for (uint8_t i = 0; i < BLE_TX_MESSAGE_COUNT; i++) {
+        if (tx_pending[i]) return false;
+    }
+    return true;
+}
+
 // ============================================================================
 // Client message decoding functions (messages server receives)
 // ============================================================================
 
-// Copy decoded payload to appropriate message buffer
-static void ble_decode_store_message(uint32_t timestamp_ms) {
-    switch (decode_msg_id) {
+// Seqlock writer side: a message's sequence is odd while it is being rewritten
+static void ble_decode_write_begin(uint8_t index) {
+    decode_seq[index]++;
+    BLE_MEMORY_BARRIER();
+}
+
+static void ble_decode_write_end(uint8_t index) {
+    BLE_MEMORY_BARRIER();
+    decode_seq[index]++;
+}
+
+// Seqlock reader side: copy a message's latest payload, retrying while the
+// decoder rewrites it. Returns false if none is available or every attempt
+// overlapped a write
+static bool ble_decode_read_consistent(uint8_t index, void *out, uint8_t size) {
+    for (uint8_t attempt = 0; attempt < BLE_DECODE_SNAPSHOT_RETRIES; attempt++) {
+        uint32_t seq = decode_seq[index];
+        BLE_MEMORY_BARRIER();
+        if (seq & 1) continue;
+        if (!decode_available[index]) return false;
+        memcpy(out, decode_storage[index], size);
+        BLE_MEMORY_BARRIER();
+        if (decode_seq[index] == seq) {
+            decode_unread[index] = false;
+            return true;
+        }
+    }
+    return false;
+}
+
+// Copy validated payload to the appropriate message buffer
+// Returns false for unknown message IDs or unexpected payload sizes
+static bool ble_decode_store_message(uint8_t msg_id, const uint8_t *payload, uint8_t payload_len, uint32_t timestamp_ms) {
+    switch (msg_id) {
+#if BLE_ENABLE_CONFIG_SET
         case 0x10:
-            memcpy(&config_set_decoded, decode_payload_buffer, sizeof(config_set_t));
-            config_set_available = true;
-            config_set_timestamp_ms = timestamp_ms;
-            config_set_unread = true;
-            break;
+            if (payload_len != sizeof(config_set_t)) return false;
+            BLE_STATS_ARRIVAL(BLE_DECODE_INDEX_CONFIG_SET, timestamp_ms);
+            BLE_TRACE(BLE_TRACE_MESSAGE_STORED, msg_id);
+            ble_decode_write_begin(BLE_DECODE_INDEX_CONFIG_SET);
+            memcpy(&config_set_decoded, payload, sizeof(config_set_t));
+            decode_available[BLE_DECODE_INDEX_CONFIG_SET] = true;
+            decode_timestamp_ms[BLE_DECODE_INDEX_CONFIG_SET] = timestamp_ms;
+            decode_unread[BLE_DECODE_INDEX_CONFIG_SET] = true;
+            ble_decode_write_end(BLE_DECODE_INDEX_CONFIG_SET);
+            return true;
+#endif
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+        case 0x7F:
+            if (payload_len != sizeof(handshake_request_t)) return false;
+            BLE_STATS_ARRIVAL(BLE_DECODE_INDEX_HANDSHAKE_REQUEST, timestamp_ms);
+            BLE_TRACE(BLE_TRACE_MESSAGE_STORED, msg_id);
+            ble_decode_write_begin(BLE_DECODE_INDEX_HANDSHAKE_REQUEST);
+            memcpy(&handshake_request_decoded, payload, sizeof(handshake_request_t));
+            decode_available[BLE_DECODE_INDEX_HANDSHAKE_REQUEST] = true;
+            decode_timestamp_ms[BLE_DECODE_INDEX_HANDSHAKE_REQUEST] = timestamp_ms;
+            decode_unread[BLE_DECODE_INDEX_HANDSHAKE_REQUEST] = true;
+            ble_decode_write_end(BLE_DECODE_INDEX_HANDSHAKE_REQUEST);
+            return true;
+#endif
         default:
-            break;
+            return false;
+    }
+}
+
+// Release partial messages that have not progressed within the timeout
+static void ble_decode_expire_slots(uint32_t time_ms) {
+    for (uint8_t i = 0; i < BLE_REASSEMBLY_SLOTS; i++) {
+        ble_reassembly_slot_t *slot = &decode_slots[i];
+        if (slot->active && (uint32_t)(time_ms - slot->last_frame_ms) > BLE_REASSEMBLY_TIMEOUT_MS) {
+            BLE_EVENT(reassembly_orphaned, BLE_TRACE_REASSEMBLY_ORPHANED, slot->msg_id);
+            slot->active = false;
+        }
+    }
+}
+
+// Find the active slot reassembling a stream (NULL if none)
+static ble_reassembly_slot_t *ble_decode_find_slot(uint8_t stream_id) {
+    for (uint8_t i = 0; i < BLE_REASSEMBLY_SLOTS; i++) {
+        if (decode_slots[i].active && decode_slots[i].stream_id == stream_id) {
+            return &decode_slots[i];
+        }
+    }
+    return NULL;
+}
+
+// Get a slot for a new message: restart the stream's slot, else take a free
+// slot, else evict the least recently updated one
+static ble_reassembly_slot_t *ble_decode_claim_slot(uint8_t stream_id) {
+    ble_reassembly_slot_t *slot = ble_decode_find_slot(stream_id);
+    if (slot != NULL) {
+        BLE_EVENT(reassembly_aborted, BLE_TRACE_REASSEMBLY_ABORTED, slot->msg_id);
+        return slot;
+    }
+    slot = &decode_slots[0];
+    for (uint8_t i = 0; i < BLE_REASSEMBLY_SLOTS; i++) {
+        if (!decode_slots[i].active) return &decode_slots[i];
+        if ((int32_t)(decode_slots[i].last_frame_ms - slot->last_frame_ms) < 0) {
+            slot = &decode_slots[i];
+        }
     }
+    BLE_EVENT(reassembly_aborted, BLE_TRACE_REASSEMBLY_ABORTED, slot->msg_id);
+    return slot;
 }
 
 // Decode client message frame (supports multi-frame reassembly)
@@ -742,108 +1362,287 @@ static void ble_decode_store_message(uint32_t timestamp_ms) {
 // time_ms: Current time in milliseconds for timestamping received messages
 bool ble_decode_frame(const uint8_t *frame, uint16_t frame_len, uint32_t time_ms) {
     if (frame == NULL || frame_len < 1) return false;
+    BLE_EVENT(frames_in, BLE_TRACE_FRAME_IN, 0);
+    
+    ble_decode_expire_slots(time_ms);
     
     // Check if this is a first frame
     if (frame[0] == BLE_SYNC_FIRST) {
-        // Reset state for new message
-        decode_valid = false;
-        decode_bytes_received = 0;
-        
         // Verify minimum frame size for first frame
-        if (frame_len < 4) return false;
+        if (frame_len < BLE_FIRST_HEADER_SIZE + 1) {
+            BLE_EVENT(resyncs, BLE_TRACE_RESYNC, 0);
+            return false;
+        }
         
         // Extract header
-        decode_expected_size = frame[1];
-        decode_msg_id = frame[2];
-        
-        // Calculate payload bytes in this frame
-        uint16_t header_size = 3;
-        uint16_t payload_in_frame = frame_len - header_size;
+        uint8_t expected_size = frame[1];
+        uint8_t msg_id = frame[2];
+        uint8_t stream_id = 0;
+        const uint8_t *payload = &frame[BLE_FIRST_HEADER_SIZE];
+        uint16_t payload_in_frame = frame_len - BLE_FIRST_HEADER_SIZE;
+        BLE_STATS_FRAME(msg_id);
         
         // Check if this frame has checksum (complete message)
-        bool has_checksum = (payload_in_frame == decode_expected_size + 1);
-        
-        if (has_checksum) {
-            // Single-frame message - verify checksum
-            uint8_t checksum = frame[3 + decode_expected_size];
-            uint8_t calc_checksum = ble_calculate_checksum(&frame[3], decode_expected_size);
-            if (checksum != calc_checksum) return false;
-            
-            // Copy payload to buffer
-            memcpy(decode_payload_buffer, &frame[3], decode_expected_size);
-            decode_bytes_received = decode_expected_size;
-            decode_valid = true;
-            
-            // Store in per-message buffer
-            ble_decode_store_message(time_ms);
-            return true;
-        } else {
-            // Multi-frame message - copy partial payload
-            if (payload_in_frame > decode_expected_size) return false;
-            memcpy(decode_payload_buffer, &frame[3], payload_in_frame);
-            decode_bytes_received = payload_in_frame;
-            return false; // Need more frames
-        }
-    } else {
-        // Continuation frame (no sync byte, just payload)
-        if (decode_bytes_received == 0) return false; // No first frame received
-        
-        uint16_t remaining = decode_expected_size - decode_bytes_received;
-        bool has_checksum = (frame_len == remaining + 1);
-        
-        if (has_checksum) {
-            // Final frame - verify checksum
-            memcpy(&decode_payload_buffer[decode_bytes_received], frame, remaining);
-            decode_bytes_received += remaining;
-            
-            uint8_t checksum = frame[remaining];
-            uint8_t calc_checksum = ble_calculate_checksum(decode_payload_buffer, decode_expected_size);
+        if (payload_in_frame == expected_size + 1) {
+            // Single-frame message - validated straight from the frame so
+            // partially reassembled messages in other slots are kept
+            uint8_t checksum = payload[expected_size];
+            uint8_t calc_checksum = ble_calculate_checksum(payload, expected_size);
             if (checksum != calc_checksum) {
-                decode_bytes_received = 0; // Reset on checksum failure
+                BLE_EVENT(checksum_errors, BLE_TRACE_CHECKSUM_ERROR, msg_id);
                 return false;
             }
-            
-            decode_valid = true;
-            
-            // Store in per-message buffer
-            ble_decode_store_message(time_ms);
-            return true;
-        } else {
-            // Continuation frame - copy payload
-            if (frame_len > remaining) return false;
-            memcpy(&decode_payload_buffer[decode_bytes_received], frame, frame_len);
-            decode_bytes_received += frame_len;
-            return false; // Need more frames
+            return ble_decode_store_message(msg_id, payload, expected_size, time_ms);
         }
+        
+        // Multi-frame message - copy partial payload into a slot
+        if (payload_in_frame > expected_size || expected_size > BLE_DECODE_MAX_PAYLOAD) {
+            BLE_EVENT(resyncs, BLE_TRACE_RESYNC, msg_id);
+            return false;
+        }
+        ble_reassembly_slot_t *slot = ble_decode_claim_slot(stream_id);
+        slot->active = true;
+        slot->stream_id = stream_id;
+        slot->msg_id = msg_id;
+        slot->expected_size = expected_size;
+        slot->bytes_received = payload_in_frame;
+        slot->last_frame_ms = time_ms;
+        memcpy(slot->payload, payload, payload_in_frame);
+        BLE_TRACE(BLE_TRACE_REASSEMBLY_START, msg_id);
+        return false; // Need more frames
     }
+    
+    // Continuation frame (no sync byte, just payload)
+    ble_reassembly_slot_t *slot = ble_decode_find_slot(0);
+    if (slot == NULL) { // No first frame received
+        BLE_EVENT(reassembly_orphaned, BLE_TRACE_REASSEMBLY_ORPHANED, 0);
+        return false;
+    }
+    BLE_STATS_FRAME(slot->msg_id);
+    
+    const uint8_t *data = &frame[BLE_CONTINUATION_HEADER_SIZE];
+    uint16_t data_len = frame_len - BLE_CONTINUATION_HEADER_SIZE;
+    uint16_t remaining = slot->expected_size - slot->bytes_received;
+    
+    if (data_len == remaining + 1) {
+        // Final frame - verify checksum and release the slot
+        memcpy(&slot->payload[slot->bytes_received], data, remaining);
+        slot->bytes_received += remaining;
+        slot->active = false;
+        
+        uint8_t checksum = data[remaining];
+        uint8_t calc_checksum = ble_calculate_checksum(slot->payload, slot->expected_size);
+        if (checksum != calc_checksum) {
+            BLE_EVENT(checksum_errors, BLE_TRACE_CHECKSUM_ERROR, slot->msg_id);
+            return false;
+        }
+        
+        return ble_decode_store_message(slot->msg_id, slot->payload, slot->expected_size, time_ms);
+    }
+    
+    // Continuation frame - copy payload
+    if (data_len > remaining) {
+        BLE_EVENT(resyncs, BLE_TRACE_RESYNC, slot->msg_id);
+        return false;
+    }
+    memcpy(&slot->payload[slot->bytes_received], data, data_len);
+    slot->bytes_received += data_len;
+    slot->last_frame_ms = time_ms;
+    return false; // Need more frames
 }
 
+#if BLE_ENABLE_CONFIG_SET
 // Get param_id from config_set message
 uint8_t ble_decode_config_set_get_param_id(void) {
-    if (!config_set_available) return 0;
-    config_set_unread = false;
+    if (!decode_available[BLE_DECODE_INDEX_CONFIG_SET]) return 0;
+    decode_unread[BLE_DECODE_INDEX_CONFIG_SET] = false;
     return config_set_decoded.param_id;
 }
 
 // Get value from config_set message
 uint32_t ble_decode_config_set_get_value(void) {
-    if (!config_set_available) return 0;
-    config_set_unread = false;
+    if (!decode_available[BLE_DECODE_INDEX_CONFIG_SET]) return 0;
+    decode_unread[BLE_DECODE_INDEX_CONFIG_SET] = false;
     return config_set_decoded.value;
 }
 
+#endif
+
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+// Get protocol_version from handshake_request message
+uint16_t ble_decode_handshake_request_get_protocol_version(void) {
+    if (!decode_available[BLE_DECODE_INDEX_HANDSHAKE_REQUEST]) return 0;
+    decode_unread[BLE_DECODE_INDEX_HANDSHAKE_REQUEST] = false;
+    return handshake_request_decoded.protocol_version;
+}
+
+// Get schema_hash from handshake_request message
+uint32_t ble_decode_handshake_request_get_schema_hash(void) {
+    if (!decode_available[BLE_DECODE_INDEX_HANDSHAKE_REQUEST]) return 0;
+    decode_unread[BLE_DECODE_INDEX_HANDSHAKE_REQUEST] = false;
+    return handshake_request_decoded.schema_hash;
+}
+
+// Get max_reassembly from handshake_request message
+uint16_t ble_decode_handshake_request_get_max_reassembly(void) {
+    if (!decode_available[BLE_DECODE_INDEX_HANDSHAKE_REQUEST]) return 0;
+    decode_unread[BLE_DECODE_INDEX_HANDSHAKE_REQUEST] = false;
+    return handshake_request_decoded.max_reassembly;
+}
+
+// Get mtu from handshake_request message
+uint16_t ble_decode_handshake_request_get_mtu(void) {
+    if (!decode_available[BLE_DECODE_INDEX_HANDSHAKE_REQUEST]) return 0;
+    decode_unread[BLE_DECODE_INDEX_HANDSHAKE_REQUEST] = false;
+    return handshake_request_decoded.mtu;
+}
+
+// Get features from handshake_request message
+uint32_t ble_decode_handshake_request_get_features(void) {
+    if (!decode_available[BLE_DECODE_INDEX_HANDSHAKE_REQUEST]) return 0;
+    decode_unread[BLE_DECODE_INDEX_HANDSHAKE_REQUEST] = false;
+    return handshake_request_decoded.features;
+}
+
+#endif
+
+#if BLE_ENABLE_CONFIG_SET
+// Copy every config_set field at once, consistent even if ble_decode_frame
+// runs concurrently in another task or ISR
+bool ble_decode_config_set_read_snapshot(ble_config_set_snapshot_t *out) {
+    config_set_t copy;
+    if (out == NULL) return false;
+    if (!ble_decode_read_consistent(BLE_DECODE_INDEX_CONFIG_SET, &copy, sizeof(copy))) return false;
+    out->param_id = copy.param_id;
+    out->value = copy.value;
+    return true;
+}
+#endif
+
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+// Copy every handshake_request field at once, consistent even if ble_decode_frame
+// runs concurrently in another task or ISR
+bool ble_decode_handshake_request_read_snapshot(ble_handshake_request_snapshot_t *out) {
+    handshake_request_t copy;
+    if (out == NULL) return false;
+    if (!ble_decode_read_consistent(BLE_DECODE_INDEX_HANDSHAKE_REQUEST, &copy, sizeof(copy))) return false;
+    out->protocol_version = copy.protocol_version;
+    out->schema_hash = copy.schema_hash;
+    out->max_reassembly = copy.max_reassembly;
+    out->mtu = copy.mtu;
+    out->features = copy.features;
+    return true;
+}
+#endif
+
 // ============================================================================
 // Message status functions
 // ============================================================================
 
+#if BLE_ENABLE_CONFIG_SET
 // Check if config_set message is unread
 bool ble_decode_config_set_check_is_unread(void) {
-    return config_set_available && config_set_unread;
+    return decode_available[BLE_DECODE_INDEX_CONFIG_SET] && decode_unread[BLE_DECODE_INDEX_CONFIG_SET];
 }
 
 // Check if config_set data is stale (max age: 1000ms)
 bool ble_decode_config_set_check_data_is_stale(uint32_t time_ms) {
-    if (!config_set_available) return true;
-    uint32_t age_ms = time_ms - config_set_timestamp_ms;
+    if (!decode_available[BLE_DECODE_INDEX_CONFIG_SET]) return true;
+    uint32_t age_ms = time_ms - decode_timestamp_ms[BLE_DECODE_INDEX_CONFIG_SET];
     return age_ms > 1000;
 }
+#endif
+
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+// Check if handshake_request message is unread
+bool ble_decode_handshake_request_check_is_unread(void) {
+    return decode_available[BLE_DECODE_INDEX_HANDSHAKE_REQUEST] && decode_unread[BLE_DECODE_INDEX_HANDSHAKE_REQUEST];
+}
+
+// Check if handshake_request data is stale (max age: 60000ms)
+bool ble_decode_handshake_request_check_data_is_stale(uint32_t time_ms) {
+    if (!decode_available[BLE_DECODE_INDEX_HANDSHAKE_REQUEST]) return true;
+    uint32_t age_ms = time_ms - decode_timestamp_ms[BLE_DECODE_INDEX_HANDSHAKE_REQUEST];
+    return age_ms > 60000;
+}
+#endif
+
+// Get bitmask of stale client messages (bit n = BLE_DECODE_INDEX_* n)
+// Messages that have never been received are reported as stale
+ble_decode_mask_t ble_decode_stale_mask(uint32_t time_ms) {
+    ble_decode_mask_t mask = 0;
+    for (uint16_t i = 0; i < BLE_DECODE_MESSAGE_COUNT; i++) {
+        if (!decode_available[i] || (uint32_t)(time_ms - decode_timestamp_ms[i]) > decode_max_age_ms[i]) {
+            mask |= (ble_decode_mask_t)1 << i;
+        }
+    }
+    return mask;
+}
+
+// Get bitmask of unread client messages (bit n = BLE_DECODE_INDEX_* n)
+ble_decode_mask_t ble_decode_unread_mask(void) {
+    ble_decode_mask_t mask = 0;
+    for (uint16_t i = 0; i < BLE_DECODE_MESSAGE_COUNT; i++) {
+        if (decode_available[i] && decode_unread[i]) {
+            mask |= (ble_decode_mask_t)1 << i;
+        }
+    }
+    return mask;
+}
+
+// ============================================================================
+// Connection handshake
+// ============================================================================
+
+void ble_link_reset(void) {
+    ble_link.negotiated = false;
+    ble_link.compatible = true;
+    ble_link.schema_match = false;
+    ble_link.mtu = BLE_DEFAULT_MTU;
+    ble_link.peer_max_reassembly = 255;
+    ble_link.features = 0;
+}
+
+const ble_link_t *ble_link_get(void) {
+    return &ble_link;
+}
+
+#if BLE_ENABLE_HANDSHAKE_REQUEST && BLE_ENABLE_HANDSHAKE_RESPONSE
+bool ble_link_service(uint16_t local_mtu) {
+    ble_handshake_request_snapshot_t peer;
+    if (!ble_decode_handshake_request_check_is_unread()) return false;
+    if (!ble_decode_handshake_request_read_snapshot(&peer)) return false;
+
+    // Smaller MTU (never below the baseline), the peer's reassembly limit, and
+    // the sending features the peer accepts unless the major version differs
+    ble_link.negotiated = true;
+    ble_link.compatible = (peer.protocol_version >> 8) == (BLE_PROTOCOL_VERSION >> 8);
+    ble_link.schema_match = peer.schema_hash == BLE_SCHEMA_HASH;
+    ble_link.mtu = peer.mtu < local_mtu ? peer.mtu : local_mtu;
+    if (ble_link.mtu < BLE_DEFAULT_MTU) ble_link.mtu = BLE_DEFAULT_MTU;
+    ble_link.peer_max_reassembly = peer.max_reassembly;
+    ble_link.features = ble_link.compatible ? (peer.features & BLE_SEND_FEATURES) : 0;
+
+    ble_encode_handshake_response_begin();
+    ble_encode_handshake_response_set_protocol_version(BLE_PROTOCOL_VERSION);
+    ble_encode_handshake_response_set_schema_hash(BLE_SCHEMA_HASH);
+    ble_encode_handshake_response_set_max_reassembly(BLE_DECODE_MAX_PAYLOAD);
+    ble_encode_handshake_response_set_mtu(local_mtu);
+    ble_encode_handshake_response_set_features(BLE_LOCAL_FEATURES);
+    return ble_encode_handshake_response_enqueue();
+}
+#endif
+
+#if BLE_ENABLE_STATS
+// ============================================================================
+// Protocol health counters
+// ============================================================================
+
+void ble_stats_read(ble_stats_t *out) {
+    if (out != NULL) memcpy(out, &ble_stats, sizeof(ble_stats));
+}
+
+void ble_stats_reset(void) {
+    memset(&ble_stats, 0, sizeof(ble_stats));
+}
+#endif
@@ -39,24 +39,64 @@ typedef struct {
 #define MSG_ID_MOTOR_DATA         0x05
 #define MSG_ID_SAFETY_STATUS      0x06
 #define MSG_ID_PERFORMANCE_DATA   0x07
+#define MSG_ID_HANDSHAKE_RESPONSE 0x7E
 #define MSG_ID_CONFIG_SET         0x10
+#define MSG_ID_HANDSHAKE_REQUEST  0x7F
+
+// Message selection: build with -DBLE_ENABLE_<MSG>=0 to strip a message's
+// functions, buffers and dispatch case
+#ifndef BLE_ENABLE_HEARTBEAT
+#define BLE_ENABLE_HEARTBEAT 1
+#endif
+#ifndef BLE_ENABLE_SERVER_MESSAGE
+#define BLE_ENABLE_SERVER_MESSAGE 1
+#endif
+#ifndef BLE_ENABLE_BMS_DATA
+#define BLE_ENABLE_BMS_DATA 1
+#endif
+#ifndef BLE_ENABLE_BMS_STATUS
+#define BLE_ENABLE_BMS_STATUS 1
+#endif
+#ifndef BLE_ENABLE_MOTOR_DATA
+#define BLE_ENABLE_MOTOR_DATA 1
+#endif
+#ifndef BLE_ENABLE_SAFETY_STATUS
+#define BLE_ENABLE_SAFETY_STATUS 1
+#endif
+#ifndef BLE_ENABLE_PERFORMANCE_DATA
+#define BLE_ENABLE_PERFORMANCE_DATA 1
+#endif
+#ifndef BLE_ENABLE_HANDSHAKE_RESPONSE
+#define BLE_ENABLE_HANDSHAKE_RESPONSE 1
+#endif
+#ifndef BLE_ENABLE_CONFIG_SET
+#define BLE_ENABLE_CONFIG_SET 1
+#endif
+#ifndef BLE_ENABLE_HANDSHAKE_REQUEST
+#define BLE_ENABLE_HANDSHAKE_REQUEST 1
+#endif
 
 // ============================================================================
 // Server message encoding functions
 // ============================================================================
 
+#if BLE_ENABLE_HEARTBEAT
 // Encode and get heartbeat message
 void ble_encode_heartbeat_begin(void);
 void ble_encode_heartbeat_set_uptime_ms(uint32_t value);
 void ble_encode_heartbeat_set_lvBattery_mv(uint32_t value);
 void ble_encode_heartbeat_set_vehicle_state(uint8_t value);
 ble_frame_t ble_encode_heartbeat_get_frame(void);
+#endif
 
+#if BLE_ENABLE_SERVER_MESSAGE
 // Encode and get server_message message
 void ble_encode_server_message_begin(void);
 void ble_encode_server_message_set_data(const uint8_t* value);
 ble_frame_t ble_encode_server_message_get_frame(void);
+#endif
 
+#if BLE_ENABLE_BMS_DATA
 // Encode and get bms_data message
 void ble_encode_bms_data_begin(void);
 void ble_encode_bms_data_set_cellVoltage1_mv(uint16_t value);
@@ -85,7 +125,9 @@ void ble_encode_bms_data_set_cellVoltage23_mv(uint16_t value);
 void ble_encode_bms_data_set_cellVoltage24_mv(uint16_t value);
 void ble_encode_bms_data_set_packTemp_c(int16_t value);
 ble_frame_t ble_encode_bms_data_get_frame(void);
+#endif
 
+#if BLE_ENABLE_BMS_STATUS
 // Encode and get bms_status message
 void ble_encode_bms_status_begin(void);
 void ble_encode_bms_status_set_soc_percent(uint8_t value);
@@ -101,7 +143,9 @@ void ble_encode_bms_status_set_maxCellVoltage_mv(uint16_t value);
 void ble_encode_bms_status_set_minCellIndex(uint8_t value);
 void ble_encode_bms_status_set_maxCellIndex(uint8_t value);
 ble_frame_t ble_encode_bms_status_get_frame(void);
+#endif
 
+#if BLE_ENABLE_MOTOR_DATA
 // Encode and get motor_data message
 void ble_encode_motor_data_begin(void);
 void ble_encode_motor_data_set_motorTemp_c(int16_t value);
@@ -112,7 +156,9 @@ void ble_encode_motor_data_set_torque_nm(uint16_t value);
 void ble_encode_motor_data_set_throttle_percent(uint8_t value);
 void ble_encode_motor_data_set_regenLevel_percent(uint8_t value);
 ble_frame_t ble_encode_motor_data_get_frame(void);
+#endif
 
+#if BLE_ENABLE_SAFETY_STATUS
 // Encode and get safety_status message
 void ble_encode_safety_status_begin(void);
 void ble_encode_safety_status_set_faultCodes(uint16_t value);
@@ -122,7 +168,9 @@ void ble_encode_safety_status_set_ride_mode(uint8_t value);
 void ble_encode_safety_status_set_frontBrake_engaged(uint8_t value);
 void ble_encode_safety_status_set_rearBrake_engaged(uint8_t value);
 ble_frame_t ble_encode_safety_status_get_frame(void);
+#endif
 
+#if BLE_ENABLE_PERFORMANCE_DATA
 // Encode and get performance_data message
 void ble_encode_performance_data_begin(void);
 void ble_encode_performance_data_set_odometer_km(uint32_t value);
@@ -132,6 +180,85 @@ void ble_encode_performance_data_set_topSpeed_kph(uint16_t value);
 void ble_encode_performance_data_set_energy_wh_per_km(uint16_t value);
 void ble_encode_performance_data_set_accel_0_60_ms(uint16_t value);
 ble_frame_t ble_encode_performance_data_get_frame(void);
+#endif
+
+#if BLE_ENABLE_HANDSHAKE_RESPONSE
+// Encode and get handshake_response message
+void ble_encode_handshake_response_begin(void);
+void ble_encode_handshake_response_set_protocol_version(uint16_t value);
+void ble_encode_handshake_response_set_schema_hash(uint32_t value);
+void ble_encode_handshake_response_set_max_reassembly(uint16_t value);
+void ble_encode_handshake_response_set_mtu(uint16_t value);
+void ble_encode_handshake_response_set_features(uint32_t value);
+ble_frame_t ble_encode_handshake_response_get_frame(void);
+#endif
+
+// Split an encoded frame into MTU-sized fragments
+// offset: position in the frame, start at 0 (advanced on each call)
+// Returns the fragment length written to out, or 0 when the frame is fully sent
+uint16_t ble_encode_fragment(ble_frame_t frame, uint16_t *offset, uint8_t *out, uint16_t mtu);
+
+// ============================================================================
+// Server message transmit queue
+// ============================================================================
+
+// Queue the encoded message for transmission (after begin/set calls).
+// Re-queuing a message that is still being sent restarts it.
+// Returns false, without queuing, when the frame is larger than the peer's
+// max_reassembly (handshake_response is always queued).
+// The queue sends the message's own frame buffer, so begin/set on a queued
+// message would change a frame that is partly sent and whose checksum is
+// already computed: wait until is_queued() returns false (or ble_tx_is_idle())
+// before encoding the message again.
+#if BLE_ENABLE_HEARTBEAT
+bool ble_encode_heartbeat_enqueue(void);  // priority 1
+bool ble_encode_heartbeat_is_queued(void);
+#endif
+#if BLE_ENABLE_SERVER_MESSAGE
+bool ble_encode_server_message_enqueue(void);  // priority 0
+bool ble_encode_server_message_is_queued(void);
+#endif
+#if BLE_ENABLE_BMS_DATA
+bool ble_encode_bms_data_enqueue(void);  // priority 1
+bool ble_encode_bms_data_is_queued(void);
+#endif
+#if BLE_ENABLE_BMS_STATUS
+bool ble_encode_bms_status_enqueue(void);  // priority 1
+bool ble_encode_bms_status_is_queued(void);
+#endif
+#if BLE_ENABLE_MOTOR_DATA
+bool ble_encode_motor_data_enqueue(void);  // priority 2
+bool ble_encode_motor_data_is_queued(void);
+#endif
+#if BLE_ENABLE_SAFETY_STATUS
+bool ble_encode_safety_status_enqueue(void);  // priority 3
+bool ble_encode_safety_status_is_queued(void);
+#endif
+#if BLE_ENABLE_PERFORMANCE_DATA
+bool ble_encode_performance_data_enqueue(void);  // priority 1
+bool ble_encode_performance_data_is_queued(void);
+#endif
+#if BLE_ENABLE_HANDSHAKE_RESPONSE
+bool ble_encode_handshake_response_enqueue(void);  // priority 3
+bool ble_encode_handshake_response_is_queued(void);
+#endif
+
+// Get the next fragment to transmit, at most mtu bytes. Higher priority
+// messages preempt lower priority ones between fragments.
+// Returns the fragment length written to out, or 0 when nothing is queued
+uint16_t ble_tx_next_fragment(uint8_t *out, uint16_t mtu);
+bool ble_tx_is_idle(void);
+
+// Transmit queue indices, counting only enabled server messages
+#define BLE_TX_INDEX_HEARTBEAT              0
+#define BLE_TX_INDEX_SERVER_MESSAGE         (BLE_TX_INDEX_HEARTBEAT + BLE_ENABLE_HEARTBEAT)
+#define BLE_TX_INDEX_BMS_DATA               (BLE_TX_INDEX_SERVER_MESSAGE + BLE_ENABLE_SERVER_MESSAGE)
+#define BLE_TX_INDEX_BMS_STATUS             (BLE_TX_INDEX_BMS_DATA + BLE_ENABLE_BMS_DATA)
+#define BLE_TX_INDEX_MOTOR_DATA             (BLE_TX_INDEX_BMS_STATUS + BLE_ENABLE_BMS_STATUS)
+#define BLE_TX_INDEX_SAFETY_STATUS          (BLE_TX_INDEX_MOTOR_DATA + BLE_ENABLE_MOTOR_DATA)
+#define BLE_TX_INDEX_PERFORMANCE_DATA       (BLE_TX_INDEX_SAFETY_STATUS + BLE_ENABLE_SAFETY_STATUS)
+#define BLE_TX_INDEX_HANDSHAKE_RESPONSE     (BLE_TX_INDEX_PERFORMANCE_DATA + BLE_ENABLE_PERFORMANCE_DATA)
+#define BLE_TX_MESSAGE_COUNT                (BLE_TX_INDEX_HANDSHAKE_RESPONSE + BLE_ENABLE_HANDSHAKE_RESPONSE)
 
 // ============================================================================
 // Client message decoding functions
@@ -141,17 +268,157 @@ ble_frame_t ble_encode_performance_data_get_frame(void);
 // time_ms: Current time in milliseconds for timestamping received messages
 bool ble_decode_frame(const uint8_t *frame, uint16_t frame_len, uint32_t time_ms);
 
+#if BLE_ENABLE_CONFIG_SET
 // Get config_set message fields
 uint8_t ble_decode_config_set_get_param_id(void);
 uint32_t ble_decode_config_set_get_value(void);
 
+// Consistent copy of every config_set field without disabling interrupts
+// Returns false if none was received or the decoder kept rewriting it
+typedef struct {
+    uint8_t param_id;
+    uint32_t value;
+} ble_config_set_snapshot_t;
+bool ble_decode_config_set_read_snapshot(ble_config_set_snapshot_t *out);
+#endif
+
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+// Get handshake_request message fields
+uint16_t ble_decode_handshake_request_get_protocol_version(void);
+uint32_t ble_decode_handshake_request_get_schema_hash(void);
+uint16_t ble_decode_handshake_request_get_max_reassembly(void);
+uint16_t ble_decode_handshake_request_get_mtu(void);
+uint32_t ble_decode_handshake_request_get_features(void);
+
+// Consistent copy of every handshake_request field without disabling interrupts
+// Returns false if none was received or the decoder kept rewriting it
+typedef struct {
+    uint16_t protocol_version;
+    uint32_t schema_hash;
+    uint16_t max_reassembly;
+    uint16_t mtu;
+    uint32_t features;
+} ble_handshake_request_snapshot_t;
+bool ble_decode_handshake_request_read_snapshot(ble_handshake_request_snapshot_t *out);
+#endif
+
 // ============================================================================
 // Message status functions
 // ============================================================================
 
+// Client message status indices (bit positions in status masks), counting
+// only enabled messages
+#define BLE_DECODE_INDEX_CONFIG_SET         0
+#define BLE_DECODE_INDEX_HANDSHAKE_REQUEST  (BLE_DECODE_INDEX_CONFIG_SET + BLE_ENABLE_CONFIG_SET)
+#define BLE_DECODE_MESSAGE_COUNT            (BLE_DECODE_INDEX_HANDSHAKE_REQUEST + BLE_ENABLE_HANDSHAKE_REQUEST)
+
+#if BLE_ENABLE_CONFIG_SET
 // config_set message status
 bool ble_decode_config_set_check_is_unread(void);
 bool ble_decode_config_set_check_data_is_stale(uint32_t time_ms);
+#endif
+
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+// handshake_request message status
+bool ble_decode_handshake_request_check_is_unread(void);
+bool ble_decode_handshake_request_check_data_is_stale(uint32_t time_ms);
+#endif
+
+// Bulk status masks - one bit per client message
+typedef uint32_t ble_decode_mask_t;
+#if BLE_ENABLE_CONFIG_SET
+#define BLE_DECODE_MASK_CONFIG_SET          ((ble_decode_mask_t)1 << BLE_DECODE_INDEX_CONFIG_SET)
+#endif
+#if BLE_ENABLE_HANDSHAKE_REQUEST
+#define BLE_DECODE_MASK_HANDSHAKE_REQUEST   ((ble_decode_mask_t)1 << BLE_DECODE_INDEX_HANDSHAKE_REQUEST)
+#endif
+ble_decode_mask_t ble_decode_stale_mask(uint32_t time_ms);
+ble_decode_mask_t ble_decode_unread_mask(void);
+
+// ============================================================================
+// Connection handshake
+// ============================================================================
+
+// After connecting, the client sends handshake_request. ble_link_service() answers
+// with handshake_response and switches this connection to the common mode; until
+// then, and after ble_link_reset(), the baseline mode applies.
+#define BLE_PROTOCOL_VERSION 0x0100  // major << 8 | minor
+#define BLE_SCHEMA_HASH 0x454E400Cu
+#define BLE_DEFAULT_MTU 20
+
+// Feature bits (handshake features field)
+#define BLE_FEATURE_PACKED_FRAMES (1u << 0)
+// Features this end accepts when receiving (announced to the peer)
+#define BLE_LOCAL_FEATURES 0u
+// Features this end uses when sending, if the peer accepts them
+#define BLE_SEND_FEATURES (BLE_FEATURE_PACKED_FRAMES)
+
+typedef struct {
+    bool negotiated;              // A handshake completed on this connection
+    bool compatible;              // Same protocol major version
+    bool schema_match;            // Peer was generated from the same schema
+    uint16_t mtu;                 // Smaller of both MTUs (BLE_DEFAULT_MTU until negotiated)
+    uint16_t peer_max_reassembly; // Largest payload the peer reassembles; larger ones are not queued
+    uint32_t features;            // BLE_SEND_FEATURES the peer accepts, in use when sending
+} ble_link_t;
+
+// Return to the baseline mode (call on every connect and disconnect)
+void ble_link_reset(void);
+// Current mode; pass ble_link_get()->mtu to ble_tx_next_fragment
+const ble_link_t *ble_link_get(void);
+#if BLE_ENABLE_HANDSHAKE_REQUEST && BLE_ENABLE_HANDSHAKE_RESPONSE
+// Answer a received handshake_request and adopt the common mode. local_mtu is
+// the largest notification this end can send. Call from the context that
+// runs the transmit queue. Returns true when a handshake was answered
+bool ble_link_service(uint16_t local_mtu);
+#endif
+
+// ============================================================================
+// Protocol health counters and trace hooks
+// ============================================================================
+
+// Build with -DBLE_ENABLE_STATS=1 to count decode and transmit events, and
+// define BLE_TRACE(event, msg_id) to be called at every stage (msg_id is 0
+// where it is not known yet). Both compile to nothing by default.
+#ifndef BLE_ENABLE_STATS
+#define BLE_ENABLE_STATS 0
+#endif
+
+typedef enum {
+    BLE_TRACE_FRAME_IN,             // Frame passed to ble_decode_frame
+    BLE_TRACE_REASSEMBLY_START,     // First frame of a multi-frame message
+    BLE_TRACE_CHECKSUM_ERROR,       // Complete message failed its checksum
+    BLE_TRACE_REASSEMBLY_ABORTED,   // Partial message restarted or evicted for another
+    BLE_TRACE_REASSEMBLY_ORPHANED,  // Partial message timed out, or continuation without one
+    BLE_TRACE_RESYNC,               // Malformed frame dropped until the next first frame
+    BLE_TRACE_MESSAGE_STORED,       // Validated message stored
+    BLE_TRACE_TX_FRAGMENT,          // Fragment returned by ble_tx_next_fragment
+    BLE_TRACE_TX_COMPLETE,          // Last fragment of a queued message returned
+} ble_trace_event_t;
+
+#if BLE_ENABLE_STATS
+// Inter-arrival histogram: bucket n counts gaps up to bounds[n] ms, the last
+// bucket everything longer
+#define BLE_STATS_INTERARRIVAL_BUCKETS 9
+extern const uint32_t ble_stats_interarrival_bounds_ms[BLE_STATS_INTERARRIVAL_BUCKETS - 1];
+
+typedef struct {
+    uint32_t frames_in;
+    uint32_t checksum_errors;
+    uint32_t reassembly_aborted;
+    uint32_t reassembly_orphaned;
+    uint32_t resyncs;
+    uint32_t rx_frames[BLE_DECODE_MESSAGE_COUNT];    // Per BLE_DECODE_INDEX_*
+    uint32_t rx_messages[BLE_DECODE_MESSAGE_COUNT];
+    uint32_t rx_interarrival[BLE_DECODE_MESSAGE_COUNT][BLE_STATS_INTERARRIVAL_BUCKETS];
+    uint32_t tx_frames[BLE_TX_MESSAGE_COUNT];        // Per BLE_TX_INDEX_*
+    uint32_t tx_messages[BLE_TX_MESSAGE_COUNT];
+} ble_stats_t;
+
+// Copy the counters (not synchronised with a decoder running concurrently)
+void ble_stats_read(ble_stats_t *out);
+void ble_stats_reset(void);
+#endif
 
 #ifdef __cplusplus
 }
@@ -8,5 +8,5 @@
  */
 
 // Decoder functionality is now built into message classes
-// - Client messages: Use encodeFrame() method
+// - Client messages: Use encodeFrame(), or encodeInto()/BleFrameWriter to reuse buffers
 // - Server messages: Use static decode() method
\ No newline at end of file
@@ -0,0 +1,211 @@
+/**
+ * BLE Telemetry Protocol v1.0.0 - background-isolate decoder
+ * Auto-generated from schema.json
+ * DO NOT EDIT MANUALLY
+ *
+ * Reassembly, checksum and decode run on a worker isolate. Notifications are
+ * posted in batches as TransferableTypedData, and validated payloads come back
+ * as one typed-data block per message type, so the cross-isolate cost is paid
+ * per batch rather than per notification.
+ */
+
+import 'dart:async';
+import 'dart:isolate';
+import 'dart:typed_data';
+
+import 'ble_messages.dart';
+
+// Payload size and message ID per msgIndex*
+const List<int> _payloadSizes = [9, 128, 50, 24, 16, 10, 16, 14];
+const List<int> _messageIds = [msgIdHeartbeat, msgIdServerMessage, msgIdBmsData, msgIdBmsStatus, msgIdMotorData, msgIdSafetyStatus, msgIdPerformanceData, msgIdHandshakeResponse];
+
+/// Validated payloads of one server message type from one batch, oldest first
+class BleMessageBlock {
+  /// msgIndex* constant of the message type
+  final int messageIndex;
+
+  /// Receive time of each payload
+  final Int64List timestampsMs;
+
+  /// [count] payloads of [payloadSize] bytes, back to back
+  final Uint8List payloads;
+
+  BleMessageBlock._(this.messageIndex, this.timestampsMs, this.payloads);
+
+  int get count => timestampsMs.length;
+  int get messageId => _messageIds[messageIndex];
+  int get payloadSize => _payloadSizes[messageIndex];
+
+  /// Payload [i] as a view into [payloads] (no copy)
+  Uint8List payloadAt(int i) {
+    return Uint8List.sublistView(payloads, i * payloadSize, (i + 1) * payloadSize);
+  }
+}
+
+/// One message type's payloads collected on the worker isolate
+class _BleBlockBuilder {
+  final BytesBuilder payloads = BytesBuilder();
+  final List<int> timestampsMs = <int>[];
+}
+
+/// Worker isolate entry point
+/// Batches arrive as [bytes, meta] where meta holds [length, timeMs] per notification;
+/// replies are flat [index, timestamps, payloads, ...] triples, or null after close
+void _bleDecodeWorker(SendPort replyPort) {
+  final commands = ReceivePort();
+  replyPort.send(commands.sendPort);
+
+  final decoder = BleDecoder(tracking: false);
+  final builders = List<_BleBlockBuilder>.generate(bleDecodeMessageCount, (_) => _BleBlockBuilder());
+  decoder.payloadListener = (messageIndex, payload, timestampMs) {
+    final builder = builders[messageIndex];
+    builder.payloads.add(payload); // Copies - payload is a reused slot view
+    builder.timestampsMs.add(timestampMs);
+  };
+
+  commands.listen((message) {
+    if (message == null) {
+      commands.close();
+      replyPort.send(null);
+      return;
+    }
+    final batch = message as List<Object?>;
+    final bytes = (batch[0] as TransferableTypedData).materialize().asUint8List();
+    final meta = (batch[1] as TransferableTypedData).materialize().asInt64List();
+
+    var offset = 0;
+    for (var i = 0; i < meta.length; i += 2) {
+      final length = meta[i];
+      decoder.decodeFrame(Uint8List.sublistView(bytes, offset, offset + length), meta[i + 1]);
+      offset += length;
+    }
+
+    final reply = <Object>[];
+    for (var index = 0; index < bleDecodeMessageCount; index++) {
+      final builder = builders[index];
+      if (builder.timestampsMs.isEmpty) continue;
+      reply
+        ..add(index)
+        ..add(TransferableTypedData.fromList([Int64List.fromList(builder.timestampsMs)]))
+        ..add(TransferableTypedData.fromList([builder.payloads.takeBytes()]));
+      builder.timestampsMs.clear();
+    }
+    replyPort.send(reply);
+  });
+}
+
+/// Decodes notifications on a background isolate
+///
+/// Notifications queue up until [maxBatchNotifications] are pending or
+/// [maxBatchDelay] has passed, then go to the worker as one transfer. Each
+/// decoded batch is emitted on [batches], and [latest] is updated with the
+/// newest payload of each message type, so its getters, unread and staleness
+/// checks behave like a BleDecoder fed on the UI isolate.
+class BleIsolateDecoder {
+  final int maxBatchNotifications;
+  final Duration maxBatchDelay;
+
+  /// Latest-value state, updated once per message type per batch
+  final BleDecoder latest = BleDecoder();
+
+  final ReceivePort _replies;
+  late final SendPort _commands;
+  final Completer<void> _ready = Completer<void>();
+  final Completer<void> _closed = Completer<void>();
+  final StreamController<List<BleMessageBlock>> _batches =
+      StreamController<List<BleMessageBlock>>.broadcast();
+
+  // Queued notifications and their [length, timeMs] pairs
+  final List<Uint8List> _pending = <Uint8List>[];
+  final Int64List _pendingMeta;
+  Timer? _flushTimer;
+  bool _closing = false;
+
+  BleIsolateDecoder._(this._replies, this.maxBatchNotifications, this.maxBatchDelay)
+      : _pendingMeta = Int64List(2 * maxBatchNotifications) {
+    _replies.listen(_onReply);
+  }
+
+  /// Start the worker isolate
+  static Future<BleIsolateDecoder> spawn({
+    int maxBatchNotifications = 64,
+    Duration maxBatchDelay = const Duration(milliseconds: 16),
+  }) async {
+    final replies = ReceivePort();
+    final decoder = BleIsolateDecoder._(replies, maxBatchNotifications, maxBatchDelay);
+    await Isolate.spawn(_bleDecodeWorker, replies.sendPort, debugName: 'BleIsolateDecoder');
+    await decoder._ready.future;
+    return decoder;
+  }
+
+  /// Decoded batches; batches that completed no message are not emitted
+  Stream<List<BleMessageBlock>> get batches => _batches.stream;
+
+  /// Queue a notification; [frame] is referenced, not copied, until the next flush
+  void addNotification(Uint8List frame, int timeMs) {
+    if (_closing) throw StateError('BleIsolateDecoder is closed');
+    final count = _pending.length;
+    _pendingMeta[2 * count] = frame.length;
+    _pendingMeta[2 * count + 1] = timeMs;
+    _pending.add(frame);
+    if (_pending.length == maxBatchNotifications) {
+      flush();
+    } else {
+      _flushTimer ??= Timer(maxBatchDelay, flush);
+    }
+  }
+
+  /// Send queued notifications to the worker now
+  void flush() {
+    _flushTimer?.cancel();
+    _flushTimer = null;
+    if (_pending.isEmpty) return;
+    final meta = Int64List.sublistView(_pendingMeta, 0, 2 * _pending.length);
+    _commands.send([TransferableTypedData.fromList(_pending), TransferableTypedData.fromList([meta])]);
+    _pending.clear();
+  }
+
+  /// Flush, let the worker finish every queued batch, then stop it
+  Future<void> close() {
+    if (!_closing) {
+      _closing = true;
+      flush();
+      _commands.send(null);
+    }
+    return _closed.future;
+  }
+
+  void _onReply(Object? message) {
+    if (message is SendPort) {
+      _commands = message;
+      _ready.complete();
+      return;
+    }
+    if (message == null) {
+      _replies.close();
+      _batches.close();
+      _closed.complete();
+      return;
+    }
+    final reply = message as List<Object?>;
+    if (reply.isEmpty) return;
+
+    final blocks = <BleMessageBlock>[];
+    for (var i = 0; i < reply.length; i += 3) {
+      final block = BleMessageBlock._(
+        reply[i] as int,
+        (reply[i + 1] as TransferableTypedData).materialize().asInt64List(),
+        (reply[i + 2] as TransferableTypedData).materialize().asUint8List(),
+      );
+      final last = block.count - 1;
+      // Only the newest payload is decoded and stored; change streams, history and
+      // link metrics read every older one straight from the block's bytes
+      for (var j = 0; j < last; j++) {
+        latest.replayPayload(block.messageId, block.payloadAt(j), block.timestampsMs[j]);
+      }
+      latest.acceptPayload(block.messageId, block.payloadAt(last), block.timestampsMs[last]);
+      blocks.add(block);
+    }
+    _batches.add(blocks);
+  }
+}
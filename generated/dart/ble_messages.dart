@@ -13,10 +13,17 @@
  * - Final frame ends with: [Checksum]
  */
 
+import 'dart:async';
 import 'dart:typed_data';
 
 // Protocol constants
 const int bleSyncFirst = 0xAA;
+const int bleFirstHeaderSize = 3;
+const int bleContinuationHeaderSize = 0;
+
+// Multi-frame reassembly
+const int bleReassemblySlots = 1;
+const int bleReassemblyTimeoutMs = 1000;
 
 // Message IDs
 const int msgIdHeartbeat = 0x01;
@@ -26,14 +33,80 @@ const int msgIdBmsStatus = 0x03;
 const int msgIdMotorData = 0x05;
 const int msgIdSafetyStatus = 0x06;
 const int msgIdPerformanceData = 0x07;
+const int msgIdHandshakeResponse = 0x7E;
 const int msgIdConfigSet = 0x10;
+const int msgIdHandshakeRequest = 0x7F;
+
+// Server message status indices (bit positions in status masks)
+const int msgIndexHeartbeat = 0;
+const int msgIndexServerMessage = 1;
+const int msgIndexBmsData = 2;
+const int msgIndexBmsStatus = 3;
+const int msgIndexMotorData = 4;
+const int msgIndexSafetyStatus = 5;
+const int msgIndexPerformanceData = 6;
+const int msgIndexHandshakeResponse = 7;
+const int bleDecodeMessageCount = 8;
+
+// Bulk status mask bits - one bit per server message
+const int msgMaskHeartbeat = 1 << msgIndexHeartbeat;
+const int msgMaskServerMessage = 1 << msgIndexServerMessage;
+const int msgMaskBmsData = 1 << msgIndexBmsData;
+const int msgMaskBmsStatus = 1 << msgIndexBmsStatus;
+const int msgMaskMotorData = 1 << msgIndexMotorData;
+const int msgMaskSafetyStatus = 1 << msgIndexSafetyStatus;
+const int msgMaskPerformanceData = 1 << msgIndexPerformanceData;
+const int msgMaskHandshakeResponse = 1 << msgIndexHandshakeResponse;
+
+// Health counters and trace hook: build with --dart-define=BLE_STATS=true and/or
+// --dart-define=BLE_TRACE=true. Off by default, when the checks are constant
+// false and compiled out.
+const bool bleStatsEnabled = bool.fromEnvironment('BLE_STATS');
+const bool bleTraceEnabled = bool.fromEnvironment('BLE_TRACE');
+
+// Decode stages (bleTraceHook events)
+const int bleTraceFrameIn = 0;
+const int bleTraceReassemblyStart = 1;
+const int bleTraceChecksumError = 2;
+const int bleTraceReassemblyAborted = 3;
+const int bleTraceReassemblyOrphaned = 4;
+const int bleTraceResync = 5;
+const int bleTraceMessageStored = 6;
+const int bleTraceEventCount = 7;
+
+/// Called at every decode stage when built with BLE_TRACE (msgId is 0 where not known yet)
+void Function(int event, int msgId)? bleTraceHook;
+
+// Inter-arrival histogram: bucket n counts gaps up to bounds[n] ms, the last bucket the rest
+const List<int> bleStatsInterarrivalBoundsMs = [10, 20, 50, 100, 200, 500, 1000, 2000];
+const int bleStatsInterarrivalBuckets = 9;
+
+// Connection handshake
+const int bleProtocolVersion = 0x0100; // major << 8 | minor
+const int bleSchemaHash = 0x454E400C;
+const int bleDefaultMtu = 20;
+const int bleFeaturePackedFrames = 1 << 0;
+
+// Features this end accepts when receiving (announced to the server)
+const int bleLocalFeatures = bleFeaturePackedFrames;
 
 // ============================================================================
 // Client message classes (messages client sends)
 // ============================================================================
 
+/// Frame size of the largest client message (default BleFrameWriter capacity)
+const int bleMaxClientFrameSize = bleFirstHeaderSize + 14 + 1;
+
+/// Common interface of client messages, used by BleFrameWriter
+abstract class BleClientMessage {
+  int get messageId;
+  int get payloadSize;
+  int get frameSize;
+  int encodeInto(ByteData target, int offset);
+}
+
 /// ConfigSet message - Client to Server
-class ConfigSet {
+class ConfigSet implements BleClientMessage {
   int _paramId = 0;
   int _value = 0;
 
@@ -47,201 +120,577 @@ class ConfigSet {
     _value = value;
   }
 
+  @override
   int get messageId => 0x10;
 
+  @override
   int get payloadSize => 5;
 
-  /// Encode message into a BLE frame
+  @override
+  int get frameSize => bleFirstHeaderSize + 5 + 1;
+
+  /// Encode message into a new BLE frame
   Uint8List encodeFrame() {
-    final payload = Uint8List(5);
-    final data = ByteData.view(payload.buffer);
-    int offset = 0;
+    final frame = Uint8List(frameSize);
+    encodeInto(ByteData.sublistView(frame), 0);
+    return frame;
+  }
 
-    data.setUint8(offset, _paramId);
-    offset += 1;
+  /// Encode the frame into [target] at [offset] without allocating
+  /// Returns the number of bytes written; throws RangeError if it does not fit
+  @override
+  int encodeInto(ByteData target, int offset) {
+    RangeError.checkValidRange(offset, offset + frameSize, target.lengthInBytes);
+    target.setUint8(offset, bleSyncFirst);
+    target.setUint8(offset + 1, 5);
+    target.setUint8(offset + 2, 0x10);
+    int position = offset + bleFirstHeaderSize;
 
-    data.setUint32(offset, _value, Endian.little);
-    offset += 4;
+    target.setUint8(position, _paramId);
+    position += 1;
 
-    final frameSize = 3 + 5 + 1;
-    final frame = Uint8List(frameSize);
-    frame[0] = bleSyncFirst;
-    frame[1] = 5;
-    frame[2] = 0x10;
-    frame.setRange(3, 3 + 5, payload);
-    frame[frameSize - 1] = _calculateChecksum(payload);
+    target.setUint32(position, _value, Endian.little);
+    position += 4;
 
-    return frame;
+    target.setUint8(position, _calculateChecksumAt(target, offset + bleFirstHeaderSize, 5));
+    return frameSize;
   }
 
   @override
   String toString() => 'ConfigSet(param_id: ${paramId}, value: ${value})';
 }
 
+/// HandshakeRequest message - Client to Server
+class HandshakeRequest implements BleClientMessage {
+  int _protocolVersion = 0;
+  int _schemaHash = 0;
+  int _maxReassembly = 0;
+  int _mtu = 0;
+  int _features = 0;
+
+  int get protocolVersion => _protocolVersion;
+  int get schemaHash => _schemaHash;
+  int get maxReassembly => _maxReassembly;
+  int get mtu => _mtu;
+  int get features => _features;
+
+  set protocolVersion(int value) {
+    _protocolVersion = value;
+  }
+  set schemaHash(int value) {
+    _schemaHash = value;
+  }
+  set maxReassembly(int value) {
+    _maxReassembly = value;
+  }
+  set mtu(int value) {
+    _mtu = value;
+  }
+  set features(int value) {
+    _features = value;
+  }
+
+  @override
+  int get messageId => 0x7F;
+
+  @override
+  int get payloadSize => 14;
+
+  @override
+  int get frameSize => bleFirstHeaderSize + 14 + 1;
+
+  /// Encode message into a new BLE frame
+  Uint8List encodeFrame() {
+    final frame = Uint8List(frameSize);
+    encodeInto(ByteData.sublistView(frame), 0);
+    return frame;
+  }
+
+  /// Encode the frame into [target] at [offset] without allocating
+  /// Returns the number of bytes written; throws RangeError if it does not fit
+  @override
+  int encodeInto(ByteData target, int offset) {
+    RangeError.checkValidRange(offset, offset + frameSize, target.lengthInBytes);
+    target.setUint8(offset, bleSyncFirst);
+    target.setUint8(offset + 1, 14);
+    target.setUint8(offset + 2, 0x7F);
+    int position = offset + bleFirstHeaderSize;
+
+    target.setUint16(position, _protocolVersion, Endian.little);
+    position += 2;
+
+    target.setUint32(position, _schemaHash, Endian.little);
+    position += 4;
+
+    target.setUint16(position, _maxReassembly, Endian.little);
+    position += 2;
+
+    target.setUint16(position, _mtu, Endian.little);
+    position += 2;
+
+    target.setUint32(position, _features, Endian.little);
+    position += 4;
+
+    target.setUint8(position, _calculateChecksumAt(target, offset + bleFirstHeaderSize, 14));
+    return frameSize;
+  }
+
+  @override
+  String toString() => 'HandshakeRequest(protocol_version: ${protocolVersion}, schema_hash: ${schemaHash}, max_reassembly: ${maxReassembly}, mtu: ${mtu}, features: ${features})';
+}
+
+/// Reusable buffer that encodes client messages back-to-back without allocating
+///
+/// Frames are self-delimiting, and [frameAt] gives a view of each one for
+/// transports that need one write per frame. [clear] reuses the buffer.
+class BleFrameWriter {
+  final Uint8List buffer;
+  final ByteData _data;
+  final Int32List _frameStarts;
+  int _length = 0;
+  int _frameCount = 0;
+
+  /// [capacity] defaults to one frame of the largest client message
+  BleFrameWriter({int capacity = bleMaxClientFrameSize, int maxFrames = 16})
+      : this._(Uint8List(capacity), maxFrames);
+
+  BleFrameWriter._(this.buffer, int maxFrames)
+      : _data = ByteData.sublistView(buffer),
+        _frameStarts = Int32List(maxFrames);
+
+  /// Bytes encoded so far
+  int get length => _length;
+
+  int get frameCount => _frameCount;
+
+  /// View of the encoded bytes (valid until the next clear)
+  Uint8List get bytes => Uint8List.sublistView(buffer, 0, _length);
+
+  /// View of one encoded frame
+  Uint8List frameAt(int index) {
+    RangeError.checkValidIndex(index, this, 'index', _frameCount);
+    final end = index + 1 < _frameCount ? _frameStarts[index + 1] : _length;
+    return Uint8List.sublistView(buffer, _frameStarts[index], end);
+  }
+
+  void clear() {
+    _length = 0;
+    _frameCount = 0;
+  }
+
+  /// Append one message; returns false (writing nothing) if it does not fit
+  bool add(BleClientMessage message) {
+    if (_frameCount == _frameStarts.length || _length + message.frameSize > buffer.length) return false;
+    _frameStarts[_frameCount++] = _length;
+    _length += message.encodeInto(_data, _length);
+    return true;
+  }
+
+  /// Append messages in order until one does not fit; returns how many were added
+  int addAll(List<BleClientMessage> messages) {
+    for (int i = 0; i < messages.length; i++) {
+      if (!add(messages[i])) return i;
+    }
+    return messages.length;
+  }
+}
+
 // ============================================================================
 // Decoder class for server messages (multi-frame support)
 // ============================================================================
 
+/// Reassembly state for one in-flight multi-frame message
+class _BleReassemblySlot {
+  final Uint8List payload;
+  bool active = false;
+  int streamId = 0;
+  int msgId = 0;
+  int expectedSize = 0;
+  int bytesReceived = 0;
+  int lastFrameMs = 0;
+
+  _BleReassemblySlot(int maxPayload) : payload = Uint8List(maxPayload);
+}
+
 /// Decoder for server messages with multi-frame reassembly support
 class BleDecoder {
-  final Uint8List _payloadBuffer = Uint8List(128);
-  int _expectedSize = 0;
-  int _bytesReceived = 0;
-  int _msgId = 0;
-  bool _valid = false;
+  static const int _maxPayloadSize = 128;
+  final List<_BleReassemblySlot> _slots =
+      List<_BleReassemblySlot>.generate(bleReassemblySlots, (_) => _BleReassemblySlot(_maxPayloadSize));
 
   Heartbeat? _heartbeat;
-  int _heartbeatTimestampMs = 0;
-  bool _heartbeatUnread = false;
   ServerMessage? _serverMessage;
-  int _serverMessageTimestampMs = 0;
-  bool _serverMessageUnread = false;
   BmsData? _bmsData;
-  int _bmsDataTimestampMs = 0;
-  bool _bmsDataUnread = false;
   BmsStatus? _bmsStatus;
-  int _bmsStatusTimestampMs = 0;
-  bool _bmsStatusUnread = false;
   MotorData? _motorData;
-  int _motorDataTimestampMs = 0;
-  bool _motorDataUnread = false;
   SafetyStatus? _safetyStatus;
-  int _safetyStatusTimestampMs = 0;
-  bool _safetyStatusUnread = false;
   PerformanceData? _performanceData;
-  int _performanceDataTimestampMs = 0;
-  bool _performanceDataUnread = false;
+  HandshakeResponse? _handshakeResponse;
+
+  // Per-field change tracking, updated on every stored message
+  final HeartbeatChanges heartbeatChanges = HeartbeatChanges();
+  final ServerMessageChanges serverMessageChanges = ServerMessageChanges();
+  final BmsDataChanges bmsDataChanges = BmsDataChanges();
+  final BmsStatusChanges bmsStatusChanges = BmsStatusChanges();
+  final MotorDataChanges motorDataChanges = MotorDataChanges();
+  final SafetyStatusChanges safetyStatusChanges = SafetyStatusChanges();
+  final PerformanceDataChanges performanceDataChanges = PerformanceDataChanges();
+  final HandshakeResponseChanges handshakeResponseChanges = HandshakeResponseChanges();
+
+  // Sample history, appended on every stored message
+  final BmsDataHistory bmsDataHistory = BmsDataHistory();
+  final BmsStatusHistory bmsStatusHistory = BmsStatusHistory();
+  final MotorDataHistory motorDataHistory = MotorDataHistory();
+
+  final List<bool> _available = List<bool>.filled(bleDecodeMessageCount, false);
+  final List<bool> _unread = List<bool>.filled(bleDecodeMessageCount, false);
+  final Int64List _timestampsMs = Int64List(bleDecodeMessageCount);
+  static const List<int> _maxAgeMs = [5000, 1000, 2000, 2000, 500, 500, 1000, 60000];
+
+  // Notified on every stored message (one per attached BleStalenessWatchdog)
+  final List<void Function(int messageIndex, int timestampMs)> _storeListeners =
+      <void Function(int messageIndex, int timestampMs)>[];
+
+  /// Called with every validated payload before it is decoded; [payload] is a
+  /// view into a reused buffer, so copy it to keep it past the call
+  void Function(int messageIndex, Uint8List payload, int timestampMs)? payloadListener;
+
+  /// False skips message objects, change tracking, history and link metrics,
+  /// so get*() return null; stats, status flags and payloadListener still update.
+  /// BleIsolateDecoder's worker decodes this way, since nothing reads its copies
+  final bool tracking;
+
+  BleDecoder({this.tracking = true});
+
+  /// Health counters (only updated when built with BLE_STATS)
+  final BleDecoderStats stats = BleDecoderStats();
+
+  /// Mode negotiated with the server (updated when the handshake response arrives)
+  final BleLink link = BleLink();
+
+  // Count a decode stage and pass it to bleTraceHook; both checks are
+  // compile-time constants, so this compiles to nothing by default
+  void _event(int event, int msgId) {
+    if (bleStatsEnabled) stats._events[event]++;
+    if (bleTraceEnabled) bleTraceHook?.call(event, msgId);
+  }
 
   /// Decode a frame (supports multi-frame reassembly)
   /// Returns true when a complete message is received and validated
   /// [timeMs] Current time in milliseconds for timestamping received messages
   bool decodeFrame(Uint8List frame, int timeMs) {
     if (frame.isEmpty) return false;
+    _event(bleTraceFrameIn, 0);
+
+    _expireSlots(timeMs);
+    return _decodeFrame(frame, timeMs);
+  }
 
+  /// Decode one notification without counting it again for each packed frame
+  bool _decodeFrame(Uint8List frame, int timeMs) {
     // Check if this is a first frame
     if (frame[0] == bleSyncFirst) {
-      // Reset state for new message
-      _valid = false;
-      _bytesReceived = 0;
-
       // Verify minimum frame size for first frame
-      if (frame.length < 4) return false;
+      if (frame.length < bleFirstHeaderSize + 1) {
+        _event(bleTraceResync, 0);
+        return false;
+      }
 
       // Extract header
-      _expectedSize = frame[1];
-      _msgId = frame[2];
+      final expectedSize = frame[1];
+      final msgId = frame[2];
+
+      // Packed notification: whole frames back to back, split after each checksum
+      final frameEnd = bleFirstHeaderSize + expectedSize + 1;
+      if (frame.length > frameEnd && frame[frameEnd] == bleSyncFirst) {
+        final stored = _decodeFrame(Uint8List.sublistView(frame, 0, frameEnd), timeMs);
+        return _decodeFrame(Uint8List.sublistView(frame, frameEnd), timeMs) || stored;
+      }
 
-      // Calculate payload bytes in this frame
-      final headerSize = 3;
-      final payloadInFrame = frame.length - headerSize;
+      const streamId = 0;
+      final payloadInFrame = frame.length - bleFirstHeaderSize;
+      if (bleStatsEnabled) stats._countFrame(msgId);
 
       // Check if this frame has checksum (complete message)
-      final hasChecksum = (payloadInFrame == _expectedSize + 1);
-
-      if (hasChecksum) {
-        // Single-frame message - verify checksum
-        final payloadData = frame.sublist(3, 3 + _expectedSize);
-        final checksum = frame[3 + _expectedSize];
-        final calcChecksum = _calculateChecksum(payloadData);
-        if (checksum != calcChecksum) return false;
-
-        // Copy payload to buffer
-        _payloadBuffer.setRange(0, _expectedSize, payloadData);
-        _bytesReceived = _expectedSize;
-        _valid = true;
-        
-        // Store decoded message in per-message buffer
-        _storeMessage(timeMs);
-        return true;
-      } else {
-        // Multi-frame message - copy partial payload
-        if (payloadInFrame > _expectedSize) return false;
-        _payloadBuffer.setRange(0, payloadInFrame, frame.sublist(3));
-        _bytesReceived = payloadInFrame;
-        return false; // Need more frames
-      }
-    } else {
-      // Continuation frame (no sync byte, just payload)
-      if (_bytesReceived == 0) return false; // No first frame received
-
-      final remaining = _expectedSize - _bytesReceived;
-      final hasChecksum = (frame.length == remaining + 1);
-
-      if (hasChecksum) {
-        // Final frame - verify checksum
-        _payloadBuffer.setRange(_bytesReceived, _bytesReceived + remaining, frame);
-        _bytesReceived += remaining;
-
-        final checksum = frame[remaining];
-        final payloadData = _payloadBuffer.sublist(0, _expectedSize);
-        final calcChecksum = _calculateChecksum(payloadData);
-        if (checksum != calcChecksum) {
-          _bytesReceived = 0; // Reset on checksum failure
+      if (payloadInFrame == expectedSize + 1) {
+        // Single-frame message - validated straight from the frame so
+        // partially reassembled messages in other slots are kept
+        final payloadData = Uint8List.sublistView(frame, bleFirstHeaderSize, bleFirstHeaderSize + expectedSize);
+        final checksum = frame[bleFirstHeaderSize + expectedSize];
+        if (checksum != _calculateChecksum(payloadData)) {
+          _event(bleTraceChecksumError, msgId);
           return false;
         }
+        return _ingest(msgId, payloadData, timeMs, true);
+      }
 
-        _valid = true;
-        
-        // Store decoded message in per-message buffer
-        _storeMessage(timeMs);
-        return true;
-      } else {
-        // Continuation frame - copy payload
-        if (frame.length > remaining) return false;
-        _payloadBuffer.setRange(_bytesReceived, _bytesReceived + frame.length, frame);
-        _bytesReceived += frame.length;
-        return false; // Need more frames
+      // Multi-frame message - copy partial payload into a slot
+      if (payloadInFrame > expectedSize || expectedSize > _maxPayloadSize) {
+        _event(bleTraceResync, msgId);
+        return false;
       }
+      final slot = _claimSlot(streamId);
+      slot.active = true;
+      slot.streamId = streamId;
+      slot.msgId = msgId;
+      slot.expectedSize = expectedSize;
+      slot.bytesReceived = payloadInFrame;
+      slot.lastFrameMs = timeMs;
+      slot.payload.setRange(0, payloadInFrame, frame, bleFirstHeaderSize);
+      _event(bleTraceReassemblyStart, msgId);
+      return false; // Need more frames
     }
+
+    // Continuation frame (no sync byte, just payload)
+    final slot = _findSlot(0);
+    if (slot == null) { // No first frame received
+      _event(bleTraceReassemblyOrphaned, 0);
+      return false;
+    }
+    if (bleStatsEnabled) stats._countFrame(slot.msgId);
+
+    final dataLength = frame.length - bleContinuationHeaderSize;
+    final remaining = slot.expectedSize - slot.bytesReceived;
+
+    if (dataLength == remaining + 1) {
+      // Final frame - verify checksum and release the slot
+      slot.payload.setRange(slot.bytesReceived, slot.expectedSize, frame, bleContinuationHeaderSize);
+      slot.bytesReceived = slot.expectedSize;
+      slot.active = false;
+
+      final checksum = frame[bleContinuationHeaderSize + remaining];
+      final payloadData = Uint8List.sublistView(slot.payload, 0, slot.expectedSize);
+      if (checksum != _calculateChecksum(payloadData)) {
+        _event(bleTraceChecksumError, slot.msgId);
+        return false;
+      }
+
+      return _ingest(slot.msgId, payloadData, timeMs, true);
+    }
+
+    // Continuation frame - copy payload
+    if (dataLength > remaining) {
+      _event(bleTraceResync, slot.msgId);
+      return false;
+    }
+    slot.payload.setRange(slot.bytesReceived, slot.bytesReceived + dataLength, frame, bleContinuationHeaderSize);
+    slot.bytesReceived += dataLength;
+    slot.lastFrameMs = timeMs;
+    return false; // Need more frames
   }
 
-  /// Store decoded message in per-message buffer
-  void _storeMessage(int timestampMs) {
-    switch (_msgId) {
+  /// Release partial messages that have not progressed within the timeout
+  void _expireSlots(int timeMs) {
+    for (final slot in _slots) {
+      if (slot.active && timeMs - slot.lastFrameMs > bleReassemblyTimeoutMs) {
+        _event(bleTraceReassemblyOrphaned, slot.msgId);
+        slot.active = false;
+      }
+    }
+  }
+
+  /// Find the active slot reassembling a stream
+  _BleReassemblySlot? _findSlot(int streamId) {
+    for (final slot in _slots) {
+      if (slot.active && slot.streamId == streamId) return slot;
+    }
+    return null;
+  }
+
+  /// Get a slot for a new message: restart the stream's slot, else take a free
+  /// slot, else evict the least recently updated one
+  _BleReassemblySlot _claimSlot(int streamId) {
+    final existing = _findSlot(streamId);
+    if (existing != null) {
+      _event(bleTraceReassemblyAborted, existing.msgId);
+      return existing;
+    }
+    var oldest = _slots[0];
+    for (final slot in _slots) {
+      if (!slot.active) return slot;
+      if (slot.lastFrameMs < oldest.lastFrameMs) oldest = slot;
+    }
+    _event(bleTraceReassemblyAborted, oldest.msgId);
+    return oldest;
+  }
+
+  /// Take a validated payload. Stats, link metrics, change tracking and history
+  /// see every payload; the latest value, status flags and listeners are only
+  /// updated when [store] is true (false: an older payload of an isolate batch).
+  /// Only a stored payload is decoded into a message object
+  /// Returns false for unknown message IDs or unexpected payload sizes
+  bool _ingest(int msgId, Uint8List payload, int timestampMs, bool store) {
+    switch (msgId) {
       case 0x01:
-        _heartbeat = _decodeHeartbeatFromBuffer();
-        _heartbeatTimestampMs = timestampMs;
-        _heartbeatUnread = true;
-        break;
+        if (payload.length != 9) return false;
+        if (bleStatsEnabled) stats._recordArrival(msgIndexHeartbeat, timestampMs);
+        if (tracking) {
+          final data = ByteData.sublistView(payload);
+          heartbeatChanges._update(data);
+        }
+        if (!store) return true;
+        _event(bleTraceMessageStored, msgId);
+        if (tracking) {
+          _heartbeat = _decodeHeartbeatFromBuffer(payload);
+        }
+        _available[msgIndexHeartbeat] = true;
+        _timestampsMs[msgIndexHeartbeat] = timestampMs;
+        _unread[msgIndexHeartbeat] = true;
+        for (final listener in _storeListeners) listener(msgIndexHeartbeat, timestampMs);
+        payloadListener?.call(msgIndexHeartbeat, payload, timestampMs);
+        return true;
       case 0x04:
-        _serverMessage = _decodeServerMessageFromBuffer();
-        _serverMessageTimestampMs = timestampMs;
-        _serverMessageUnread = true;
-        break;
+        if (payload.length != 128) return false;
+        if (bleStatsEnabled) stats._recordArrival(msgIndexServerMessage, timestampMs);
+        if (tracking) {
+          final data = ByteData.sublistView(payload);
+          serverMessageChanges._update(data);
+        }
+        if (!store) return true;
+        _event(bleTraceMessageStored, msgId);
+        if (tracking) {
+          _serverMessage = _decodeServerMessageFromBuffer(payload);
+        }
+        _available[msgIndexServerMessage] = true;
+        _timestampsMs[msgIndexServerMessage] = timestampMs;
+        _unread[msgIndexServerMessage] = true;
+        for (final listener in _storeListeners) listener(msgIndexServerMessage, timestampMs);
+        payloadListener?.call(msgIndexServerMessage, payload, timestampMs);
+        return true;
       case 0x02:
-        _bmsData = _decodeBmsDataFromBuffer();
-        _bmsDataTimestampMs = timestampMs;
-        _bmsDataUnread = true;
-        break;
+        if (payload.length != 50) return false;
+        if (bleStatsEnabled) stats._recordArrival(msgIndexBmsData, timestampMs);
+        if (tracking) {
+          final data = ByteData.sublistView(payload);
+          bmsDataChanges._update(data);
+          bmsDataHistory._append(data, timestampMs);
+        }
+        if (!store) return true;
+        _event(bleTraceMessageStored, msgId);
+        if (tracking) {
+          _bmsData = _decodeBmsDataFromBuffer(payload);
+        }
+        _available[msgIndexBmsData] = true;
+        _timestampsMs[msgIndexBmsData] = timestampMs;
+        _unread[msgIndexBmsData] = true;
+        for (final listener in _storeListeners) listener(msgIndexBmsData, timestampMs);
+        payloadListener?.call(msgIndexBmsData, payload, timestampMs);
+        return true;
       case 0x03:
-        _bmsStatus = _decodeBmsStatusFromBuffer();
-        _bmsStatusTimestampMs = timestampMs;
-        _bmsStatusUnread = true;
-        break;
+        if (payload.length != 24) return false;
+        if (bleStatsEnabled) stats._recordArrival(msgIndexBmsStatus, timestampMs);
+        if (tracking) {
+          final data = ByteData.sublistView(payload);
+          bmsStatusChanges._update(data);
+          bmsStatusHistory._append(data, timestampMs);
+        }
+        if (!store) return true;
+        _event(bleTraceMessageStored, msgId);
+        if (tracking) {
+          _bmsStatus = _decodeBmsStatusFromBuffer(payload);
+        }
+        _available[msgIndexBmsStatus] = true;
+        _timestampsMs[msgIndexBmsStatus] = timestampMs;
+        _unread[msgIndexBmsStatus] = true;
+        for (final listener in _storeListeners) listener(msgIndexBmsStatus, timestampMs);
+        payloadListener?.call(msgIndexBmsStatus, payload, timestampMs);
+        return true;
       case 0x05:
-        _motorData = _decodeMotorDataFromBuffer();
-        _motorDataTimestampMs = timestampMs;
-        _motorDataUnread = true;
-        break;
+        if (payload.length != 16) return false;
+        if (bleStatsEnabled) stats._recordArrival(msgIndexMotorData, timestampMs);
+        if (tracking) {
+          final data = ByteData.sublistView(payload);
+          motorDataChanges._update(data);
+          motorDataHistory._append(data, timestampMs);
+        }
+        if (!store) return true;
+        _event(bleTraceMessageStored, msgId);
+        if (tracking) {
+          _motorData = _decodeMotorDataFromBuffer(payload);
+        }
+        _available[msgIndexMotorData] = true;
+        _timestampsMs[msgIndexMotorData] = timestampMs;
+        _unread[msgIndexMotorData] = true;
+        for (final listener in _storeListeners) listener(msgIndexMotorData, timestampMs);
+        payloadListener?.call(msgIndexMotorData, payload, timestampMs);
+        return true;
       case 0x06:
-        _safetyStatus = _decodeSafetyStatusFromBuffer();
-        _safetyStatusTimestampMs = timestampMs;
-        _safetyStatusUnread = true;
-        break;
+        if (payload.length != 10) return false;
+        if (bleStatsEnabled) stats._recordArrival(msgIndexSafetyStatus, timestampMs);
+        if (tracking) {
+          final data = ByteData.sublistView(payload);
+          safetyStatusChanges._update(data);
+        }
+        if (!store) return true;
+        _event(bleTraceMessageStored, msgId);
+        if (tracking) {
+          _safetyStatus = _decodeSafetyStatusFromBuffer(payload);
+        }
+        _available[msgIndexSafetyStatus] = true;
+        _timestampsMs[msgIndexSafetyStatus] = timestampMs;
+        _unread[msgIndexSafetyStatus] = true;
+        for (final listener in _storeListeners) listener(msgIndexSafetyStatus, timestampMs);
+        payloadListener?.call(msgIndexSafetyStatus, payload, timestampMs);
+        return true;
       case 0x07:
-        _performanceData = _decodePerformanceDataFromBuffer();
-        _performanceDataTimestampMs = timestampMs;
-        _performanceDataUnread = true;
-        break;
+        if (payload.length != 16) return false;
+        if (bleStatsEnabled) stats._recordArrival(msgIndexPerformanceData, timestampMs);
+        if (tracking) {
+          final data = ByteData.sublistView(payload);
+          performanceDataChanges._update(data);
+        }
+        if (!store) return true;
+        _event(bleTraceMessageStored, msgId);
+        if (tracking) {
+          _performanceData = _decodePerformanceDataFromBuffer(payload);
+        }
+        _available[msgIndexPerformanceData] = true;
+        _timestampsMs[msgIndexPerformanceData] = timestampMs;
+        _unread[msgIndexPerformanceData] = true;
+        for (final listener in _storeListeners) listener(msgIndexPerformanceData, timestampMs);
+        payloadListener?.call(msgIndexPerformanceData, payload, timestampMs);
+        return true;
+      case 0x7E:
+        if (payload.length != 14) return false;
+        if (bleStatsEnabled) stats._recordArrival(msgIndexHandshakeResponse, timestampMs);
+        if (tracking) {
+          final data = ByteData.sublistView(payload);
+          handshakeResponseChanges._update(data);
+        }
+        if (!store) return true;
+        _event(bleTraceMessageStored, msgId);
+        if (tracking) {
+          _handshakeResponse = _decodeHandshakeResponseFromBuffer(payload);
+          link._accept(_handshakeResponse!);
+        }
+        _available[msgIndexHandshakeResponse] = true;
+        _timestampsMs[msgIndexHandshakeResponse] = timestampMs;
+        _unread[msgIndexHandshakeResponse] = true;
+        for (final listener in _storeListeners) listener(msgIndexHandshakeResponse, timestampMs);
+        payloadListener?.call(msgIndexHandshakeResponse, payload, timestampMs);
+        return true;
       default:
-        break;
+        return false;
     }
   }
 
-  /// Internal: Decode heartbeat from payload buffer
-  Heartbeat _decodeHeartbeatFromBuffer() {
+  /// Store a payload that was already reassembled and checksum-validated
+  /// (used by BleIsolateDecoder to update latest values on the UI isolate)
+  bool acceptPayload(int msgId, Uint8List payload, int timestampMs) {
+    return _ingest(msgId, payload, timestampMs, true);
+  }
+
+  /// Feed a validated payload older than the latest one to stats, change tracking,
+  /// history and link metrics without storing it (BleIsolateDecoder replays every
+  /// payload of a batch this way, then stores only the newest with acceptPayload)
+  bool replayPayload(int msgId, Uint8List payload, int timestampMs) {
+    return _ingest(msgId, payload, timestampMs, false);
+  }
+
+  /// Internal: Decode heartbeat from a validated payload
+  Heartbeat _decodeHeartbeatFromBuffer(Uint8List payload) {
     final msg = Heartbeat._();
-    final data = ByteData.view(_payloadBuffer.buffer);
+    final data = ByteData.sublistView(payload);
     int offset = 0;
 
     msg._uptimeMs = data.getUint32(offset, Endian.little);
@@ -256,16 +705,16 @@ class BleDecoder {
     return msg;
   }
 
-  /// Internal: Decode server_message from payload buffer
-  ServerMessage _decodeServerMessageFromBuffer() {
+  /// Internal: Decode server_message from a validated payload
+  ServerMessage _decodeServerMessageFromBuffer(Uint8List payload) {
     final msg = ServerMessage._();
-    final data = ByteData.view(_payloadBuffer.buffer);
+    final data = ByteData.sublistView(payload);
     int offset = 0;
 
     // Decode string (null-terminated)
     final stringBytes = <int>[];
     for (int i = 0; i < 128; i++) {
-      final byte = _payloadBuffer[offset + i];
+      final byte = payload[offset + i];
       if (byte == 0) break; // Null terminator
       stringBytes.add(byte);
     }
@@ -275,10 +724,10 @@ class BleDecoder {
     return msg;
   }
 
-  /// Internal: Decode bms_data from payload buffer
-  BmsData _decodeBmsDataFromBuffer() {
+  /// Internal: Decode bms_data from a validated payload
+  BmsData _decodeBmsDataFromBuffer(Uint8List payload) {
     final msg = BmsData._();
-    final data = ByteData.view(_payloadBuffer.buffer);
+    final data = ByteData.sublistView(payload);
     int offset = 0;
 
     msg._cellVoltage1Mv = data.getUint16(offset, Endian.little);
@@ -359,10 +808,10 @@ class BleDecoder {
     return msg;
   }
 
-  /// Internal: Decode bms_status from payload buffer
-  BmsStatus _decodeBmsStatusFromBuffer() {
+  /// Internal: Decode bms_status from a validated payload
+  BmsStatus _decodeBmsStatusFromBuffer(Uint8List payload) {
     final msg = BmsStatus._();
-    final data = ByteData.view(_payloadBuffer.buffer);
+    final data = ByteData.sublistView(payload);
     int offset = 0;
 
     msg._socPercent = data.getUint8(offset);
@@ -404,10 +853,10 @@ class BleDecoder {
     return msg;
   }
 
-  /// Internal: Decode motor_data from payload buffer
-  MotorData _decodeMotorDataFromBuffer() {
+  /// Internal: Decode motor_data from a validated payload
+  MotorData _decodeMotorDataFromBuffer(Uint8List payload) {
     final msg = MotorData._();
-    final data = ByteData.view(_payloadBuffer.buffer);
+    final data = ByteData.sublistView(payload);
     int offset = 0;
 
     msg._motorTempC = data.getInt16(offset, Endian.little);
@@ -434,10 +883,10 @@ class BleDecoder {
     return msg;
   }
 
-  /// Internal: Decode safety_status from payload buffer
-  SafetyStatus _decodeSafetyStatusFromBuffer() {
+  /// Internal: Decode safety_status from a validated payload
+  SafetyStatus _decodeSafetyStatusFromBuffer(Uint8List payload) {
     final msg = SafetyStatus._();
-    final data = ByteData.view(_payloadBuffer.buffer);
+    final data = ByteData.sublistView(payload);
     int offset = 0;
 
     msg._faultCodes = data.getUint16(offset, Endian.little);
@@ -461,10 +910,10 @@ class BleDecoder {
     return msg;
   }
 
-  /// Internal: Decode performance_data from payload buffer
-  PerformanceData _decodePerformanceDataFromBuffer() {
+  /// Internal: Decode performance_data from a validated payload
+  PerformanceData _decodePerformanceDataFromBuffer(Uint8List payload) {
     final msg = PerformanceData._();
-    final data = ByteData.view(_payloadBuffer.buffer);
+    final data = ByteData.sublistView(payload);
     int offset = 0;
 
     msg._odometerKm = data.getUint32(offset, Endian.little);
@@ -488,10 +937,34 @@ class BleDecoder {
     return msg;
   }
 
+  /// Internal: Decode handshake_response from a validated payload
+  HandshakeResponse _decodeHandshakeResponseFromBuffer(Uint8List payload) {
+    final msg = HandshakeResponse._();
+    final data = ByteData.sublistView(payload);
+    int offset = 0;
+
+    msg._protocolVersion = data.getUint16(offset, Endian.little);
+    offset += 2;
+
+    msg._schemaHash = data.getUint32(offset, Endian.little);
+    offset += 4;
+
+    msg._maxReassembly = data.getUint16(offset, Endian.little);
+    offset += 2;
+
+    msg._mtu = data.getUint16(offset, Endian.little);
+    offset += 2;
+
+    msg._features = data.getUint32(offset, Endian.little);
+    offset += 4;
+
+    return msg;
+  }
+
   /// Get stored heartbeat message (returns null if no message available)
   Heartbeat? getHeartbeat() {
     if (_heartbeat != null) {
-      _heartbeatUnread = false;
+      _unread[msgIndexHeartbeat] = false;
     }
     return _heartbeat;
   }
@@ -499,7 +972,7 @@ class BleDecoder {
   /// Get stored server_message message (returns null if no message available)
   ServerMessage? getServerMessage() {
     if (_serverMessage != null) {
-      _serverMessageUnread = false;
+      _unread[msgIndexServerMessage] = false;
     }
     return _serverMessage;
   }
@@ -507,7 +980,7 @@ class BleDecoder {
   /// Get stored bms_data message (returns null if no message available)
   BmsData? getBmsData() {
     if (_bmsData != null) {
-      _bmsDataUnread = false;
+      _unread[msgIndexBmsData] = false;
     }
     return _bmsData;
   }
@@ -515,7 +988,7 @@ class BleDecoder {
   /// Get stored bms_status message (returns null if no message available)
   BmsStatus? getBmsStatus() {
     if (_bmsStatus != null) {
-      _bmsStatusUnread = false;
+      _unread[msgIndexBmsStatus] = false;
     }
     return _bmsStatus;
   }
@@ -523,7 +996,7 @@ class BleDecoder {
   /// Get stored motor_data message (returns null if no message available)
   MotorData? getMotorData() {
     if (_motorData != null) {
-      _motorDataUnread = false;
+      _unread[msgIndexMotorData] = false;
     }
     return _motorData;
   }
@@ -531,7 +1004,7 @@ class BleDecoder {
   /// Get stored safety_status message (returns null if no message available)
   SafetyStatus? getSafetyStatus() {
     if (_safetyStatus != null) {
-      _safetyStatusUnread = false;
+      _unread[msgIndexSafetyStatus] = false;
     }
     return _safetyStatus;
   }
@@ -539,95 +1012,1123 @@ class BleDecoder {
   /// Get stored performance_data message (returns null if no message available)
   PerformanceData? getPerformanceData() {
     if (_performanceData != null) {
-      _performanceDataUnread = false;
+      _unread[msgIndexPerformanceData] = false;
     }
     return _performanceData;
   }
 
+  /// Get stored handshake_response message (returns null if no message available)
+  HandshakeResponse? getHandshakeResponse() {
+    if (_handshakeResponse != null) {
+      _unread[msgIndexHandshakeResponse] = false;
+    }
+    return _handshakeResponse;
+  }
+
   /// Check if heartbeat message is unread
   bool heartbeatCheckIsUnread() {
-    return _heartbeat != null && _heartbeatUnread;
+    return _available[msgIndexHeartbeat] && _unread[msgIndexHeartbeat];
   }
 
   /// Check if heartbeat data is stale (max age: 5000ms)
   bool heartbeatCheckDataIsStale(int timeMs) {
-    if (_heartbeat == null) return true;
-    final ageMs = timeMs - _heartbeatTimestampMs;
+    if (!_available[msgIndexHeartbeat]) return true;
+    final ageMs = timeMs - _timestampsMs[msgIndexHeartbeat];
     return ageMs > 5000;
   }
 
   /// Check if server_message message is unread
   bool serverMessageCheckIsUnread() {
-    return _serverMessage != null && _serverMessageUnread;
+    return _available[msgIndexServerMessage] && _unread[msgIndexServerMessage];
   }
 
   /// Check if server_message data is stale (max age: 1000ms)
   bool serverMessageCheckDataIsStale(int timeMs) {
-    if (_serverMessage == null) return true;
-    final ageMs = timeMs - _serverMessageTimestampMs;
+    if (!_available[msgIndexServerMessage]) return true;
+    final ageMs = timeMs - _timestampsMs[msgIndexServerMessage];
     return ageMs > 1000;
   }
 
   /// Check if bms_data message is unread
   bool bmsDataCheckIsUnread() {
-    return _bmsData != null && _bmsDataUnread;
+    return _available[msgIndexBmsData] && _unread[msgIndexBmsData];
   }
 
   /// Check if bms_data data is stale (max age: 2000ms)
   bool bmsDataCheckDataIsStale(int timeMs) {
-    if (_bmsData == null) return true;
-    final ageMs = timeMs - _bmsDataTimestampMs;
+    if (!_available[msgIndexBmsData]) return true;
+    final ageMs = timeMs - _timestampsMs[msgIndexBmsData];
     return ageMs > 2000;
   }
 
   /// Check if bms_status message is unread
   bool bmsStatusCheckIsUnread() {
-    return _bmsStatus != null && _bmsStatusUnread;
+    return _available[msgIndexBmsStatus] && _unread[msgIndexBmsStatus];
   }
 
   /// Check if bms_status data is stale (max age: 2000ms)
   bool bmsStatusCheckDataIsStale(int timeMs) {
-    if (_bmsStatus == null) return true;
-    final ageMs = timeMs - _bmsStatusTimestampMs;
+    if (!_available[msgIndexBmsStatus]) return true;
+    final ageMs = timeMs - _timestampsMs[msgIndexBmsStatus];
     return ageMs > 2000;
   }
 
   /// Check if motor_data message is unread
   bool motorDataCheckIsUnread() {
-    return _motorData != null && _motorDataUnread;
+    return _available[msgIndexMotorData] && _unread[msgIndexMotorData];
   }
 
   /// Check if motor_data data is stale (max age: 500ms)
   bool motorDataCheckDataIsStale(int timeMs) {
-    if (_motorData == null) return true;
-    final ageMs = timeMs - _motorDataTimestampMs;
+    if (!_available[msgIndexMotorData]) return true;
+    final ageMs = timeMs - _timestampsMs[msgIndexMotorData];
     return ageMs > 500;
   }
 
   /// Check if safety_status message is unread
   bool safetyStatusCheckIsUnread() {
-    return _safetyStatus != null && _safetyStatusUnread;
+    return _available[msgIndexSafetyStatus] && _unread[msgIndexSafetyStatus];
   }
 
   /// Check if safety_status data is stale (max age: 500ms)
   bool safetyStatusCheckDataIsStale(int timeMs) {
-    if (_safetyStatus == null) return true;
-    final ageMs = timeMs - _safetyStatusTimestampMs;
+    if (!_available[msgIndexSafetyStatus]) return true;
+    final ageMs = timeMs - _timestampsMs[msgIndexSafetyStatus];
     return ageMs > 500;
   }
 
   /// Check if performance_data message is unread
   bool performanceDataCheckIsUnread() {
-    return _performanceData != null && _performanceDataUnread;
+    return _available[msgIndexPerformanceData] && _unread[msgIndexPerformanceData];
   }
 
   /// Check if performance_data data is stale (max age: 1000ms)
   bool performanceDataCheckDataIsStale(int timeMs) {
-    if (_performanceData == null) return true;
-    final ageMs = timeMs - _performanceDataTimestampMs;
+    if (!_available[msgIndexPerformanceData]) return true;
+    final ageMs = timeMs - _timestampsMs[msgIndexPerformanceData];
     return ageMs > 1000;
   }
 
+  /// Check if handshake_response message is unread
+  bool handshakeResponseCheckIsUnread() {
+    return _available[msgIndexHandshakeResponse] && _unread[msgIndexHandshakeResponse];
+  }
+
+  /// Check if handshake_response data is stale (max age: 60000ms)
+  bool handshakeResponseCheckDataIsStale(int timeMs) {
+    if (!_available[msgIndexHandshakeResponse]) return true;
+    final ageMs = timeMs - _timestampsMs[msgIndexHandshakeResponse];
+    return ageMs > 60000;
+  }
+
+  /// Get bitmask of stale server messages (bit n = msgIndex* n)
+  /// Messages that have never been received are reported as stale
+  int staleMask(int timeMs) {
+    int mask = 0;
+    for (int i = 0; i < bleDecodeMessageCount; i++) {
+      if (!_available[i] || timeMs - _timestampsMs[i] > _maxAgeMs[i]) {
+        mask |= 1 << i;
+      }
+    }
+    return mask;
+  }
+
+  /// Get bitmask of unread server messages (bit n = msgIndex* n)
+  int unreadMask() {
+    int mask = 0;
+    for (int i = 0; i < bleDecodeMessageCount; i++) {
+      if (_available[i] && _unread[i]) {
+        mask |= 1 << i;
+      }
+    }
+    return mask;
+  }
+
+}
+
+/// Stale or fresh transition of a server message
+class BleStalenessEvent {
+  /// Message index (msgIndex*)
+  final int messageIndex;
+  /// True when the message became stale, false when fresh data arrived
+  final bool isStale;
+  final int timeMs;
+
+  const BleStalenessEvent(this.messageIndex, this.isStale, this.timeMs);
+
+  @override
+  String toString() => 'BleStalenessEvent(messageIndex: $messageIndex, isStale: $isStale, timeMs: $timeMs)';
+}
+
+/// Staleness watchdog for a [BleDecoder]
+///
+/// Uses a single timer armed for the nearest upcoming maxAge expiry across all
+/// server messages, and emits an event only when a message changes state.
+/// [clockMs] must use the same time base as the timeMs passed to decodeFrame().
+/// Messages that have never been received start out stale.
+class BleStalenessWatchdog {
+  final BleDecoder _decoder;
+  final int Function() _clockMs;
+  final StreamController<BleStalenessEvent> _events = StreamController<BleStalenessEvent>.broadcast();
+  final List<bool> _stale = List<bool>.filled(bleDecodeMessageCount, true);
+  Timer? _timer;
+  int? _armedExpiryMs; // Expiry the timer is armed for
+
+  BleStalenessWatchdog(this._decoder, this._clockMs) {
+    _decoder._storeListeners.add(_onStore);
+  }
+
+  /// Stale/fresh transition events
+  Stream<BleStalenessEvent> get events => _events.stream;
+
+  /// Last reported state of a message (msgIndex*)
+  bool isStale(int messageIndex) => _stale[messageIndex];
+
+  /// Stop the timer and detach from the decoder
+  void dispose() {
+    _timer?.cancel();
+    _timer = null;
+    _decoder._storeListeners.remove(_onStore);
+    _events.close();
+  }
+
+  void _onStore(int messageIndex, int timeMs) {
+    if (_stale[messageIndex]) {
+      _stale[messageIndex] = false;
+      _events.add(BleStalenessEvent(messageIndex, false, timeMs));
+    }
+    // Re-arm when this message now expires before the armed timer, e.g. a
+    // short-maxAge message that came back while a longer one is armed
+    final expiryMs = timeMs + BleDecoder._maxAgeMs[messageIndex];
+    if (_timer == null || expiryMs < _armedExpiryMs!) {
+      _timer?.cancel();
+      _check();
+    }
+  }
+
+  void _check() {
+    _timer = null;
+    _armedExpiryMs = null;
+    final nowMs = _clockMs();
+    int? nextExpiryMs;
+    for (int i = 0; i < bleDecodeMessageCount; i++) {
+      if (_stale[i]) continue;
+      final expiryMs = _decoder._timestampsMs[i] + BleDecoder._maxAgeMs[i];
+      if (nowMs > expiryMs) {
+        _stale[i] = true;
+        _events.add(BleStalenessEvent(i, true, nowMs));
+      } else if (nextExpiryMs == null || expiryMs < nextExpiryMs) {
+        nextExpiryMs = expiryMs;
+      }
+    }
+    if (nextExpiryMs != null) {
+      // Stale once age exceeds maxAge, i.e. 1ms after the expiry time
+      _armedExpiryMs = nextExpiryMs;
+      _timer = Timer(Duration(milliseconds: nextExpiryMs - nowMs + 1), _check);
+    }
+  }
+}
+
+/// Immutable state of every server message at one tick
+///
+/// Message objects are shared with the decoder and earlier snapshots until a
+/// newer message is stored, so identical(a.motorData, b.motorData) means
+/// motor_data did not change between two snapshots.
+class BleStateSnapshot {
+  /// Clock time of the tick that produced this snapshot
+  final int timeMs;
+  final Heartbeat? heartbeat;
+  final ServerMessage? serverMessage;
+  final BmsData? bmsData;
+  final BmsStatus? bmsStatus;
+  final MotorData? motorData;
+  final SafetyStatus? safetyStatus;
+  final PerformanceData? performanceData;
+  final HandshakeResponse? handshakeResponse;
+  final List<bool> _unread;
+  final List<bool> _stale;
+
+  BleStateSnapshot._(this.timeMs, this.heartbeat, this.serverMessage, this.bmsData, this.bmsStatus, this.motorData, this.safetyStatus, this.performanceData, this.handshakeResponse, this._unread, this._stale);
+
+  /// Message not yet read through the decoder's get*() (msgIndex*)
+  bool isUnread(int messageIndex) => _unread[messageIndex];
+
+  /// Message missing or older than its maxAge at [timeMs] (msgIndex*)
+  bool isStale(int messageIndex) => _stale[messageIndex];
+
+  bool _matches(BleDecoder decoder, List<bool> unread, List<bool> stale) {
+    if (!identical(heartbeat, decoder._heartbeat)) return false;
+    if (!identical(serverMessage, decoder._serverMessage)) return false;
+    if (!identical(bmsData, decoder._bmsData)) return false;
+    if (!identical(bmsStatus, decoder._bmsStatus)) return false;
+    if (!identical(motorData, decoder._motorData)) return false;
+    if (!identical(safetyStatus, decoder._safetyStatus)) return false;
+    if (!identical(performanceData, decoder._performanceData)) return false;
+    if (!identical(handshakeResponse, decoder._handshakeResponse)) return false;
+    for (int i = 0; i < bleDecodeMessageCount; i++) {
+      if (_unread[i] != unread[i] || _stale[i] != stale[i]) return false;
+    }
+    return true;
+  }
+}
+
+/// Coalesces decoder updates into at most one BleStateSnapshot per tick
+///
+/// Tick at a fixed rate with [start], or call [tick] from a vsync callback
+/// (e.g. SchedulerBinding.addPersistentFrameCallback). A snapshot is only
+/// emitted when a message was stored or an unread/stale flag changed.
+class BleStateCoalescer {
+  final BleDecoder _decoder;
+  final int Function() _clockMs;
+  final StreamController<BleStateSnapshot> _snapshots = StreamController<BleStateSnapshot>.broadcast();
+  final List<bool> _unread = List<bool>.filled(bleDecodeMessageCount, false);
+  final List<bool> _stale = List<bool>.filled(bleDecodeMessageCount, true);
+  BleStateSnapshot? _latest;
+  Timer? _timer;
+
+  BleStateCoalescer(this._decoder, this._clockMs);
+
+  /// One snapshot per tick with changes
+  Stream<BleStateSnapshot> get snapshots => _snapshots.stream;
+
+  /// Most recently emitted snapshot (null before the first tick)
+  BleStateSnapshot? get latest => _latest;
+
+  /// Tick periodically (default about 30 Hz)
+  void start([Duration interval = const Duration(milliseconds: 33)]) {
+    _timer?.cancel();
+    _timer = Timer.periodic(interval, (_) => tick());
+  }
+
+  /// Stop periodic ticks
+  void stop() {
+    _timer?.cancel();
+    _timer = null;
+  }
+
+  /// Emit a snapshot if anything changed since the last one; returns it or null
+  BleStateSnapshot? tick() {
+    final timeMs = _clockMs();
+    final decoder = _decoder;
+    for (int i = 0; i < bleDecodeMessageCount; i++) {
+      final available = decoder._available[i];
+      _unread[i] = available && decoder._unread[i];
+      _stale[i] = !available || timeMs - decoder._timestampsMs[i] > BleDecoder._maxAgeMs[i];
+    }
+    final latest = _latest;
+    if (latest != null && latest._matches(decoder, _unread, _stale)) return null;
+
+    final snapshot = BleStateSnapshot._(
+      timeMs, decoder._heartbeat, decoder._serverMessage, decoder._bmsData, decoder._bmsStatus, decoder._motorData, decoder._safetyStatus, decoder._performanceData, decoder._handshakeResponse,
+      List<bool>.unmodifiable(_unread), List<bool>.unmodifiable(_stale),
+    );
+    _latest = snapshot;
+    _snapshots.add(snapshot);
+    return snapshot;
+  }
+
+  /// Stop ticking and close [snapshots]
+  void dispose() {
+    stop();
+    _snapshots.close();
+  }
+}
+
+/// Last [capacity] bms_data samples, one typed column per numeric field
+///
+/// Each sample is written at i and i + capacity, so the newest n samples are
+/// always contiguous and the last*() methods return views instead of copies.
+/// Views follow the ring: re-request them after new samples are appended.
+class BmsDataHistory {
+  static const int capacity = 128;
+
+  final Int64List _timestampsMs = Int64List(2 * capacity);
+  final Uint16List _cellVoltage1Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage2Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage3Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage4Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage5Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage6Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage7Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage8Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage9Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage10Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage11Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage12Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage13Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage14Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage15Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage16Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage17Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage18Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage19Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage20Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage21Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage22Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage23Mv = Uint16List(2 * capacity);
+  final Uint16List _cellVoltage24Mv = Uint16List(2 * capacity);
+  final Int16List _packTempC = Int16List(2 * capacity);
+  int _next = 0;
+  int _length = 0;
+
+  /// Number of samples held (at most [capacity])
+  int get length => _length;
+
+  // Columns are read straight from the payload bytes, without a message object
+  void _append(ByteData data, int timestampMs) {
+    final i = _next;
+    final j = i + capacity;
+    _timestampsMs[i] = _timestampsMs[j] = timestampMs;
+    _cellVoltage1Mv[i] = _cellVoltage1Mv[j] = data.getUint16(0, Endian.little);
+    _cellVoltage2Mv[i] = _cellVoltage2Mv[j] = data.getUint16(2, Endian.little);
+    _cellVoltage3Mv[i] = _cellVoltage3Mv[j] = data.getUint16(4, Endian.little);
+    _cellVoltage4Mv[i] = _cellVoltage4Mv[j] = data.getUint16(6, Endian.little);
+    _cellVoltage5Mv[i] = _cellVoltage5Mv[j] = data.getUint16(8, Endian.little);
+    _cellVoltage6Mv[i] = _cellVoltage6Mv[j] = data.getUint16(10, Endian.little);
+    _cellVoltage7Mv[i] = _cellVoltage7Mv[j] = data.getUint16(12, Endian.little);
+    _cellVoltage8Mv[i] = _cellVoltage8Mv[j] = data.getUint16(14, Endian.little);
+    _cellVoltage9Mv[i] = _cellVoltage9Mv[j] = data.getUint16(16, Endian.little);
+    _cellVoltage10Mv[i] = _cellVoltage10Mv[j] = data.getUint16(18, Endian.little);
+    _cellVoltage11Mv[i] = _cellVoltage11Mv[j] = data.getUint16(20, Endian.little);
+    _cellVoltage12Mv[i] = _cellVoltage12Mv[j] = data.getUint16(22, Endian.little);
+    _cellVoltage13Mv[i] = _cellVoltage13Mv[j] = data.getUint16(24, Endian.little);
+    _cellVoltage14Mv[i] = _cellVoltage14Mv[j] = data.getUint16(26, Endian.little);
+    _cellVoltage15Mv[i] = _cellVoltage15Mv[j] = data.getUint16(28, Endian.little);
+    _cellVoltage16Mv[i] = _cellVoltage16Mv[j] = data.getUint16(30, Endian.little);
+    _cellVoltage17Mv[i] = _cellVoltage17Mv[j] = data.getUint16(32, Endian.little);
+    _cellVoltage18Mv[i] = _cellVoltage18Mv[j] = data.getUint16(34, Endian.little);
+    _cellVoltage19Mv[i] = _cellVoltage19Mv[j] = data.getUint16(36, Endian.little);
+    _cellVoltage20Mv[i] = _cellVoltage20Mv[j] = data.getUint16(38, Endian.little);
+    _cellVoltage21Mv[i] = _cellVoltage21Mv[j] = data.getUint16(40, Endian.little);
+    _cellVoltage22Mv[i] = _cellVoltage22Mv[j] = data.getUint16(42, Endian.little);
+    _cellVoltage23Mv[i] = _cellVoltage23Mv[j] = data.getUint16(44, Endian.little);
+    _cellVoltage24Mv[i] = _cellVoltage24Mv[j] = data.getUint16(46, Endian.little);
+    _packTempC[i] = _packTempC[j] = data.getInt16(48, Endian.little);
+    _next = i + 1 == capacity ? 0 : i + 1;
+    if (_length < capacity) _length++;
+  }
+
+  /// Drop all samples
+  void clear() {
+    _next = 0;
+    _length = 0;
+  }
+
+  // Start of the newest n samples in the mirrored columns (they end at _next + capacity)
+  int _windowStart(int n) => _next + capacity - (n < _length ? n : _length);
+
+  /// Newest [n] timestampsMs values, oldest first
+  Int64List lastTimestampsMs(int n) => Int64List.sublistView(_timestampsMs, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage1Mv values, oldest first
+  Uint16List lastCellVoltage1Mv(int n) => Uint16List.sublistView(_cellVoltage1Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage2Mv values, oldest first
+  Uint16List lastCellVoltage2Mv(int n) => Uint16List.sublistView(_cellVoltage2Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage3Mv values, oldest first
+  Uint16List lastCellVoltage3Mv(int n) => Uint16List.sublistView(_cellVoltage3Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage4Mv values, oldest first
+  Uint16List lastCellVoltage4Mv(int n) => Uint16List.sublistView(_cellVoltage4Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage5Mv values, oldest first
+  Uint16List lastCellVoltage5Mv(int n) => Uint16List.sublistView(_cellVoltage5Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage6Mv values, oldest first
+  Uint16List lastCellVoltage6Mv(int n) => Uint16List.sublistView(_cellVoltage6Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage7Mv values, oldest first
+  Uint16List lastCellVoltage7Mv(int n) => Uint16List.sublistView(_cellVoltage7Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage8Mv values, oldest first
+  Uint16List lastCellVoltage8Mv(int n) => Uint16List.sublistView(_cellVoltage8Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage9Mv values, oldest first
+  Uint16List lastCellVoltage9Mv(int n) => Uint16List.sublistView(_cellVoltage9Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage10Mv values, oldest first
+  Uint16List lastCellVoltage10Mv(int n) => Uint16List.sublistView(_cellVoltage10Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage11Mv values, oldest first
+  Uint16List lastCellVoltage11Mv(int n) => Uint16List.sublistView(_cellVoltage11Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage12Mv values, oldest first
+  Uint16List lastCellVoltage12Mv(int n) => Uint16List.sublistView(_cellVoltage12Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage13Mv values, oldest first
+  Uint16List lastCellVoltage13Mv(int n) => Uint16List.sublistView(_cellVoltage13Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage14Mv values, oldest first
+  Uint16List lastCellVoltage14Mv(int n) => Uint16List.sublistView(_cellVoltage14Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage15Mv values, oldest first
+  Uint16List lastCellVoltage15Mv(int n) => Uint16List.sublistView(_cellVoltage15Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage16Mv values, oldest first
+  Uint16List lastCellVoltage16Mv(int n) => Uint16List.sublistView(_cellVoltage16Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage17Mv values, oldest first
+  Uint16List lastCellVoltage17Mv(int n) => Uint16List.sublistView(_cellVoltage17Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage18Mv values, oldest first
+  Uint16List lastCellVoltage18Mv(int n) => Uint16List.sublistView(_cellVoltage18Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage19Mv values, oldest first
+  Uint16List lastCellVoltage19Mv(int n) => Uint16List.sublistView(_cellVoltage19Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage20Mv values, oldest first
+  Uint16List lastCellVoltage20Mv(int n) => Uint16List.sublistView(_cellVoltage20Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage21Mv values, oldest first
+  Uint16List lastCellVoltage21Mv(int n) => Uint16List.sublistView(_cellVoltage21Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage22Mv values, oldest first
+  Uint16List lastCellVoltage22Mv(int n) => Uint16List.sublistView(_cellVoltage22Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage23Mv values, oldest first
+  Uint16List lastCellVoltage23Mv(int n) => Uint16List.sublistView(_cellVoltage23Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] cellVoltage24Mv values, oldest first
+  Uint16List lastCellVoltage24Mv(int n) => Uint16List.sublistView(_cellVoltage24Mv, _windowStart(n), _next + capacity);
+  /// Newest [n] packTempC values, oldest first
+  Int16List lastPackTempC(int n) => Int16List.sublistView(_packTempC, _windowStart(n), _next + capacity);
+}
+
+/// Last [capacity] bms_status samples, one typed column per numeric field
+///
+/// Each sample is written at i and i + capacity, so the newest n samples are
+/// always contiguous and the last*() methods return views instead of copies.
+/// Views follow the ring: re-request them after new samples are appended.
+class BmsStatusHistory {
+  static const int capacity = 128;
+
+  final Int64List _timestampsMs = Int64List(2 * capacity);
+  final Uint8List _socPercent = Uint8List(2 * capacity);
+  final Uint8List _sohPercent = Uint8List(2 * capacity);
+  final Uint32List _packVoltageMv = Uint32List(2 * capacity);
+  final Int32List _packCurrentMa = Int32List(2 * capacity);
+  final Uint16List _remainingRangeKm = Uint16List(2 * capacity);
+  final Uint16List _timeToEmptyMin = Uint16List(2 * capacity);
+  final Uint16List _timeToFullMin = Uint16List(2 * capacity);
+  final Uint16List _cellDeltaMv = Uint16List(2 * capacity);
+  final Uint16List _minCellVoltageMv = Uint16List(2 * capacity);
+  final Uint16List _maxCellVoltageMv = Uint16List(2 * capacity);
+  final Uint8List _minCellIndex = Uint8List(2 * capacity);
+  final Uint8List _maxCellIndex = Uint8List(2 * capacity);
+  int _next = 0;
+  int _length = 0;
+
+  /// Number of samples held (at most [capacity])
+  int get length => _length;
+
+  // Columns are read straight from the payload bytes, without a message object
+  void _append(ByteData data, int timestampMs) {
+    final i = _next;
+    final j = i + capacity;
+    _timestampsMs[i] = _timestampsMs[j] = timestampMs;
+    _socPercent[i] = _socPercent[j] = data.getUint8(0);
+    _sohPercent[i] = _sohPercent[j] = data.getUint8(1);
+    _packVoltageMv[i] = _packVoltageMv[j] = data.getUint32(2, Endian.little);
+    _packCurrentMa[i] = _packCurrentMa[j] = data.getInt32(6, Endian.little);
+    _remainingRangeKm[i] = _remainingRangeKm[j] = data.getUint16(10, Endian.little);
+    _timeToEmptyMin[i] = _timeToEmptyMin[j] = data.getUint16(12, Endian.little);
+    _timeToFullMin[i] = _timeToFullMin[j] = data.getUint16(14, Endian.little);
+    _cellDeltaMv[i] = _cellDeltaMv[j] = data.getUint16(16, Endian.little);
+    _minCellVoltageMv[i] = _minCellVoltageMv[j] = data.getUint16(18, Endian.little);
+    _maxCellVoltageMv[i] = _maxCellVoltageMv[j] = data.getUint16(20, Endian.little);
+    _minCellIndex[i] = _minCellIndex[j] = data.getUint8(22);
+    _maxCellIndex[i] = _maxCellIndex[j] = data.getUint8(23);
+    _next = i + 1 == capacity ? 0 : i + 1;
+    if (_length < capacity) _length++;
+  }
+
+  /// Drop all samples
+  void clear() {
+    _next = 0;
+    _length = 0;
+  }
+
+  // Start of the newest n samples in the mirrored columns (they end at _next + capacity)
+  int _windowStart(int n) => _next + capacity - (n < _length ? n : _length);
+
+  /// Newest [n] timestampsMs values, oldest first
+  Int64List lastTimestampsMs(int n) => Int64List.sublistView(_timestampsMs, _windowStart(n), _next + capacity);
+  /// Newest [n] socPercent values, oldest first
+  Uint8List lastSocPercent(int n) => Uint8List.sublistView(_socPercent, _windowStart(n), _next + capacity);
+  /// Newest [n] sohPercent values, oldest first
+  Uint8List lastSohPercent(int n) => Uint8List.sublistView(_sohPercent, _windowStart(n), _next + capacity);
+  /// Newest [n] packVoltageMv values, oldest first
+  Uint32List lastPackVoltageMv(int n) => Uint32List.sublistView(_packVoltageMv, _windowStart(n), _next + capacity);
+  /// Newest [n] packCurrentMa values, oldest first
+  Int32List lastPackCurrentMa(int n) => Int32List.sublistView(_packCurrentMa, _windowStart(n), _next + capacity);
+  /// Newest [n] remainingRangeKm values, oldest first
+  Uint16List lastRemainingRangeKm(int n) => Uint16List.sublistView(_remainingRangeKm, _windowStart(n), _next + capacity);
+  /// Newest [n] timeToEmptyMin values, oldest first
+  Uint16List lastTimeToEmptyMin(int n) => Uint16List.sublistView(_timeToEmptyMin, _windowStart(n), _next + capacity);
+  /// Newest [n] timeToFullMin values, oldest first
+  Uint16List lastTimeToFullMin(int n) => Uint16List.sublistView(_timeToFullMin, _windowStart(n), _next + capacity);
+  /// Newest [n] cellDeltaMv values, oldest first
+  Uint16List lastCellDeltaMv(int n) => Uint16List.sublistView(_cellDeltaMv, _windowStart(n), _next + capacity);
+  /// Newest [n] minCellVoltageMv values, oldest first
+  Uint16List lastMinCellVoltageMv(int n) => Uint16List.sublistView(_minCellVoltageMv, _windowStart(n), _next + capacity);
+  /// Newest [n] maxCellVoltageMv values, oldest first
+  Uint16List lastMaxCellVoltageMv(int n) => Uint16List.sublistView(_maxCellVoltageMv, _windowStart(n), _next + capacity);
+  /// Newest [n] minCellIndex values, oldest first
+  Uint8List lastMinCellIndex(int n) => Uint8List.sublistView(_minCellIndex, _windowStart(n), _next + capacity);
+  /// Newest [n] maxCellIndex values, oldest first
+  Uint8List lastMaxCellIndex(int n) => Uint8List.sublistView(_maxCellIndex, _windowStart(n), _next + capacity);
+}
+
+/// Last [capacity] motor_data samples, one typed column per numeric field
+///
+/// Each sample is written at i and i + capacity, so the newest n samples are
+/// always contiguous and the last*() methods return views instead of copies.
+/// Views follow the ring: re-request them after new samples are appended.
+class MotorDataHistory {
+  static const int capacity = 256;
+
+  final Int64List _timestampsMs = Int64List(2 * capacity);
+  final Int16List _motorTempC = Int16List(2 * capacity);
+  final Int16List _controllerTempC = Int16List(2 * capacity);
+  final Uint32List _motorRpm = Uint32List(2 * capacity);
+  final Uint32List _powerW = Uint32List(2 * capacity);
+  final Uint16List _torqueNm = Uint16List(2 * capacity);
+  final Uint8List _throttlePercent = Uint8List(2 * capacity);
+  final Uint8List _regenLevelPercent = Uint8List(2 * capacity);
+  int _next = 0;
+  int _length = 0;
+
+  /// Number of samples held (at most [capacity])
+  int get length => _length;
+
+  // Columns are read straight from the payload bytes, without a message object
+  void _append(ByteData data, int timestampMs) {
+    final i = _next;
+    final j = i + capacity;
+    _timestampsMs[i] = _timestampsMs[j] = timestampMs;
+    _motorTempC[i] = _motorTempC[j] = data.getInt16(0, Endian.little);
+    _controllerTempC[i] = _controllerTempC[j] = data.getInt16(2, Endian.little);
+    _motorRpm[i] = _motorRpm[j] = data.getUint32(4, Endian.little);
+    _powerW[i] = _powerW[j] = data.getUint32(8, Endian.little);
+    _torqueNm[i] = _torqueNm[j] = data.getUint16(12, Endian.little);
+    _throttlePercent[i] = _throttlePercent[j] = data.getUint8(14);
+    _regenLevelPercent[i] = _regenLevelPercent[j] = data.getUint8(15);
+    _next = i + 1 == capacity ? 0 : i + 1;
+    if (_length < capacity) _length++;
+  }
+
+  /// Drop all samples
+  void clear() {
+    _next = 0;
+    _length = 0;
+  }
+
+  // Start of the newest n samples in the mirrored columns (they end at _next + capacity)
+  int _windowStart(int n) => _next + capacity - (n < _length ? n : _length);
+
+  /// Newest [n] timestampsMs values, oldest first
+  Int64List lastTimestampsMs(int n) => Int64List.sublistView(_timestampsMs, _windowStart(n), _next + capacity);
+  /// Newest [n] motorTempC values, oldest first
+  Int16List lastMotorTempC(int n) => Int16List.sublistView(_motorTempC, _windowStart(n), _next + capacity);
+  /// Newest [n] controllerTempC values, oldest first
+  Int16List lastControllerTempC(int n) => Int16List.sublistView(_controllerTempC, _windowStart(n), _next + capacity);
+  /// Newest [n] motorRpm values, oldest first
+  Uint32List lastMotorRpm(int n) => Uint32List.sublistView(_motorRpm, _windowStart(n), _next + capacity);
+  /// Newest [n] powerW values, oldest first
+  Uint32List lastPowerW(int n) => Uint32List.sublistView(_powerW, _windowStart(n), _next + capacity);
+  /// Newest [n] torqueNm values, oldest first
+  Uint16List lastTorqueNm(int n) => Uint16List.sublistView(_torqueNm, _windowStart(n), _next + capacity);
+  /// Newest [n] throttlePercent values, oldest first
+  Uint8List lastThrottlePercent(int n) => Uint8List.sublistView(_throttlePercent, _windowStart(n), _next + capacity);
+  /// Newest [n] regenLevelPercent values, oldest first
+  Uint8List lastRegenLevelPercent(int n) => Uint8List.sublistView(_regenLevelPercent, _windowStart(n), _next + capacity);
+}
+
+/// Null-terminated string field of [size] bytes at [offset]
+String _bleStringAt(ByteData data, int offset, int size) {
+  var end = offset;
+  while (end < offset + size && data.getUint8(end) != 0) {
+    end++;
+  }
+  return String.fromCharCodes(Uint8List.sublistView(data, offset, end));
+}
+
+/// Latest value of one message field, notifying only when it actually changes
+class BleFieldValue<T> {
+  T _value;
+  bool _known = false;
+  StreamController<T>? _changes;
+
+  BleFieldValue(this._value);
+
+  /// Value from the last stored message (type default before the first)
+  T get value => _value;
+
+  /// Emits each new value; created on first use, so unobserved fields cost nothing
+  Stream<T> get changes => (_changes ??= StreamController<T>.broadcast()).stream;
+
+  bool _set(T value) {
+    if (_known && value == _value) return false;
+    _known = true;
+    _value = value;
+    final changes = _changes;
+    if (changes != null && changes.hasListener) changes.add(value);
+    return true;
+  }
+}
+
+/// Field-level changes of heartbeat
+/// [changedMask] has one bit per field that differed from the previous
+/// message; the first message sets every bit.
+class HeartbeatChanges {
+  static const int uptimeMsBit = 1 << 0;
+  static const int lvBatteryMvBit = 1 << 1;
+  static const int vehicleStateBit = 1 << 2;
+
+  final BleFieldValue<int> uptimeMs = BleFieldValue<int>(0);
+  final BleFieldValue<int> lvBatteryMv = BleFieldValue<int>(0);
+  final BleFieldValue<int> vehicleState = BleFieldValue<int>(0);
+
+  int _changedMask = 0;
+
+  /// Fields changed by the last stored message (*Bit constants)
+  int get changedMask => _changedMask;
+
+  // Fields are read straight from the payload bytes, without a message object
+  void _update(ByteData data) {
+    var mask = 0;
+    if (uptimeMs._set(data.getUint32(0, Endian.little))) mask |= uptimeMsBit;
+    if (lvBatteryMv._set(data.getUint32(4, Endian.little))) mask |= lvBatteryMvBit;
+    if (vehicleState._set(data.getUint8(8))) mask |= vehicleStateBit;
+    _changedMask = mask;
+  }
+}
+
+/// Field-level changes of server_message
+/// [changedMask] has one bit per field that differed from the previous
+/// message; the first message sets every bit.
+class ServerMessageChanges {
+  static const int dataBit = 1 << 0;
+
+  final BleFieldValue<String> data = BleFieldValue<String>('');
+
+  int _changedMask = 0;
+
+  /// Fields changed by the last stored message (*Bit constants)
+  int get changedMask => _changedMask;
+
+  // Fields are read straight from the payload bytes, without a message object
+  void _update(ByteData data) {
+    var mask = 0;
+    if (this.data._set(_bleStringAt(data, 0, 128))) mask |= dataBit;
+    _changedMask = mask;
+  }
+}
+
+/// Field-level changes of bms_data
+/// [changedMask] has one bit per field that differed from the previous
+/// message; the first message sets every bit.
+class BmsDataChanges {
+  static const int cellVoltage1MvBit = 1 << 0;
+  static const int cellVoltage2MvBit = 1 << 1;
+  static const int cellVoltage3MvBit = 1 << 2;
+  static const int cellVoltage4MvBit = 1 << 3;
+  static const int cellVoltage5MvBit = 1 << 4;
+  static const int cellVoltage6MvBit = 1 << 5;
+  static const int cellVoltage7MvBit = 1 << 6;
+  static const int cellVoltage8MvBit = 1 << 7;
+  static const int cellVoltage9MvBit = 1 << 8;
+  static const int cellVoltage10MvBit = 1 << 9;
+  static const int cellVoltage11MvBit = 1 << 10;
+  static const int cellVoltage12MvBit = 1 << 11;
+  static const int cellVoltage13MvBit = 1 << 12;
+  static const int cellVoltage14MvBit = 1 << 13;
+  static const int cellVoltage15MvBit = 1 << 14;
+  static const int cellVoltage16MvBit = 1 << 15;
+  static const int cellVoltage17MvBit = 1 << 16;
+  static const int cellVoltage18MvBit = 1 << 17;
+  static const int cellVoltage19MvBit = 1 << 18;
+  static const int cellVoltage20MvBit = 1 << 19;
+  static const int cellVoltage21MvBit = 1 << 20;
+  static const int cellVoltage22MvBit = 1 << 21;
+  static const int cellVoltage23MvBit = 1 << 22;
+  static const int cellVoltage24MvBit = 1 << 23;
+  static const int packTempCBit = 1 << 24;
+
+  final BleFieldValue<int> cellVoltage1Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage2Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage3Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage4Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage5Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage6Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage7Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage8Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage9Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage10Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage11Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage12Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage13Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage14Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage15Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage16Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage17Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage18Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage19Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage20Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage21Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage22Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage23Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellVoltage24Mv = BleFieldValue<int>(0);
+  final BleFieldValue<int> packTempC = BleFieldValue<int>(0);
+
+  int _changedMask = 0;
+
+  /// Fields changed by the last stored message (*Bit constants)
+  int get changedMask => _changedMask;
+
+  // Fields are read straight from the payload bytes, without a message object
+  void _update(ByteData data) {
+    var mask = 0;
+    if (cellVoltage1Mv._set(data.getUint16(0, Endian.little))) mask |= cellVoltage1MvBit;
+    if (cellVoltage2Mv._set(data.getUint16(2, Endian.little))) mask |= cellVoltage2MvBit;
+    if (cellVoltage3Mv._set(data.getUint16(4, Endian.little))) mask |= cellVoltage3MvBit;
+    if (cellVoltage4Mv._set(data.getUint16(6, Endian.little))) mask |= cellVoltage4MvBit;
+    if (cellVoltage5Mv._set(data.getUint16(8, Endian.little))) mask |= cellVoltage5MvBit;
+    if (cellVoltage6Mv._set(data.getUint16(10, Endian.little))) mask |= cellVoltage6MvBit;
+    if (cellVoltage7Mv._set(data.getUint16(12, Endian.little))) mask |= cellVoltage7MvBit;
+    if (cellVoltage8Mv._set(data.getUint16(14, Endian.little))) mask |= cellVoltage8MvBit;
+    if (cellVoltage9Mv._set(data.getUint16(16, Endian.little))) mask |= cellVoltage9MvBit;
+    if (cellVoltage10Mv._set(data.getUint16(18, Endian.little))) mask |= cellVoltage10MvBit;
+    if (cellVoltage11Mv._set(data.getUint16(20, Endian.little))) mask |= cellVoltage11MvBit;
+    if (cellVoltage12Mv._set(data.getUint16(22, Endian.little))) mask |= cellVoltage12MvBit;
+    if (cellVoltage13Mv._set(data.getUint16(24, Endian.little))) mask |= cellVoltage13MvBit;
+    if (cellVoltage14Mv._set(data.getUint16(26, Endian.little))) mask |= cellVoltage14MvBit;
+    if (cellVoltage15Mv._set(data.getUint16(28, Endian.little))) mask |= cellVoltage15MvBit;
+    if (cellVoltage16Mv._set(data.getUint16(30, Endian.little))) mask |= cellVoltage16MvBit;
+    if (cellVoltage17Mv._set(data.getUint16(32, Endian.little))) mask |= cellVoltage17MvBit;
+    if (cellVoltage18Mv._set(data.getUint16(34, Endian.little))) mask |= cellVoltage18MvBit;
+    if (cellVoltage19Mv._set(data.getUint16(36, Endian.little))) mask |= cellVoltage19MvBit;
+    if (cellVoltage20Mv._set(data.getUint16(38, Endian.little))) mask |= cellVoltage20MvBit;
+    if (cellVoltage21Mv._set(data.getUint16(40, Endian.little))) mask |= cellVoltage21MvBit;
+    if (cellVoltage22Mv._set(data.getUint16(42, Endian.little))) mask |= cellVoltage22MvBit;
+    if (cellVoltage23Mv._set(data.getUint16(44, Endian.little))) mask |= cellVoltage23MvBit;
+    if (cellVoltage24Mv._set(data.getUint16(46, Endian.little))) mask |= cellVoltage24MvBit;
+    if (packTempC._set(data.getInt16(48, Endian.little))) mask |= packTempCBit;
+    _changedMask = mask;
+  }
+}
+
+/// Field-level changes of bms_status
+/// [changedMask] has one bit per field that differed from the previous
+/// message; the first message sets every bit.
+class BmsStatusChanges {
+  static const int socPercentBit = 1 << 0;
+  static const int sohPercentBit = 1 << 1;
+  static const int packVoltageMvBit = 1 << 2;
+  static const int packCurrentMaBit = 1 << 3;
+  static const int remainingRangeKmBit = 1 << 4;
+  static const int timeToEmptyMinBit = 1 << 5;
+  static const int timeToFullMinBit = 1 << 6;
+  static const int cellDeltaMvBit = 1 << 7;
+  static const int minCellVoltageMvBit = 1 << 8;
+  static const int maxCellVoltageMvBit = 1 << 9;
+  static const int minCellIndexBit = 1 << 10;
+  static const int maxCellIndexBit = 1 << 11;
+
+  final BleFieldValue<int> socPercent = BleFieldValue<int>(0);
+  final BleFieldValue<int> sohPercent = BleFieldValue<int>(0);
+  final BleFieldValue<int> packVoltageMv = BleFieldValue<int>(0);
+  final BleFieldValue<int> packCurrentMa = BleFieldValue<int>(0);
+  final BleFieldValue<int> remainingRangeKm = BleFieldValue<int>(0);
+  final BleFieldValue<int> timeToEmptyMin = BleFieldValue<int>(0);
+  final BleFieldValue<int> timeToFullMin = BleFieldValue<int>(0);
+  final BleFieldValue<int> cellDeltaMv = BleFieldValue<int>(0);
+  final BleFieldValue<int> minCellVoltageMv = BleFieldValue<int>(0);
+  final BleFieldValue<int> maxCellVoltageMv = BleFieldValue<int>(0);
+  final BleFieldValue<int> minCellIndex = BleFieldValue<int>(0);
+  final BleFieldValue<int> maxCellIndex = BleFieldValue<int>(0);
+
+  int _changedMask = 0;
+
+  /// Fields changed by the last stored message (*Bit constants)
+  int get changedMask => _changedMask;
+
+  // Fields are read straight from the payload bytes, without a message object
+  void _update(ByteData data) {
+    var mask = 0;
+    if (socPercent._set(data.getUint8(0))) mask |= socPercentBit;
+    if (sohPercent._set(data.getUint8(1))) mask |= sohPercentBit;
+    if (packVoltageMv._set(data.getUint32(2, Endian.little))) mask |= packVoltageMvBit;
+    if (packCurrentMa._set(data.getInt32(6, Endian.little))) mask |= packCurrentMaBit;
+    if (remainingRangeKm._set(data.getUint16(10, Endian.little))) mask |= remainingRangeKmBit;
+    if (timeToEmptyMin._set(data.getUint16(12, Endian.little))) mask |= timeToEmptyMinBit;
+    if (timeToFullMin._set(data.getUint16(14, Endian.little))) mask |= timeToFullMinBit;
+    if (cellDeltaMv._set(data.getUint16(16, Endian.little))) mask |= cellDeltaMvBit;
+    if (minCellVoltageMv._set(data.getUint16(18, Endian.little))) mask |= minCellVoltageMvBit;
+    if (maxCellVoltageMv._set(data.getUint16(20, Endian.little))) mask |= maxCellVoltageMvBit;
+    if (minCellIndex._set(data.getUint8(22))) mask |= minCellIndexBit;
+    if (maxCellIndex._set(data.getUint8(23))) mask |= maxCellIndexBit;
+    _changedMask = mask;
+  }
+}
+
+/// Field-level changes of motor_data
+/// [changedMask] has one bit per field that differed from the previous
+/// message; the first message sets every bit.
+class MotorDataChanges {
+  static const int motorTempCBit = 1 << 0;
+  static const int controllerTempCBit = 1 << 1;
+  static const int motorRpmBit = 1 << 2;
+  static const int powerWBit = 1 << 3;
+  static const int torqueNmBit = 1 << 4;
+  static const int throttlePercentBit = 1 << 5;
+  static const int regenLevelPercentBit = 1 << 6;
+
+  final BleFieldValue<int> motorTempC = BleFieldValue<int>(0);
+  final BleFieldValue<int> controllerTempC = BleFieldValue<int>(0);
+  final BleFieldValue<int> motorRpm = BleFieldValue<int>(0);
+  final BleFieldValue<int> powerW = BleFieldValue<int>(0);
+  final BleFieldValue<int> torqueNm = BleFieldValue<int>(0);
+  final BleFieldValue<int> throttlePercent = BleFieldValue<int>(0);
+  final BleFieldValue<int> regenLevelPercent = BleFieldValue<int>(0);
+
+  int _changedMask = 0;
+
+  /// Fields changed by the last stored message (*Bit constants)
+  int get changedMask => _changedMask;
+
+  // Fields are read straight from the payload bytes, without a message object
+  void _update(ByteData data) {
+    var mask = 0;
+    if (motorTempC._set(data.getInt16(0, Endian.little))) mask |= motorTempCBit;
+    if (controllerTempC._set(data.getInt16(2, Endian.little))) mask |= controllerTempCBit;
+    if (motorRpm._set(data.getUint32(4, Endian.little))) mask |= motorRpmBit;
+    if (powerW._set(data.getUint32(8, Endian.little))) mask |= powerWBit;
+    if (torqueNm._set(data.getUint16(12, Endian.little))) mask |= torqueNmBit;
+    if (throttlePercent._set(data.getUint8(14))) mask |= throttlePercentBit;
+    if (regenLevelPercent._set(data.getUint8(15))) mask |= regenLevelPercentBit;
+    _changedMask = mask;
+  }
+}
+
+/// Field-level changes of safety_status
+/// [changedMask] has one bit per field that differed from the previous
+/// message; the first message sets every bit.
+class SafetyStatusChanges {
+  static const int faultCodesBit = 1 << 0;
+  static const int warningFlagsBit = 1 << 1;
+  static const int chargingStatusBit = 1 << 2;
+  static const int rideModeBit = 1 << 3;
+  static const int frontBrakeEngagedBit = 1 << 4;
+  static const int rearBrakeEngagedBit = 1 << 5;
+
+  final BleFieldValue<int> faultCodes = BleFieldValue<int>(0);
+  final BleFieldValue<int> warningFlags = BleFieldValue<int>(0);
+  final BleFieldValue<int> chargingStatus = BleFieldValue<int>(0);
+  final BleFieldValue<int> rideMode = BleFieldValue<int>(0);
+  final BleFieldValue<int> frontBrakeEngaged = BleFieldValue<int>(0);
+  final BleFieldValue<int> rearBrakeEngaged = BleFieldValue<int>(0);
+
+  int _changedMask = 0;
+
+  /// Fields changed by the last stored message (*Bit constants)
+  int get changedMask => _changedMask;
+
+  // Fields are read straight from the payload bytes, without a message object
+  void _update(ByteData data) {
+    var mask = 0;
+    if (faultCodes._set(data.getUint16(0, Endian.little))) mask |= faultCodesBit;
+    if (warningFlags._set(data.getUint32(2, Endian.little))) mask |= warningFlagsBit;
+    if (chargingStatus._set(data.getUint8(6))) mask |= chargingStatusBit;
+    if (rideMode._set(data.getUint8(7))) mask |= rideModeBit;
+    if (frontBrakeEngaged._set(data.getUint8(8))) mask |= frontBrakeEngagedBit;
+    if (rearBrakeEngaged._set(data.getUint8(9))) mask |= rearBrakeEngagedBit;
+    _changedMask = mask;
+  }
+}
+
+/// Field-level changes of performance_data
+/// [changedMask] has one bit per field that differed from the previous
+/// message; the first message sets every bit.
+class PerformanceDataChanges {
+  static const int odometerKmBit = 1 << 0;
+  static const int tripKmBit = 1 << 1;
+  static const int avgSpeedKphBit = 1 << 2;
+  static const int topSpeedKphBit = 1 << 3;
+  static const int energyWhPerKmBit = 1 << 4;
+  static const int accel060MsBit = 1 << 5;
+
+  final BleFieldValue<int> odometerKm = BleFieldValue<int>(0);
+  final BleFieldValue<int> tripKm = BleFieldValue<int>(0);
+  final BleFieldValue<int> avgSpeedKph = BleFieldValue<int>(0);
+  final BleFieldValue<int> topSpeedKph = BleFieldValue<int>(0);
+  final BleFieldValue<int> energyWhPerKm = BleFieldValue<int>(0);
+  final BleFieldValue<int> accel060Ms = BleFieldValue<int>(0);
+
+  int _changedMask = 0;
+
+  /// Fields changed by the last stored message (*Bit constants)
+  int get changedMask => _changedMask;
+
+  // Fields are read straight from the payload bytes, without a message object
+  void _update(ByteData data) {
+    var mask = 0;
+    if (odometerKm._set(data.getUint32(0, Endian.little))) mask |= odometerKmBit;
+    if (tripKm._set(data.getUint32(4, Endian.little))) mask |= tripKmBit;
+    if (avgSpeedKph._set(data.getUint16(8, Endian.little))) mask |= avgSpeedKphBit;
+    if (topSpeedKph._set(data.getUint16(10, Endian.little))) mask |= topSpeedKphBit;
+    if (energyWhPerKm._set(data.getUint16(12, Endian.little))) mask |= energyWhPerKmBit;
+    if (accel060Ms._set(data.getUint16(14, Endian.little))) mask |= accel060MsBit;
+    _changedMask = mask;
+  }
+}
+
+/// Field-level changes of handshake_response
+/// [changedMask] has one bit per field that differed from the previous
+/// message; the first message sets every bit.
+class HandshakeResponseChanges {
+  static const int protocolVersionBit = 1 << 0;
+  static const int schemaHashBit = 1 << 1;
+  static const int maxReassemblyBit = 1 << 2;
+  static const int mtuBit = 1 << 3;
+  static const int featuresBit = 1 << 4;
+
+  final BleFieldValue<int> protocolVersion = BleFieldValue<int>(0);
+  final BleFieldValue<int> schemaHash = BleFieldValue<int>(0);
+  final BleFieldValue<int> maxReassembly = BleFieldValue<int>(0);
+  final BleFieldValue<int> mtu = BleFieldValue<int>(0);
+  final BleFieldValue<int> features = BleFieldValue<int>(0);
+
+  int _changedMask = 0;
+
+  /// Fields changed by the last stored message (*Bit constants)
+  int get changedMask => _changedMask;
+
+  // Fields are read straight from the payload bytes, without a message object
+  void _update(ByteData data) {
+    var mask = 0;
+    if (protocolVersion._set(data.getUint16(0, Endian.little))) mask |= protocolVersionBit;
+    if (schemaHash._set(data.getUint32(2, Endian.little))) mask |= schemaHashBit;
+    if (maxReassembly._set(data.getUint16(6, Endian.little))) mask |= maxReassemblyBit;
+    if (mtu._set(data.getUint16(8, Endian.little))) mask |= mtuBit;
+    if (features._set(data.getUint32(10, Endian.little))) mask |= featuresBit;
+    _changedMask = mask;
+  }
+}
+
+/// Decoder health counters, updated only when built with BLE_STATS
+class BleDecoderStats {
+  // Per decode stage, indexed by bleTrace* event
+  final Int64List _events = Int64List(bleTraceEventCount);
+
+  /// Frames per server message (msgIndex*), including ones that later failed
+  final Int64List rxFrames = Int64List(bleDecodeMessageCount);
+
+  /// Validated messages stored per server message (msgIndex*)
+  final Int64List rxMessages = Int64List(bleDecodeMessageCount);
+
+  /// Inter-arrival histograms: bucket b of message i is at i * bleStatsInterarrivalBuckets + b
+  final Int64List rxInterarrival = Int64List(bleDecodeMessageCount * bleStatsInterarrivalBuckets);
+
+  final Int64List _lastArrivalMs = Int64List(bleDecodeMessageCount);
+
+  int get framesIn => _events[bleTraceFrameIn];
+  int get checksumErrors => _events[bleTraceChecksumError];
+  int get reassemblyAborted => _events[bleTraceReassemblyAborted];
+  int get reassemblyOrphaned => _events[bleTraceReassemblyOrphaned];
+  int get resyncs => _events[bleTraceResync];
+
+  /// Zero every counter
+  void reset() {
+    _events.fillRange(0, _events.length, 0);
+    rxFrames.fillRange(0, rxFrames.length, 0);
+    rxMessages.fillRange(0, rxMessages.length, 0);
+    rxInterarrival.fillRange(0, rxInterarrival.length, 0);
+  }
+
+  // Count a frame against its server message (unknown IDs only count in framesIn)
+  void _countFrame(int msgId) {
+    switch (msgId) {
+      case 0x01:
+        rxFrames[msgIndexHeartbeat]++;
+        break;
+      case 0x04:
+        rxFrames[msgIndexServerMessage]++;
+        break;
+      case 0x02:
+        rxFrames[msgIndexBmsData]++;
+        break;
+      case 0x03:
+        rxFrames[msgIndexBmsStatus]++;
+        break;
+      case 0x05:
+        rxFrames[msgIndexMotorData]++;
+        break;
+      case 0x06:
+        rxFrames[msgIndexSafetyStatus]++;
+        break;
+      case 0x07:
+        rxFrames[msgIndexPerformanceData]++;
+        break;
+      case 0x7E:
+        rxFrames[msgIndexHandshakeResponse]++;
+        break;
+    }
+  }
+
+  // Count a stored message and bucket the time since its previous arrival
+  void _recordArrival(int index, int timeMs) {
+    if (rxMessages[index]++ > 0) {
+      final intervalMs = timeMs - _lastArrivalMs[index];
+      var bucket = 0;
+      while (bucket < bleStatsInterarrivalBuckets - 1 && intervalMs > bleStatsInterarrivalBoundsMs[bucket]) {
+        bucket++;
+      }
+      rxInterarrival[index * bleStatsInterarrivalBuckets + bucket]++;
+    }
+    _lastArrivalMs[index] = timeMs;
+  }
+}
+
+/// Per-connection mode negotiated by the handshake
+///
+/// Send [request] after every connect; the mode is adopted when the server's
+/// HandshakeResponse is decoded. Until then, and after [reset], the baseline
+/// values apply, which every peer supports.
+class BleLink {
+  /// Largest notification this end can receive (from the platform MTU exchange)
+  int localMtu;
+
+  /// A handshake response arrived on this connection
+  bool negotiated = false;
+
+  /// Same protocol major version as the server
+  bool compatible = true;
+
+  /// The server was generated from the same schema
+  bool schemaMatches = false;
+
+  /// Smaller of both MTUs (bleDefaultMtu until negotiated)
+  int mtu = bleDefaultMtu;
+
+  /// Largest payload the server reassembles
+  int peerMaxReassembly = 255;
+
+  /// Features the server accepts (0 if incompatible)
+  int peerFeatures = 0;
+
+  BleLink({this.localMtu = bleDefaultMtu});
+
+  /// Handshake announcing this end's version, schema, limits and features
+  HandshakeRequest request() {
+    return HandshakeRequest()
+      ..protocolVersion = bleProtocolVersion
+      ..schemaHash = bleSchemaHash
+      ..maxReassembly = BleDecoder._maxPayloadSize
+      ..mtu = localMtu
+      ..features = bleLocalFeatures;
+  }
+
+  /// Whether the server can reassemble [message] (larger ones would be dropped)
+  bool accepts(BleClientMessage message) => message.payloadSize <= peerMaxReassembly;
+
+  /// Return to the baseline mode (call on every disconnect)
+  void reset() {
+    negotiated = false;
+    compatible = true;
+    schemaMatches = false;
+    mtu = bleDefaultMtu;
+    peerMaxReassembly = 255;
+    peerFeatures = 0;
+  }
+
+  // Adopt the common mode from the server's response
+  void _accept(HandshakeResponse response) {
+    negotiated = true;
+    compatible = (response.protocolVersion >> 8) == (bleProtocolVersion >> 8);
+    schemaMatches = response.schemaHash == bleSchemaHash;
+    final commonMtu = response.mtu < localMtu ? response.mtu : localMtu;
+    mtu = commonMtu < bleDefaultMtu ? bleDefaultMtu : commonMtu;
+    peerMaxReassembly = response.maxReassembly;
+    peerFeatures = compatible ? response.features : 0;
+  }
 }
 
 // ============================================================================
@@ -838,6 +2339,28 @@ class PerformanceData {
   String toString() => 'PerformanceData(odometer_km: ${odometerKm}, trip_km: ${tripKm}, avgSpeed_kph: ${avgSpeedKph}, topSpeed_kph: ${topSpeedKph}, energy_wh_per_km: ${energyWhPerKm}, accel_0_60_ms: ${accel060Ms})';
 }
 
+/// HandshakeResponse message - Server to Client
+class HandshakeResponse {
+  int _protocolVersion = 0;
+  int _schemaHash = 0;
+  int _maxReassembly = 0;
+  int _mtu = 0;
+  int _features = 0;
+
+  int get protocolVersion => _protocolVersion;
+  int get schemaHash => _schemaHash;
+  int get maxReassembly => _maxReassembly;
+  int get mtu => _mtu;
+  int get features => _features;
+
+  HandshakeResponse._();
+
+  int get messageId => 0x7E;
+
+  @override
+  String toString() => 'HandshakeResponse(protocol_version: ${protocolVersion}, schema_hash: ${schemaHash}, max_reassembly: ${maxReassembly}, mtu: ${mtu}, features: ${features})';
+}
+
 // ============================================================================
 // Protocol layer helper functions
 // ============================================================================
@@ -849,4 +2372,30 @@ int _calculateChecksum(Uint8List data) {
     sum += byte;
   }
   return sum & 0xFF;
-}
\ No newline at end of file
+}
+
+// Sum-mod-256 checksum of bytes already written into a ByteData
+int _calculateChecksumAt(ByteData data, int start, int length) {
+  int sum = 0;
+  for (int i = start; i < start + length; i++) {
+    sum += data.getUint8(i);
+  }
+  return sum & 0xFF;
+}
+
+/// Split an encoded frame into MTU-sized fragments
+List<Uint8List> bleFragmentFrame(Uint8List frame, int mtu) {
+  final fragments = <Uint8List>[];
+  int offset = 0;
+  while (offset < frame.length) {
+    // Continuation frames are raw payload, so every fragment is a plain slice
+    const headerSize = 0;
+    if (mtu <= headerSize) break;
+    final chunk = frame.length - offset < mtu - headerSize ? frame.length - offset : mtu - headerSize;
+    final fragment = Uint8List(headerSize + chunk);
+    fragment.setRange(headerSize, headerSize + chunk, frame, offset);
+    fragments.add(fragment);
+    offset += chunk;
+  }
+  return fragments;
+}
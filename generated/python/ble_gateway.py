@@ -0,0 +1,223 @@
+"""
+BLE Telemetry Gateway v1.0.0
+Auto-generated from schema.json
+DO NOT EDIT MANUALLY
+
+Reads complete frames from serial/UART bridges or TCP sockets, validates
+them and fans decoded messages out to async subscribers per message type.
+Subscriber queues are bounded: by default a full queue pauses the device
+stream feeding it; with drop_oldest=True the oldest queued event is dropped.
+"""
+
+import asyncio
+import collections
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+from ble_protocol import BleStreamParser
+
+logger = logging.getLogger(__name__)
+
+
+class BleEvent(NamedTuple):
+    """Decoded message received from a device"""
+    device_id: str
+    time_ms: int
+    message: Any
+
+
+class BleSubscription:
+    """Bounded queue of events for one subscriber (async iterable)"""
+
+    def __init__(self, gateway: 'BleGateway', msg_id: Optional[int], queue_size: int):
+        self._gateway = gateway
+        self.msg_id = msg_id
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> BleEvent:
+        return await self.queue.get()
+
+    async def get(self) -> BleEvent:
+        return await self.queue.get()
+
+    def close(self):
+        self._gateway.unsubscribe(self)
+
+
+class BleGatewayProtocol(asyncio.Protocol):
+    """asyncio protocol for one device stream (TCP, serial pty, pipe)"""
+
+    def __init__(self, gateway: 'BleGateway', device_id: str):
+        self._gateway = gateway
+        self.device_id = device_id
+        self.parser = BleStreamParser()
+        self._pending: collections.deque = collections.deque()
+        self._transport: Optional[asyncio.BaseTransport] = None
+        self._draining = False
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._gateway._parsers[self.device_id] = self.parser
+
+    def data_received(self, data: bytes):
+        time_ms = self._gateway.time_ms()
+        for message in self.parser.feed(data):
+            self._pending.append(BleEvent(self.device_id, time_ms, message))
+        if not self._draining:
+            self._flush()
+
+    def connection_lost(self, exc):
+        self._transport = None
+        # TCP device IDs change on every reconnect, so drop the counters with the stream
+        if self._gateway._parsers.get(self.device_id) is self.parser:
+            del self._gateway._parsers[self.device_id]
+
+    def _flush(self):
+        while self._pending:
+            event = self._pending.popleft()
+            blocked = self._gateway._offer(event)
+            if blocked:
+                # A subscriber is full - stop reading until it catches up
+                self._draining = True
+                if self._transport is not None:
+                    self._transport.pause_reading()
+                self._gateway._spawn(self._drain(event, blocked))
+                return
+
+    async def _drain(self, event: BleEvent, blocked: List[BleSubscription]):
+        for subscription in blocked:
+            await subscription.queue.put(event)
+        self._draining = False
+        self._flush()
+        if not self._draining and self._transport is not None and not self._transport.is_closing():
+            self._transport.resume_reading()
+
+
+class BleGateway:
+    """Fans decoded messages from many device streams out to subscribers"""
+
+    def __init__(self, queue_size: int = 256, drop_oldest: bool = False):
+        self.queue_size = queue_size
+        self.drop_oldest = drop_oldest
+        self._subscribers: Dict[Optional[int], List[BleSubscription]] = {}
+        self._parsers: Dict[str, BleStreamParser] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def time_ms() -> int:
+        """Event loop clock in ms (call from a coroutine or loop callback)"""
+        return int(asyncio.get_running_loop().time() * 1000)
+
+    def subscribe(self, msg_id: Optional[int] = None, queue_size: Optional[int] = None) -> BleSubscription:
+        """Subscribe to one message type (MSG_ID_*), or to all with msg_id=None"""
+        subscription = BleSubscription(self, msg_id, queue_size or self.queue_size)
+        self._subscribers.setdefault(msg_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: BleSubscription):
+        subscribers = self._subscribers.get(subscription.msg_id, [])
+        if subscription in subscribers:
+            subscribers.remove(subscription)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-device frame, checksum failure and resync counters"""
+        return {
+            device_id: {
+                'frames': parser.frames,
+                'checksum_failures': parser.checksum_failures,
+                'unknown_messages': parser.unknown_messages,
+                'resyncs': parser.resyncs,
+            }
+            for device_id, parser in self._parsers.items()
+        }
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        """Run a background task, keeping it referenced until done and logging failures"""
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('Gateway task failed', exc_info=task.exception())
+
+    def _targets(self, event: BleEvent) -> List[BleSubscription]:
+        return self._subscribers.get(event.message.MSG_ID, []) + self._subscribers.get(None, [])
+
+    def _offer(self, event: BleEvent) -> List[BleSubscription]:
+        """Queue event without waiting; returns subscribers that are still full"""
+        blocked = []
+        for subscription in self._targets(event):
+            if subscription.queue.full():
+                if not self.drop_oldest:
+                    blocked.append(subscription)
+                    continue
+                subscription.queue.get_nowait()
+                subscription.dropped += 1
+            subscription.queue.put_nowait(event)
+        return blocked
+
+    async def publish(self, event: BleEvent):
+        """Deliver an event, waiting for space unless drop_oldest is set"""
+        for subscription in self._offer(event):
+            await subscription.queue.put(event)
+
+    def protocol(self, device_id: str) -> BleGatewayProtocol:
+        """Protocol instance for loop.create_connection / connect_read_pipe"""
+        return BleGatewayProtocol(self, device_id)
+
+    async def serve_reader(self, reader: asyncio.StreamReader, device_id: str):
+        """Consume a StreamReader until EOF"""
+        parser = BleStreamParser()
+        self._parsers[device_id] = parser
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                time_ms = self.time_ms()
+                for message in parser.feed(data):
+                    await self.publish(BleEvent(device_id, time_ms, message))
+        finally:
+            if self._parsers.get(device_id) is parser:
+                del self._parsers[device_id]
+
+    async def start_server(self, host: str = '127.0.0.1', port: int = 0, **kwargs) -> asyncio.AbstractServer:
+        """Accept TCP device streams; each peer address is a device ID"""
+        loop = asyncio.get_running_loop()
+
+        def factory():
+            return _AddressedProtocol(self)
+
+        return await loop.create_server(factory, host, port, **kwargs)
+
+    async def connect_serial(self, path: str, device_id: Optional[str] = None):
+        """Read a serial device or pty (already configured for raw mode)
+
+        The returned transport owns the file: closing the transport closes it
+        """
+        loop = asyncio.get_running_loop()
+        pipe = open(path, 'rb', buffering=0)
+        try:
+            return await loop.connect_read_pipe(lambda: self.protocol(device_id or path), pipe)
+        except BaseException:
+            pipe.close()
+            raise
+
+
+class _AddressedProtocol(BleGatewayProtocol):
+    """Gateway protocol that names the device after the TCP peer"""
+
+    def __init__(self, gateway: BleGateway):
+        super().__init__(gateway, '')
+
+    def connection_made(self, transport):
+        peer = transport.get_extra_info('peername')
+        self.device_id = f'{peer[0]}:{peer[1]}' if isinstance(peer, tuple) else str(peer)
+        super().connection_made(transport)
@@ -0,0 +1,564 @@
+"""
+BLE Telemetry Protocol v1.0.0
+Auto-generated from schema.json
+DO NOT EDIT MANUALLY
+
+Host-side codec: encodes and decodes both server and client messages.
+"""
+
+import struct
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Protocol constants
+PROTOCOL_VERSION = '1.0.0'
+SYNC_FIRST = 0xAA
+STREAMS_ENABLED = False
+FIRST_HEADER_SIZE = 3
+CONTINUATION_HEADER_SIZE = 0
+
+# Multi-frame reassembly
+REASSEMBLY_SLOTS = 1
+REASSEMBLY_TIMEOUT_MS = 1000
+
+# Header extension [Seq][SendTimeMs] at the start of extended payloads
+_HEADER_EXTENSION_STRUCT = struct.Struct('<BH')
+HEADER_EXTENSION_SIZE = _HEADER_EXTENSION_STRUCT.size
+
+# Connection handshake
+HANDSHAKE_VERSION = 0x0100  # major << 8 | minor
+SCHEMA_HASH = 0x454E400C
+DEFAULT_MTU = 20
+FEATURE_PACKED_FRAMES = 1 << 0
+
+_SYNC_FIRST_BYTES = bytes((SYNC_FIRST,))
+
+# Message IDs
+MSG_ID_HEARTBEAT = 0x01
+MSG_ID_SERVER_MESSAGE = 0x04
+MSG_ID_BMS_DATA = 0x02
+MSG_ID_BMS_STATUS = 0x03
+MSG_ID_MOTOR_DATA = 0x05
+MSG_ID_SAFETY_STATUS = 0x06
+MSG_ID_PERFORMANCE_DATA = 0x07
+MSG_ID_HANDSHAKE_RESPONSE = 0x7E
+MSG_ID_CONFIG_SET = 0x10
+MSG_ID_HANDSHAKE_REQUEST = 0x7F
+
+
+def calculate_checksum(data) -> int:
+    """Calculate sum-mod-256 checksum"""
+    return sum(data) & 0xFF
+
+
+def build_frame(msg_id: int, payload: bytes, stream_id: int = 0) -> bytes:
+    """Build a complete frame: [0xAA][Length][MsgID][StreamID?][Payload][Checksum]"""
+    header = bytes((SYNC_FIRST, len(payload), msg_id))
+    return header + payload + bytes((calculate_checksum(payload),))
+
+
+def fragment_frame(frame: bytes, mtu: int) -> List[bytes]:
+    """Split a complete frame into MTU-sized fragments"""
+    fragments = [frame[:mtu]]
+    offset = len(fragments[0])
+    # Continuation frames are raw payload, so every fragment is a plain slice
+    header = b''
+    chunk = mtu - len(header)
+    if chunk <= 0:
+        raise ValueError(f'MTU {mtu} too small for continuation frames')
+    while offset < len(frame):
+        fragments.append(header + frame[offset:offset + chunk])
+        offset += chunk
+    return fragments
+
+
+def read_header_extension(payload) -> Tuple[int, int]:
+    """(seq, send_time_ms) of a payload whose message has HEADER_EXTENSION"""
+    return _HEADER_EXTENSION_STRUCT.unpack_from(payload)
+
+
+def _decode_string(raw: bytes) -> str:
+    """Decode a null-terminated string field"""
+    return raw.split(b'\0', 1)[0].decode('latin-1')
+
+
+def _encode_string(value: str, size: int) -> bytes:
+    """Encode a string field, truncated to leave room for the null terminator"""
+    return value.encode('latin-1', 'replace')[:size - 1]
+
+
+# ============================================================================
+# Server messages (server to client)
+# ============================================================================
+
+_HEARTBEAT_STRUCT = struct.Struct('<IIB')
+
+
+class Heartbeat(NamedTuple):
+    """heartbeat message - Server to Client"""
+    uptime_ms: int = 0
+    lvBattery_mv: int = 0
+    vehicle_state: int = 0
+
+    MSG_ID = 0x01
+    STREAM_ID = 0x01
+    MAX_AGE_MS = 5000
+    PAYLOAD_SIZE = _HEARTBEAT_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _HEARTBEAT_STRUCT.pack(self.uptime_ms, self.lvBattery_mv, self.vehicle_state)
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'Heartbeat':
+        return cls._make(_HEARTBEAT_STRUCT.unpack_from(payload))
+
+
+_SERVER_MESSAGE_STRUCT = struct.Struct('<128s')
+
+
+class ServerMessage(NamedTuple):
+    """server_message message - Server to Client"""
+    data: str = ''
+
+    MSG_ID = 0x04
+    STREAM_ID = 0x04
+    MAX_AGE_MS = 1000
+    PAYLOAD_SIZE = _SERVER_MESSAGE_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _SERVER_MESSAGE_STRUCT.pack(_encode_string(self.data, 128))
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'ServerMessage':
+        values = _SERVER_MESSAGE_STRUCT.unpack_from(payload)
+        return cls(_decode_string(values[0]))
+
+
+_BMS_DATA_STRUCT = struct.Struct('<HHHHHHHHHHHHHHHHHHHHHHHHh')
+
+
+class BmsData(NamedTuple):
+    """bms_data message - Server to Client"""
+    cellVoltage1_mv: int = 0
+    cellVoltage2_mv: int = 0
+    cellVoltage3_mv: int = 0
+    cellVoltage4_mv: int = 0
+    cellVoltage5_mv: int = 0
+    cellVoltage6_mv: int = 0
+    cellVoltage7_mv: int = 0
+    cellVoltage8_mv: int = 0
+    cellVoltage9_mv: int = 0
+    cellVoltage10_mv: int = 0
+    cellVoltage11_mv: int = 0
+    cellVoltage12_mv: int = 0
+    cellVoltage13_mv: int = 0
+    cellVoltage14_mv: int = 0
+    cellVoltage15_mv: int = 0
+    cellVoltage16_mv: int = 0
+    cellVoltage17_mv: int = 0
+    cellVoltage18_mv: int = 0
+    cellVoltage19_mv: int = 0
+    cellVoltage20_mv: int = 0
+    cellVoltage21_mv: int = 0
+    cellVoltage22_mv: int = 0
+    cellVoltage23_mv: int = 0
+    cellVoltage24_mv: int = 0
+    packTemp_c: int = 0
+
+    MSG_ID = 0x02
+    STREAM_ID = 0x02
+    MAX_AGE_MS = 2000
+    PAYLOAD_SIZE = _BMS_DATA_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _BMS_DATA_STRUCT.pack(self.cellVoltage1_mv, self.cellVoltage2_mv, self.cellVoltage3_mv, self.cellVoltage4_mv, self.cellVoltage5_mv, self.cellVoltage6_mv, self.cellVoltage7_mv, self.cellVoltage8_mv, self.cellVoltage9_mv, self.cellVoltage10_mv, self.cellVoltage11_mv, self.cellVoltage12_mv, self.cellVoltage13_mv, self.cellVoltage14_mv, self.cellVoltage15_mv, self.cellVoltage16_mv, self.cellVoltage17_mv, self.cellVoltage18_mv, self.cellVoltage19_mv, self.cellVoltage20_mv, self.cellVoltage21_mv, self.cellVoltage22_mv, self.cellVoltage23_mv, self.cellVoltage24_mv, self.packTemp_c)
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'BmsData':
+        return cls._make(_BMS_DATA_STRUCT.unpack_from(payload))
+
+
+_BMS_STATUS_STRUCT = struct.Struct('<BBIiHHHHHHBB')
+
+
+class BmsStatus(NamedTuple):
+    """bms_status message - Server to Client"""
+    soc_percent: int = 0
+    soh_percent: int = 0
+    packVoltage_mv: int = 0
+    packCurrent_ma: int = 0
+    remainingRange_km: int = 0
+    timeToEmpty_min: int = 0
+    timeToFull_min: int = 0
+    cellDelta_mv: int = 0
+    minCellVoltage_mv: int = 0
+    maxCellVoltage_mv: int = 0
+    minCellIndex: int = 0
+    maxCellIndex: int = 0
+
+    MSG_ID = 0x03
+    STREAM_ID = 0x03
+    MAX_AGE_MS = 2000
+    PAYLOAD_SIZE = _BMS_STATUS_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _BMS_STATUS_STRUCT.pack(self.soc_percent, self.soh_percent, self.packVoltage_mv, self.packCurrent_ma, self.remainingRange_km, self.timeToEmpty_min, self.timeToFull_min, self.cellDelta_mv, self.minCellVoltage_mv, self.maxCellVoltage_mv, self.minCellIndex, self.maxCellIndex)
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'BmsStatus':
+        return cls._make(_BMS_STATUS_STRUCT.unpack_from(payload))
+
+
+_MOTOR_DATA_STRUCT = struct.Struct('<hhIIHBB')
+
+
+class MotorData(NamedTuple):
+    """motor_data message - Server to Client"""
+    motorTemp_c: int = 0
+    controllerTemp_c: int = 0
+    motorRpm: int = 0
+    power_w: int = 0
+    torque_nm: int = 0
+    throttle_percent: int = 0
+    regenLevel_percent: int = 0
+
+    MSG_ID = 0x05
+    STREAM_ID = 0x05
+    MAX_AGE_MS = 500
+    PAYLOAD_SIZE = _MOTOR_DATA_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _MOTOR_DATA_STRUCT.pack(self.motorTemp_c, self.controllerTemp_c, self.motorRpm, self.power_w, self.torque_nm, self.throttle_percent, self.regenLevel_percent)
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'MotorData':
+        return cls._make(_MOTOR_DATA_STRUCT.unpack_from(payload))
+
+
+_SAFETY_STATUS_STRUCT = struct.Struct('<HIBBBB')
+
+
+class SafetyStatus(NamedTuple):
+    """safety_status message - Server to Client"""
+    faultCodes: int = 0
+    warning_flags: int = 0
+    charging_status: int = 0
+    ride_mode: int = 0
+    frontBrake_engaged: int = 0
+    rearBrake_engaged: int = 0
+
+    MSG_ID = 0x06
+    STREAM_ID = 0x06
+    MAX_AGE_MS = 500
+    PAYLOAD_SIZE = _SAFETY_STATUS_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _SAFETY_STATUS_STRUCT.pack(self.faultCodes, self.warning_flags, self.charging_status, self.ride_mode, self.frontBrake_engaged, self.rearBrake_engaged)
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'SafetyStatus':
+        return cls._make(_SAFETY_STATUS_STRUCT.unpack_from(payload))
+
+
+_PERFORMANCE_DATA_STRUCT = struct.Struct('<IIHHHH')
+
+
+class PerformanceData(NamedTuple):
+    """performance_data message - Server to Client"""
+    odometer_km: int = 0
+    trip_km: int = 0
+    avgSpeed_kph: int = 0
+    topSpeed_kph: int = 0
+    energy_wh_per_km: int = 0
+    accel_0_60_ms: int = 0
+
+    MSG_ID = 0x07
+    STREAM_ID = 0x07
+    MAX_AGE_MS = 1000
+    PAYLOAD_SIZE = _PERFORMANCE_DATA_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _PERFORMANCE_DATA_STRUCT.pack(self.odometer_km, self.trip_km, self.avgSpeed_kph, self.topSpeed_kph, self.energy_wh_per_km, self.accel_0_60_ms)
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'PerformanceData':
+        return cls._make(_PERFORMANCE_DATA_STRUCT.unpack_from(payload))
+
+
+_HANDSHAKE_RESPONSE_STRUCT = struct.Struct('<HIHHI')
+
+
+class HandshakeResponse(NamedTuple):
+    """handshake_response message - Server to Client"""
+    protocol_version: int = 0
+    schema_hash: int = 0
+    max_reassembly: int = 0
+    mtu: int = 0
+    features: int = 0
+
+    MSG_ID = 0x7E
+    STREAM_ID = 0x7E
+    MAX_AGE_MS = 60000
+    PAYLOAD_SIZE = _HANDSHAKE_RESPONSE_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _HANDSHAKE_RESPONSE_STRUCT.pack(self.protocol_version, self.schema_hash, self.max_reassembly, self.mtu, self.features)
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'HandshakeResponse':
+        return cls._make(_HANDSHAKE_RESPONSE_STRUCT.unpack_from(payload))
+
+
+# ============================================================================
+# Client messages (client to server)
+# ============================================================================
+
+_CONFIG_SET_STRUCT = struct.Struct('<BI')
+
+
+class ConfigSet(NamedTuple):
+    """config_set message - Client to Server"""
+    param_id: int = 0
+    value: int = 0
+
+    MSG_ID = 0x10
+    STREAM_ID = 0x10
+    MAX_AGE_MS = 1000
+    PAYLOAD_SIZE = _CONFIG_SET_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _CONFIG_SET_STRUCT.pack(self.param_id, self.value)
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'ConfigSet':
+        return cls._make(_CONFIG_SET_STRUCT.unpack_from(payload))
+
+
+_HANDSHAKE_REQUEST_STRUCT = struct.Struct('<HIHHI')
+
+
+class HandshakeRequest(NamedTuple):
+    """handshake_request message - Client to Server"""
+    protocol_version: int = 0
+    schema_hash: int = 0
+    max_reassembly: int = 0
+    mtu: int = 0
+    features: int = 0
+
+    MSG_ID = 0x7F
+    STREAM_ID = 0x7F
+    MAX_AGE_MS = 60000
+    PAYLOAD_SIZE = _HANDSHAKE_REQUEST_STRUCT.size
+    HEADER_EXTENSION = False
+
+    def encode_payload(self) -> bytes:
+        return _HANDSHAKE_REQUEST_STRUCT.pack(self.protocol_version, self.schema_hash, self.max_reassembly, self.mtu, self.features)
+
+    def encode_frame(self) -> bytes:
+        """Encode message into a BLE frame"""
+        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)
+
+    @classmethod
+    def decode(cls, payload) -> 'HandshakeRequest':
+        return cls._make(_HANDSHAKE_REQUEST_STRUCT.unpack_from(payload))
+
+
+SERVER_MESSAGES = {
+    Heartbeat.MSG_ID: Heartbeat,
+    ServerMessage.MSG_ID: ServerMessage,
+    BmsData.MSG_ID: BmsData,
+    BmsStatus.MSG_ID: BmsStatus,
+    MotorData.MSG_ID: MotorData,
+    SafetyStatus.MSG_ID: SafetyStatus,
+    PerformanceData.MSG_ID: PerformanceData,
+    HandshakeResponse.MSG_ID: HandshakeResponse,
+}
+
+CLIENT_MESSAGES = {
+    ConfigSet.MSG_ID: ConfigSet,
+    HandshakeRequest.MSG_ID: HandshakeRequest,
+}
+
+MESSAGE_TYPES = {**SERVER_MESSAGES, **CLIENT_MESSAGES}
+
+
+def decode_payload(msg_id: int, payload) -> Optional[Any]:
+    """Decode a validated payload, or None for unknown IDs or wrong sizes"""
+    message_type = MESSAGE_TYPES.get(msg_id)
+    if message_type is None or len(payload) != message_type.PAYLOAD_SIZE:
+        return None
+    return message_type.decode(payload)
+
+
+class _ReassemblySlot:
+    __slots__ = ('stream_id', 'msg_id', 'expected_size', 'payload', 'last_frame_ms')
+
+    def __init__(self, stream_id: int, msg_id: int, expected_size: int, time_ms: int):
+        self.stream_id = stream_id
+        self.msg_id = msg_id
+        self.expected_size = expected_size
+        self.payload = bytearray()
+        self.last_frame_ms = time_ms
+
+
+class BleDecoder:
+    """Frame decoder for packet transports (one BLE notification per frame)"""
+
+    def __init__(self):
+        self._slots: Dict[int, _ReassemblySlot] = {}
+
+    def decode_frame(self, frame: bytes, time_ms: int = 0):
+        """Decode a frame (supports multi-frame reassembly)
+
+        Returns the decoded message once complete and validated, otherwise None
+        """
+        if not frame:
+            return None
+
+        # Release partial messages that have not progressed within the timeout
+        for stream_id, slot in list(self._slots.items()):
+            if time_ms - slot.last_frame_ms > REASSEMBLY_TIMEOUT_MS:
+                del self._slots[stream_id]
+
+        if frame[0] == SYNC_FIRST:
+            if len(frame) < FIRST_HEADER_SIZE + 1:
+                return None
+            expected_size = frame[1]
+            msg_id = frame[2]
+            stream_id = 0
+            payload = frame[FIRST_HEADER_SIZE:]
+
+            if len(payload) == expected_size + 1:
+                # Single-frame message - other slots are left untouched
+                if payload[expected_size] != calculate_checksum(payload[:expected_size]):
+                    return None
+                return decode_payload(msg_id, payload[:expected_size])
+
+            if len(payload) > expected_size:
+                return None
+            if stream_id not in self._slots and len(self._slots) >= REASSEMBLY_SLOTS:
+                # Evict the least recently updated slot
+                oldest = min(self._slots.values(), key=lambda s: s.last_frame_ms)
+                del self._slots[oldest.stream_id]
+            slot = _ReassemblySlot(stream_id, msg_id, expected_size, time_ms)
+            slot.payload += payload
+            self._slots[stream_id] = slot
+            return None
+
+        # Continuation frame (no sync byte, just payload)
+        slot = self._slots.get(0)
+        if slot is None:
+            return None
+        data = frame[CONTINUATION_HEADER_SIZE:]
+        remaining = slot.expected_size - len(slot.payload)
+
+        if len(data) == remaining + 1:
+            # Final frame - verify checksum and release the slot
+            del self._slots[slot.stream_id]
+            slot.payload += data[:remaining]
+            if data[remaining] != calculate_checksum(slot.payload):
+                return None
+            return decode_payload(slot.msg_id, bytes(slot.payload))
+
+        if len(data) <= remaining:
+            slot.payload += data
+            slot.last_frame_ms = time_ms
+        return None
+
+
+class BleStreamParser:
+    """Extracts whole frames from a byte stream (UART bridge, TCP socket)
+
+    The stream carries complete frames back to back. The parser hunts for the
+    sync byte, validates length and checksum, and resynchronises one byte
+    later when a candidate frame fails validation.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.frames = 0
+        self.checksum_failures = 0
+        self.unknown_messages = 0
+        self.resyncs = 0
+
+    def feed(self, data: bytes) -> List[Any]:
+        """Append received bytes and return the messages completed by them"""
+        buffer = self._buffer
+        buffer += data
+        messages = []
+        position = 0
+        while True:
+            start = buffer.find(_SYNC_FIRST_BYTES, position)
+            if start < 0:
+                if position < len(buffer):
+                    self.resyncs += 1
+                position = len(buffer)
+                break
+            if start > position:
+                self.resyncs += 1
+            if len(buffer) - start < FIRST_HEADER_SIZE:
+                position = start
+                break
+            length = buffer[start + 1]
+            end = start + FIRST_HEADER_SIZE + length + 1
+            if end > len(buffer):
+                position = start
+                break
+            payload = bytes(buffer[start + FIRST_HEADER_SIZE:end - 1])
+            if buffer[end - 1] != calculate_checksum(payload):
+                self.checksum_failures += 1
+                position = start + 1
+                continue
+            self.frames += 1
+            message = decode_payload(buffer[start + 2], payload)
+            if message is None:
+                self.unknown_messages += 1
+            else:
+                messages.append(message)
+            position = end
+        del buffer[:position]
+        return messages
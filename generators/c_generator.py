@@ -8,27 +8,65 @@ Frame format:
 - Continuation: [Payload...]
 - Final frame ends with: [Checksum] (covers entire payload)
 
+With frame.stream enabled, first frames carry a [StreamID] after MsgID and
+continuation frames become [0x55][StreamID][Payload...], so messages on
+different streams can be reassembled concurrently.
+
 Frame buffers are managed internally in the private implementation.
 """
 
 import json
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Optional
+
+from handshake import (find_handshake, get_default_mtu, get_features, protocol_version16,
+                       schema_hash32)
+from message_selection import select_messages
 
 
 class CGenerator:
-    def __init__(self, protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any]):
+    # Handshake features this runtime implements when sending / accepts when receiving
+    SEND_FEATURES = ('packed_frames',)
+    RECEIVE_FEATURES = ()
+
+    def __init__(self, protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any],
+                 schema_hash: Optional[int] = None):
         """
         Initialize generator with separate protocol and message schemas
 
         Args:
             protocol_schema: Contains protocol, frame, and types definitions
             messages_schema: Contains message definitions (server and client)
+            schema_hash: Handshake schema hash (default: hash of the given schemas;
+                pass the hash of the unselected schema when generating a subset)
         """
         self.protocol = protocol_schema['protocol']
         self.frame = protocol_schema['frame']
         self.types = protocol_schema['types']
         self.server_messages = messages_schema['messages']['server']
         self.client_messages = messages_schema['messages']['client']
+        self.stream = self.frame.get('stream', {})
+        self.streams_enabled = self.stream.get('enabled', False)
+        self.decode = protocol_schema.get('decode', {})
+        self.zero_copy = self.decode.get('zero_copy', False)
+        self.stats = protocol_schema.get('stats', {})
+        self.handshake = find_handshake(messages_schema)
+        self.features = get_features(protocol_schema)
+        self.default_mtu = get_default_mtu(protocol_schema)
+        self.schema_hash = schema_hash32(protocol_schema, messages_schema) if schema_hash is None else schema_hash
+        for msg_name, msg_info in self.client_messages.items():
+            if self.has_header_extension(msg_info):
+                raise ValueError(f"{msg_name}: header_extension is only supported on server messages")
+
+        # Per-message values needed by several sections are computed once,
+        # keeping generation linear in schema size
+        self._variable_types = frozenset(
+            name for name, info in self.types.items() if info.get('size') == 'variable'
+        )
+        self._message_sizes = {
+            msg_name: self.calculate_struct_size(msg_info['fields'])
+            for messages in (self.server_messages, self.client_messages)
+            for msg_name, msg_info in messages.items()
+        }
 
     # ========================================================================
     # Protocol Layer - Frame format and encoding/decoding logic
@@ -40,6 +78,45 @@ class CGenerator:
         lines.append("// Protocol constants")
         first_sync = next(f['value'] for f in self.frame['first']['fields'] if f['name'] == 'sync')
         lines.append(f"#define BLE_SYNC_FIRST {first_sync}")
+        if self.streams_enabled:
+            lines.append(f"#define BLE_SYNC_CONTINUATION {self.stream.get('continuation_sync', '0x55')}")
+        lines.append(f"#define BLE_FIRST_HEADER_SIZE {self._get_first_header_size()}")
+        lines.append(f"#define BLE_CONTINUATION_HEADER_SIZE {self._get_continuation_header_size()}")
+        lines.append("")
+        if self._uses_header_extension():
+            lines.append("// Header extension [Seq][SendTimeMs:2] at the start of extended payloads.")
+            lines.append("// Build with -DBLE_SEND_TIME_MS()=<millisecond clock expression> to stamp the")
+            lines.append("// send time; without a clock it is 0, which receivers treat as \"not stamped\"")
+            lines.append("// (sequence numbers still work)")
+            lines.append(f"#define BLE_HEADER_EXTENSION_SIZE {self.HEADER_EXTENSION_SIZE}")
+            lines.append("#ifndef BLE_SEND_TIME_MS")
+            lines.append("#define BLE_SEND_TIME_MS() 0")
+            lines.append("#endif")
+            lines.append("")
+        lines.append("// Multi-frame reassembly")
+        lines.append(f"#define BLE_REASSEMBLY_SLOTS {self._get_reassembly_slot_count()}")
+        lines.append(f"#define BLE_REASSEMBLY_TIMEOUT_MS {self.stream.get('reassembly_timeout_ms', 1000)}")
+        if self.zero_copy:
+            lines.append("// Zero-copy receive pool: the latest payload of every message, one slot per")
+            lines.append("// reassembly, plus payloads the application keeps pinned while newer ones arrive")
+            lines.append("#ifndef BLE_DECODE_PINNED_SLOTS")
+            lines.append(f"#define BLE_DECODE_PINNED_SLOTS {self._get_decode_pinned_slot_count()}")
+            lines.append("#endif")
+            lines.append("#define BLE_DECODE_POOL_SLOTS (BLE_DECODE_MESSAGE_COUNT + BLE_REASSEMBLY_SLOTS + BLE_DECODE_PINNED_SLOTS)")
+        lines.append("")
+        lines.append("// Lock-free reads of decoded messages (seqlock). Override the barrier for")
+        lines.append("// compilers without GCC builtins; on a single core a compiler barrier is enough")
+        lines.append("#ifndef BLE_MEMORY_BARRIER")
+        lines.append("#define BLE_MEMORY_BARRIER() __sync_synchronize()")
+        lines.append("#endif")
+        lines.append("#ifndef BLE_DECODE_SNAPSHOT_RETRIES")
+        lines.append("#define BLE_DECODE_SNAPSHOT_RETRIES 4")
+        lines.append("#endif")
+        lines.append("")
+        lines.append("// Trace hook called at every decode and transmit stage (see ble_trace_event_t)")
+        lines.append("#ifndef BLE_TRACE")
+        lines.append("#define BLE_TRACE(event, msg_id) ((void)0)")
+        lines.append("#endif")
         lines.append("")
         return lines
 
@@ -57,24 +134,300 @@ class CGenerator:
         lines.append("")
         return lines
 
+    def _get_first_header_size(self) -> int:
+        """Bytes before the payload in a first frame ([Sync][Length][MsgID][StreamID?])"""
+        return 4 if self.streams_enabled else 3
+
+    def _get_continuation_header_size(self) -> int:
+        """Bytes before the payload in a continuation frame ([Sync][StreamID] or none)"""
+        return 2 if self.streams_enabled else 0
+
+    def _get_reassembly_slot_count(self) -> int:
+        """Concurrent reassembly slots (one unless stream IDs are on the wire)"""
+        return self.stream.get('reassembly_slots', 4) if self.streams_enabled else 1
+
+    def _get_decode_pinned_slot_count(self) -> int:
+        """Zero-copy slots beyond one per message and reassembly, for pinned payloads"""
+        pinned_slots = self.decode.get('pinned_slots', 1)
+        if not isinstance(pinned_slots, int) or pinned_slots < 0:
+            raise ValueError(f"decode.pinned_slots must be a non-negative integer, got {pinned_slots!r}")
+        return pinned_slots
+
+    def _get_decode_slot_count_name(self) -> str:
+        """Constant bounding the decoder's slot array"""
+        return 'BLE_DECODE_POOL_SLOTS' if self.zero_copy else 'BLE_REASSEMBLY_SLOTS'
+
+    def _get_frame_format_comment(self) -> List[str]:
+        """Describe the wire frame layout for generated file headers"""
+        if self.streams_enabled:
+            continuation_sync = self.stream.get('continuation_sync', '0x55')
+            return [
+                " * - First frame: [0xAA][Length][MsgID][StreamID][Payload...]",
+                f" * - Continuation: [{continuation_sync}][StreamID][Payload...]",
+                " * - Final frame ends with: [Checksum]",
+            ]
+        return [
+            " * - First frame: [0xAA][Length][MsgID][Payload...]",
+            " * - Continuation: [Payload...]",
+            " * - Final frame ends with: [Checksum]",
+        ]
+
+    def get_stream_id(self, msg_info: Dict) -> str:
+        """Get the stream ID a message is sent on (defaults to its message ID)"""
+        return str(msg_info.get('stream', msg_info['id']))
+
     def _generate_decode_store_message_function(self) -> List[str]:
         """Generate helper function to store decoded message in per-message buffer"""
+        if self.zero_copy:
+            return self._generate_seqlock_functions() + self._generate_decode_publish_functions()
+        lines = self._generate_seqlock_functions()
+        lines.append("// Copy validated payload to the appropriate message buffer")
+        lines.append("// Returns false for unknown message IDs or unexpected payload sizes")
+        lines.append("static bool ble_decode_store_message(uint8_t msg_id, const uint8_t *payload, uint8_t payload_len, uint32_t timestamp_ms) {")
+        lines.append("    switch (msg_id) {")
+        for msg_name, msg_info in self.client_messages.items():
+            index_name = self.get_decode_index_name(msg_name)
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"        case {msg_info['id']}:")
+            lines.append(f"            if (payload_len != sizeof({msg_name}_t)) return false;")
+            lines.append(f"            BLE_STATS_ARRIVAL({index_name}, timestamp_ms);")
+            lines.append(f"            BLE_TRACE(BLE_TRACE_MESSAGE_STORED, msg_id);")
+            lines.append(f"            ble_decode_write_begin({index_name});")
+            lines.append(f"            memcpy(&{msg_name}_decoded, payload, sizeof({msg_name}_t));")
+            lines.append(f"            decode_available[{index_name}] = true;")
+            lines.append(f"            decode_timestamp_ms[{index_name}] = timestamp_ms;")
+            lines.append(f"            decode_unread[{index_name}] = true;")
+            lines.append(f"            ble_decode_write_end({index_name});")
+            lines.append(f"            return true;")
+            lines.append("#endif")
+        lines.append("        default:")
+        lines.append("            return false;")
+        lines.append("    }")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _generate_seqlock_functions(self) -> List[str]:
+        """Generate per-message sequence counters so readers never see a half-written message"""
         lines = []
-        lines.append("// Copy decoded payload to appropriate message buffer")
-        lines.append("static void ble_decode_store_message(uint32_t timestamp_ms) {")
-        lines.append("    switch (decode_msg_id) {")
+        lines.append("// Seqlock writer side: a message's sequence is odd while it is being rewritten")
+        lines.append("static void ble_decode_write_begin(uint8_t index) {")
+        lines.append("    decode_seq[index]++;")
+        lines.append("    BLE_MEMORY_BARRIER();")
+        lines.append("}")
+        lines.append("")
+        lines.append("static void ble_decode_write_end(uint8_t index) {")
+        lines.append("    BLE_MEMORY_BARRIER();")
+        lines.append("    decode_seq[index]++;")
+        lines.append("}")
+        lines.append("")
+        lines.append("// Seqlock reader side: copy a message's latest payload, retrying while the")
+        lines.append("// decoder rewrites it. Returns false if none is available or every attempt")
+        lines.append("// overlapped a write")
+        lines.append("static bool ble_decode_read_consistent(uint8_t index, void *out, uint8_t size) {")
+        lines.append("    for (uint8_t attempt = 0; attempt < BLE_DECODE_SNAPSHOT_RETRIES; attempt++) {")
+        lines.append("        uint32_t seq = decode_seq[index];")
+        lines.append("        BLE_MEMORY_BARRIER();")
+        lines.append("        if (seq & 1) continue;")
+        lines.append("        if (!decode_available[index]) return false;")
+        if self.zero_copy:
+            lines.append("        const ble_reassembly_slot_t *slot = decode_current[index];")
+            lines.append("        if (slot == NULL) continue;")
+            lines.append("        memcpy(out, slot->payload, size);")
+        else:
+            lines.append("        memcpy(out, decode_storage[index], size);")
+        lines.append("        BLE_MEMORY_BARRIER();")
+        lines.append("        if (decode_seq[index] == seq) {")
+        lines.append("            decode_unread[index] = false;")
+        lines.append("            return true;")
+        lines.append("        }")
+        lines.append("    }")
+        lines.append("    return false;")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _generate_snapshot_functions(self) -> List[str]:
+        """Generate read_snapshot functions copying every field of a message consistently"""
+        lines = []
+        for msg_name, msg_info in self.client_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"// Copy every {msg_name} field at once, consistent even if ble_decode_frame")
+            lines.append(f"// runs concurrently in another task or ISR")
+            lines.append(f"bool ble_decode_{msg_name}_read_snapshot(ble_{msg_name}_snapshot_t *out) {{")
+            lines.append(f"    {msg_name}_t copy;")
+            lines.append(f"    if (out == NULL) return false;")
+            lines.append(f"    if (!ble_decode_read_consistent({self.get_decode_index_name(msg_name)}, &copy, sizeof(copy))) return false;")
+            for field_name, field_value in msg_info['fields'].items():
+                if self.is_variable_size(self.get_field_type_name(field_value)):
+                    lines.append(f"    memcpy(out->{field_name}, copy.{field_name}, sizeof(out->{field_name}));")
+                else:
+                    lines.append(f"    out->{field_name} = copy.{field_name};")
+            lines.append(f"    return true;")
+            lines.append(f"}}")
+            lines.append("#endif")
+            lines.append("")
+        return lines
+
+    def _generate_decode_publish_functions(self) -> List[str]:
+        """Generate zero-copy helpers that make a filled receive slot a message's latest payload"""
+        lines = []
+        lines.append("// Map a validated payload to its BLE_DECODE_INDEX_* value")
+        lines.append("// Returns -1 for unknown message IDs or unexpected payload sizes")
+        lines.append("static int16_t ble_decode_message_index(uint8_t msg_id, uint8_t payload_len) {")
+        lines.append("    switch (msg_id) {")
         for msg_name, msg_info in self.client_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
             lines.append(f"        case {msg_info['id']}:")
-            lines.append(f"            memcpy(&{msg_name}_decoded, decode_payload_buffer, sizeof({msg_name}_t));")
-            lines.append(f"            {msg_name}_available = true;")
-            lines.append(f"            {msg_name}_timestamp_ms = timestamp_ms;")
-            lines.append(f"            {msg_name}_unread = true;")
-            lines.append(f"            break;")
+            lines.append(f"            return payload_len == sizeof({msg_name}_t) ? {self.get_decode_index_name(msg_name)} : -1;")
+            lines.append("#endif")
         lines.append("        default:")
-        lines.append("            break;")
+        lines.append("            return -1;")
+        lines.append("    }")
+        lines.append("}")
+        lines.append("")
+        lines.append("// Make a filled slot the latest payload of its message; the previous one")
+        lines.append("// returns to the pool once the application has released it")
+        lines.append("static void ble_decode_publish_slot(ble_reassembly_slot_t *slot, uint8_t index, uint32_t timestamp_ms) {")
+        lines.append("    BLE_STATS_ARRIVAL(index, timestamp_ms);")
+        lines.append("    BLE_TRACE(BLE_TRACE_MESSAGE_STORED, slot->msg_id);")
+        lines.append("    ble_decode_write_begin(index);")
+        lines.append("    if (decode_current[index] != NULL) decode_current[index]->held = false;")
+        lines.append("    slot->active = false;")
+        lines.append("    slot->held = true;")
+        lines.append("    slot->last_frame_ms = timestamp_ms;")
+        lines.append("    decode_current[index] = slot;")
+        lines.append("    decode_available[index] = true;")
+        lines.append("    decode_timestamp_ms[index] = timestamp_ms;")
+        lines.append("    decode_unread[index] = true;")
+        lines.append("    ble_decode_write_end(index);")
+        lines.append("}")
+        lines.append("")
+        lines.append("// Overwrite a message's latest payload in its own slot, so a new payload does")
+        lines.append("// not take another slot. Returns false if there is none or it is pinned")
+        lines.append("static bool ble_decode_replace_payload(uint8_t index, const uint8_t *payload, uint8_t payload_len, uint32_t timestamp_ms) {")
+        lines.append("    ble_reassembly_slot_t *slot = decode_current[index];")
+        lines.append("    if (slot == NULL) return false;")
+        lines.append("    ble_decode_write_begin(index);")
+        lines.append("    // An acquire that pinned the slot before the write began keeps it unchanged;")
+        lines.append("    // one that pins it afterwards sees the sequence change and retries")
+        lines.append("    if (slot->refs > 0) {")
+        lines.append("        ble_decode_write_end(index);")
+        lines.append("        return false;")
+        lines.append("    }")
+        lines.append("    memcpy(slot->payload, payload, payload_len);")
+        lines.append("    slot->last_frame_ms = timestamp_ms;")
+        lines.append("    decode_available[index] = true;")
+        lines.append("    decode_timestamp_ms[index] = timestamp_ms;")
+        lines.append("    decode_unread[index] = true;")
+        lines.append("    ble_decode_write_end(index);")
+        lines.append("    BLE_STATS_ARRIVAL(index, timestamp_ms);")
+        lines.append("    BLE_TRACE(BLE_TRACE_MESSAGE_STORED, slot->msg_id);")
+        lines.append("    return true;")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _generate_reassembly_slot_functions(self) -> List[str]:
+        """Generate reassembly slot lookup, allocation and timeout eviction"""
+        slot_count = self._get_decode_slot_count_name()
+        lines = []
+        lines.append("// Release partial messages that have not progressed within the timeout")
+        lines.append("static void ble_decode_expire_slots(uint32_t time_ms) {")
+        lines.append(f"    for (uint8_t i = 0; i < {slot_count}; i++) {{")
+        lines.append("        ble_reassembly_slot_t *slot = &decode_slots[i];")
+        lines.append("        if (slot->active && (uint32_t)(time_ms - slot->last_frame_ms) > BLE_REASSEMBLY_TIMEOUT_MS) {")
+        lines.append("            BLE_EVENT(reassembly_orphaned, BLE_TRACE_REASSEMBLY_ORPHANED, slot->msg_id);")
+        lines.append("            slot->active = false;")
+        lines.append("        }")
         lines.append("    }")
         lines.append("}")
         lines.append("")
+        lines.append("// Find the active slot reassembling a stream (NULL if none)")
+        lines.append("static ble_reassembly_slot_t *ble_decode_find_slot(uint8_t stream_id) {")
+        lines.append(f"    for (uint8_t i = 0; i < {slot_count}; i++) {{")
+        lines.append("        if (decode_slots[i].active && decode_slots[i].stream_id == stream_id) {")
+        lines.append("            return &decode_slots[i];")
+        lines.append("        }")
+        lines.append("    }")
+        lines.append("    return NULL;")
+        lines.append("}")
+        lines.append("")
+        if self.zero_copy:
+            lines.extend(self._generate_pool_claim_functions())
+            return lines
+        lines.append("// Get a slot for a new message: restart the stream's slot, else take a free")
+        lines.append("// slot, else evict the least recently updated one")
+        lines.append("static ble_reassembly_slot_t *ble_decode_claim_slot(uint8_t stream_id) {")
+        lines.append("    ble_reassembly_slot_t *slot = ble_decode_find_slot(stream_id);")
+        lines.append("    if (slot != NULL) {")
+        lines.append("        BLE_EVENT(reassembly_aborted, BLE_TRACE_REASSEMBLY_ABORTED, slot->msg_id);")
+        lines.append("        return slot;")
+        lines.append("    }")
+        lines.append("    slot = &decode_slots[0];")
+        lines.append("    for (uint8_t i = 0; i < BLE_REASSEMBLY_SLOTS; i++) {")
+        lines.append("        if (!decode_slots[i].active) return &decode_slots[i];")
+        lines.append("        if ((int32_t)(decode_slots[i].last_frame_ms - slot->last_frame_ms) < 0) {")
+        lines.append("            slot = &decode_slots[i];")
+        lines.append("        }")
+        lines.append("    }")
+        lines.append("    BLE_EVENT(reassembly_aborted, BLE_TRACE_REASSEMBLY_ABORTED, slot->msg_id);")
+        lines.append("    return slot;")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _generate_pool_claim_functions(self) -> List[str]:
+        """Generate zero-copy slot allocation that never reuses a pinned slot"""
+        lines = []
+        lines.append("// Get an unused slot, else the least recently updated partial message, else")
+        lines.append("// (last resort) the oldest unpinned payload of another message, which then")
+        lines.append("// reads as unavailable. Returns NULL when the application has pinned every slot")
+        lines.append("static ble_reassembly_slot_t *ble_decode_alloc_slot(void) {")
+        lines.append("    ble_reassembly_slot_t *held = NULL;")
+        lines.append("    ble_reassembly_slot_t *partial = NULL;")
+        lines.append("    for (uint8_t i = 0; i < BLE_DECODE_POOL_SLOTS; i++) {")
+        lines.append("        ble_reassembly_slot_t *slot = &decode_slots[i];")
+        lines.append("        if (slot->refs > 0) continue;")
+        lines.append("        if (slot->held) {")
+        lines.append("            if (held == NULL || (int32_t)(slot->last_frame_ms - held->last_frame_ms) < 0) held = slot;")
+        lines.append("        } else if (slot->active) {")
+        lines.append("            if (partial == NULL || (int32_t)(slot->last_frame_ms - partial->last_frame_ms) < 0) partial = slot;")
+        lines.append("        } else {")
+        lines.append("            return slot;")
+        lines.append("        }")
+        lines.append("    }")
+        lines.append("    if (partial != NULL) {")
+        lines.append("        BLE_EVENT(reassembly_aborted, BLE_TRACE_REASSEMBLY_ABORTED, partial->msg_id);")
+        lines.append("        return partial;")
+        lines.append("    }")
+        lines.append("    if (held != NULL) {")
+        lines.append("        for (uint8_t i = 0; i < BLE_DECODE_MESSAGE_COUNT; i++) {")
+        lines.append("            if (decode_current[i] == held) {")
+        lines.append("                ble_decode_write_begin(i);")
+        lines.append("                decode_current[i] = NULL;")
+        lines.append("                decode_available[i] = false;")
+        lines.append("                ble_decode_write_end(i);")
+        lines.append("            }")
+        lines.append("        }")
+        lines.append("        held->held = false;")
+        lines.append("        BLE_MEMORY_BARRIER();")
+        lines.append("        // An acquire that raced with the eviction wins and keeps the slot")
+        lines.append("        if (held->refs == 0) return held;")
+        lines.append("    }")
+        lines.append("    return NULL;")
+        lines.append("}")
+        lines.append("")
+        lines.append("// Get a slot for a new message: restart the stream's slot, else allocate one")
+        lines.append("static ble_reassembly_slot_t *ble_decode_claim_slot(uint8_t stream_id) {")
+        lines.append("    ble_reassembly_slot_t *slot = ble_decode_find_slot(stream_id);")
+        lines.append("    if (slot != NULL) {")
+        lines.append("        BLE_EVENT(reassembly_aborted, BLE_TRACE_REASSEMBLY_ABORTED, slot->msg_id);")
+        lines.append("        return slot;")
+        lines.append("    }")
+        lines.append("    return ble_decode_alloc_slot();")
+        lines.append("}")
+        lines.append("")
         return lines
 
     def _generate_decode_frame_function(self) -> List[str]:
@@ -85,88 +438,659 @@ class CGenerator:
         lines.append("// time_ms: Current time in milliseconds for timestamping received messages")
         lines.append("bool ble_decode_frame(const uint8_t *frame, uint16_t frame_len, uint32_t time_ms) {")
         lines.append("    if (frame == NULL || frame_len < 1) return false;")
+        lines.append("    BLE_EVENT(frames_in, BLE_TRACE_FRAME_IN, 0);")
+        lines.append("    ")
+        lines.append("    ble_decode_expire_slots(time_ms);")
         lines.append("    ")
         lines.append("    // Check if this is a first frame")
         lines.append("    if (frame[0] == BLE_SYNC_FIRST) {")
-        lines.append("        // Reset state for new message")
-        lines.append("        decode_valid = false;")
-        lines.append("        decode_bytes_received = 0;")
-        lines.append("        ")
         lines.append("        // Verify minimum frame size for first frame")
-        lines.append("        if (frame_len < 4) return false;")
+        lines.append("        if (frame_len < BLE_FIRST_HEADER_SIZE + 1) {")
+        lines.append("            BLE_EVENT(resyncs, BLE_TRACE_RESYNC, 0);")
+        lines.append("            return false;")
+        lines.append("        }")
         lines.append("        ")
         lines.append("        // Extract header")
-        lines.append("        decode_expected_size = frame[1];")
-        lines.append("        decode_msg_id = frame[2];")
-        lines.append("        ")
-        lines.append("        // Calculate payload bytes in this frame")
-        lines.append("        uint16_t header_size = 3;")
-        lines.append("        uint16_t payload_in_frame = frame_len - header_size;")
+        lines.append("        uint8_t expected_size = frame[1];")
+        lines.append("        uint8_t msg_id = frame[2];")
+        if self.streams_enabled:
+            lines.append("        uint8_t stream_id = frame[3];")
+        else:
+            lines.append("        uint8_t stream_id = 0;")
+        lines.append("        const uint8_t *payload = &frame[BLE_FIRST_HEADER_SIZE];")
+        lines.append("        uint16_t payload_in_frame = frame_len - BLE_FIRST_HEADER_SIZE;")
+        lines.append("        BLE_STATS_FRAME(msg_id);")
         lines.append("        ")
         lines.append("        // Check if this frame has checksum (complete message)")
-        lines.append("        bool has_checksum = (payload_in_frame == decode_expected_size + 1);")
+        lines.append("        if (payload_in_frame == expected_size + 1) {")
+        lines.append("            // Single-frame message - validated straight from the frame so")
+        lines.append("            // partially reassembled messages in other slots are kept")
+        lines.append("            uint8_t checksum = payload[expected_size];")
+        lines.append("            uint8_t calc_checksum = ble_calculate_checksum(payload, expected_size);")
+        lines.append("            if (checksum != calc_checksum) {")
+        lines.append("                BLE_EVENT(checksum_errors, BLE_TRACE_CHECKSUM_ERROR, msg_id);")
+        lines.append("                return false;")
+        lines.append("            }")
+        if self.zero_copy:
+            lines.append("            int16_t index = ble_decode_message_index(msg_id, expected_size);")
+            lines.append("            if (index < 0) return false;")
+            lines.append("            // Copied once out of the notification buffer, into the message's")
+            lines.append("            // own slot when it is not pinned")
+            lines.append("            if (ble_decode_replace_payload((uint8_t)index, payload, expected_size, time_ms)) return true;")
+            lines.append("            ble_reassembly_slot_t *slot = ble_decode_alloc_slot();")
+            lines.append("            if (slot == NULL) return false; // Every slot is pinned")
+            lines.append("            slot->msg_id = msg_id;")
+            lines.append("            slot->expected_size = expected_size;")
+            lines.append("            memcpy(slot->payload, payload, expected_size);")
+            lines.append("            ble_decode_publish_slot(slot, (uint8_t)index, time_ms);")
+            lines.append("            return true;")
+        else:
+            lines.append("            return ble_decode_store_message(msg_id, payload, expected_size, time_ms);")
+        lines.append("        }")
         lines.append("        ")
-        lines.append("        if (has_checksum) {")
-        lines.append("            // Single-frame message - verify checksum")
-        lines.append("            uint8_t checksum = frame[3 + decode_expected_size];")
-        lines.append("            uint8_t calc_checksum = ble_calculate_checksum(&frame[3], decode_expected_size);")
-        lines.append("            if (checksum != calc_checksum) return false;")
-        lines.append("            ")
-        lines.append("            // Copy payload to buffer")
-        lines.append("            memcpy(decode_payload_buffer, &frame[3], decode_expected_size);")
-        lines.append("            decode_bytes_received = decode_expected_size;")
-        lines.append("            decode_valid = true;")
-        lines.append("            ")
-        lines.append("            // Store in per-message buffer")
-        lines.append("            ble_decode_store_message(time_ms);")
-        lines.append("            return true;")
-        lines.append("        } else {")
-        lines.append("            // Multi-frame message - copy partial payload")
-        lines.append("            if (payload_in_frame > decode_expected_size) return false;")
-        lines.append("            memcpy(decode_payload_buffer, &frame[3], payload_in_frame);")
-        lines.append("            decode_bytes_received = payload_in_frame;")
-        lines.append("            return false; // Need more frames")
+        lines.append("        // Multi-frame message - copy partial payload into a slot")
+        lines.append("        if (payload_in_frame > expected_size || expected_size > BLE_DECODE_MAX_PAYLOAD) {")
+        lines.append("            BLE_EVENT(resyncs, BLE_TRACE_RESYNC, msg_id);")
+        lines.append("            return false;")
         lines.append("        }")
-        lines.append("    } else {")
-        lines.append("        // Continuation frame (no sync byte, just payload)")
-        lines.append("        if (decode_bytes_received == 0) return false; // No first frame received")
+        lines.append("        ble_reassembly_slot_t *slot = ble_decode_claim_slot(stream_id);")
+        if self.zero_copy:
+            lines.append("        if (slot == NULL) return false; // Every slot is pinned")
+        lines.append("        slot->active = true;")
+        lines.append("        slot->stream_id = stream_id;")
+        lines.append("        slot->msg_id = msg_id;")
+        lines.append("        slot->expected_size = expected_size;")
+        lines.append("        slot->bytes_received = payload_in_frame;")
+        lines.append("        slot->last_frame_ms = time_ms;")
+        lines.append("        memcpy(slot->payload, payload, payload_in_frame);")
+        lines.append("        BLE_TRACE(BLE_TRACE_REASSEMBLY_START, msg_id);")
+        lines.append("        return false; // Need more frames")
+        lines.append("    }")
+        lines.append("    ")
+        if self.streams_enabled:
+            lines.append("    // Continuation frame: [Sync][StreamID][Payload...]")
+            lines.append("    if (frame[0] != BLE_SYNC_CONTINUATION || frame_len < BLE_CONTINUATION_HEADER_SIZE + 1) {")
+            lines.append("        BLE_EVENT(resyncs, BLE_TRACE_RESYNC, 0);")
+            lines.append("        return false;")
+            lines.append("    }")
+            lines.append("    ble_reassembly_slot_t *slot = ble_decode_find_slot(frame[1]);")
+        else:
+            lines.append("    // Continuation frame (no sync byte, just payload)")
+            lines.append("    ble_reassembly_slot_t *slot = ble_decode_find_slot(0);")
+        lines.append("    if (slot == NULL) { // No first frame received")
+        lines.append("        BLE_EVENT(reassembly_orphaned, BLE_TRACE_REASSEMBLY_ORPHANED, 0);")
+        lines.append("        return false;")
+        lines.append("    }")
+        lines.append("    BLE_STATS_FRAME(slot->msg_id);")
+        lines.append("    ")
+        lines.append("    const uint8_t *data = &frame[BLE_CONTINUATION_HEADER_SIZE];")
+        lines.append("    uint16_t data_len = frame_len - BLE_CONTINUATION_HEADER_SIZE;")
+        lines.append("    uint16_t remaining = slot->expected_size - slot->bytes_received;")
+        lines.append("    ")
+        lines.append("    if (data_len == remaining + 1) {")
+        lines.append("        // Final frame - verify checksum and release the slot")
+        lines.append("        memcpy(&slot->payload[slot->bytes_received], data, remaining);")
+        lines.append("        slot->bytes_received += remaining;")
+        lines.append("        slot->active = false;")
         lines.append("        ")
-        lines.append("        uint16_t remaining = decode_expected_size - decode_bytes_received;")
-        lines.append("        bool has_checksum = (frame_len == remaining + 1);")
+        lines.append("        uint8_t checksum = data[remaining];")
+        lines.append("        uint8_t calc_checksum = ble_calculate_checksum(slot->payload, slot->expected_size);")
+        lines.append("        if (checksum != calc_checksum) {")
+        lines.append("            BLE_EVENT(checksum_errors, BLE_TRACE_CHECKSUM_ERROR, slot->msg_id);")
+        lines.append("            return false;")
+        lines.append("        }")
         lines.append("        ")
-        lines.append("        if (has_checksum) {")
-        lines.append("            // Final frame - verify checksum")
-        lines.append("            memcpy(&decode_payload_buffer[decode_bytes_received], frame, remaining);")
-        lines.append("            decode_bytes_received += remaining;")
-        lines.append("            ")
-        lines.append("            uint8_t checksum = frame[remaining];")
-        lines.append("            uint8_t calc_checksum = ble_calculate_checksum(decode_payload_buffer, decode_expected_size);")
-        lines.append("            if (checksum != calc_checksum) {")
-        lines.append("                decode_bytes_received = 0; // Reset on checksum failure")
-        lines.append("                return false;")
-        lines.append("            }")
-        lines.append("            ")
-        lines.append("            decode_valid = true;")
-        lines.append("            ")
-        lines.append("            // Store in per-message buffer")
-        lines.append("            ble_decode_store_message(time_ms);")
-        lines.append("            return true;")
-        lines.append("        } else {")
-        lines.append("            // Continuation frame - copy payload")
-        lines.append("            if (frame_len > remaining) return false;")
-        lines.append("            memcpy(&decode_payload_buffer[decode_bytes_received], frame, frame_len);")
-        lines.append("            decode_bytes_received += frame_len;")
-        lines.append("            return false; // Need more frames")
+        if self.zero_copy:
+            lines.append("        // The reassembled payload is handed out from this slot without a copy")
+            lines.append("        int16_t index = ble_decode_message_index(slot->msg_id, slot->expected_size);")
+            lines.append("        if (index < 0) return false;")
+            lines.append("        ble_decode_publish_slot(slot, (uint8_t)index, time_ms);")
+            lines.append("        return true;")
+        else:
+            lines.append("        return ble_decode_store_message(slot->msg_id, slot->payload, slot->expected_size, time_ms);")
+        lines.append("    }")
+        lines.append("    ")
+        lines.append("    // Continuation frame - copy payload")
+        lines.append("    if (data_len > remaining) {")
+        lines.append("        BLE_EVENT(resyncs, BLE_TRACE_RESYNC, slot->msg_id);")
+        lines.append("        return false;")
+        lines.append("    }")
+        lines.append("    memcpy(&slot->payload[slot->bytes_received], data, data_len);")
+        lines.append("    slot->bytes_received += data_len;")
+        lines.append("    slot->last_frame_ms = time_ms;")
+        lines.append("    return false; // Need more frames")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _generate_field_getters(self) -> List[str]:
+        """Generate getters that read the per-message decoded copies"""
+        lines = []
+        for msg_name, msg_info in self.client_messages.items():
+            index_name = self.get_decode_index_name(msg_name)
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            for field_name, field_value in msg_info['fields'].items():
+                field_type = self.get_field_type_name(field_value)
+                lines.append(f"// Get {field_name} from {msg_name} message")
+
+                if self.is_variable_size(field_type):
+                    # String getter
+                    lines.append(f"const uint8_t* ble_decode_{msg_name}_get_{field_name}(void) {{")
+                    lines.append(f"    if (!decode_available[{index_name}]) return (const uint8_t*)\"\";")
+                    lines.append(f"    decode_unread[{index_name}] = false;")
+                    lines.append(f"    return (const uint8_t*){msg_name}_decoded.{field_name};")
+                    lines.append(f"}}")
+                else:
+                    # Numeric getter
+                    c_type = self.get_c_type(field_type)
+                    lines.append(f"{c_type} ble_decode_{msg_name}_get_{field_name}(void) {{")
+                    lines.append(f"    if (!decode_available[{index_name}]) return 0;")
+                    lines.append(f"    decode_unread[{index_name}] = false;")
+                    lines.append(f"    return {msg_name}_decoded.{field_name};")
+                    lines.append(f"}}")
+                lines.append("")
+            lines.append("#endif")
+            lines.append("")
+        return lines
+
+    def _generate_zero_copy_getters(self) -> List[str]:
+        """Generate acquire/release and getters that read fields in place from a receive slot"""
+        lines = []
+        lines.append("// Return a slot pinned by acquire to the pool")
+        lines.append("void ble_decode_release(const ble_decode_slot_t *slot) {")
+        lines.append("    ble_reassembly_slot_t *pinned = (ble_reassembly_slot_t *)slot;")
+        lines.append("    if (pinned != NULL && pinned->refs > 0) pinned->refs--;")
+        lines.append("}")
+        lines.append("")
+        for msg_name, msg_info in self.client_messages.items():
+            index_name = self.get_decode_index_name(msg_name)
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"// Pin the latest {msg_name} payload (NULL if none received). The pin only")
+            lines.append(f"// counts if the decoder did not replace the payload meanwhile")
+            lines.append(f"const ble_decode_slot_t *ble_decode_{msg_name}_acquire(void) {{")
+            lines.append(f"    for (uint8_t attempt = 0; attempt < BLE_DECODE_SNAPSHOT_RETRIES; attempt++) {{")
+            lines.append(f"        uint32_t seq = decode_seq[{index_name}];")
+            lines.append(f"        BLE_MEMORY_BARRIER();")
+            lines.append(f"        ble_reassembly_slot_t *slot = decode_current[{index_name}];")
+            lines.append(f"        if (slot == NULL) {{")
+            lines.append(f"            if (seq & 1) continue;")
+            lines.append(f"            return NULL;")
+            lines.append(f"        }}")
+            lines.append(f"        slot->refs++;")
+            lines.append(f"        BLE_MEMORY_BARRIER();")
+            lines.append(f"        if (!(seq & 1) && decode_seq[{index_name}] == seq) {{")
+            lines.append(f"            decode_unread[{index_name}] = false;")
+            lines.append(f"            return slot;")
+            lines.append(f"        }}")
+            lines.append(f"        slot->refs--;")
+            lines.append(f"    }}")
+            lines.append(f"    return NULL;")
+            lines.append(f"}}")
+            lines.append("")
+            for field_name, field_value in msg_info['fields'].items():
+                field_type = self.get_field_type_name(field_value)
+                offset = f"offsetof({msg_name}_t, {field_name})"
+                lines.append(f"// Get {field_name} from a pinned {msg_name} payload")
+                if self.is_variable_size(field_type):
+                    lines.append(f"const uint8_t* ble_decode_{msg_name}_get_{field_name}(const ble_decode_slot_t *slot) {{")
+                    lines.append(f"    if (slot == NULL || slot->msg_id != {msg_info['id']}) return (const uint8_t*)\"\";")
+                    lines.append(f"    return &slot->payload[{offset}];")
+                else:
+                    c_type = self.get_c_type(field_type)
+                    lines.append(f"{c_type} ble_decode_{msg_name}_get_{field_name}(const ble_decode_slot_t *slot) {{")
+                    lines.append(f"    if (slot == NULL || slot->msg_id != {msg_info['id']}) return 0;")
+                    lines.append(f"    {c_type} value;")
+                    lines.append(f"    memcpy(&value, &slot->payload[{offset}], sizeof(value));")
+                    lines.append(f"    return value;")
+                lines.append(f"}}")
+                lines.append("")
+            lines.append("#endif")
+            lines.append("")
+        return lines
+
+    def _generate_fragment_function(self) -> List[str]:
+        """Generate helper that splits an encoded frame into MTU-sized fragments"""
+        lines = []
+        lines.append("// Split an encoded frame into MTU-sized fragments")
+        lines.append("uint16_t ble_encode_fragment(ble_frame_t frame, uint16_t *offset, uint8_t *out, uint16_t mtu) {")
+        lines.append("    if (offset == NULL || out == NULL || *offset >= frame.length) return 0;")
+        lines.append("")
+        if self.streams_enabled:
+            lines.append("    uint16_t header_len = 0;")
+            lines.append("    if (*offset > 0) {")
+            lines.append("        // Continuation frame: [Sync][StreamID][Payload...]")
+            lines.append("        if (mtu <= BLE_CONTINUATION_HEADER_SIZE) return 0;")
+            lines.append("        out[0] = BLE_SYNC_CONTINUATION;")
+            lines.append("        out[1] = frame.data[3];")
+            lines.append("        header_len = BLE_CONTINUATION_HEADER_SIZE;")
+            lines.append("    }")
+            lines.append("")
+            lines.append("    uint16_t chunk = frame.length - *offset;")
+            lines.append("    if (chunk > mtu - header_len) chunk = mtu - header_len;")
+            lines.append("    memcpy(&out[header_len], &frame.data[*offset], chunk);")
+            lines.append("    *offset += chunk;")
+            lines.append("    return header_len + chunk;")
+        else:
+            lines.append("    // Continuation frames are raw payload, so every fragment is a plain slice")
+            lines.append("    uint16_t chunk = frame.length - *offset;")
+            lines.append("    if (chunk > mtu) chunk = mtu;")
+            lines.append("    memcpy(out, &frame.data[*offset], chunk);")
+            lines.append("    *offset += chunk;")
+            lines.append("    return chunk;")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def get_tx_priority(self, msg_info: Dict) -> int:
+        """Get the transmit priority of a server message (higher preempts lower)"""
+        return msg_info.get('priority', 0)
+
+    def _generate_tx_queue_functions(self) -> List[str]:
+        """Generate priority TX queue that fragments queued frames lazily"""
+        lines = []
+        lines.append("// Number of encoded fragments still owed for a message that has started sending")
+        lines.append("static uint8_t ble_tx_in_flight(void) {")
+        lines.append("    uint8_t count = 0;")
+        lines.append("    for (uint8_t i = 0; i < BLE_TX_MESSAGE_COUNT; i++) {")
+        lines.append("        if (tx_pending[i] && tx_offset[i] > 0) count++;")
+        lines.append("    }")
+        lines.append("    return count;")
+        lines.append("}")
+        lines.append("")
+        packs_frames = self.handshake and 'packed_frames' in self.features
+        if packs_frames:
+            lines.append("// Append whole queued frames to a notification, highest priority first")
+            lines.append("// (packed_frames: the receiver splits them at each frame's length)")
+            lines.append("static uint16_t ble_tx_pack(uint8_t *out, uint16_t space) {")
+            lines.append("    uint16_t used = 0;")
+            lines.append("    for (;;) {")
+            lines.append("        int16_t selected = -1;")
+            lines.append("        for (uint8_t i = 0; i < BLE_TX_MESSAGE_COUNT; i++) {")
+            lines.append("            if (!tx_pending[i] || tx_offset[i] > 0 || *tx_lengths[i] > space - used) continue;")
+            lines.append("            if (selected < 0 || tx_priority[i] > tx_priority[selected]) {")
+            lines.append("                selected = i;")
+            lines.append("            }")
+            lines.append("        }")
+            lines.append("        if (selected < 0) return used;")
+            lines.append("        memcpy(&out[used], tx_buffers[selected], *tx_lengths[selected]);")
+            lines.append("        used += *tx_lengths[selected];")
+            lines.append("        tx_pending[selected] = false;")
+            lines.append("        BLE_EVENT(tx_frames[selected], BLE_TRACE_TX_FRAGMENT, tx_buffers[selected][2]);")
+            lines.append("        BLE_EVENT(tx_messages[selected], BLE_TRACE_TX_COMPLETE, tx_buffers[selected][2]);")
+            lines.append("    }")
+            lines.append("}")
+            lines.append("")
+        lines.append("// Get the next fragment to transmit, at most mtu bytes")
+        lines.append("// Returns the fragment length written to out, or 0 when nothing is queued")
+        lines.append("uint16_t ble_tx_next_fragment(uint8_t *out, uint16_t mtu) {")
+        lines.append("    if (out == NULL) return 0;")
+        lines.append("    ")
+        lines.append("    // Pick the highest priority message that may send now. A message that has")
+        lines.append("    // not started may only interleave with partially sent ones if it fits in")
+        if self.streams_enabled:
+            lines.append("    // a single frame or the receiver has a free reassembly slot for it.")
+        else:
+            lines.append("    // a single frame, since continuation frames carry no stream ID.")
+        lines.append("    uint8_t in_flight = ble_tx_in_flight();")
+        lines.append("    int16_t selected = -1;")
+        lines.append("    for (uint8_t i = 0; i < BLE_TX_MESSAGE_COUNT; i++) {")
+        lines.append("        if (!tx_pending[i]) continue;")
+        lines.append("        if (tx_offset[i] == 0 && in_flight > 0 && *tx_lengths[i] > mtu) {")
+        if self.streams_enabled:
+            lines.append("            if (in_flight >= BLE_REASSEMBLY_SLOTS) continue;")
+        else:
+            lines.append("            continue;")
+        lines.append("        }")
+        lines.append("        if (selected < 0 || tx_priority[i] > tx_priority[selected]) {")
+        lines.append("            selected = i;")
+        lines.append("        }")
+        lines.append("    }")
+        lines.append("    if (selected < 0) return 0;")
+        lines.append("    ")
+        lines.append("    ble_frame_t frame = {")
+        lines.append("        .data = tx_buffers[selected],")
+        lines.append("        .length = *tx_lengths[selected]")
+        lines.append("    };")
+        lines.append("    uint16_t fragment_len = ble_encode_fragment(frame, &tx_offset[selected], out, mtu);")
+        lines.append("    if (fragment_len > 0) {")
+        lines.append("        BLE_EVENT(tx_frames[selected], BLE_TRACE_TX_FRAGMENT, frame.data[2]);")
+        lines.append("        if (tx_offset[selected] >= frame.length) {")
+        lines.append("            BLE_EVENT(tx_messages[selected], BLE_TRACE_TX_COMPLETE, frame.data[2]);")
         lines.append("        }")
         lines.append("    }")
+        lines.append("    if (fragment_len == 0 || tx_offset[selected] >= frame.length) {")
+        lines.append("        tx_pending[selected] = false;")
+        lines.append("        tx_offset[selected] = 0;")
+        lines.append("    }")
+        if packs_frames:
+            lines.append("    // A notification that carried a whole frame is filled up with other")
+            lines.append("    // whole frames when the peer accepts packed frames")
+            lines.append("    if (fragment_len == frame.length && (ble_link.features & BLE_FEATURE_PACKED_FRAMES)) {")
+            lines.append("        fragment_len += ble_tx_pack(&out[fragment_len], mtu - fragment_len);")
+            lines.append("    }")
+        lines.append("    return fragment_len;")
+        lines.append("}")
+        lines.append("")
+        lines.append("// Check if every queued message has been fully sent")
+        lines.append("bool ble_tx_is_idle(void) {")
+        lines.append("    for (uint8_t i = 0; i < BLE_TX_MESSAGE_COUNT; i++) {")
+        lines.append("        if (tx_pending[i]) return false;")
+        lines.append("    }")
+        lines.append("    return true;")
         lines.append("}")
         lines.append("")
         return lines
 
+    def _get_status_mask_type(self) -> str:
+        """Get the smallest C integer type holding one status bit per client message"""
+        return 'uint32_t' if len(self.client_messages) <= 32 else 'uint64_t'
+
+    def _has_status_masks(self) -> bool:
+        """Bulk status masks are only generated when every client message fits in one word"""
+        return len(self.client_messages) <= 64
+
+    def _generate_status_mask_functions(self) -> List[str]:
+        """Generate bulk stale/unread mask functions over the status arrays"""
+        lines = []
+        lines.append("// Get bitmask of stale client messages (bit n = BLE_DECODE_INDEX_* n)")
+        lines.append("// Messages that have never been received are reported as stale")
+        lines.append("ble_decode_mask_t ble_decode_stale_mask(uint32_t time_ms) {")
+        lines.append("    ble_decode_mask_t mask = 0;")
+        lines.append("    for (uint16_t i = 0; i < BLE_DECODE_MESSAGE_COUNT; i++) {")
+        lines.append("        if (!decode_available[i] || (uint32_t)(time_ms - decode_timestamp_ms[i]) > decode_max_age_ms[i]) {")
+        lines.append("            mask |= (ble_decode_mask_t)1 << i;")
+        lines.append("        }")
+        lines.append("    }")
+        lines.append("    return mask;")
+        lines.append("}")
+        lines.append("")
+        lines.append("// Get bitmask of unread client messages (bit n = BLE_DECODE_INDEX_* n)")
+        lines.append("ble_decode_mask_t ble_decode_unread_mask(void) {")
+        lines.append("    ble_decode_mask_t mask = 0;")
+        lines.append("    for (uint16_t i = 0; i < BLE_DECODE_MESSAGE_COUNT; i++) {")
+        lines.append("        if (decode_available[i] && decode_unread[i]) {")
+        lines.append("            mask |= (ble_decode_mask_t)1 << i;")
+        lines.append("        }")
+        lines.append("    }")
+        lines.append("    return mask;")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def get_feature_macro(self, feature: str) -> str:
+        return f"BLE_FEATURE_{feature.upper()}"
+
+    def _get_feature_mask(self, features) -> str:
+        """C expression OR-ing the given handshake feature bits"""
+        macros = [self.get_feature_macro(feature) for feature in features if feature in self.features]
+        return f"({' | '.join(macros)})" if macros else "0u"
+
+    def _generate_handshake_declarations(self) -> List[str]:
+        """Generate handshake constants, the negotiated link mode and its functions"""
+        request, response = self.handshake
+        lines = []
+        lines.append("// ============================================================================")
+        lines.append("// Connection handshake")
+        lines.append("// ============================================================================")
+        lines.append("")
+        lines.append(f"// After connecting, the client sends {request}. ble_link_service() answers")
+        lines.append(f"// with {response} and switches this connection to the common mode; until")
+        lines.append("// then, and after ble_link_reset(), the baseline mode applies.")
+        lines.append(f"#define BLE_PROTOCOL_VERSION 0x{protocol_version16(self.protocol['version']):04X}  // major << 8 | minor")
+        lines.append(f"#define BLE_SCHEMA_HASH 0x{self.schema_hash:08X}u")
+        lines.append(f"#define BLE_DEFAULT_MTU {self.default_mtu}")
+        lines.append("")
+        lines.append("// Feature bits (handshake features field)")
+        for feature, bit in self.features.items():
+            lines.append(f"#define {self.get_feature_macro(feature)} (1u << {bit})")
+        lines.append("// Features this end accepts when receiving (announced to the peer)")
+        lines.append(f"#define BLE_LOCAL_FEATURES {self._get_feature_mask(self.RECEIVE_FEATURES)}")
+        lines.append("// Features this end uses when sending, if the peer accepts them")
+        lines.append(f"#define BLE_SEND_FEATURES {self._get_feature_mask(self.SEND_FEATURES)}")
+        lines.append("")
+        lines.append("typedef struct {")
+        lines.append("    bool negotiated;              // A handshake completed on this connection")
+        lines.append("    bool compatible;              // Same protocol major version")
+        lines.append("    bool schema_match;            // Peer was generated from the same schema")
+        lines.append("    uint16_t mtu;                 // Smaller of both MTUs (BLE_DEFAULT_MTU until negotiated)")
+        lines.append("    uint16_t peer_max_reassembly; // Largest payload the peer reassembles; larger ones are not queued")
+        lines.append("    uint32_t features;            // BLE_SEND_FEATURES the peer accepts, in use when sending")
+        lines.append("} ble_link_t;")
+        lines.append("")
+        lines.append("// Return to the baseline mode (call on every connect and disconnect)")
+        lines.append("void ble_link_reset(void);")
+        lines.append("// Current mode; pass ble_link_get()->mtu to ble_tx_next_fragment")
+        lines.append("const ble_link_t *ble_link_get(void);")
+        lines.append(f"#if {self.get_enable_macro(request)} && {self.get_enable_macro(response)}")
+        lines.append(f"// Answer a received {request} and adopt the common mode. local_mtu is")
+        lines.append("// the largest notification this end can send. Call from the context that")
+        lines.append("// runs the transmit queue. Returns true when a handshake was answered")
+        lines.append("bool ble_link_service(uint16_t local_mtu);")
+        lines.append("#endif")
+        lines.append("")
+        return lines
+
+    def _generate_handshake_functions(self) -> List[str]:
+        """Generate link reset/get and the handshake responder"""
+        request, response = self.handshake
+        lines = []
+        lines.append("// ============================================================================")
+        lines.append("// Connection handshake")
+        lines.append("// ============================================================================")
+        lines.append("")
+        lines.append("void ble_link_reset(void) {")
+        lines.append("    ble_link.negotiated = false;")
+        lines.append("    ble_link.compatible = true;")
+        lines.append("    ble_link.schema_match = false;")
+        lines.append("    ble_link.mtu = BLE_DEFAULT_MTU;")
+        lines.append("    ble_link.peer_max_reassembly = 255;")
+        lines.append("    ble_link.features = 0;")
+        lines.append("}")
+        lines.append("")
+        lines.append("const ble_link_t *ble_link_get(void) {")
+        lines.append("    return &ble_link;")
+        lines.append("}")
+        lines.append("")
+        lines.append(f"#if {self.get_enable_macro(request)} && {self.get_enable_macro(response)}")
+        lines.append(f"bool ble_link_service(uint16_t local_mtu) {{")
+        lines.append(f"    ble_{request}_snapshot_t peer;")
+        lines.append(f"    if (!ble_decode_{request}_check_is_unread()) return false;")
+        lines.append(f"    if (!ble_decode_{request}_read_snapshot(&peer)) return false;")
+        lines.append("")
+        lines.append("    // Smaller MTU (never below the baseline), the peer's reassembly limit, and")
+        lines.append("    // the sending features the peer accepts unless the major version differs")
+        lines.append("    ble_link.negotiated = true;")
+        lines.append("    ble_link.compatible = (peer.protocol_version >> 8) == (BLE_PROTOCOL_VERSION >> 8);")
+        lines.append("    ble_link.schema_match = peer.schema_hash == BLE_SCHEMA_HASH;")
+        lines.append("    ble_link.mtu = peer.mtu < local_mtu ? peer.mtu : local_mtu;")
+        lines.append("    if (ble_link.mtu < BLE_DEFAULT_MTU) ble_link.mtu = BLE_DEFAULT_MTU;")
+        lines.append("    ble_link.peer_max_reassembly = peer.max_reassembly;")
+        lines.append("    ble_link.features = ble_link.compatible ? (peer.features & BLE_SEND_FEATURES) : 0;")
+        lines.append("")
+        lines.append(f"    ble_encode_{response}_begin();")
+        lines.append(f"    ble_encode_{response}_set_protocol_version(BLE_PROTOCOL_VERSION);")
+        lines.append(f"    ble_encode_{response}_set_schema_hash(BLE_SCHEMA_HASH);")
+        lines.append(f"    ble_encode_{response}_set_max_reassembly(BLE_DECODE_MAX_PAYLOAD);")
+        lines.append(f"    ble_encode_{response}_set_mtu(local_mtu);")
+        lines.append(f"    ble_encode_{response}_set_features(BLE_LOCAL_FEATURES);")
+        lines.append(f"    return ble_encode_{response}_enqueue();")
+        lines.append("}")
+        lines.append("#endif")
+        lines.append("")
+        return lines
+
+    def _get_interarrival_bounds(self) -> List[int]:
+        """Upper bounds (ms) of the inter-arrival histogram buckets; one more bucket catches the rest"""
+        return self.stats.get('interarrival_buckets_ms', [10, 20, 50, 100, 200, 500, 1000, 2000])
+
+    def _generate_stats_declarations(self) -> List[str]:
+        """Generate the optional health counter API and trace event codes"""
+        lines = []
+        lines.append("// ============================================================================")
+        lines.append("// Protocol health counters and trace hooks")
+        lines.append("// ============================================================================")
+        lines.append("")
+        lines.append("// Build with -DBLE_ENABLE_STATS=1 to count decode and transmit events, and")
+        lines.append("// define BLE_TRACE(event, msg_id) to be called at every stage (msg_id is 0")
+        lines.append("// where it is not known yet). Both compile to nothing by default.")
+        lines.append("#ifndef BLE_ENABLE_STATS")
+        lines.append("#define BLE_ENABLE_STATS 0")
+        lines.append("#endif")
+        lines.append("")
+        lines.append("typedef enum {")
+        lines.append("    BLE_TRACE_FRAME_IN,             // Frame passed to ble_decode_frame")
+        lines.append("    BLE_TRACE_REASSEMBLY_START,     // First frame of a multi-frame message")
+        lines.append("    BLE_TRACE_CHECKSUM_ERROR,       // Complete message failed its checksum")
+        lines.append("    BLE_TRACE_REASSEMBLY_ABORTED,   // Partial message restarted or evicted for another")
+        lines.append("    BLE_TRACE_REASSEMBLY_ORPHANED,  // Partial message timed out, or continuation without one")
+        lines.append("    BLE_TRACE_RESYNC,               // Malformed frame dropped until the next first frame")
+        lines.append("    BLE_TRACE_MESSAGE_STORED,       // Validated message stored")
+        lines.append("    BLE_TRACE_TX_FRAGMENT,          // Fragment returned by ble_tx_next_fragment")
+        lines.append("    BLE_TRACE_TX_COMPLETE,          // Last fragment of a queued message returned")
+        lines.append("} ble_trace_event_t;")
+        lines.append("")
+        bounds = self._get_interarrival_bounds()
+        lines.append("#if BLE_ENABLE_STATS")
+        lines.append("// Inter-arrival histogram: bucket n counts gaps up to bounds[n] ms, the last")
+        lines.append("// bucket everything longer")
+        lines.append(f"#define BLE_STATS_INTERARRIVAL_BUCKETS {len(bounds) + 1}")
+        lines.append("extern const uint32_t ble_stats_interarrival_bounds_ms[BLE_STATS_INTERARRIVAL_BUCKETS - 1];")
+        lines.append("")
+        lines.append("typedef struct {")
+        lines.append("    uint32_t frames_in;")
+        lines.append("    uint32_t checksum_errors;")
+        lines.append("    uint32_t reassembly_aborted;")
+        lines.append("    uint32_t reassembly_orphaned;")
+        lines.append("    uint32_t resyncs;")
+        lines.append("    uint32_t rx_frames[BLE_DECODE_MESSAGE_COUNT];    // Per BLE_DECODE_INDEX_*")
+        lines.append("    uint32_t rx_messages[BLE_DECODE_MESSAGE_COUNT];")
+        lines.append("    uint32_t rx_interarrival[BLE_DECODE_MESSAGE_COUNT][BLE_STATS_INTERARRIVAL_BUCKETS];")
+        lines.append("    uint32_t tx_frames[BLE_TX_MESSAGE_COUNT];        // Per BLE_TX_INDEX_*")
+        lines.append("    uint32_t tx_messages[BLE_TX_MESSAGE_COUNT];")
+        lines.append("} ble_stats_t;")
+        lines.append("")
+        lines.append("// Copy the counters (not synchronised with a decoder running concurrently)")
+        lines.append("void ble_stats_read(ble_stats_t *out);")
+        lines.append("void ble_stats_reset(void);")
+        lines.append("#endif")
+        lines.append("")
+        return lines
+
+    def _generate_stats_state(self) -> List[str]:
+        """Generate counter storage and the event macros used by the decoder and TX queue"""
+        bounds = ', '.join(str(bound) for bound in self._get_interarrival_bounds())
+        lines = []
+        lines.append("// Health counters; BLE_EVENT counts a stage and passes it to BLE_TRACE")
+        lines.append("#if BLE_ENABLE_STATS")
+        lines.append(f"const uint32_t ble_stats_interarrival_bounds_ms[BLE_STATS_INTERARRIVAL_BUCKETS - 1] = {{{bounds}}};")
+        lines.append("static ble_stats_t ble_stats;")
+        lines.append("static uint32_t stats_last_arrival_ms[BLE_DECODE_MESSAGE_COUNT];")
+        lines.append("")
+        lines.append("// Count a frame against its client message (unknown IDs only count in frames_in)")
+        lines.append("static void ble_stats_count_frame(uint8_t msg_id) {")
+        lines.append("    switch (msg_id) {")
+        for msg_name, msg_info in self.client_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"        case {msg_info['id']}:")
+            lines.append(f"            ble_stats.rx_frames[{self.get_decode_index_name(msg_name)}]++;")
+            lines.append("            break;")
+            lines.append("#endif")
+        lines.append("        default:")
+        lines.append("            break;")
+        lines.append("    }")
+        lines.append("}")
+        lines.append("")
+        lines.append("// Count a stored message and bucket the time since its previous arrival")
+        lines.append("static void ble_stats_record_arrival(uint8_t index, uint32_t time_ms) {")
+        lines.append("    if (ble_stats.rx_messages[index]++ > 0) {")
+        lines.append("        uint32_t interval_ms = time_ms - stats_last_arrival_ms[index];")
+        lines.append("        uint8_t bucket = 0;")
+        lines.append("        while (bucket < BLE_STATS_INTERARRIVAL_BUCKETS - 1 && interval_ms > ble_stats_interarrival_bounds_ms[bucket]) {")
+        lines.append("            bucket++;")
+        lines.append("        }")
+        lines.append("        ble_stats.rx_interarrival[index][bucket]++;")
+        lines.append("    }")
+        lines.append("    stats_last_arrival_ms[index] = time_ms;")
+        lines.append("}")
+        lines.append("")
+        lines.append("#define BLE_STATS_INC(counter) (ble_stats.counter++)")
+        lines.append("#define BLE_STATS_FRAME(msg_id) ble_stats_count_frame(msg_id)")
+        lines.append("#define BLE_STATS_ARRIVAL(index, time_ms) ble_stats_record_arrival(index, time_ms)")
+        lines.append("#else")
+        lines.append("#define BLE_STATS_INC(counter) ((void)0)")
+        lines.append("#define BLE_STATS_FRAME(msg_id) ((void)0)")
+        lines.append("#define BLE_STATS_ARRIVAL(index, time_ms) ((void)0)")
+        lines.append("#endif")
+        lines.append("#define BLE_EVENT(counter, event, msg_id) do { BLE_STATS_INC(counter); BLE_TRACE(event, msg_id); } while (0)")
+        lines.append("")
+        return lines
+
+    def _generate_stats_functions(self) -> List[str]:
+        """Generate the public counter read/reset functions"""
+        lines = []
+        lines.append("#if BLE_ENABLE_STATS")
+        lines.append("// ============================================================================")
+        lines.append("// Protocol health counters")
+        lines.append("// ============================================================================")
+        lines.append("")
+        lines.append("void ble_stats_read(ble_stats_t *out) {")
+        lines.append("    if (out != NULL) memcpy(out, &ble_stats, sizeof(ble_stats));")
+        lines.append("}")
+        lines.append("")
+        lines.append("void ble_stats_reset(void) {")
+        lines.append("    memset(&ble_stats, 0, sizeof(ble_stats));")
+        lines.append("}")
+        lines.append("#endif")
+        lines.append("")
+        return lines
+
     # ========================================================================
     # Message Layer - Type handling and message-specific logic
     # ========================================================================
 
+    def get_decode_index_name(self, msg_name: str) -> str:
+        """Get the status array index constant for a client message"""
+        return f"BLE_DECODE_INDEX_{msg_name.upper()}"
+
+    def get_tx_index_name(self, msg_name: str) -> str:
+        """Get the transmit queue index constant for a server message"""
+        return f"BLE_TX_INDEX_{msg_name.upper()}"
+
+    def get_enable_macro(self, msg_name: str) -> str:
+        """Get the preprocessor switch that compiles a message in or out"""
+        return f"BLE_ENABLE_{msg_name.upper()}"
+
+    def _get_chained_index_defines(self, messages: Dict, index_name, count_name: str) -> List[str]:
+        """Index constants that skip disabled messages, plus the enabled count"""
+        lines = []
+        previous = None
+        for msg_name in messages:
+            value = '0' if previous is None else f"({index_name(previous)} + {self.get_enable_macro(previous)})"
+            lines.append(f"#define {index_name(msg_name):<35} {value}")
+            previous = msg_name
+        lines.append(f"#define {count_name:<35} ({index_name(previous)} + {self.get_enable_macro(previous)})")
+        return lines
+
+    def _get_guarded_initializers(self, messages: Dict, value) -> List[str]:
+        """Array initializer entries, one per enabled message"""
+        lines = []
+        for msg_name, msg_info in messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"    {value(msg_name, msg_info)},")
+            lines.append("#endif")
+        return lines
+
+    C_TYPES = {
+        'uint8': 'uint8_t',
+        'int8': 'int8_t',
+        'uint16': 'uint16_t',
+        'int16': 'int16_t',
+        'uint32': 'uint32_t',
+        'int32': 'int32_t',
+        'uint64': 'uint64_t',
+        'int64': 'int64_t',
+    }
+
     def get_c_type(self, type_name: str, for_struct_decl: bool = False, max_string_length: int = 64) -> str:
         """Convert schema type to C type
 
@@ -175,24 +1099,14 @@ class CGenerator:
             for_struct_decl: If True, returns type suitable for struct field declaration
             max_string_length: Maximum string length for string types
         """
-        type_map = {
-            'uint8': 'uint8_t',
-            'int8': 'int8_t',
-            'uint16': 'uint16_t',
-            'int16': 'int16_t',
-            'uint32': 'uint32_t',
-            'int32': 'int32_t',
-            'uint64': 'uint64_t',
-            'int64': 'int64_t',
-        }
         if type_name == 'string':
             # For struct declarations, we need the array size in the field declaration
             return 'char' if for_struct_decl else 'const char*'
-        return type_map.get(type_name, type_name)
+        return self.C_TYPES.get(type_name, type_name)
 
     def is_variable_size(self, type_name: str) -> bool:
         """Check if a type has variable size"""
-        return self.types.get(type_name, {}).get('size') == 'variable'
+        return type_name in self._variable_types
 
     def get_field_type_name(self, field_value) -> str:
         """Extract type name from field value (handles both string and dict formats)"""
@@ -221,6 +1135,26 @@ class CGenerator:
             total += self.get_field_size(field_value, max_string_length)
         return total
 
+    def get_message_size(self, msg_name: str) -> int:
+        """Payload size of a message in bytes (computed once per message)"""
+        return self._message_sizes[msg_name]
+
+    # Header extension layout: [Seq:uint8][SendTimeMs:uint16], as in protocol.json
+    HEADER_EXTENSION_SIZE = 3
+
+    def has_header_extension(self, msg_info: Dict) -> bool:
+        """Whether a message carries the [Seq][SendTimeMs] header extension"""
+        return bool(msg_info.get('header_extension', False))
+
+    def _uses_header_extension(self) -> bool:
+        return any(self.has_header_extension(msg_info) for msg_info in self.server_messages.values())
+
+    def get_payload_size(self, msg_name: str) -> int:
+        """Payload bytes on the wire: header extension (if enabled) plus fields"""
+        msg_info = self.server_messages.get(msg_name, {})
+        extension = self.HEADER_EXTENSION_SIZE if self.has_header_extension(msg_info) else 0
+        return extension + self.get_message_size(msg_name)
+
     def generate_header(self) -> str:
         """Generate C header file with only function declarations"""
         lines = []
@@ -234,9 +1168,9 @@ class CGenerator:
         lines.append(" * - Decodes client messages (for reception)")
         lines.append(" *")
         lines.append(" * Frame format:")
-        lines.append(" * - First frame: [0xAA][Length][MsgID][Payload...]")
-        lines.append(" * - Continuation: [Payload...]")
-        lines.append(" * - Final frame ends with: [Checksum]")
+        lines.extend(self._get_frame_format_comment())
+        if self._uses_header_extension():
+            lines.append(" * - Extended messages start their payload with [Seq][SendTimeMs:2]")
         lines.append(" *")
         lines.append(" * Frame buffers are managed internally.")
         lines.append(" */")
@@ -270,6 +1204,16 @@ class CGenerator:
             lines.append(f"#define {constant_name:<25} {msg_info['id']}")
         lines.append("")
 
+        # Per-build message selection
+        lines.append("// Message selection: build with -DBLE_ENABLE_<MSG>=0 to strip a message's")
+        lines.append("// functions, buffers and dispatch case")
+        for msg_name in list(self.server_messages) + list(self.client_messages):
+            enable = self.get_enable_macro(msg_name)
+            lines.append(f"#ifndef {enable}")
+            lines.append(f"#define {enable} 1")
+            lines.append("#endif")
+        lines.append("")
+
         # Server message encoding functions (server sends these)
         lines.append("// ============================================================================")
         lines.append("// Server message encoding functions")
@@ -277,6 +1221,7 @@ class CGenerator:
         lines.append("")
 
         for msg_name, msg_info in self.server_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
             lines.append(f"// Encode and get {msg_name} message")
             # Begin function - initializes internal buffer
             lines.append(f"void ble_encode_{msg_name}_begin(void);")
@@ -290,8 +1235,51 @@ class CGenerator:
                     lines.append(f"void ble_encode_{msg_name}_set_{field_name}({c_type} value);")
             # Get frame function - returns frame struct
             lines.append(f"ble_frame_t ble_encode_{msg_name}_get_frame(void);")
+            lines.append("#endif")
             lines.append("")
 
+        lines.append("// Split an encoded frame into MTU-sized fragments")
+        lines.append("// offset: position in the frame, start at 0 (advanced on each call)")
+        lines.append("// Returns the fragment length written to out, or 0 when the frame is fully sent")
+        lines.append("uint16_t ble_encode_fragment(ble_frame_t frame, uint16_t *offset, uint8_t *out, uint16_t mtu);")
+        lines.append("")
+
+        if self._uses_header_extension():
+            extended = ', '.join(name for name, info in self.server_messages.items() if self.has_header_extension(info))
+            lines.append(f"// Header extension ({extended}): get_frame and enqueue stamp a rolling")
+            lines.append("// sequence number and the send time (BLE_SEND_TIME_MS)")
+            lines.append("")
+
+        lines.append("// ============================================================================")
+        lines.append("// Server message transmit queue")
+        lines.append("// ============================================================================")
+        lines.append("")
+        lines.append("// Queue the encoded message for transmission (after begin/set calls).")
+        lines.append("// Re-queuing a message that is still being sent restarts it.")
+        if self.handshake:
+            lines.append("// Returns false, without queuing, when the frame is larger than the peer's")
+            lines.append(f"// max_reassembly ({self.handshake[1]} is always queued).")
+        lines.append("// The queue sends the message's own frame buffer, so begin/set on a queued")
+        lines.append("// message would change a frame that is partly sent and whose checksum is")
+        lines.append("// already computed: wait until is_queued() returns false (or ble_tx_is_idle())")
+        lines.append("// before encoding the message again.")
+        for msg_name, msg_info in self.server_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"bool ble_encode_{msg_name}_enqueue(void);  // priority {self.get_tx_priority(msg_info)}")
+            lines.append(f"bool ble_encode_{msg_name}_is_queued(void);")
+            lines.append("#endif")
+        lines.append("")
+        lines.append("// Get the next fragment to transmit, at most mtu bytes. Higher priority")
+        lines.append("// messages preempt lower priority ones between fragments.")
+        lines.append("// Returns the fragment length written to out, or 0 when nothing is queued")
+        lines.append("uint16_t ble_tx_next_fragment(uint8_t *out, uint16_t mtu);")
+        lines.append("bool ble_tx_is_idle(void);")
+        lines.append("")
+        lines.append("// Transmit queue indices, counting only enabled server messages")
+        lines.extend(self._get_chained_index_defines(self.server_messages, self.get_tx_index_name,
+                                                     'BLE_TX_MESSAGE_COUNT'))
+        lines.append("")
+
         # Client message decoding functions (server receives these)
         lines.append("// ============================================================================")
         lines.append("// Client message decoding functions")
@@ -303,16 +1291,41 @@ class CGenerator:
         lines.append("bool ble_decode_frame(const uint8_t *frame, uint16_t frame_len, uint32_t time_ms);")
         lines.append("")
 
+        if self.zero_copy:
+            lines.append("// Zero-copy decoding: payloads stay in a pool of receive slots. acquire pins")
+            lines.append("// the latest payload of a message so it survives newer ones, getters read it")
+            lines.append("// in place, and release returns the slot to the pool. Unpinned payloads may")
+            lines.append("// be reclaimed for new messages when the pool is full.")
+            lines.append("typedef struct ble_decode_slot ble_decode_slot_t;")
+            lines.append("void ble_decode_release(const ble_decode_slot_t *slot);")
+            lines.append("")
         for msg_name, msg_info in self.client_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
             lines.append(f"// Get {msg_name} message fields")
+            if self.zero_copy:
+                lines.append(f"const ble_decode_slot_t *ble_decode_{msg_name}_acquire(void);")
+            getter_args = 'const ble_decode_slot_t *slot' if self.zero_copy else 'void'
             # Getter functions for each field
             for field_name, field_value in msg_info['fields'].items():
                 field_type = self.get_field_type_name(field_value)
                 if self.is_variable_size(field_type):
-                    lines.append(f"const uint8_t* ble_decode_{msg_name}_get_{field_name}(void);")
+                    lines.append(f"const uint8_t* ble_decode_{msg_name}_get_{field_name}({getter_args});")
                 else:
                     c_type = self.get_c_type(field_type)
-                    lines.append(f"{c_type} ble_decode_{msg_name}_get_{field_name}(void);")
+                    lines.append(f"{c_type} ble_decode_{msg_name}_get_{field_name}({getter_args});")
+            lines.append("")
+            lines.append(f"// Consistent copy of every {msg_name} field without disabling interrupts")
+            lines.append(f"// Returns false if none was received or the decoder kept rewriting it")
+            lines.append("typedef struct {")
+            for field_name, field_value in msg_info['fields'].items():
+                field_type = self.get_field_type_name(field_value)
+                if self.is_variable_size(field_type):
+                    lines.append(f"    char {field_name}[{self.get_field_size(field_value)}];")
+                else:
+                    lines.append(f"    {self.get_c_type(field_type)} {field_name};")
+            lines.append(f"}} ble_{msg_name}_snapshot_t;")
+            lines.append(f"bool ble_decode_{msg_name}_read_snapshot(ble_{msg_name}_snapshot_t *out);")
+            lines.append("#endif")
             lines.append("")
 
         # Timestamp and status functions
@@ -321,12 +1334,37 @@ class CGenerator:
         lines.append("// ============================================================================")
         lines.append("")
 
+        lines.append("// Client message status indices (bit positions in status masks), counting")
+        lines.append("// only enabled messages")
+        lines.extend(self._get_chained_index_defines(self.client_messages, self.get_decode_index_name,
+                                                     'BLE_DECODE_MESSAGE_COUNT'))
+        lines.append("")
+
         for msg_name, msg_info in self.client_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
             lines.append(f"// {msg_name} message status")
             lines.append(f"bool ble_decode_{msg_name}_check_is_unread(void);")
             lines.append(f"bool ble_decode_{msg_name}_check_data_is_stale(uint32_t time_ms);")
+            lines.append("#endif")
+            lines.append("")
+
+        if self._has_status_masks():
+            lines.append("// Bulk status masks - one bit per client message")
+            lines.append(f"typedef {self._get_status_mask_type()} ble_decode_mask_t;")
+            for msg_name in self.client_messages:
+                mask_name = f"BLE_DECODE_MASK_{msg_name.upper()}"
+                lines.append(f"#if {self.get_enable_macro(msg_name)}")
+                lines.append(f"#define {mask_name:<35} ((ble_decode_mask_t)1 << {self.get_decode_index_name(msg_name)})")
+                lines.append("#endif")
+            lines.append("ble_decode_mask_t ble_decode_stale_mask(uint32_t time_ms);")
+            lines.append("ble_decode_mask_t ble_decode_unread_mask(void);")
             lines.append("")
 
+        if self.handshake:
+            lines.extend(self._generate_handshake_declarations())
+
+        lines.extend(self._generate_stats_declarations())
+
         lines.append("#ifdef __cplusplus")
         lines.append("}")
         lines.append("#endif")
@@ -345,6 +1383,8 @@ class CGenerator:
         lines.append(" */")
         lines.append("")
         lines.append('#include "ble_protocol.h"')
+        if self.zero_copy:
+            lines.append('#include <stddef.h>')
         lines.append('#include <string.h>')
         lines.append("")
 
@@ -358,6 +1398,7 @@ class CGenerator:
         lines.append("")
 
         for msg_name, msg_info in self.server_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
             lines.append(f"typedef struct {{")
             for field_name, field_value in msg_info['fields'].items():
                 field_type = self.get_field_type_name(field_value)
@@ -368,6 +1409,7 @@ class CGenerator:
                     c_type = self.get_c_type(field_type, for_struct_decl=True)
                     lines.append(f"    {c_type} {field_name};")
             lines.append(f"}} __attribute__((packed)) {msg_name}_t;")
+            lines.append("#endif")
             lines.append("")
 
         # Private message structures (client messages)
@@ -377,6 +1419,7 @@ class CGenerator:
         lines.append("")
 
         for msg_name, msg_info in self.client_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
             lines.append(f"typedef struct {{")
             for field_name, field_value in msg_info['fields'].items():
                 field_type = self.get_field_type_name(field_value)
@@ -387,6 +1430,7 @@ class CGenerator:
                     c_type = self.get_c_type(field_type, for_struct_decl=True)
                     lines.append(f"    {c_type} {field_name};")
             lines.append(f"}} __attribute__((packed)) {msg_name}_t;")
+            lines.append("#endif")
             lines.append("")
 
         # Private frame buffers
@@ -397,36 +1441,105 @@ class CGenerator:
 
         # Server encode buffers
         for msg_name, msg_info in self.server_messages.items():
-            msg_size = self.calculate_struct_size(msg_info['fields'])
-            buffer_size = 3 + msg_size + 1  # Header + payload + checksum
+            msg_size = self.get_payload_size(msg_name)
+            buffer_size = self._get_first_header_size() + msg_size + 1  # Header + payload + checksum
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
             lines.append(f"static uint8_t {msg_name}_encode_buffer[{buffer_size}];")
             lines.append(f"static uint16_t {msg_name}_encode_len;")
+            if self.has_header_extension(msg_info):
+                lines.append(f"static uint8_t {msg_name}_encode_seq;")
+            lines.append("#endif")
         lines.append("")
 
-        # Shared decode state for multi-frame reassembly
-        max_client_size = max(self.calculate_struct_size(msg['fields']) for msg in self.client_messages.values())
-        lines.append(f"static uint8_t decode_payload_buffer[{max_client_size}];")
-        lines.append(f"static uint8_t decode_expected_size;")
-        lines.append(f"static uint8_t decode_bytes_received;")
-        lines.append(f"static uint8_t decode_msg_id;")
-        lines.append(f"static bool decode_valid;")
+        # Transmit queue state, indexed by BLE_TX_INDEX_* over enabled server messages
+        lines.append("#if BLE_TX_MESSAGE_COUNT == 0")
+        lines.append('#error "At least one server message must be enabled"')
+        lines.append("#endif")
+        lines.append("static uint8_t * const tx_buffers[BLE_TX_MESSAGE_COUNT] = {")
+        lines.extend(self._get_guarded_initializers(self.server_messages, lambda n, i: f"{n}_encode_buffer"))
+        lines.append("};")
+        lines.append("static uint16_t * const tx_lengths[BLE_TX_MESSAGE_COUNT] = {")
+        lines.extend(self._get_guarded_initializers(self.server_messages, lambda n, i: f"&{n}_encode_len"))
+        lines.append("};")
+        lines.append("static const uint8_t tx_priority[BLE_TX_MESSAGE_COUNT] = {")
+        lines.extend(self._get_guarded_initializers(self.server_messages, lambda n, i: str(self.get_tx_priority(i))))
+        lines.append("};")
+        lines.append("static bool tx_pending[BLE_TX_MESSAGE_COUNT];")
+        lines.append("static uint16_t tx_offset[BLE_TX_MESSAGE_COUNT];")
         lines.append("")
+        if self.handshake:
+            lines.append("// Negotiated mode of the current connection (baseline until a handshake)")
+            lines.append("static ble_link_t ble_link = {")
+            lines.append("    .compatible = true,")
+            lines.append("    .mtu = BLE_DEFAULT_MTU,")
+            lines.append("    .peer_max_reassembly = 255,")
+            lines.append("};")
+            lines.append("")
 
-        # Per-message decoded buffers (for storing complete messages)
-        for msg_name, msg_info in self.client_messages.items():
-            msg_size = self.calculate_struct_size(msg_info['fields'])
-            lines.append(f"static {msg_name}_t {msg_name}_decoded;")
-            lines.append(f"static bool {msg_name}_available;")
-            lines.append(f"static uint32_t {msg_name}_timestamp_ms;")
-            lines.append(f"static bool {msg_name}_unread;")
+        # Reassembly slots for multi-frame messages
+        # Reassembly slots hold the largest enabled client message
+        by_size = sorted(self.client_messages, key=self.get_message_size, reverse=True)
+        for position, msg_name in enumerate(by_size):
+            directive = '#if' if position == 0 else '#elif'
+            lines.append(f"{directive} {self.get_enable_macro(msg_name)}")
+            lines.append(f"#define BLE_DECODE_MAX_PAYLOAD {self.get_message_size(msg_name)}")
+        lines.append("#else")
+        lines.append('#error "At least one client message must be enabled"')
+        lines.append("#endif")
+        lines.append("")
+        if self.zero_copy:
+            # Receive pool: slots reassemble, then hold decoded payloads in place
+            lines.append("typedef struct ble_decode_slot {")
+        else:
+            lines.append("typedef struct {")
+        lines.append("    bool active;")
+        lines.append("    uint8_t stream_id;")
+        lines.append("    uint8_t msg_id;")
+        lines.append("    uint8_t expected_size;")
+        lines.append("    uint8_t bytes_received;")
+        lines.append("    uint32_t last_frame_ms;")
+        if self.zero_copy:
+            lines.append("    bool held;      // Latest payload of its message")
+            lines.append("    uint8_t refs;   // Application pins (acquire/release)")
+        lines.append("    uint8_t payload[BLE_DECODE_MAX_PAYLOAD];")
+        lines.append("} ble_reassembly_slot_t;")
+        lines.append("")
+        lines.append(f"static ble_reassembly_slot_t decode_slots[{self._get_decode_slot_count_name()}];")
+        lines.append("")
+
+        if self.zero_copy:
+            # Latest payload per message, indexed by BLE_DECODE_INDEX_*
+            lines.append("static ble_reassembly_slot_t *decode_current[BLE_DECODE_MESSAGE_COUNT];")
+        else:
+            # Per-message decoded buffers (for storing complete messages)
+            for msg_name, msg_info in self.client_messages.items():
+                lines.append(f"#if {self.get_enable_macro(msg_name)}")
+                lines.append(f"static {msg_name}_t {msg_name}_decoded;")
+                lines.append("#endif")
+            lines.append("static const void * const decode_storage[BLE_DECODE_MESSAGE_COUNT] = {")
+            lines.extend(self._get_guarded_initializers(self.client_messages, lambda n, i: f"&{n}_decoded"))
+            lines.append("};")
+        lines.append("")
+
+        # Message status arrays, indexed by BLE_DECODE_INDEX_*
+        lines.append("static bool decode_available[BLE_DECODE_MESSAGE_COUNT];")
+        lines.append("static bool decode_unread[BLE_DECODE_MESSAGE_COUNT];")
+        lines.append("static uint32_t decode_timestamp_ms[BLE_DECODE_MESSAGE_COUNT];")
+        lines.append("static volatile uint32_t decode_seq[BLE_DECODE_MESSAGE_COUNT];")
+        lines.append("static const uint32_t decode_max_age_ms[BLE_DECODE_MESSAGE_COUNT] = {")
+        lines.extend(self._get_guarded_initializers(self.client_messages, lambda n, i: str(i.get('maxAge', 1000))))
+        lines.append("};")
         lines.append("")
 
+        lines.extend(self._generate_stats_state())
+
         # Protocol helper functions
         lines.append("// ============================================================================")
         lines.append("// Protocol layer helper functions")
         lines.append("// ============================================================================")
         lines.append("")
         lines.extend(self._generate_checksum_function())
+        lines.extend(self._generate_fragment_function())
 
         # Server message encoding functions
         lines.append("// ============================================================================")
@@ -435,23 +1548,35 @@ class CGenerator:
         lines.append("")
 
         for msg_name, msg_info in self.server_messages.items():
-            msg_size = self.calculate_struct_size(msg_info['fields'])
+            tx_index = self.get_tx_index_name(msg_name)
+            extended = self.has_header_extension(msg_info)
+            fields_start = "BLE_FIRST_HEADER_SIZE + BLE_HEADER_EXTENSION_SIZE" if extended else "BLE_FIRST_HEADER_SIZE"
+            payload_layout = "[Seq][SendTimeMs:2][Payload]" if extended else "[Payload]"
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
 
             # Begin encode function
             lines.append(f"// Begin encoding {msg_name} message")
             lines.append(f"void ble_encode_{msg_name}_begin(void) {{")
-            lines.append(f"    const uint16_t payload_size = sizeof({msg_name}_t);")
+            if extended:
+                lines.append(f"    const uint16_t payload_size = BLE_HEADER_EXTENSION_SIZE + sizeof({msg_name}_t);")
+            else:
+                lines.append(f"    const uint16_t payload_size = sizeof({msg_name}_t);")
             lines.append(f"    ")
-            lines.append(f"    // Frame: [0xAA][Length][MsgID][Payload][Checksum]")
+            if self.streams_enabled:
+                lines.append(f"    // Frame: [0xAA][Length][MsgID][StreamID]{payload_layout}[Checksum]")
+            else:
+                lines.append(f"    // Frame: [0xAA][Length][MsgID]{payload_layout}[Checksum]")
             lines.append(f"    {msg_name}_encode_buffer[0] = BLE_SYNC_FIRST;")
             lines.append(f"    {msg_name}_encode_buffer[1] = payload_size;")
             lines.append(f"    {msg_name}_encode_buffer[2] = {msg_info['id']};")
+            if self.streams_enabled:
+                lines.append(f"    {msg_name}_encode_buffer[3] = {self.get_stream_id(msg_info)};")
             lines.append(f"    ")
             lines.append(f"    // Zero out payload area")
-            lines.append(f"    memset(&{msg_name}_encode_buffer[3], 0, payload_size);")
+            lines.append(f"    memset(&{msg_name}_encode_buffer[BLE_FIRST_HEADER_SIZE], 0, payload_size);")
             lines.append(f"    ")
             lines.append(f"    // Frame length includes header, payload, and checksum")
-            lines.append(f"    {msg_name}_encode_len = 3 + payload_size + 1;")
+            lines.append(f"    {msg_name}_encode_len = BLE_FIRST_HEADER_SIZE + payload_size + 1;")
             lines.append(f"}}")
             lines.append("")
 
@@ -463,7 +1588,7 @@ class CGenerator:
                 if self.is_variable_size(field_type):
                     # String setter
                     lines.append(f"void ble_encode_{msg_name}_set_{field_name}(const uint8_t* value) {{")
-                    lines.append(f"    {msg_name}_t *msg = ({msg_name}_t*)&{msg_name}_encode_buffer[3];")
+                    lines.append(f"    {msg_name}_t *msg = ({msg_name}_t*)&{msg_name}_encode_buffer[{fields_start}];")
                     lines.append(f"    if (value != NULL) {{")
                     lines.append(f"        strncpy(msg->{field_name}, (const char*)value, sizeof(msg->{field_name}) - 1);")
                     lines.append(f"        msg->{field_name}[sizeof(msg->{field_name}) - 1] = '\\0';")
@@ -475,7 +1600,7 @@ class CGenerator:
                     # Numeric setter
                     c_type = self.get_c_type(field_type)
                     lines.append(f"void ble_encode_{msg_name}_set_{field_name}({c_type} value) {{")
-                    lines.append(f"    {msg_name}_t *msg = ({msg_name}_t*)&{msg_name}_encode_buffer[3];")
+                    lines.append(f"    {msg_name}_t *msg = ({msg_name}_t*)&{msg_name}_encode_buffer[{fields_start}];")
                     lines.append(f"    msg->{field_name} = value;")
                     lines.append(f"}}")
                 lines.append("")
@@ -483,9 +1608,16 @@ class CGenerator:
             # Get frame function
             lines.append(f"// Get encoded {msg_name} frame")
             lines.append(f"ble_frame_t ble_encode_{msg_name}_get_frame(void) {{")
+            if extended:
+                lines.append(f"    // Stamp the header extension: rolling sequence number, send time mod 2^16")
+                lines.append(f"    uint16_t send_time_ms = (uint16_t)BLE_SEND_TIME_MS();")
+                lines.append(f"    {msg_name}_encode_buffer[BLE_FIRST_HEADER_SIZE] = {msg_name}_encode_seq++;")
+                lines.append(f"    {msg_name}_encode_buffer[BLE_FIRST_HEADER_SIZE + 1] = (uint8_t)send_time_ms;")
+                lines.append(f"    {msg_name}_encode_buffer[BLE_FIRST_HEADER_SIZE + 2] = (uint8_t)(send_time_ms >> 8);")
+                lines.append(f"    ")
             lines.append(f"    // Calculate checksum before returning frame")
             lines.append(f"    uint8_t payload_size = {msg_name}_encode_buffer[1];")
-            lines.append(f"    {msg_name}_encode_buffer[3 + payload_size] = ble_calculate_checksum(&{msg_name}_encode_buffer[3], payload_size);")
+            lines.append(f"    {msg_name}_encode_buffer[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&{msg_name}_encode_buffer[BLE_FIRST_HEADER_SIZE], payload_size);")
             lines.append(f"    ")
             lines.append(f"    ble_frame_t frame = {{")
             lines.append(f"        .data = {msg_name}_encode_buffer,")
@@ -495,6 +1627,26 @@ class CGenerator:
             lines.append(f"}}")
             lines.append("")
 
+            # Enqueue function
+            lines.append(f"// Queue encoded {msg_name} frame for transmission")
+            lines.append(f"bool ble_encode_{msg_name}_enqueue(void) {{")
+            if self.handshake and msg_name != self.handshake[1]:
+                lines.append(f"    if ({msg_name}_encode_buffer[1] > ble_link.peer_max_reassembly) return false;  // Peer cannot reassemble it")
+            lines.append(f"    ble_encode_{msg_name}_get_frame();")
+            lines.append(f"    tx_offset[{tx_index}] = 0;")
+            lines.append(f"    tx_pending[{tx_index}] = true;")
+            lines.append(f"    return true;")
+            lines.append(f"}}")
+            lines.append("")
+            lines.append(f"// Check if the {msg_name} frame is still queued or being sent")
+            lines.append(f"bool ble_encode_{msg_name}_is_queued(void) {{")
+            lines.append(f"    return tx_pending[{tx_index}];")
+            lines.append(f"}}")
+            lines.append("#endif")
+            lines.append("")
+
+        lines.extend(self._generate_tx_queue_functions())
+
         # Client message decoding functions
         lines.append("// ============================================================================")
         lines.append("// Client message decoding functions (messages server receives)")
@@ -503,30 +1655,15 @@ class CGenerator:
 
         # Protocol layer decode functions
         lines.extend(self._generate_decode_store_message_function())
+        lines.extend(self._generate_reassembly_slot_functions())
         lines.extend(self._generate_decode_frame_function())
 
         # Field getters for each message type
-        for msg_name, msg_info in self.client_messages.items():
-            for field_name, field_value in msg_info['fields'].items():
-                field_type = self.get_field_type_name(field_value)
-                lines.append(f"// Get {field_name} from {msg_name} message")
-
-                if self.is_variable_size(field_type):
-                    # String getter
-                    lines.append(f"const uint8_t* ble_decode_{msg_name}_get_{field_name}(void) {{")
-                    lines.append(f"    if (!{msg_name}_available) return (const uint8_t*)\"\";")
-                    lines.append(f"    {msg_name}_unread = false;")
-                    lines.append(f"    return (const uint8_t*){msg_name}_decoded.{field_name};")
-                    lines.append(f"}}")
-                else:
-                    # Numeric getter
-                    c_type = self.get_c_type(field_type)
-                    lines.append(f"{c_type} ble_decode_{msg_name}_get_{field_name}(void) {{")
-                    lines.append(f"    if (!{msg_name}_available) return 0;")
-                    lines.append(f"    {msg_name}_unread = false;")
-                    lines.append(f"    return {msg_name}_decoded.{field_name};")
-                    lines.append(f"}}")
-                lines.append("")
+        if self.zero_copy:
+            lines.extend(self._generate_zero_copy_getters())
+        else:
+            lines.extend(self._generate_field_getters())
+        lines.extend(self._generate_snapshot_functions())
 
         # Time and status functions
         lines.append("// ============================================================================")
@@ -536,41 +1673,267 @@ class CGenerator:
 
         for msg_name, msg_info in self.client_messages.items():
             max_age = msg_info.get('maxAge', 1000)
+            index_name = self.get_decode_index_name(msg_name)
 
             # Check is unread
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
             lines.append(f"// Check if {msg_name} message is unread")
             lines.append(f"bool ble_decode_{msg_name}_check_is_unread(void) {{")
-            lines.append(f"    return {msg_name}_available && {msg_name}_unread;")
+            lines.append(f"    return decode_available[{index_name}] && decode_unread[{index_name}];")
             lines.append(f"}}")
             lines.append("")
 
             # Check data is stale
             lines.append(f"// Check if {msg_name} data is stale (max age: {max_age}ms)")
             lines.append(f"bool ble_decode_{msg_name}_check_data_is_stale(uint32_t time_ms) {{")
-            lines.append(f"    if (!{msg_name}_available) return true;")
-            lines.append(f"    uint32_t age_ms = time_ms - {msg_name}_timestamp_ms;")
+            lines.append(f"    if (!decode_available[{index_name}]) return true;")
+            lines.append(f"    uint32_t age_ms = time_ms - decode_timestamp_ms[{index_name}];")
             lines.append(f"    return age_ms > {max_age};")
             lines.append(f"}}")
+            lines.append("#endif")
             lines.append("")
 
+        if self._has_status_masks():
+            lines.extend(self._generate_status_mask_functions())
+
+        if self.handshake:
+            lines.extend(self._generate_handshake_functions())
+
+        lines.extend(self._generate_stats_functions())
+
         return '\n'.join(lines)
 
+    # ========================================================================
+    # Micro-benchmark
+    # ========================================================================
+
+    # MTU sizes for the reassembly benchmarks (only messages whose frame is
+    # larger than the MTU are fragmented)
+    BENCHMARK_MTUS = (8, 20, 64, 128, 244)
 
-def generate_c_code(protocol_schema_path: str, messages_schema_path: str, output_dir: str = '.'):
+    def generate_benchmark(self) -> str:
+        """Generate a standalone C micro-benchmark for the generated codec
+
+        The benchmark includes ble_protocol.c directly so it can time private
+        helpers (checksum, reassembly) without widening the public API. It
+        prints one JSON object with ns per operation for every benchmark.
+        """
+        lines = []
+        lines.append("/**")
+        lines.append(f" * BLE Telemetry Protocol v{self.protocol['version']} - Micro-benchmark")
+        lines.append(" * Auto-generated from schema.json")
+        lines.append(" * DO NOT EDIT MANUALLY")
+        lines.append(" *")
+        lines.append(" * Build: cc -std=c99 -O2 -o ble_benchmark ble_benchmark.c")
+        lines.append(" * Output: {\"benchmarks\": [{\"name\", \"ns_per_op\", \"bytes_per_op\"}, ...]}")
+        lines.append(" */")
+        lines.append("")
+        lines.append("#define _POSIX_C_SOURCE 199309L")
+        lines.append("")
+        lines.append('#include "ble_protocol.c"')
+        lines.append("#include <stdio.h>")
+        lines.append("#include <time.h>")
+        lines.append("")
+        lines.append("#define BENCH_TARGET_NS 20000000ULL  // Time per measurement")
+        lines.append("#define BENCH_REPEATS 5                // Best of N measurements")
+        lines.append("#define BENCH_MAX_FRAGMENTS 256")
+        lines.append("")
+        lines.append("// Keep the optimizer from hoisting work out of the timed loops")
+        lines.append("#define BENCH_CLOBBER() __asm__ __volatile__(\"\" ::: \"memory\")")
+        lines.append("")
+        lines.append("static volatile uint32_t bench_sink;")
+        lines.append("static int bench_count;")
+        lines.append("")
+        lines.append("typedef void (*bench_fn_t)(uint32_t iterations);")
+        lines.append("")
+        lines.append("static uint64_t bench_now_ns(void) {")
+        lines.append("    struct timespec ts;")
+        lines.append("    clock_gettime(CLOCK_MONOTONIC, &ts);")
+        lines.append("    return (uint64_t)ts.tv_sec * 1000000000ULL + (uint64_t)ts.tv_nsec;")
+        lines.append("}")
+        lines.append("")
+        lines.append("// Calibrate an iteration count, then report the best of BENCH_REPEATS runs")
+        lines.append("static void bench_run(const char *name, bench_fn_t fn, uint32_t bytes_per_op) {")
+        lines.append("    uint32_t iterations = 1;")
+        lines.append("    uint64_t elapsed;")
+        lines.append("    for (;;) {")
+        lines.append("        uint64_t start = bench_now_ns();")
+        lines.append("        fn(iterations);")
+        lines.append("        elapsed = bench_now_ns() - start;")
+        lines.append("        if (elapsed >= BENCH_TARGET_NS / 16 || iterations >= (1u << 30)) break;")
+        lines.append("        iterations *= 2;")
+        lines.append("    }")
+        lines.append("    if (elapsed > 0 && elapsed < BENCH_TARGET_NS) {")
+        lines.append("        double scaled = (double)iterations * BENCH_TARGET_NS / elapsed;")
+        lines.append("        iterations = scaled > (double)(1u << 30) ? (1u << 30) : (uint32_t)scaled;")
+        lines.append("    }")
+        lines.append("")
+        lines.append("    double best_ns = -1.0;")
+        lines.append("    for (int r = 0; r < BENCH_REPEATS; r++) {")
+        lines.append("        uint64_t start = bench_now_ns();")
+        lines.append("        fn(iterations);")
+        lines.append("        double ns = (double)(bench_now_ns() - start) / iterations;")
+        lines.append("        if (best_ns < 0 || ns < best_ns) best_ns = ns;")
+        lines.append("    }")
+        lines.append("    printf(\"%s    {\\\"name\\\": \\\"%s\\\", \\\"ns_per_op\\\": %.3f, \\\"bytes_per_op\\\": %u}\",")
+        lines.append("           bench_count++ ? \",\\n\" : \"\", name, best_ns, (unsigned)bytes_per_op);")
+        lines.append("}")
+        lines.append("")
+
+        # Client frames are built by hand since the server side has no client encoder
+        lines.append("// Build a valid client frame with a deterministic payload")
+        lines.append("static uint16_t bench_build_frame(uint8_t *out, uint8_t msg_id, uint8_t stream_id, uint8_t payload_size) {")
+        lines.append("    out[0] = BLE_SYNC_FIRST;")
+        lines.append("    out[1] = payload_size;")
+        lines.append("    out[2] = msg_id;")
+        if self.streams_enabled:
+            lines.append("    out[3] = stream_id;")
+        else:
+            lines.append("    (void)stream_id;")
+        lines.append("    for (uint16_t i = 0; i < payload_size; i++) {")
+        lines.append("        out[BLE_FIRST_HEADER_SIZE + i] = (uint8_t)(i * 7 + 1);")
+        lines.append("    }")
+        lines.append("    out[BLE_FIRST_HEADER_SIZE + payload_size] = ble_calculate_checksum(&out[BLE_FIRST_HEADER_SIZE], payload_size);")
+        lines.append("    return BLE_FIRST_HEADER_SIZE + payload_size + 1;")
+        lines.append("}")
+        lines.append("")
+
+        lines.append("// ============================================================================")
+        lines.append("// Server message encoding")
+        lines.append("// ============================================================================")
+        lines.append("")
+        for msg_name, msg_info in self.server_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"static void bench_encode_{msg_name}(uint32_t iterations) {{")
+            lines.append("    for (uint32_t i = 0; i < iterations; i++) {")
+            lines.append(f"        ble_encode_{msg_name}_begin();")
+            for k, (field_name, field_value) in enumerate(msg_info['fields'].items()):
+                field_type = self.get_field_type_name(field_value)
+                if self.is_variable_size(field_type):
+                    lines.append(f"        ble_encode_{msg_name}_set_{field_name}((const uint8_t*)\"benchmark\");")
+                else:
+                    c_type = self.get_c_type(field_type)
+                    lines.append(f"        ble_encode_{msg_name}_set_{field_name}(({c_type})(i + {k}));")
+            lines.append(f"        ble_frame_t frame = ble_encode_{msg_name}_get_frame();")
+            lines.append("        bench_sink += frame.data[frame.length - 1];")
+            lines.append("        BENCH_CLOBBER();")
+            lines.append("    }")
+            lines.append("}")
+            lines.append("")
+            lines.append(f"static void bench_checksum_{msg_name}(uint32_t iterations) {{")
+            lines.append(f"    ble_encode_{msg_name}_begin();")
+            lines.append("    for (uint32_t i = 0; i < iterations; i++) {")
+            lines.append(f"        bench_sink += ble_calculate_checksum(&{msg_name}_encode_buffer[BLE_FIRST_HEADER_SIZE], "
+                         f"{self.get_payload_size(msg_name)});")
+            lines.append("        BENCH_CLOBBER();")
+            lines.append("    }")
+            lines.append("}")
+            lines.append("#endif")
+            lines.append("")
+
+        lines.append("// ============================================================================")
+        lines.append("// Client message decoding and reassembly")
+        lines.append("// ============================================================================")
+        lines.append("")
+        for msg_name, msg_info in self.client_messages.items():
+            frame_len = self._get_first_header_size() + self.get_message_size(msg_name) + 1
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"static uint8_t bench_{msg_name}_frame[{frame_len}];")
+            lines.append(f"static uint16_t bench_{msg_name}_frame_len;")
+            lines.append("")
+            lines.append(f"static void bench_decode_{msg_name}(uint32_t iterations) {{")
+            lines.append("    for (uint32_t i = 0; i < iterations; i++) {")
+            lines.append(f"        bench_sink += ble_decode_frame(bench_{msg_name}_frame, bench_{msg_name}_frame_len, i);")
+            lines.append("        BENCH_CLOBBER();")
+            lines.append("    }")
+            lines.append("}")
+            lines.append("")
+            lines.append(f"static void bench_snapshot_{msg_name}(uint32_t iterations) {{")
+            lines.append(f"    ble_{msg_name}_snapshot_t snapshot;")
+            lines.append(f"    ble_decode_frame(bench_{msg_name}_frame, bench_{msg_name}_frame_len, 0);")
+            lines.append("    for (uint32_t i = 0; i < iterations; i++) {")
+            lines.append(f"        bench_sink += ble_decode_{msg_name}_read_snapshot(&snapshot);")
+            lines.append("        BENCH_CLOBBER();")
+            lines.append("    }")
+            lines.append("}")
+            lines.append("")
+            for mtu in self.BENCHMARK_MTUS:
+                if frame_len <= mtu:
+                    continue
+                lines.append(f"static void bench_reassemble_{msg_name}_mtu{mtu}(uint32_t iterations) {{")
+                lines.append("    static uint8_t fragments[BENCH_MAX_FRAGMENTS][" + str(mtu) + "];")
+                lines.append("    static uint16_t lengths[BENCH_MAX_FRAGMENTS];")
+                lines.append("    static uint16_t count;")
+                lines.append("    if (count == 0) {")
+                lines.append(f"        ble_frame_t frame = {{ .data = bench_{msg_name}_frame, .length = bench_{msg_name}_frame_len }};")
+                lines.append("        uint16_t offset = 0;")
+                lines.append("        while (count < BENCH_MAX_FRAGMENTS &&")
+                lines.append(f"               (lengths[count] = ble_encode_fragment(frame, &offset, fragments[count], {mtu})) > 0) {{")
+                lines.append("            count++;")
+                lines.append("        }")
+                lines.append("    }")
+                lines.append("    for (uint32_t i = 0; i < iterations; i++) {")
+                lines.append("        for (uint16_t f = 0; f < count; f++) {")
+                lines.append("            bench_sink += ble_decode_frame(fragments[f], lengths[f], i);")
+                lines.append("        }")
+                lines.append("        BENCH_CLOBBER();")
+                lines.append("    }")
+                lines.append("}")
+                lines.append("")
+            lines.append("#endif")
+            lines.append("")
+
+        lines.append("int main(void) {")
+        for msg_name, msg_info in self.client_messages.items():
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"    bench_{msg_name}_frame_len = bench_build_frame(bench_{msg_name}_frame, {msg_info['id']}, "
+                         f"{self.get_stream_id(msg_info)}, sizeof({msg_name}_t));")
+            lines.append("#endif")
+        lines.append("")
+        lines.append("    printf(\"{\\\"benchmarks\\\": [\\n\");")
+        for msg_name, msg_info in self.server_messages.items():
+            frame_len = self._get_first_header_size() + self.get_payload_size(msg_name) + 1
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"    bench_run(\"encode/{msg_name}\", bench_encode_{msg_name}, {frame_len});")
+            lines.append(f"    bench_run(\"checksum/{msg_name}\", bench_checksum_{msg_name}, {self.get_payload_size(msg_name)});")
+            lines.append("#endif")
+        for msg_name, msg_info in self.client_messages.items():
+            frame_len = self._get_first_header_size() + self.get_message_size(msg_name) + 1
+            lines.append(f"#if {self.get_enable_macro(msg_name)}")
+            lines.append(f"    bench_run(\"decode/{msg_name}\", bench_decode_{msg_name}, {frame_len});")
+            lines.append(f"    bench_run(\"snapshot/{msg_name}\", bench_snapshot_{msg_name}, sizeof({msg_name}_t));")
+            for mtu in self.BENCHMARK_MTUS:
+                if frame_len > mtu:
+                    lines.append(f"    bench_run(\"reassemble/{msg_name}/mtu{mtu}\", bench_reassemble_{msg_name}_mtu{mtu}, {frame_len});")
+            lines.append("#endif")
+        lines.append("    printf(\"\\n]}\\n\");")
+        lines.append("    return 0;")
+        lines.append("}")
+        lines.append("")
+
+        return '\n'.join(lines)
+
+
+def generate_c_code(protocol_schema_path: str, messages_schema_path: str, output_dir: str = '.',
+                    benchmark: bool = False, enabled_messages: Optional[Iterable[str]] = None):
     """Main function to generate C code
 
     Args:
         protocol_schema_path: Path to protocol.json (frame format, types)
         messages_schema_path: Path to messages.json (message definitions)
         output_dir: Output directory for generated files
+        benchmark: Also generate the ble_benchmark.c micro-benchmark
+        enabled_messages: Only generate these messages (default: all)
     """
     with open(protocol_schema_path, 'r') as f:
         protocol_schema = json.load(f)
 
     with open(messages_schema_path, 'r') as f:
-        messages_schema = json.load(f)
+        all_messages_schema = json.load(f)
+    messages_schema = select_messages(all_messages_schema, enabled_messages)
 
-    generator = CGenerator(protocol_schema, messages_schema)
+    generator = CGenerator(protocol_schema, messages_schema,
+                           schema_hash=schema_hash32(protocol_schema, all_messages_schema))
 
     # Generate header
     header_content = generator.generate_header()
@@ -586,6 +1949,13 @@ def generate_c_code(protocol_schema_path: str, messages_schema_path: str, output
         f.write(impl_content)
     print(f"Generated: {impl_path}")
 
+    # Generate micro-benchmark
+    if benchmark:
+        benchmark_path = f"{output_dir}/ble_benchmark.c"
+        with open(benchmark_path, 'w') as f:
+            f.write(generator.generate_benchmark())
+        print(f"Generated: {benchmark_path}")
+
 
 if __name__ == '__main__':
     import sys
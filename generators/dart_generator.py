@@ -7,26 +7,64 @@ Frame format:
 - First frame: [0xAA][Length][MsgID][Payload...]
 - Continuation: [Payload...]
 - Final frame ends with: [Checksum] (covers entire payload)
+
+With frame.stream enabled, first frames carry a [StreamID] after MsgID and
+continuation frames become [0x55][StreamID][Payload...], so messages on
+different streams can be reassembled concurrently.
 """
 
 import json
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from handshake import (find_handshake, get_default_mtu, get_features, protocol_version16,
+                       schema_hash32)
+from message_selection import select_messages
 
 
 class DartGenerator:
-    def __init__(self, protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any]):
+    # Handshake features this runtime implements when sending / accepts when receiving
+    SEND_FEATURES = ()
+    RECEIVE_FEATURES = ('packed_frames',)
+
+    def __init__(self, protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any],
+                 schema_hash: Optional[int] = None):
         """
         Initialize generator with separate protocol and message schemas
 
         Args:
             protocol_schema: Contains protocol, frame, and types definitions
             messages_schema: Contains message definitions (server and client)
+            schema_hash: Handshake schema hash (default: hash of the given schemas;
+                pass the hash of the unselected schema when generating a subset)
         """
         self.protocol = protocol_schema['protocol']
         self.frame = protocol_schema['frame']
         self.types = protocol_schema['types']
         self.server_messages = messages_schema['messages']['server']
         self.client_messages = messages_schema['messages']['client']
+        self.stream = self.frame.get('stream', {})
+        self.streams_enabled = self.stream.get('enabled', False)
+        self.stats = protocol_schema.get('stats', {})
+        self.header_extension = protocol_schema.get('header_extension', {})
+        self.handshake = find_handshake(messages_schema)
+        self.features = get_features(protocol_schema)
+        self.default_mtu = get_default_mtu(protocol_schema)
+        self.schema_hash = schema_hash32(protocol_schema, messages_schema) if schema_hash is None else schema_hash
+        for msg_name, msg_info in self.client_messages.items():
+            if self.has_header_extension(msg_info):
+                raise ValueError(f"{msg_name}: header_extension is only supported on server messages")
+
+        # Per-message values needed by several sections are computed once,
+        # keeping generation linear in schema size
+        self._variable_types = frozenset(
+            name for name, info in self.types.items() if info.get('size') == 'variable'
+        )
+        self._message_sizes = {
+            msg_name: self.calculate_struct_size(msg_info['fields'])
+            for messages in (self.server_messages, self.client_messages)
+            for msg_name, msg_info in messages.items()
+        }
+        self._camel_case_names: Dict[str, str] = {}
 
     # ========================================================================
     # Protocol Layer - Frame format and encoding/decoding logic
@@ -38,6 +76,14 @@ class DartGenerator:
         lines.append("// Protocol constants")
         first_sync = next(f['value'] for f in self.frame['first']['fields'] if f['name'] == 'sync')
         lines.append(f"const int bleSyncFirst = {first_sync};")
+        if self.streams_enabled:
+            lines.append(f"const int bleSyncContinuation = {self.stream.get('continuation_sync', '0x55')};")
+        lines.append(f"const int bleFirstHeaderSize = {self._get_first_header_size()};")
+        lines.append(f"const int bleContinuationHeaderSize = {self._get_continuation_header_size()};")
+        lines.append("")
+        lines.append("// Multi-frame reassembly")
+        lines.append(f"const int bleReassemblySlots = {self._get_reassembly_slot_count()};")
+        lines.append(f"const int bleReassemblyTimeoutMs = {self.stream.get('reassembly_timeout_ms', 1000)};")
         lines.append("")
         return lines
 
@@ -52,6 +98,155 @@ class DartGenerator:
         lines.append("  }")
         lines.append("  return sum & 0xFF;")
         lines.append("}")
+        lines.append("")
+        lines.append("// Sum-mod-256 checksum of bytes already written into a ByteData")
+        lines.append("int _calculateChecksumAt(ByteData data, int start, int length) {")
+        lines.append("  int sum = 0;")
+        lines.append("  for (int i = start; i < start + length; i++) {")
+        lines.append("    sum += data.getUint8(i);")
+        lines.append("  }")
+        lines.append("  return sum & 0xFF;")
+        lines.append("}")
+        return lines
+
+    def _get_first_header_size(self) -> int:
+        """Bytes before the payload in a first frame ([Sync][Length][MsgID][StreamID?])"""
+        return 4 if self.streams_enabled else 3
+
+    def _get_continuation_header_size(self) -> int:
+        """Bytes before the payload in a continuation frame ([Sync][StreamID] or none)"""
+        return 2 if self.streams_enabled else 0
+
+    def _get_reassembly_slot_count(self) -> int:
+        """Concurrent reassembly slots (one unless stream IDs are on the wire)"""
+        return self.stream.get('reassembly_slots', 4) if self.streams_enabled else 1
+
+    def _get_frame_format_comment(self) -> List[str]:
+        """Describe the wire frame layout for generated file headers"""
+        if self.streams_enabled:
+            continuation_sync = self.stream.get('continuation_sync', '0x55')
+            return [
+                " * - First frame: [0xAA][Length][MsgID][StreamID][Payload...]",
+                f" * - Continuation: [{continuation_sync}][StreamID][Payload...]",
+                " * - Final frame ends with: [Checksum]",
+            ]
+        return [
+            " * - First frame: [0xAA][Length][MsgID][Payload...]",
+            " * - Continuation: [Payload...]",
+            " * - Final frame ends with: [Checksum]",
+        ]
+
+    def get_stream_id(self, msg_info: Dict) -> str:
+        """Get the stream ID a message is sent on (defaults to its message ID)"""
+        return str(msg_info.get('stream', msg_info['id']))
+
+    def _generate_reassembly_slot_class(self) -> List[str]:
+        """Generate the per-stream reassembly slot class"""
+        lines = []
+        lines.append("/// Reassembly state for one in-flight multi-frame message")
+        lines.append("class _BleReassemblySlot {")
+        lines.append("  final Uint8List payload;")
+        lines.append("  bool active = false;")
+        lines.append("  int streamId = 0;")
+        lines.append("  int msgId = 0;")
+        lines.append("  int expectedSize = 0;")
+        lines.append("  int bytesReceived = 0;")
+        lines.append("  int lastFrameMs = 0;")
+        lines.append("")
+        lines.append("  _BleReassemblySlot(int maxPayload) : payload = Uint8List(maxPayload);")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _generate_fragment_function(self) -> List[str]:
+        """Generate helper that splits an encoded frame into MTU-sized fragments"""
+        lines = []
+        lines.append("/// Split an encoded frame into MTU-sized fragments")
+        lines.append("List<Uint8List> bleFragmentFrame(Uint8List frame, int mtu) {")
+        lines.append("  final fragments = <Uint8List>[];")
+        lines.append("  int offset = 0;")
+        lines.append("  while (offset < frame.length) {")
+        if self.streams_enabled:
+            lines.append("    final headerSize = offset == 0 ? 0 : bleContinuationHeaderSize;")
+        else:
+            lines.append("    // Continuation frames are raw payload, so every fragment is a plain slice")
+            lines.append("    const headerSize = 0;")
+        lines.append("    if (mtu <= headerSize) break;")
+        lines.append("    final chunk = frame.length - offset < mtu - headerSize ? frame.length - offset : mtu - headerSize;")
+        lines.append("    final fragment = Uint8List(headerSize + chunk);")
+        if self.streams_enabled:
+            lines.append("    if (headerSize > 0) {")
+            lines.append("      fragment[0] = bleSyncContinuation;")
+            lines.append("      fragment[1] = frame[3];")
+            lines.append("    }")
+        lines.append("    fragment.setRange(headerSize, headerSize + chunk, frame, offset);")
+        lines.append("    fragments.add(fragment);")
+        lines.append("    offset += chunk;")
+        lines.append("  }")
+        lines.append("  return fragments;")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _generate_frame_writer_class(self) -> List[str]:
+        """Generate reusable buffer that batches client frames without allocating"""
+        lines = []
+        lines.append("/// Reusable buffer that encodes client messages back-to-back without allocating")
+        lines.append("///")
+        lines.append("/// Frames are self-delimiting, and [frameAt] gives a view of each one for")
+        lines.append("/// transports that need one write per frame. [clear] reuses the buffer.")
+        lines.append("class BleFrameWriter {")
+        lines.append("  final Uint8List buffer;")
+        lines.append("  final ByteData _data;")
+        lines.append("  final Int32List _frameStarts;")
+        lines.append("  int _length = 0;")
+        lines.append("  int _frameCount = 0;")
+        lines.append("")
+        lines.append("  /// [capacity] defaults to one frame of the largest client message")
+        lines.append("  BleFrameWriter({int capacity = bleMaxClientFrameSize, int maxFrames = 16})")
+        lines.append("      : this._(Uint8List(capacity), maxFrames);")
+        lines.append("")
+        lines.append("  BleFrameWriter._(this.buffer, int maxFrames)")
+        lines.append("      : _data = ByteData.sublistView(buffer),")
+        lines.append("        _frameStarts = Int32List(maxFrames);")
+        lines.append("")
+        lines.append("  /// Bytes encoded so far")
+        lines.append("  int get length => _length;")
+        lines.append("")
+        lines.append("  int get frameCount => _frameCount;")
+        lines.append("")
+        lines.append("  /// View of the encoded bytes (valid until the next clear)")
+        lines.append("  Uint8List get bytes => Uint8List.sublistView(buffer, 0, _length);")
+        lines.append("")
+        lines.append("  /// View of one encoded frame")
+        lines.append("  Uint8List frameAt(int index) {")
+        lines.append("    RangeError.checkValidIndex(index, this, 'index', _frameCount);")
+        lines.append("    final end = index + 1 < _frameCount ? _frameStarts[index + 1] : _length;")
+        lines.append("    return Uint8List.sublistView(buffer, _frameStarts[index], end);")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  void clear() {")
+        lines.append("    _length = 0;")
+        lines.append("    _frameCount = 0;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Append one message; returns false (writing nothing) if it does not fit")
+        lines.append("  bool add(BleClientMessage message) {")
+        lines.append("    if (_frameCount == _frameStarts.length || _length + message.frameSize > buffer.length) return false;")
+        lines.append("    _frameStarts[_frameCount++] = _length;")
+        lines.append("    _length += message.encodeInto(_data, _length);")
+        lines.append("    return true;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Append messages in order until one does not fit; returns how many were added")
+        lines.append("  int addAll(List<BleClientMessage> messages) {")
+        lines.append("    for (int i = 0; i < messages.length; i++) {")
+        lines.append("      if (!add(messages[i])) return i;")
+        lines.append("    }")
+        lines.append("    return messages.length;")
+        lines.append("  }")
+        lines.append("}")
+        lines.append("")
         return lines
 
     def _generate_decode_frame_method(self) -> List[str]:
@@ -62,129 +257,958 @@ class DartGenerator:
         lines.append("  /// [timeMs] Current time in milliseconds for timestamping received messages")
         lines.append("  bool decodeFrame(Uint8List frame, int timeMs) {")
         lines.append("    if (frame.isEmpty) return false;")
+        lines.append("    _event(bleTraceFrameIn, 0);")
         lines.append("")
+        lines.append("    _expireSlots(timeMs);")
+        if self._accepts_packed_frames():
+            lines.append("    return _decodeFrame(frame, timeMs);")
+            lines.append("  }")
+            lines.append("")
+            lines.append("  /// Decode one notification without counting it again for each packed frame")
+            lines.append("  bool _decodeFrame(Uint8List frame, int timeMs) {")
+        else:
+            lines.append("")
         lines.append("    // Check if this is a first frame")
         lines.append("    if (frame[0] == bleSyncFirst) {")
-        lines.append("      // Reset state for new message")
-        lines.append("      _valid = false;")
-        lines.append("      _bytesReceived = 0;")
-        lines.append("")
         lines.append("      // Verify minimum frame size for first frame")
-        lines.append("      if (frame.length < 4) return false;")
+        lines.append("      if (frame.length < bleFirstHeaderSize + 1) {")
+        lines.append("        _event(bleTraceResync, 0);")
+        lines.append("        return false;")
+        lines.append("      }")
         lines.append("")
         lines.append("      // Extract header")
-        lines.append("      _expectedSize = frame[1];")
-        lines.append("      _msgId = frame[2];")
-        lines.append("")
-        lines.append("      // Calculate payload bytes in this frame")
-        lines.append("      final headerSize = 3;")
-        lines.append("      final payloadInFrame = frame.length - headerSize;")
+        lines.append("      final expectedSize = frame[1];")
+        lines.append("      final msgId = frame[2];")
+        if self._accepts_packed_frames():
+            lines.append("")
+            lines.append("      // Packed notification: whole frames back to back, split after each checksum")
+            lines.append("      final frameEnd = bleFirstHeaderSize + expectedSize + 1;")
+            lines.append("      if (frame.length > frameEnd && frame[frameEnd] == bleSyncFirst) {")
+            lines.append("        final stored = _decodeFrame(Uint8List.sublistView(frame, 0, frameEnd), timeMs);")
+            lines.append("        return _decodeFrame(Uint8List.sublistView(frame, frameEnd), timeMs) || stored;")
+            lines.append("      }")
+            lines.append("")
+        if self.streams_enabled:
+            lines.append("      final streamId = frame[3];")
+        else:
+            lines.append("      const streamId = 0;")
+        lines.append("      final payloadInFrame = frame.length - bleFirstHeaderSize;")
+        lines.append("      if (bleStatsEnabled) stats._countFrame(msgId);")
         lines.append("")
         lines.append("      // Check if this frame has checksum (complete message)")
-        lines.append("      final hasChecksum = (payloadInFrame == _expectedSize + 1);")
-        lines.append("")
-        lines.append("      if (hasChecksum) {")
-        lines.append("        // Single-frame message - verify checksum")
-        lines.append("        final payloadData = frame.sublist(3, 3 + _expectedSize);")
-        lines.append("        final checksum = frame[3 + _expectedSize];")
-        lines.append("        final calcChecksum = _calculateChecksum(payloadData);")
-        lines.append("        if (checksum != calcChecksum) return false;")
-        lines.append("")
-        lines.append("        // Copy payload to buffer")
-        lines.append("        _payloadBuffer.setRange(0, _expectedSize, payloadData);")
-        lines.append("        _bytesReceived = _expectedSize;")
-        lines.append("        _valid = true;")
-        lines.append("        ")
-        lines.append("        // Store decoded message in per-message buffer")
-        lines.append("        _storeMessage(timeMs);")
-        lines.append("        return true;")
-        lines.append("      } else {")
-        lines.append("        // Multi-frame message - copy partial payload")
-        lines.append("        if (payloadInFrame > _expectedSize) return false;")
-        lines.append("        _payloadBuffer.setRange(0, payloadInFrame, frame.sublist(3));")
-        lines.append("        _bytesReceived = payloadInFrame;")
-        lines.append("        return false; // Need more frames")
-        lines.append("      }")
-        lines.append("    } else {")
-        lines.append("      // Continuation frame (no sync byte, just payload)")
-        lines.append("      if (_bytesReceived == 0) return false; // No first frame received")
-        lines.append("")
-        lines.append("      final remaining = _expectedSize - _bytesReceived;")
-        lines.append("      final hasChecksum = (frame.length == remaining + 1);")
-        lines.append("")
-        lines.append("      if (hasChecksum) {")
-        lines.append("        // Final frame - verify checksum")
-        lines.append("        _payloadBuffer.setRange(_bytesReceived, _bytesReceived + remaining, frame);")
-        lines.append("        _bytesReceived += remaining;")
-        lines.append("")
-        lines.append("        final checksum = frame[remaining];")
-        lines.append("        final payloadData = _payloadBuffer.sublist(0, _expectedSize);")
-        lines.append("        final calcChecksum = _calculateChecksum(payloadData);")
-        lines.append("        if (checksum != calcChecksum) {")
-        lines.append("          _bytesReceived = 0; // Reset on checksum failure")
+        lines.append("      if (payloadInFrame == expectedSize + 1) {")
+        lines.append("        // Single-frame message - validated straight from the frame so")
+        lines.append("        // partially reassembled messages in other slots are kept")
+        lines.append("        final payloadData = Uint8List.sublistView(frame, bleFirstHeaderSize, bleFirstHeaderSize + expectedSize);")
+        lines.append("        final checksum = frame[bleFirstHeaderSize + expectedSize];")
+        lines.append("        if (checksum != _calculateChecksum(payloadData)) {")
+        lines.append("          _event(bleTraceChecksumError, msgId);")
         lines.append("          return false;")
         lines.append("        }")
+        lines.append("        return _ingest(msgId, payloadData, timeMs, true);")
+        lines.append("      }")
         lines.append("")
-        lines.append("        _valid = true;")
-        lines.append("        ")
-        lines.append("        // Store decoded message in per-message buffer")
-        lines.append("        _storeMessage(timeMs);")
-        lines.append("        return true;")
-        lines.append("      } else {")
-        lines.append("        // Continuation frame - copy payload")
-        lines.append("        if (frame.length > remaining) return false;")
-        lines.append("        _payloadBuffer.setRange(_bytesReceived, _bytesReceived + frame.length, frame);")
-        lines.append("        _bytesReceived += frame.length;")
-        lines.append("        return false; // Need more frames")
+        lines.append("      // Multi-frame message - copy partial payload into a slot")
+        lines.append("      if (payloadInFrame > expectedSize || expectedSize > _maxPayloadSize) {")
+        lines.append("        _event(bleTraceResync, msgId);")
+        lines.append("        return false;")
         lines.append("      }")
+        lines.append("      final slot = _claimSlot(streamId);")
+        lines.append("      slot.active = true;")
+        lines.append("      slot.streamId = streamId;")
+        lines.append("      slot.msgId = msgId;")
+        lines.append("      slot.expectedSize = expectedSize;")
+        lines.append("      slot.bytesReceived = payloadInFrame;")
+        lines.append("      slot.lastFrameMs = timeMs;")
+        lines.append("      slot.payload.setRange(0, payloadInFrame, frame, bleFirstHeaderSize);")
+        lines.append("      _event(bleTraceReassemblyStart, msgId);")
+        lines.append("      return false; // Need more frames")
+        lines.append("    }")
+        lines.append("")
+        if self.streams_enabled:
+            lines.append("    // Continuation frame: [Sync][StreamID][Payload...]")
+            lines.append("    if (frame[0] != bleSyncContinuation || frame.length < bleContinuationHeaderSize + 1) {")
+            lines.append("      _event(bleTraceResync, 0);")
+            lines.append("      return false;")
+            lines.append("    }")
+            lines.append("    final slot = _findSlot(frame[1]);")
+        else:
+            lines.append("    // Continuation frame (no sync byte, just payload)")
+            lines.append("    final slot = _findSlot(0);")
+        lines.append("    if (slot == null) { // No first frame received")
+        lines.append("      _event(bleTraceReassemblyOrphaned, 0);")
+        lines.append("      return false;")
+        lines.append("    }")
+        lines.append("    if (bleStatsEnabled) stats._countFrame(slot.msgId);")
+        lines.append("")
+        lines.append("    final dataLength = frame.length - bleContinuationHeaderSize;")
+        lines.append("    final remaining = slot.expectedSize - slot.bytesReceived;")
+        lines.append("")
+        lines.append("    if (dataLength == remaining + 1) {")
+        lines.append("      // Final frame - verify checksum and release the slot")
+        lines.append("      slot.payload.setRange(slot.bytesReceived, slot.expectedSize, frame, bleContinuationHeaderSize);")
+        lines.append("      slot.bytesReceived = slot.expectedSize;")
+        lines.append("      slot.active = false;")
+        lines.append("")
+        lines.append("      final checksum = frame[bleContinuationHeaderSize + remaining];")
+        lines.append("      final payloadData = Uint8List.sublistView(slot.payload, 0, slot.expectedSize);")
+        lines.append("      if (checksum != _calculateChecksum(payloadData)) {")
+        lines.append("        _event(bleTraceChecksumError, slot.msgId);")
+        lines.append("        return false;")
+        lines.append("      }")
+        lines.append("")
+        lines.append("      return _ingest(slot.msgId, payloadData, timeMs, true);")
+        lines.append("    }")
+        lines.append("")
+        lines.append("    // Continuation frame - copy payload")
+        lines.append("    if (dataLength > remaining) {")
+        lines.append("      _event(bleTraceResync, slot.msgId);")
+        lines.append("      return false;")
+        lines.append("    }")
+        lines.append("    slot.payload.setRange(slot.bytesReceived, slot.bytesReceived + dataLength, frame, bleContinuationHeaderSize);")
+        lines.append("    slot.bytesReceived += dataLength;")
+        lines.append("    slot.lastFrameMs = timeMs;")
+        lines.append("    return false; // Need more frames")
+        lines.append("  }")
+        lines.append("")
+        return lines
+
+    def _generate_reassembly_slot_methods(self) -> List[str]:
+        """Generate reassembly slot lookup, allocation and timeout eviction"""
+        lines = []
+        lines.append("  /// Release partial messages that have not progressed within the timeout")
+        lines.append("  void _expireSlots(int timeMs) {")
+        lines.append("    for (final slot in _slots) {")
+        lines.append("      if (slot.active && timeMs - slot.lastFrameMs > bleReassemblyTimeoutMs) {")
+        lines.append("        _event(bleTraceReassemblyOrphaned, slot.msgId);")
+        lines.append("        slot.active = false;")
+        lines.append("      }")
+        lines.append("    }")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Find the active slot reassembling a stream")
+        lines.append("  _BleReassemblySlot? _findSlot(int streamId) {")
+        lines.append("    for (final slot in _slots) {")
+        lines.append("      if (slot.active && slot.streamId == streamId) return slot;")
+        lines.append("    }")
+        lines.append("    return null;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Get a slot for a new message: restart the stream's slot, else take a free")
+        lines.append("  /// slot, else evict the least recently updated one")
+        lines.append("  _BleReassemblySlot _claimSlot(int streamId) {")
+        lines.append("    final existing = _findSlot(streamId);")
+        lines.append("    if (existing != null) {")
+        lines.append("      _event(bleTraceReassemblyAborted, existing.msgId);")
+        lines.append("      return existing;")
         lines.append("    }")
+        lines.append("    var oldest = _slots[0];")
+        lines.append("    for (final slot in _slots) {")
+        lines.append("      if (!slot.active) return slot;")
+        lines.append("      if (slot.lastFrameMs < oldest.lastFrameMs) oldest = slot;")
+        lines.append("    }")
+        lines.append("    _event(bleTraceReassemblyAborted, oldest.msgId);")
+        lines.append("    return oldest;")
         lines.append("  }")
         lines.append("")
         return lines
 
     def _generate_store_message_method(self) -> List[str]:
-        """Generate helper method to store decoded message in per-message buffer"""
+        """Generate the per-message ingest switch shared by decodeFrame and the isolate replay"""
         lines = []
-        lines.append("  /// Store decoded message in per-message buffer")
-        lines.append("  void _storeMessage(int timestampMs) {")
-        lines.append("    switch (_msgId) {")
+        lines.append("  /// Take a validated payload. Stats, link metrics, change tracking and history")
+        lines.append("  /// see every payload; the latest value, status flags and listeners are only")
+        lines.append("  /// updated when [store] is true (false: an older payload of an isolate batch).")
+        lines.append("  /// Only a stored payload is decoded into a message object")
+        lines.append("  /// Returns false for unknown message IDs or unexpected payload sizes")
+        lines.append("  bool _ingest(int msgId, Uint8List payload, int timestampMs, bool store) {")
+        lines.append("    switch (msgId) {")
         for msg_name, msg_info in self.server_messages.items():
             class_name = self.to_pascal_case(msg_name)
             camel_name = self.to_camel_case(msg_name)
+            index_name = self.get_decode_index_name(msg_name)
+            msg_size = self.get_payload_size(msg_name)
             lines.append(f"      case {msg_info['id']}:")
-            lines.append(f"        _{camel_name} = _decode{class_name}FromBuffer();")
-            lines.append(f"        _{camel_name}TimestampMs = timestampMs;")
-            lines.append(f"        _{camel_name}Unread = true;")
-            lines.append(f"        break;")
+            lines.append(f"        if (payload.length != {msg_size}) return false;")
+            lines.append(f"        if (bleStatsEnabled) stats._recordArrival({index_name}, timestampMs);")
+            lines.append("        if (tracking) {")
+            if self.has_header_extension(msg_info):
+                lines.append(f"          linkMetrics.record({index_name}, payload, timestampMs);")
+            lines.append("          final data = ByteData.sublistView(payload);")
+            lines.append(f"          {camel_name}Changes._update(data);")
+            if self.get_history_capacity(msg_info):
+                lines.append(f"          {camel_name}History._append(data, timestampMs);")
+            lines.append("        }")
+            lines.append(f"        if (!store) return true;")
+            lines.append(f"        _event(bleTraceMessageStored, msgId);")
+            lines.append("        if (tracking) {")
+            lines.append(f"          _{camel_name} = _decode{class_name}FromBuffer(payload);")
+            if self.handshake and msg_name == self.handshake[1]:
+                lines.append(f"          link._accept(_{camel_name}!);")
+            lines.append("        }")
+            lines.append(f"        _available[{index_name}] = true;")
+            lines.append(f"        _timestampsMs[{index_name}] = timestampMs;")
+            lines.append(f"        _unread[{index_name}] = true;")
+            lines.append(f"        for (final listener in _storeListeners) listener({index_name}, timestampMs);")
+            lines.append(f"        payloadListener?.call({index_name}, payload, timestampMs);")
+            lines.append(f"        return true;")
         lines.append("      default:")
-        lines.append("        break;")
+        lines.append("        return false;")
+        lines.append("    }")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Store a payload that was already reassembled and checksum-validated")
+        lines.append("  /// (used by BleIsolateDecoder to update latest values on the UI isolate)")
+        lines.append("  bool acceptPayload(int msgId, Uint8List payload, int timestampMs) {")
+        lines.append("    return _ingest(msgId, payload, timestampMs, true);")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Feed a validated payload older than the latest one to stats, change tracking,")
+        lines.append("  /// history and link metrics without storing it (BleIsolateDecoder replays every")
+        lines.append("  /// payload of a batch this way, then stores only the newest with acceptPayload)")
+        lines.append("  bool replayPayload(int msgId, Uint8List payload, int timestampMs) {")
+        lines.append("    return _ingest(msgId, payload, timestampMs, false);")
+        lines.append("  }")
+        lines.append("")
+        return lines
+
+    def _has_status_masks(self) -> bool:
+        """Bulk status masks are only generated when every server message fits in one int"""
+        return len(self.server_messages) <= 64
+
+    def _generate_status_mask_methods(self) -> List[str]:
+        """Generate bulk stale/unread mask methods over the status arrays"""
+        lines = []
+        lines.append("  /// Get bitmask of stale server messages (bit n = msgIndex* n)")
+        lines.append("  /// Messages that have never been received are reported as stale")
+        lines.append("  int staleMask(int timeMs) {")
+        lines.append("    int mask = 0;")
+        lines.append("    for (int i = 0; i < bleDecodeMessageCount; i++) {")
+        lines.append("      if (!_available[i] || timeMs - _timestampsMs[i] > _maxAgeMs[i]) {")
+        lines.append("        mask |= 1 << i;")
+        lines.append("      }")
+        lines.append("    }")
+        lines.append("    return mask;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Get bitmask of unread server messages (bit n = msgIndex* n)")
+        lines.append("  int unreadMask() {")
+        lines.append("    int mask = 0;")
+        lines.append("    for (int i = 0; i < bleDecodeMessageCount; i++) {")
+        lines.append("      if (_available[i] && _unread[i]) {")
+        lines.append("        mask |= 1 << i;")
+        lines.append("      }")
+        lines.append("    }")
+        lines.append("    return mask;")
+        lines.append("  }")
+        lines.append("")
+        return lines
+
+    def _generate_state_coalescer_classes(self) -> List[str]:
+        """Generate immutable whole-state snapshots and the per-tick coalescer that emits them"""
+        lines = []
+        lines.append("/// Immutable state of every server message at one tick")
+        lines.append("///")
+        lines.append("/// Message objects are shared with the decoder and earlier snapshots until a")
+        lines.append("/// newer message is stored, so identical(a.motorData, b.motorData) means")
+        lines.append("/// motor_data did not change between two snapshots.")
+        lines.append("class BleStateSnapshot {")
+        lines.append("  /// Clock time of the tick that produced this snapshot")
+        lines.append("  final int timeMs;")
+        for msg_name in self.server_messages:
+            class_name = self.to_pascal_case(msg_name)
+            camel_name = self.to_camel_case(msg_name)
+            lines.append(f"  final {class_name}? {camel_name};")
+        lines.append("  final List<bool> _unread;")
+        lines.append("  final List<bool> _stale;")
+        lines.append("")
+        params = ', '.join(f"this.{self.to_camel_case(msg_name)}" for msg_name in self.server_messages)
+        lines.append(f"  BleStateSnapshot._(this.timeMs, {params}, this._unread, this._stale);")
+        lines.append("")
+        lines.append("  /// Message not yet read through the decoder's get*() (msgIndex*)")
+        lines.append("  bool isUnread(int messageIndex) => _unread[messageIndex];")
+        lines.append("")
+        lines.append("  /// Message missing or older than its maxAge at [timeMs] (msgIndex*)")
+        lines.append("  bool isStale(int messageIndex) => _stale[messageIndex];")
+        lines.append("")
+        lines.append("  bool _matches(BleDecoder decoder, List<bool> unread, List<bool> stale) {")
+        for msg_name in self.server_messages:
+            camel_name = self.to_camel_case(msg_name)
+            lines.append(f"    if (!identical({camel_name}, decoder._{camel_name})) return false;")
+        lines.append("    for (int i = 0; i < bleDecodeMessageCount; i++) {")
+        lines.append("      if (_unread[i] != unread[i] || _stale[i] != stale[i]) return false;")
+        lines.append("    }")
+        lines.append("    return true;")
+        lines.append("  }")
+        lines.append("}")
+        lines.append("")
+
+        lines.append("/// Coalesces decoder updates into at most one BleStateSnapshot per tick")
+        lines.append("///")
+        lines.append("/// Tick at a fixed rate with [start], or call [tick] from a vsync callback")
+        lines.append("/// (e.g. SchedulerBinding.addPersistentFrameCallback). A snapshot is only")
+        lines.append("/// emitted when a message was stored or an unread/stale flag changed.")
+        lines.append("class BleStateCoalescer {")
+        lines.append("  final BleDecoder _decoder;")
+        lines.append("  final int Function() _clockMs;")
+        lines.append("  final StreamController<BleStateSnapshot> _snapshots = StreamController<BleStateSnapshot>.broadcast();")
+        lines.append("  final List<bool> _unread = List<bool>.filled(bleDecodeMessageCount, false);")
+        lines.append("  final List<bool> _stale = List<bool>.filled(bleDecodeMessageCount, true);")
+        lines.append("  BleStateSnapshot? _latest;")
+        lines.append("  Timer? _timer;")
+        lines.append("")
+        lines.append("  BleStateCoalescer(this._decoder, this._clockMs);")
+        lines.append("")
+        lines.append("  /// One snapshot per tick with changes")
+        lines.append("  Stream<BleStateSnapshot> get snapshots => _snapshots.stream;")
+        lines.append("")
+        lines.append("  /// Most recently emitted snapshot (null before the first tick)")
+        lines.append("  BleStateSnapshot? get latest => _latest;")
+        lines.append("")
+        lines.append("  /// Tick periodically (default about 30 Hz)")
+        lines.append("  void start([Duration interval = const Duration(milliseconds: 33)]) {")
+        lines.append("    _timer?.cancel();")
+        lines.append("    _timer = Timer.periodic(interval, (_) => tick());")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Stop periodic ticks")
+        lines.append("  void stop() {")
+        lines.append("    _timer?.cancel();")
+        lines.append("    _timer = null;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Emit a snapshot if anything changed since the last one; returns it or null")
+        lines.append("  BleStateSnapshot? tick() {")
+        lines.append("    final timeMs = _clockMs();")
+        lines.append("    final decoder = _decoder;")
+        lines.append("    for (int i = 0; i < bleDecodeMessageCount; i++) {")
+        lines.append("      final available = decoder._available[i];")
+        lines.append("      _unread[i] = available && decoder._unread[i];")
+        lines.append("      _stale[i] = !available || timeMs - decoder._timestampsMs[i] > BleDecoder._maxAgeMs[i];")
+        lines.append("    }")
+        lines.append("    final latest = _latest;")
+        lines.append("    if (latest != null && latest._matches(decoder, _unread, _stale)) return null;")
+        lines.append("")
+        args = ', '.join(f"decoder._{self.to_camel_case(msg_name)}" for msg_name in self.server_messages)
+        lines.append("    final snapshot = BleStateSnapshot._(")
+        lines.append(f"      timeMs, {args},")
+        lines.append("      List<bool>.unmodifiable(_unread), List<bool>.unmodifiable(_stale),")
+        lines.append("    );")
+        lines.append("    _latest = snapshot;")
+        lines.append("    _snapshots.add(snapshot);")
+        lines.append("    return snapshot;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Stop ticking and close [snapshots]")
+        lines.append("  void dispose() {")
+        lines.append("    stop();")
+        lines.append("    _snapshots.close();")
+        lines.append("  }")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _get_interarrival_bounds(self) -> List[int]:
+        """Upper bounds (ms) of the inter-arrival histogram buckets; one more bucket catches the rest"""
+        return self.stats.get('interarrival_buckets_ms', [10, 20, 50, 100, 200, 500, 1000, 2000])
+
+    def _get_stats_constants(self) -> List[str]:
+        """Generate the compile-time stats/trace switches, trace event codes and trace hook"""
+        bounds = ', '.join(str(bound) for bound in self._get_interarrival_bounds())
+        lines = []
+        lines.append("// Health counters and trace hook: build with --dart-define=BLE_STATS=true and/or")
+        lines.append("// --dart-define=BLE_TRACE=true. Off by default, when the checks are constant")
+        lines.append("// false and compiled out.")
+        lines.append("const bool bleStatsEnabled = bool.fromEnvironment('BLE_STATS');")
+        lines.append("const bool bleTraceEnabled = bool.fromEnvironment('BLE_TRACE');")
+        lines.append("")
+        lines.append("// Decode stages (bleTraceHook events)")
+        lines.append("const int bleTraceFrameIn = 0;")
+        lines.append("const int bleTraceReassemblyStart = 1;")
+        lines.append("const int bleTraceChecksumError = 2;")
+        lines.append("const int bleTraceReassemblyAborted = 3;")
+        lines.append("const int bleTraceReassemblyOrphaned = 4;")
+        lines.append("const int bleTraceResync = 5;")
+        lines.append("const int bleTraceMessageStored = 6;")
+        lines.append("const int bleTraceEventCount = 7;")
+        lines.append("")
+        lines.append("/// Called at every decode stage when built with BLE_TRACE (msgId is 0 where not known yet)")
+        lines.append("void Function(int event, int msgId)? bleTraceHook;")
+        lines.append("")
+        lines.append("// Inter-arrival histogram: bucket n counts gaps up to bounds[n] ms, the last bucket the rest")
+        lines.append(f"const List<int> bleStatsInterarrivalBoundsMs = [{bounds}];")
+        lines.append(f"const int bleStatsInterarrivalBuckets = {len(self._get_interarrival_bounds()) + 1};")
+        lines.append("")
+        return lines
+
+    def _generate_stats_class(self) -> List[str]:
+        """Generate decoder health counters"""
+        lines = []
+        lines.append("/// Decoder health counters, updated only when built with BLE_STATS")
+        lines.append("class BleDecoderStats {")
+        lines.append("  // Per decode stage, indexed by bleTrace* event")
+        lines.append("  final Int64List _events = Int64List(bleTraceEventCount);")
+        lines.append("")
+        lines.append("  /// Frames per server message (msgIndex*), including ones that later failed")
+        lines.append("  final Int64List rxFrames = Int64List(bleDecodeMessageCount);")
+        lines.append("")
+        lines.append("  /// Validated messages stored per server message (msgIndex*)")
+        lines.append("  final Int64List rxMessages = Int64List(bleDecodeMessageCount);")
+        lines.append("")
+        lines.append("  /// Inter-arrival histograms: bucket b of message i is at i * bleStatsInterarrivalBuckets + b")
+        lines.append("  final Int64List rxInterarrival = Int64List(bleDecodeMessageCount * bleStatsInterarrivalBuckets);")
+        lines.append("")
+        lines.append("  final Int64List _lastArrivalMs = Int64List(bleDecodeMessageCount);")
+        lines.append("")
+        lines.append("  int get framesIn => _events[bleTraceFrameIn];")
+        lines.append("  int get checksumErrors => _events[bleTraceChecksumError];")
+        lines.append("  int get reassemblyAborted => _events[bleTraceReassemblyAborted];")
+        lines.append("  int get reassemblyOrphaned => _events[bleTraceReassemblyOrphaned];")
+        lines.append("  int get resyncs => _events[bleTraceResync];")
+        lines.append("")
+        lines.append("  /// Zero every counter")
+        lines.append("  void reset() {")
+        lines.append("    _events.fillRange(0, _events.length, 0);")
+        lines.append("    rxFrames.fillRange(0, rxFrames.length, 0);")
+        lines.append("    rxMessages.fillRange(0, rxMessages.length, 0);")
+        lines.append("    rxInterarrival.fillRange(0, rxInterarrival.length, 0);")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  // Count a frame against its server message (unknown IDs only count in framesIn)")
+        lines.append("  void _countFrame(int msgId) {")
+        lines.append("    switch (msgId) {")
+        for msg_name, msg_info in self.server_messages.items():
+            lines.append(f"      case {msg_info['id']}:")
+            lines.append(f"        rxFrames[{self.get_decode_index_name(msg_name)}]++;")
+            lines.append("        break;")
+        lines.append("    }")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  // Count a stored message and bucket the time since its previous arrival")
+        lines.append("  void _recordArrival(int index, int timeMs) {")
+        lines.append("    if (rxMessages[index]++ > 0) {")
+        lines.append("      final intervalMs = timeMs - _lastArrivalMs[index];")
+        lines.append("      var bucket = 0;")
+        lines.append("      while (bucket < bleStatsInterarrivalBuckets - 1 && intervalMs > bleStatsInterarrivalBoundsMs[bucket]) {")
+        lines.append("        bucket++;")
+        lines.append("      }")
+        lines.append("      rxInterarrival[index * bleStatsInterarrivalBuckets + bucket]++;")
+        lines.append("    }")
+        lines.append("    _lastArrivalMs[index] = timeMs;")
+        lines.append("  }")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _accepts_packed_frames(self) -> bool:
+        return bool(self.handshake) and 'packed_frames' in self.features
+
+    def _get_feature_mask(self, features) -> str:
+        """Dart expression OR-ing the given handshake feature bits"""
+        names = [f"bleFeature{self.to_pascal_case(feature)}" for feature in features if feature in self.features]
+        return ' | '.join(names) if names else "0"
+
+    def _get_handshake_constants(self) -> List[str]:
+        """Generate handshake version, schema hash, baseline MTU and feature bits"""
+        lines = []
+        lines.append("// Connection handshake")
+        lines.append(f"const int bleProtocolVersion = 0x{protocol_version16(self.protocol['version']):04X}; // major << 8 | minor")
+        lines.append(f"const int bleSchemaHash = 0x{self.schema_hash:08X};")
+        lines.append(f"const int bleDefaultMtu = {self.default_mtu};")
+        for feature, bit in self.features.items():
+            lines.append(f"const int bleFeature{self.to_pascal_case(feature)} = 1 << {bit};")
+        lines.append("")
+        lines.append("// Features this end accepts when receiving (announced to the server)")
+        lines.append(f"const int bleLocalFeatures = {self._get_feature_mask(self.RECEIVE_FEATURES)};")
+        lines.append("")
+        return lines
+
+    def _generate_link_class(self) -> List[str]:
+        """Generate the per-connection mode negotiated by the handshake"""
+        request, response = self.handshake
+        request_class = self.to_pascal_case(request)
+        response_class = self.to_pascal_case(response)
+        lines = []
+        lines.append("/// Per-connection mode negotiated by the handshake")
+        lines.append("///")
+        lines.append(f"/// Send [request] after every connect; the mode is adopted when the server's")
+        lines.append(f"/// {response_class} is decoded. Until then, and after [reset], the baseline")
+        lines.append("/// values apply, which every peer supports.")
+        lines.append("class BleLink {")
+        lines.append("  /// Largest notification this end can receive (from the platform MTU exchange)")
+        lines.append("  int localMtu;")
+        lines.append("")
+        lines.append("  /// A handshake response arrived on this connection")
+        lines.append("  bool negotiated = false;")
+        lines.append("")
+        lines.append("  /// Same protocol major version as the server")
+        lines.append("  bool compatible = true;")
+        lines.append("")
+        lines.append("  /// The server was generated from the same schema")
+        lines.append("  bool schemaMatches = false;")
+        lines.append("")
+        lines.append("  /// Smaller of both MTUs (bleDefaultMtu until negotiated)")
+        lines.append("  int mtu = bleDefaultMtu;")
+        lines.append("")
+        lines.append("  /// Largest payload the server reassembles")
+        lines.append("  int peerMaxReassembly = 255;")
+        lines.append("")
+        lines.append("  /// Features the server accepts (0 if incompatible)")
+        lines.append("  int peerFeatures = 0;")
+        lines.append("")
+        lines.append("  BleLink({this.localMtu = bleDefaultMtu});")
+        lines.append("")
+        lines.append("  /// Handshake announcing this end's version, schema, limits and features")
+        lines.append(f"  {request_class} request() {{")
+        lines.append(f"    return {request_class}()")
+        lines.append("      ..protocolVersion = bleProtocolVersion")
+        lines.append("      ..schemaHash = bleSchemaHash")
+        lines.append("      ..maxReassembly = BleDecoder._maxPayloadSize")
+        lines.append("      ..mtu = localMtu")
+        lines.append("      ..features = bleLocalFeatures;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Whether the server can reassemble [message] (larger ones would be dropped)")
+        lines.append("  bool accepts(BleClientMessage message) => message.payloadSize <= peerMaxReassembly;")
+        lines.append("")
+        lines.append("  /// Return to the baseline mode (call on every disconnect)")
+        lines.append("  void reset() {")
+        lines.append("    negotiated = false;")
+        lines.append("    compatible = true;")
+        lines.append("    schemaMatches = false;")
+        lines.append("    mtu = bleDefaultMtu;")
+        lines.append("    peerMaxReassembly = 255;")
+        lines.append("    peerFeatures = 0;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  // Adopt the common mode from the server's response")
+        lines.append(f"  void _accept({response_class} response) {{")
+        lines.append("    negotiated = true;")
+        lines.append("    compatible = (response.protocolVersion >> 8) == (bleProtocolVersion >> 8);")
+        lines.append("    schemaMatches = response.schemaHash == bleSchemaHash;")
+        lines.append("    final commonMtu = response.mtu < localMtu ? response.mtu : localMtu;")
+        lines.append("    mtu = commonMtu < bleDefaultMtu ? bleDefaultMtu : commonMtu;")
+        lines.append("    peerMaxReassembly = response.maxReassembly;")
+        lines.append("    peerFeatures = compatible ? response.features : 0;")
+        lines.append("  }")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def _get_latency_bounds(self) -> List[int]:
+        """Upper bounds (ms) of the latency histogram buckets; one more bucket catches the rest"""
+        return self.header_extension.get('latency_buckets_ms', [5, 10, 20, 50, 100, 200, 500, 1000])
+
+    def _get_header_extension_constants(self) -> List[str]:
+        """Generate header extension size, per-message flags and latency buckets"""
+        extended = ', '.join('true' if self.has_header_extension(msg_info) else 'false'
+                             for msg_info in self.server_messages.values())
+        bounds = ', '.join(str(bound) for bound in self._get_latency_bounds())
+        lines = []
+        lines.append("// Header extension [Seq][SendTimeMs:2] at the start of extended payloads")
+        lines.append(f"const int bleHeaderExtensionSize = {self.HEADER_EXTENSION_SIZE};")
+        lines.append("")
+        lines.append("// Whether each server message (msgIndex*) carries the header extension")
+        lines.append(f"const List<bool> bleHeaderExtended = [{extended}];")
+        lines.append("")
+        lines.append("// Latency histogram: bucket n counts latencies up to bounds[n] ms, the last bucket the rest")
+        lines.append(f"const List<int> bleLatencyBoundsMs = [{bounds}];")
+        lines.append(f"const int bleLatencyBuckets = {len(self._get_latency_bounds()) + 1};")
+        lines.append("")
+        return lines
+
+    def _generate_link_metrics_class(self) -> List[str]:
+        """Generate sequence gap and latency tracking for header-extended messages"""
+        lines = []
+        lines.append("/// Sequence gaps and send-to-receive latency of messages with the header extension")
+        lines.append("///")
+        lines.append("/// Sender and receiver clocks are unrelated, so latency is measured against a")
+        lines.append("/// clock offset estimate: the smallest receive-minus-send difference over the")
+        lines.append("/// last [offsetWindow] samples, i.e. the fastest recent message counts as zero")
+        lines.append("/// latency. Restarting the window lets the estimate follow clock drift.")
+        lines.append("/// A SendTimeMs of 0 means the sender has no clock; such messages only count")
+        lines.append("/// toward sequence gaps.")
+        lines.append("class BleLinkMetrics {")
+        lines.append("  /// Samples per clock offset window")
+        lines.append("  final int offsetWindow;")
+        lines.append("")
+        lines.append("  /// Extended messages received per server message (msgIndex*)")
+        lines.append("  final Int64List received = Int64List(bleDecodeMessageCount);")
+        lines.append("")
+        lines.append("  /// Skipped sequence numbers (lost messages) per server message")
+        lines.append("  final Int64List gaps = Int64List(bleDecodeMessageCount);")
+        lines.append("")
+        lines.append("  /// Repeated sequence numbers per server message")
+        lines.append("  final Int64List duplicates = Int64List(bleDecodeMessageCount);")
+        lines.append("")
+        lines.append("  /// Latency histograms: bucket b of message i is at i * bleLatencyBuckets + b")
+        lines.append("  final Int64List latency = Int64List(bleDecodeMessageCount * bleLatencyBuckets);")
+        lines.append("")
+        lines.append("  /// Latest latency per server message in ms")
+        lines.append("  final Int64List lastLatencyMs = Int64List(bleDecodeMessageCount);")
+        lines.append("")
+        lines.append("  final Int16List _lastSeq = Int16List(bleDecodeMessageCount);")
+        lines.append("  int _offsetMs = -1; // Receive minus send clock, mod 2^16; -1 until the first sample")
+        lines.append("  int _windowMinMs = -1;")
+        lines.append("  int _windowCount = 0;")
+        lines.append("")
+        lines.append("  BleLinkMetrics({this.offsetWindow = 256}) {")
+        lines.append("    _lastSeq.fillRange(0, _lastSeq.length, -1);")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Estimated receive-minus-send clock offset (mod 2^16 ms), or -1 before the first sample")
+        lines.append("  int get clockOffsetMs => _offsetMs;")
+        lines.append("")
+        lines.append("  /// Zero every counter and forget sequence numbers and the clock offset")
+        lines.append("  /// (call on reconnect: the sender may have restarted its sequence numbers)")
+        lines.append("  void reset() {")
+        lines.append("    received.fillRange(0, received.length, 0);")
+        lines.append("    gaps.fillRange(0, gaps.length, 0);")
+        lines.append("    duplicates.fillRange(0, duplicates.length, 0);")
+        lines.append("    latency.fillRange(0, latency.length, 0);")
+        lines.append("    lastLatencyMs.fillRange(0, lastLatencyMs.length, 0);")
+        lines.append("    _lastSeq.fillRange(0, _lastSeq.length, -1);")
+        lines.append("    _offsetMs = -1;")
+        lines.append("    _windowMinMs = -1;")
+        lines.append("    _windowCount = 0;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Record the header extension of a validated payload received at [timeMs]")
+        lines.append("  /// (payloads of messages without the extension are ignored)")
+        lines.append("  void record(int index, Uint8List payload, int timeMs) {")
+        lines.append("    if (!bleHeaderExtended[index]) return;")
+        lines.append("    final seq = payload[0];")
+        lines.append("    final sendTimeMs = payload[1] | (payload[2] << 8);")
+        lines.append("")
+        lines.append("    final lastSeq = _lastSeq[index];")
+        lines.append("    if (lastSeq >= 0) {")
+        lines.append("      final step = (seq - lastSeq) & 0xFF;")
+        lines.append("      if (step == 0) {")
+        lines.append("        duplicates[index]++;")
+        lines.append("      } else {")
+        lines.append("        gaps[index] += step - 1;")
+        lines.append("      }")
         lines.append("    }")
+        lines.append("    _lastSeq[index] = seq;")
+        lines.append("    received[index]++;")
+        lines.append("    if (sendTimeMs == 0) return; // Not stamped (sender built without a clock)")
+        lines.append("")
+        lines.append("    // Latency plus the unknown clock offset, on the 16-bit send clock circle")
+        lines.append("    final deltaMs = (timeMs - sendTimeMs) & 0xFFFF;")
+        lines.append("    if (_windowMinMs < 0 || _isBefore(deltaMs, _windowMinMs)) _windowMinMs = deltaMs;")
+        lines.append("    if (_offsetMs < 0 || _isBefore(deltaMs, _offsetMs)) _offsetMs = deltaMs;")
+        lines.append("    if (++_windowCount == offsetWindow) {")
+        lines.append("      _offsetMs = _windowMinMs;")
+        lines.append("      _windowMinMs = -1;")
+        lines.append("      _windowCount = 0;")
+        lines.append("    }")
+        lines.append("")
+        lines.append("    final latencyMs = (deltaMs - _offsetMs) & 0xFFFF;")
+        lines.append("    lastLatencyMs[index] = latencyMs;")
+        lines.append("    var bucket = 0;")
+        lines.append("    while (bucket < bleLatencyBuckets - 1 && latencyMs > bleLatencyBoundsMs[bucket]) {")
+        lines.append("      bucket++;")
+        lines.append("    }")
+        lines.append("    latency[index * bleLatencyBuckets + bucket]++;")
         lines.append("  }")
         lines.append("")
+        lines.append("  // Whether a comes before b on the 16-bit clock circle")
+        lines.append("  static bool _isBefore(int a, int b) => ((a - b) & 0xFFFF) >= 0x8000;")
+        lines.append("}")
+        lines.append("")
+        return lines
+
+    def get_history_capacity(self, msg_info: Dict) -> int:
+        """Samples kept per field for a server message (0: no history)"""
+        return msg_info.get('history', 0)
+
+    def _generate_history_classes(self) -> List[str]:
+        """Generate column-oriented history rings for messages with a schema history capacity"""
+        lines = []
+        for msg_name, msg_info in self.server_messages.items():
+            capacity = self.get_history_capacity(msg_info)
+            if not capacity:
+                continue
+            class_name = self.to_pascal_case(msg_name)
+            # (camelCase name, typed list class, read expression) per numeric field;
+            # strings are not recorded
+            columns = [('timestampsMs', 'Int64List', 'timestampMs')]
+            for field_name, field_value, offset in self.get_field_offsets(msg_info):
+                field_type = self.get_field_type_name(field_value)
+                if not self.is_variable_size(field_type):
+                    columns.append((self.to_camel_case(field_name), self.HISTORY_LIST_TYPES[field_type],
+                                    self.get_field_read_expression(field_value, offset)))
+
+            lines.append(f"/// Last [capacity] {msg_name} samples, one typed column per numeric field")
+            lines.append("///")
+            lines.append("/// Each sample is written at i and i + capacity, so the newest n samples are")
+            lines.append("/// always contiguous and the last*() methods return views instead of copies.")
+            lines.append("/// Views follow the ring: re-request them after new samples are appended.")
+            lines.append(f"class {class_name}History {{")
+            lines.append(f"  static const int capacity = {capacity};")
+            lines.append("")
+            for column, list_type, _ in columns:
+                lines.append(f"  final {list_type} _{column} = {list_type}(2 * capacity);")
+            lines.append("  int _next = 0;")
+            lines.append("  int _length = 0;")
+            lines.append("")
+            lines.append("  /// Number of samples held (at most [capacity])")
+            lines.append("  int get length => _length;")
+            lines.append("")
+            lines.append("  // Columns are read straight from the payload bytes, without a message object")
+            lines.append("  void _append(ByteData data, int timestampMs) {")
+            lines.append("    final i = _next;")
+            lines.append("    final j = i + capacity;")
+            for column, _, read in columns:
+                lines.append(f"    _{column}[i] = _{column}[j] = {read};")
+            lines.append("    _next = i + 1 == capacity ? 0 : i + 1;")
+            lines.append("    if (_length < capacity) _length++;")
+            lines.append("  }")
+            lines.append("")
+            lines.append("  /// Drop all samples")
+            lines.append("  void clear() {")
+            lines.append("    _next = 0;")
+            lines.append("    _length = 0;")
+            lines.append("  }")
+            lines.append("")
+            lines.append("  // Start of the newest n samples in the mirrored columns (they end at _next + capacity)")
+            lines.append("  int _windowStart(int n) => _next + capacity - (n < _length ? n : _length);")
+            lines.append("")
+            for column, list_type, _ in columns:
+                method = 'last' + column[0].upper() + column[1:]
+                lines.append(f"  /// Newest [n] {column} values, oldest first")
+                lines.append(f"  {list_type} {method}(int n) => {list_type}.sublistView(_{column}, _windowStart(n), _next + capacity);")
+            lines.append("}")
+            lines.append("")
+        return lines
+
+    def _generate_change_tracking_classes(self) -> List[str]:
+        """Generate per-field change detection: changed-field masks and per-field change streams"""
+        lines = []
+        has_strings = any(self.is_variable_size(self.get_field_type_name(field_value))
+                          for msg_info in self.server_messages.values()
+                          for field_value in msg_info['fields'].values())
+        if has_strings:
+            lines.append("/// Null-terminated string field of [size] bytes at [offset]")
+            lines.append("String _bleStringAt(ByteData data, int offset, int size) {")
+            lines.append("  var end = offset;")
+            lines.append("  while (end < offset + size && data.getUint8(end) != 0) {")
+            lines.append("    end++;")
+            lines.append("  }")
+            lines.append("  return String.fromCharCodes(Uint8List.sublistView(data, offset, end));")
+            lines.append("}")
+            lines.append("")
+        lines.append("/// Latest value of one message field, notifying only when it actually changes")
+        lines.append("class BleFieldValue<T> {")
+        lines.append("  T _value;")
+        lines.append("  bool _known = false;")
+        lines.append("  StreamController<T>? _changes;")
+        lines.append("")
+        lines.append("  BleFieldValue(this._value);")
+        lines.append("")
+        lines.append("  /// Value from the last stored message (type default before the first)")
+        lines.append("  T get value => _value;")
+        lines.append("")
+        lines.append("  /// Emits each new value; created on first use, so unobserved fields cost nothing")
+        lines.append("  Stream<T> get changes => (_changes ??= StreamController<T>.broadcast()).stream;")
+        lines.append("")
+        lines.append("  bool _set(T value) {")
+        lines.append("    if (_known && value == _value) return false;")
+        lines.append("    _known = true;")
+        lines.append("    _value = value;")
+        lines.append("    final changes = _changes;")
+        lines.append("    if (changes != null && changes.hasListener) changes.add(value);")
+        lines.append("    return true;")
+        lines.append("  }")
+        lines.append("}")
+        lines.append("")
+
+        for msg_name, msg_info in self.server_messages.items():
+            class_name = self.to_pascal_case(msg_name)
+            fields = msg_info['fields']
+            has_mask = len(fields) <= 64
+
+            lines.append(f"/// Field-level changes of {msg_name}")
+            if has_mask:
+                lines.append("/// [changedMask] has one bit per field that differed from the previous")
+                lines.append("/// message; the first message sets every bit.")
+            lines.append(f"class {class_name}Changes {{")
+            if has_mask:
+                for bit, field_name in enumerate(fields):
+                    lines.append(f"  static const int {self.to_camel_case(field_name)}Bit = 1 << {bit};")
+                lines.append("")
+            for field_name, field_value in fields.items():
+                field_type = self.get_field_type_name(field_value)
+                dart_type = self.get_dart_type(field_type)
+                default = "''" if self.is_variable_size(field_type) else "0"
+                lines.append(f"  final BleFieldValue<{dart_type}> {self.to_camel_case(field_name)} = "
+                             f"BleFieldValue<{dart_type}>({default});")
+            lines.append("")
+            if has_mask:
+                lines.append("  int _changedMask = 0;")
+                lines.append("")
+                lines.append("  /// Fields changed by the last stored message (*Bit constants)")
+                lines.append("  int get changedMask => _changedMask;")
+                lines.append("")
+            lines.append("  // Fields are read straight from the payload bytes, without a message object")
+            lines.append("  void _update(ByteData data) {")
+            if has_mask:
+                lines.append("    var mask = 0;")
+            for field_name, field_value, offset in self.get_field_offsets(msg_info):
+                camel_name = self.to_camel_case(field_name)
+                read = self.get_field_read_expression(field_value, offset)
+                # A field named "data" is shadowed by the parameter
+                target = f"this.{camel_name}" if camel_name == 'data' else camel_name
+                if has_mask:
+                    lines.append(f"    if ({target}._set({read})) mask |= {camel_name}Bit;")
+                else:
+                    lines.append(f"    {target}._set({read});")
+            if has_mask:
+                lines.append("    _changedMask = mask;")
+            lines.append("  }")
+            lines.append("}")
+            lines.append("")
+        return lines
+
+    def _generate_staleness_watchdog_class(self) -> List[str]:
+        """Generate single-timer watchdog that reports stale/fresh transitions"""
+        lines = []
+        lines.append("/// Stale or fresh transition of a server message")
+        lines.append("class BleStalenessEvent {")
+        lines.append("  /// Message index (msgIndex*)")
+        lines.append("  final int messageIndex;")
+        lines.append("  /// True when the message became stale, false when fresh data arrived")
+        lines.append("  final bool isStale;")
+        lines.append("  final int timeMs;")
+        lines.append("")
+        lines.append("  const BleStalenessEvent(this.messageIndex, this.isStale, this.timeMs);")
+        lines.append("")
+        lines.append("  @override")
+        lines.append("  String toString() => 'BleStalenessEvent(messageIndex: $messageIndex, isStale: $isStale, timeMs: $timeMs)';")
+        lines.append("}")
+        lines.append("")
+        lines.append("/// Staleness watchdog for a [BleDecoder]")
+        lines.append("///")
+        lines.append("/// Uses a single timer armed for the nearest upcoming maxAge expiry across all")
+        lines.append("/// server messages, and emits an event only when a message changes state.")
+        lines.append("/// [clockMs] must use the same time base as the timeMs passed to decodeFrame().")
+        lines.append("/// Messages that have never been received start out stale.")
+        lines.append("class BleStalenessWatchdog {")
+        lines.append("  final BleDecoder _decoder;")
+        lines.append("  final int Function() _clockMs;")
+        lines.append("  final StreamController<BleStalenessEvent> _events = StreamController<BleStalenessEvent>.broadcast();")
+        lines.append("  final List<bool> _stale = List<bool>.filled(bleDecodeMessageCount, true);")
+        lines.append("  Timer? _timer;")
+        lines.append("  int? _armedExpiryMs; // Expiry the timer is armed for")
+        lines.append("")
+        lines.append("  BleStalenessWatchdog(this._decoder, this._clockMs) {")
+        lines.append("    _decoder._storeListeners.add(_onStore);")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Stale/fresh transition events")
+        lines.append("  Stream<BleStalenessEvent> get events => _events.stream;")
+        lines.append("")
+        lines.append("  /// Last reported state of a message (msgIndex*)")
+        lines.append("  bool isStale(int messageIndex) => _stale[messageIndex];")
+        lines.append("")
+        lines.append("  /// Stop the timer and detach from the decoder")
+        lines.append("  void dispose() {")
+        lines.append("    _timer?.cancel();")
+        lines.append("    _timer = null;")
+        lines.append("    _decoder._storeListeners.remove(_onStore);")
+        lines.append("    _events.close();")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  void _onStore(int messageIndex, int timeMs) {")
+        lines.append("    if (_stale[messageIndex]) {")
+        lines.append("      _stale[messageIndex] = false;")
+        lines.append("      _events.add(BleStalenessEvent(messageIndex, false, timeMs));")
+        lines.append("    }")
+        lines.append("    // Re-arm when this message now expires before the armed timer, e.g. a")
+        lines.append("    // short-maxAge message that came back while a longer one is armed")
+        lines.append("    final expiryMs = timeMs + BleDecoder._maxAgeMs[messageIndex];")
+        lines.append("    if (_timer == null || expiryMs < _armedExpiryMs!) {")
+        lines.append("      _timer?.cancel();")
+        lines.append("      _check();")
+        lines.append("    }")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  void _check() {")
+        lines.append("    _timer = null;")
+        lines.append("    _armedExpiryMs = null;")
+        lines.append("    final nowMs = _clockMs();")
+        lines.append("    int? nextExpiryMs;")
+        lines.append("    for (int i = 0; i < bleDecodeMessageCount; i++) {")
+        lines.append("      if (_stale[i]) continue;")
+        lines.append("      final expiryMs = _decoder._timestampsMs[i] + BleDecoder._maxAgeMs[i];")
+        lines.append("      if (nowMs > expiryMs) {")
+        lines.append("        _stale[i] = true;")
+        lines.append("        _events.add(BleStalenessEvent(i, true, nowMs));")
+        lines.append("      } else if (nextExpiryMs == null || expiryMs < nextExpiryMs) {")
+        lines.append("        nextExpiryMs = expiryMs;")
+        lines.append("      }")
+        lines.append("    }")
+        lines.append("    if (nextExpiryMs != null) {")
+        lines.append("      // Stale once age exceeds maxAge, i.e. 1ms after the expiry time")
+        lines.append("      _armedExpiryMs = nextExpiryMs;")
+        lines.append("      _timer = Timer(Duration(milliseconds: nextExpiryMs - nowMs + 1), _check);")
+        lines.append("    }")
+        lines.append("  }")
+        lines.append("}")
+        lines.append("")
         return lines
 
     # ========================================================================
     # Message Layer - Type handling and message-specific logic
     # ========================================================================
 
+    def get_decode_index_name(self, msg_name: str) -> str:
+        """Get the status array index constant for a server message"""
+        return f"msgIndex{self.to_pascal_case(msg_name)}"
+
+    DART_TYPES = {
+        'uint8': 'int',
+        'int8': 'int',
+        'uint16': 'int',
+        'int16': 'int',
+        'uint32': 'int',
+        'int32': 'int',
+        'uint64': 'int',
+        'int64': 'int',
+        'string': 'String',
+    }
+
+    BYTE_DATA_METHODS = {
+        'uint8': ('getUint8', 'setUint8'),
+        'int8': ('getInt8', 'setInt8'),
+        'uint16': ('getUint16', 'setUint16'),
+        'int16': ('getInt16', 'setInt16'),
+        'uint32': ('getUint32', 'setUint32'),
+        'int32': ('getInt32', 'setInt32'),
+        'uint64': ('getUint64', 'setUint64'),
+        'int64': ('getInt64', 'setInt64'),
+    }
+
+    # Typed list per field type for history columns (uint64 shares Int64List:
+    # Dart ints are signed 64-bit)
+    HISTORY_LIST_TYPES = {
+        'uint8': 'Uint8List',
+        'int8': 'Int8List',
+        'uint16': 'Uint16List',
+        'int16': 'Int16List',
+        'uint32': 'Uint32List',
+        'int32': 'Int32List',
+        'uint64': 'Int64List',
+        'int64': 'Int64List',
+    }
+
     def get_dart_type(self, type_name: str) -> str:
         """Convert schema type to Dart type"""
-        type_map = {
-            'uint8': 'int',
-            'int8': 'int',
-            'uint16': 'int',
-            'int16': 'int',
-            'uint32': 'int',
-            'int32': 'int',
-            'uint64': 'int',
-            'int64': 'int',
-            'string': 'String',
-        }
-        return type_map.get(type_name, type_name)
+        return self.DART_TYPES.get(type_name, type_name)
 
     def is_variable_size(self, type_name: str) -> bool:
         """Check if a type has variable size"""
-        return self.types.get(type_name, {}).get('size') == 'variable'
+        return type_name in self._variable_types
 
     def get_field_type_name(self, field_value) -> str:
         """Extract type name from field value (handles both string and dict formats)"""
@@ -208,17 +1232,7 @@ class DartGenerator:
 
     def get_byte_data_method(self, type_name: str) -> Tuple[str, str]:
         """Get ByteData read/write method for a type"""
-        methods = {
-            'uint8': ('getUint8', 'setUint8'),
-            'int8': ('getInt8', 'setInt8'),
-            'uint16': ('getUint16', 'setUint16'),
-            'int16': ('getInt16', 'setInt16'),
-            'uint32': ('getUint32', 'setUint32'),
-            'int32': ('getInt32', 'setInt32'),
-            'uint64': ('getUint64', 'setUint64'),
-            'int64': ('getInt64', 'setInt64'),
-        }
-        return methods.get(type_name, ('getUint8', 'setUint8'))
+        return self.BYTE_DATA_METHODS.get(type_name, ('getUint8', 'setUint8'))
 
     def calculate_struct_size(self, fields: Dict, max_string_length: int = 64) -> int:
         """Calculate total size of message in bytes"""
@@ -227,10 +1241,53 @@ class DartGenerator:
             total += self.get_field_size(field_value, max_string_length)
         return total
 
+    def get_message_size(self, msg_name: str) -> int:
+        """Payload size of a message in bytes (computed once per message)"""
+        return self._message_sizes[msg_name]
+
+    # Header extension layout: [Seq:uint8][SendTimeMs:uint16], as in protocol.json
+    HEADER_EXTENSION_SIZE = 3
+
+    def has_header_extension(self, msg_info: Dict) -> bool:
+        """Whether a message carries the [Seq][SendTimeMs] header extension"""
+        return bool(msg_info.get('header_extension', False))
+
+    def _uses_header_extension(self) -> bool:
+        return any(self.has_header_extension(msg_info) for msg_info in self.server_messages.values())
+
+    def get_field_offsets(self, msg_info: Dict) -> List[Tuple[str, Any, int]]:
+        """(name, schema value, payload offset) per field, after any header extension"""
+        offset = self.HEADER_EXTENSION_SIZE if self.has_header_extension(msg_info) else 0
+        offsets = []
+        for field_name, field_value in msg_info['fields'].items():
+            offsets.append((field_name, field_value, offset))
+            offset += self.get_field_size(field_value)
+        return offsets
+
+    def get_field_read_expression(self, field_value, offset: int) -> str:
+        """Dart expression reading a field from ByteData `data` at a payload offset"""
+        field_type = self.get_field_type_name(field_value)
+        if self.is_variable_size(field_type):
+            return f"_bleStringAt(data, {offset}, {self.get_field_size(field_value)})"
+        read_method, _ = self.get_byte_data_method(field_type)
+        if self.types[field_type]['size'] == 1:
+            return f"data.{read_method}({offset})"
+        return f"data.{read_method}({offset}, Endian.little)"
+
+    def get_payload_size(self, msg_name: str) -> int:
+        """Payload bytes on the wire: header extension (if enabled) plus fields"""
+        msg_info = self.server_messages.get(msg_name, {})
+        extension = self.HEADER_EXTENSION_SIZE if self.has_header_extension(msg_info) else 0
+        return extension + self.get_message_size(msg_name)
+
     def to_camel_case(self, snake_str: str) -> str:
         """Convert snake_case to camelCase"""
-        components = snake_str.split('_')
-        return components[0] + ''.join(x.title() for x in components[1:])
+        name = self._camel_case_names.get(snake_str)
+        if name is None:
+            components = snake_str.split('_')
+            name = components[0] + ''.join(x.title() for x in components[1:])
+            self._camel_case_names[snake_str] = name
+        return name
 
     def to_pascal_case(self, snake_str: str) -> str:
         """Convert snake_case to PascalCase"""
@@ -249,11 +1306,12 @@ class DartGenerator:
         lines.append(" * - Decodes server messages (for reception)")
         lines.append(" *")
         lines.append(" * Frame format:")
-        lines.append(" * - First frame: [0xAA][Length][MsgID][Payload...]")
-        lines.append(" * - Continuation: [Payload...]")
-        lines.append(" * - Final frame ends with: [Checksum]")
+        lines.extend(self._get_frame_format_comment())
+        if self._uses_header_extension():
+            lines.append(" * - Extended messages start their payload with [Seq][SendTimeMs:2]")
         lines.append(" */")
         lines.append("")
+        lines.append("import 'dart:async';")
         lines.append("import 'dart:typed_data';")
         lines.append("")
 
@@ -270,18 +1328,50 @@ class DartGenerator:
             lines.append(f"const int {constant_name} = {msg_info['id']};")
         lines.append("")
 
+        # Server message status indices and mask bits
+        lines.append("// Server message status indices (bit positions in status masks)")
+        for index, msg_name in enumerate(self.server_messages):
+            lines.append(f"const int {self.get_decode_index_name(msg_name)} = {index};")
+        lines.append(f"const int bleDecodeMessageCount = {len(self.server_messages)};")
+        lines.append("")
+        if self._has_status_masks():
+            lines.append("// Bulk status mask bits - one bit per server message")
+            for msg_name in self.server_messages:
+                index_name = self.get_decode_index_name(msg_name)
+                lines.append(f"const int msgMask{self.to_pascal_case(msg_name)} = 1 << {index_name};")
+            lines.append("")
+
+        lines.extend(self._get_stats_constants())
+        if self._uses_header_extension():
+            lines.extend(self._get_header_extension_constants())
+        if self.handshake:
+            lines.extend(self._get_handshake_constants())
+
         # Client message classes (client sends these)
         lines.append("// ============================================================================")
         lines.append("// Client message classes (messages client sends)")
         lines.append("// ============================================================================")
         lines.append("")
 
+        max_client_size = max(self.get_message_size(msg_name) for msg_name in self.client_messages)
+        lines.append("/// Frame size of the largest client message (default BleFrameWriter capacity)")
+        lines.append(f"const int bleMaxClientFrameSize = bleFirstHeaderSize + {max_client_size} + 1;")
+        lines.append("")
+        lines.append("/// Common interface of client messages, used by BleFrameWriter")
+        lines.append("abstract class BleClientMessage {")
+        lines.append("  int get messageId;")
+        lines.append("  int get payloadSize;")
+        lines.append("  int get frameSize;")
+        lines.append("  int encodeInto(ByteData target, int offset);")
+        lines.append("}")
+        lines.append("")
+
         for msg_name, msg_info in self.client_messages.items():
             class_name = self.to_pascal_case(msg_name)
-            msg_size = self.calculate_struct_size(msg_info['fields'])
+            msg_size = self.get_message_size(msg_name)
 
             lines.append(f"/// {class_name} message - Client to Server")
-            lines.append(f"class {class_name} {{")
+            lines.append(f"class {class_name} implements BleClientMessage {{")
 
             # Private fields
             for field_name, field_value in msg_info['fields'].items():
@@ -313,19 +1403,39 @@ class DartGenerator:
             lines.append("")
 
             # Message ID getter
+            lines.append("  @override")
             lines.append(f"  int get messageId => {msg_info['id']};")
             lines.append("")
 
-            # Payload size getter
+            # Payload and frame size getters
+            lines.append("  @override")
             lines.append(f"  int get payloadSize => {msg_size};")
             lines.append("")
+            lines.append("  @override")
+            lines.append(f"  int get frameSize => bleFirstHeaderSize + {msg_size} + 1;")
+            lines.append("")
 
-            # Encode method
-            lines.append("  /// Encode message into a BLE frame")
+            # Encode into a new frame
+            lines.append("  /// Encode message into a new BLE frame")
             lines.append("  Uint8List encodeFrame() {")
-            lines.append(f"    final payload = Uint8List({msg_size});")
-            lines.append("    final data = ByteData.view(payload.buffer);")
-            lines.append("    int offset = 0;")
+            lines.append("    final frame = Uint8List(frameSize);")
+            lines.append("    encodeInto(ByteData.sublistView(frame), 0);")
+            lines.append("    return frame;")
+            lines.append("  }")
+            lines.append("")
+
+            # Encode into a caller-owned buffer: [0xAA][Length][MsgID][StreamID?][Payload][Checksum]
+            lines.append("  /// Encode the frame into [target] at [offset] without allocating")
+            lines.append("  /// Returns the number of bytes written; throws RangeError if it does not fit")
+            lines.append("  @override")
+            lines.append("  int encodeInto(ByteData target, int offset) {")
+            lines.append("    RangeError.checkValidRange(offset, offset + frameSize, target.lengthInBytes);")
+            lines.append("    target.setUint8(offset, bleSyncFirst);")
+            lines.append(f"    target.setUint8(offset + 1, {msg_size});")
+            lines.append(f"    target.setUint8(offset + 2, {msg_info['id']});")
+            if self.streams_enabled:
+                lines.append(f"    target.setUint8(offset + 3, {self.get_stream_id(msg_info)});")
+            lines.append("    int position = offset + bleFirstHeaderSize;")
             lines.append("")
 
             for field_name, field_value in msg_info['fields'].items():
@@ -333,16 +1443,14 @@ class DartGenerator:
                 camel_name = self.to_camel_case(field_name)
 
                 if self.is_variable_size(field_type):
-                    # String encoding - null-terminated
+                    # String encoding - null-terminated, rest of the field zeroed
                     field_size = self.get_field_size(field_value)
                     lines.append(f"    // Encode string (null-terminated)")
-                    lines.append(f"    final stringBytes = _{camel_name}.codeUnits;")
-                    lines.append(f"    final bytesToCopy = stringBytes.length < {field_size} - 1 ? stringBytes.length : {field_size} - 1;")
-                    lines.append(f"    for (int i = 0; i < bytesToCopy; i++) {{")
-                    lines.append(f"      payload[offset + i] = stringBytes[i];")
+                    lines.append(f"    final {camel_name}Length = _{camel_name}.length < {field_size} - 1 ? _{camel_name}.length : {field_size} - 1;")
+                    lines.append(f"    for (int i = 0; i < {field_size}; i++) {{")
+                    lines.append(f"      target.setUint8(position + i, i < {camel_name}Length ? _{camel_name}.codeUnitAt(i) : 0);")
                     lines.append(f"    }}")
-                    lines.append(f"    payload[offset + bytesToCopy] = 0; // Null terminator")
-                    lines.append(f"    offset += {field_size};")
+                    lines.append(f"    position += {field_size};")
                     lines.append("")
                 else:
                     # Numeric encoding
@@ -350,22 +1458,14 @@ class DartGenerator:
                     field_size = self.types[field_type]['size']
 
                     if field_size == 1:
-                        lines.append(f"    data.{write_method}(offset, _{camel_name});")
+                        lines.append(f"    target.{write_method}(position, _{camel_name});")
                     else:
-                        lines.append(f"    data.{write_method}(offset, _{camel_name}, Endian.little);")
-                    lines.append(f"    offset += {field_size};")
+                        lines.append(f"    target.{write_method}(position, _{camel_name}, Endian.little);")
+                    lines.append(f"    position += {field_size};")
                     lines.append("")
 
-            # Create frame: [0xAA][Length][MsgID][Payload][Checksum]
-            lines.append(f"    final frameSize = 3 + {msg_size} + 1;")
-            lines.append("    final frame = Uint8List(frameSize);")
-            lines.append("    frame[0] = bleSyncFirst;")
-            lines.append(f"    frame[1] = {msg_size};")
-            lines.append(f"    frame[2] = {msg_info['id']};")
-            lines.append(f"    frame.setRange(3, 3 + {msg_size}, payload);")
-            lines.append(f"    frame[frameSize - 1] = _calculateChecksum(payload);")
-            lines.append("")
-            lines.append("    return frame;")
+            lines.append(f"    target.setUint8(position, _calculateChecksumAt(target, offset + bleFirstHeaderSize, {msg_size}));")
+            lines.append("    return frameSize;")
             lines.append("  }")
             lines.append("")
 
@@ -380,21 +1480,23 @@ class DartGenerator:
             lines.append("}")
             lines.append("")
 
+        lines.extend(self._generate_frame_writer_class())
+
         # Decoder class for multi-frame reassembly
         lines.append("// ============================================================================")
         lines.append("// Decoder class for server messages (multi-frame support)")
         lines.append("// ============================================================================")
         lines.append("")
 
-        max_server_size = max(self.calculate_struct_size(msg['fields']) for msg in self.server_messages.values())
+        max_server_size = max(self.get_payload_size(msg_name) for msg_name in self.server_messages)
+
+        lines.extend(self._generate_reassembly_slot_class())
 
         lines.append("/// Decoder for server messages with multi-frame reassembly support")
         lines.append("class BleDecoder {")
-        lines.append(f"  final Uint8List _payloadBuffer = Uint8List({max_server_size});")
-        lines.append("  int _expectedSize = 0;")
-        lines.append("  int _bytesReceived = 0;")
-        lines.append("  int _msgId = 0;")
-        lines.append("  bool _valid = false;")
+        lines.append(f"  static const int _maxPayloadSize = {max_server_size};")
+        lines.append("  final List<_BleReassemblySlot> _slots =")
+        lines.append("      List<_BleReassemblySlot>.generate(bleReassemblySlots, (_) => _BleReassemblySlot(_maxPayloadSize));")
         lines.append("")
 
         # Per-message storage
@@ -402,22 +1504,84 @@ class DartGenerator:
             class_name = self.to_pascal_case(msg_name)
             camel_name = self.to_camel_case(msg_name)
             lines.append(f"  {class_name}? _{camel_name};")
-            lines.append(f"  int _{camel_name}TimestampMs = 0;")
-            lines.append(f"  bool _{camel_name}Unread = false;")
+        lines.append("")
+
+        # Field-level change tracking
+        lines.append("  // Per-field change tracking, updated on every stored message")
+        for msg_name in self.server_messages:
+            class_name = self.to_pascal_case(msg_name)
+            camel_name = self.to_camel_case(msg_name)
+            lines.append(f"  final {class_name}Changes {camel_name}Changes = {class_name}Changes();")
+        lines.append("")
+
+        # Optional per-message history rings (schema "history": capacity)
+        history_messages = [msg_name for msg_name, msg_info in self.server_messages.items()
+                            if self.get_history_capacity(msg_info)]
+        if history_messages:
+            lines.append("  // Sample history, appended on every stored message")
+            for msg_name in history_messages:
+                class_name = self.to_pascal_case(msg_name)
+                camel_name = self.to_camel_case(msg_name)
+                lines.append(f"  final {class_name}History {camel_name}History = {class_name}History();")
+            lines.append("")
+
+        # Message status arrays, indexed by msgIndex*
+        max_ages = ', '.join(str(msg_info.get('maxAge', 1000)) for msg_info in self.server_messages.values())
+        lines.append("  final List<bool> _available = List<bool>.filled(bleDecodeMessageCount, false);")
+        lines.append("  final List<bool> _unread = List<bool>.filled(bleDecodeMessageCount, false);")
+        lines.append("  final Int64List _timestampsMs = Int64List(bleDecodeMessageCount);")
+        lines.append(f"  static const List<int> _maxAgeMs = [{max_ages}];")
+        lines.append("")
+        lines.append("  // Notified on every stored message (one per attached BleStalenessWatchdog)")
+        lines.append("  final List<void Function(int messageIndex, int timestampMs)> _storeListeners =")
+        lines.append("      <void Function(int messageIndex, int timestampMs)>[];")
+        lines.append("")
+        lines.append("  /// Called with every validated payload before it is decoded; [payload] is a")
+        lines.append("  /// view into a reused buffer, so copy it to keep it past the call")
+        lines.append("  void Function(int messageIndex, Uint8List payload, int timestampMs)? payloadListener;")
+        lines.append("")
+        lines.append("  /// False skips message objects, change tracking, history and link metrics,")
+        lines.append("  /// so get*() return null; stats, status flags and payloadListener still update.")
+        lines.append("  /// BleIsolateDecoder's worker decodes this way, since nothing reads its copies")
+        lines.append("  final bool tracking;")
+        lines.append("")
+        lines.append("  BleDecoder({this.tracking = true});")
+        lines.append("")
+        lines.append("  /// Health counters (only updated when built with BLE_STATS)")
+        lines.append("  final BleDecoderStats stats = BleDecoderStats();")
+        lines.append("")
+        if self._uses_header_extension():
+            lines.append("  /// Sequence gaps and latency of messages with the header extension")
+            lines.append("  final BleLinkMetrics linkMetrics = BleLinkMetrics();")
+            lines.append("")
+        if self.handshake:
+            lines.append("  /// Mode negotiated with the server (updated when the handshake response arrives)")
+            lines.append("  final BleLink link = BleLink();")
+            lines.append("")
+        lines.append("  // Count a decode stage and pass it to bleTraceHook; both checks are")
+        lines.append("  // compile-time constants, so this compiles to nothing by default")
+        lines.append("  void _event(int event, int msgId) {")
+        lines.append("    if (bleStatsEnabled) stats._events[event]++;")
+        lines.append("    if (bleTraceEnabled) bleTraceHook?.call(event, msgId);")
+        lines.append("  }")
         lines.append("")
 
         # Protocol layer decode methods
         lines.extend(self._generate_decode_frame_method())
+        lines.extend(self._generate_reassembly_slot_methods())
         lines.extend(self._generate_store_message_method())
 
         # Add internal decode methods (from buffer)
         for msg_name, msg_info in self.server_messages.items():
             class_name = self.to_pascal_case(msg_name)
-            lines.append(f"  /// Internal: Decode {msg_name} from payload buffer")
-            lines.append(f"  {class_name} _decode{class_name}FromBuffer() {{")
+            lines.append(f"  /// Internal: Decode {msg_name} from a validated payload")
+            lines.append(f"  {class_name} _decode{class_name}FromBuffer(Uint8List payload) {{")
             lines.append(f"    final msg = {class_name}._();")
-            lines.append("    final data = ByteData.view(_payloadBuffer.buffer);")
-            lines.append("    int offset = 0;")
+            lines.append("    final data = ByteData.sublistView(payload);")
+            if self.has_header_extension(msg_info):
+                lines.append("    int offset = bleHeaderExtensionSize; // Skip [Seq][SendTimeMs]")
+            else:
+                lines.append("    int offset = 0;")
             lines.append("")
 
             for field_name, field_value in msg_info['fields'].items():
@@ -430,7 +1594,7 @@ class DartGenerator:
                     lines.append(f"    // Decode string (null-terminated)")
                     lines.append(f"    final stringBytes = <int>[];")
                     lines.append(f"    for (int i = 0; i < {field_size}; i++) {{")
-                    lines.append(f"      final byte = _payloadBuffer[offset + i];")
+                    lines.append(f"      final byte = payload[offset + i];")
                     lines.append(f"      if (byte == 0) break; // Null terminator")
                     lines.append(f"      stringBytes.add(byte);")
                     lines.append(f"    }}")
@@ -460,7 +1624,7 @@ class DartGenerator:
             lines.append(f"  /// Get stored {msg_name} message (returns null if no message available)")
             lines.append(f"  {class_name}? get{class_name}() {{")
             lines.append(f"    if (_{camel_name} != null) {{")
-            lines.append(f"      _{camel_name}Unread = false;")
+            lines.append(f"      _unread[{self.get_decode_index_name(msg_name)}] = false;")
             lines.append(f"    }}")
             lines.append(f"    return _{camel_name};")
             lines.append("  }")
@@ -471,26 +1635,40 @@ class DartGenerator:
             class_name = self.to_pascal_case(msg_name)
             camel_name = self.to_camel_case(msg_name)
             max_age = msg_info.get('maxAge', 1000)
+            index_name = self.get_decode_index_name(msg_name)
 
             # Check is unread
             lines.append(f"  /// Check if {msg_name} message is unread")
             lines.append(f"  bool {camel_name}CheckIsUnread() {{")
-            lines.append(f"    return _{camel_name} != null && _{camel_name}Unread;")
+            lines.append(f"    return _available[{index_name}] && _unread[{index_name}];")
             lines.append("  }")
             lines.append("")
 
             # Check data is stale
             lines.append(f"  /// Check if {msg_name} data is stale (max age: {max_age}ms)")
             lines.append(f"  bool {camel_name}CheckDataIsStale(int timeMs) {{")
-            lines.append(f"    if (_{camel_name} == null) return true;")
-            lines.append(f"    final ageMs = timeMs - _{camel_name}TimestampMs;")
+            lines.append(f"    if (!_available[{index_name}]) return true;")
+            lines.append(f"    final ageMs = timeMs - _timestampsMs[{index_name}];")
             lines.append(f"    return ageMs > {max_age};")
             lines.append("  }")
             lines.append("")
 
+        if self._has_status_masks():
+            lines.extend(self._generate_status_mask_methods())
+
         lines.append("}")
         lines.append("")
 
+        lines.extend(self._generate_staleness_watchdog_class())
+        lines.extend(self._generate_state_coalescer_classes())
+        lines.extend(self._generate_history_classes())
+        lines.extend(self._generate_change_tracking_classes())
+        lines.extend(self._generate_stats_class())
+        if self._uses_header_extension():
+            lines.extend(self._generate_link_metrics_class())
+        if self.handshake:
+            lines.extend(self._generate_link_class())
+
         # Server message classes (client receives these)
         lines.append("// ============================================================================")
         lines.append("// Server message classes (messages client receives)")
@@ -499,7 +1677,7 @@ class DartGenerator:
 
         for msg_name, msg_info in self.server_messages.items():
             class_name = self.to_pascal_case(msg_name)
-            msg_size = self.calculate_struct_size(msg_info['fields'])
+            msg_size = self.get_message_size(msg_name)
 
             lines.append(f"/// {class_name} message - Server to Client")
             lines.append(f"class {class_name} {{")
@@ -548,6 +1726,8 @@ class DartGenerator:
         lines.append("// ============================================================================")
         lines.append("")
         lines.extend(self._generate_checksum_function())
+        lines.append("")
+        lines.extend(self._generate_fragment_function())
 
         return '\n'.join(lines)
 
@@ -564,27 +1744,256 @@ class DartGenerator:
         lines.append(" */")
         lines.append("")
         lines.append("// Decoder functionality is now built into message classes")
-        lines.append("// - Client messages: Use encodeFrame() method")
+        lines.append("// - Client messages: Use encodeFrame(), or encodeInto()/BleFrameWriter to reuse buffers")
         lines.append("// - Server messages: Use static decode() method")
 
         return '\n'.join(lines)
 
+    def generate_isolate(self) -> str:
+        """Generate the background-isolate decoder (separate file: dart:isolate is unavailable on the web)"""
+        lines = []
+        lines.append("/**")
+        lines.append(f" * BLE Telemetry Protocol v{self.protocol['version']} - background-isolate decoder")
+        lines.append(" * Auto-generated from schema.json")
+        lines.append(" * DO NOT EDIT MANUALLY")
+        lines.append(" *")
+        lines.append(" * Reassembly, checksum and decode run on a worker isolate. Notifications are")
+        lines.append(" * posted in batches as TransferableTypedData, and validated payloads come back")
+        lines.append(" * as one typed-data block per message type, so the cross-isolate cost is paid")
+        lines.append(" * per batch rather than per notification.")
+        lines.append(" */")
+        lines.append("")
+        lines.append("import 'dart:async';")
+        lines.append("import 'dart:isolate';")
+        lines.append("import 'dart:typed_data';")
+        lines.append("")
+        lines.append("import 'ble_messages.dart';")
+        lines.append("")
+
+        payload_sizes = ', '.join(str(self.get_payload_size(msg_name)) for msg_name in self.server_messages)
+        message_ids = ', '.join(f"msgId{self.to_pascal_case(msg_name)}" for msg_name in self.server_messages)
+        lines.append("// Payload size and message ID per msgIndex*")
+        lines.append(f"const List<int> _payloadSizes = [{payload_sizes}];")
+        lines.append(f"const List<int> _messageIds = [{message_ids}];")
+        lines.append("")
+
+        lines.append("/// Validated payloads of one server message type from one batch, oldest first")
+        lines.append("class BleMessageBlock {")
+        lines.append("  /// msgIndex* constant of the message type")
+        lines.append("  final int messageIndex;")
+        lines.append("")
+        lines.append("  /// Receive time of each payload")
+        lines.append("  final Int64List timestampsMs;")
+        lines.append("")
+        lines.append("  /// [count] payloads of [payloadSize] bytes, back to back")
+        lines.append("  final Uint8List payloads;")
+        lines.append("")
+        lines.append("  BleMessageBlock._(this.messageIndex, this.timestampsMs, this.payloads);")
+        lines.append("")
+        lines.append("  int get count => timestampsMs.length;")
+        lines.append("  int get messageId => _messageIds[messageIndex];")
+        lines.append("  int get payloadSize => _payloadSizes[messageIndex];")
+        lines.append("")
+        lines.append("  /// Payload [i] as a view into [payloads] (no copy)")
+        lines.append("  Uint8List payloadAt(int i) {")
+        lines.append("    return Uint8List.sublistView(payloads, i * payloadSize, (i + 1) * payloadSize);")
+        lines.append("  }")
+        lines.append("}")
+        lines.append("")
+
+        lines.append("/// One message type's payloads collected on the worker isolate")
+        lines.append("class _BleBlockBuilder {")
+        lines.append("  final BytesBuilder payloads = BytesBuilder();")
+        lines.append("  final List<int> timestampsMs = <int>[];")
+        lines.append("}")
+        lines.append("")
+
+        lines.append("/// Worker isolate entry point")
+        lines.append("/// Batches arrive as [bytes, meta] where meta holds [length, timeMs] per notification;")
+        lines.append("/// replies are flat [index, timestamps, payloads, ...] triples, or null after close")
+        lines.append("void _bleDecodeWorker(SendPort replyPort) {")
+        lines.append("  final commands = ReceivePort();")
+        lines.append("  replyPort.send(commands.sendPort);")
+        lines.append("")
+        lines.append("  final decoder = BleDecoder(tracking: false);")
+        lines.append("  final builders = List<_BleBlockBuilder>.generate(bleDecodeMessageCount, (_) => _BleBlockBuilder());")
+        lines.append("  decoder.payloadListener = (messageIndex, payload, timestampMs) {")
+        lines.append("    final builder = builders[messageIndex];")
+        lines.append("    builder.payloads.add(payload); // Copies - payload is a reused slot view")
+        lines.append("    builder.timestampsMs.add(timestampMs);")
+        lines.append("  };")
+        lines.append("")
+        lines.append("  commands.listen((message) {")
+        lines.append("    if (message == null) {")
+        lines.append("      commands.close();")
+        lines.append("      replyPort.send(null);")
+        lines.append("      return;")
+        lines.append("    }")
+        lines.append("    final batch = message as List<Object?>;")
+        lines.append("    final bytes = (batch[0] as TransferableTypedData).materialize().asUint8List();")
+        lines.append("    final meta = (batch[1] as TransferableTypedData).materialize().asInt64List();")
+        lines.append("")
+        lines.append("    var offset = 0;")
+        lines.append("    for (var i = 0; i < meta.length; i += 2) {")
+        lines.append("      final length = meta[i];")
+        lines.append("      decoder.decodeFrame(Uint8List.sublistView(bytes, offset, offset + length), meta[i + 1]);")
+        lines.append("      offset += length;")
+        lines.append("    }")
+        lines.append("")
+        lines.append("    final reply = <Object>[];")
+        lines.append("    for (var index = 0; index < bleDecodeMessageCount; index++) {")
+        lines.append("      final builder = builders[index];")
+        lines.append("      if (builder.timestampsMs.isEmpty) continue;")
+        lines.append("      reply")
+        lines.append("        ..add(index)")
+        lines.append("        ..add(TransferableTypedData.fromList([Int64List.fromList(builder.timestampsMs)]))")
+        lines.append("        ..add(TransferableTypedData.fromList([builder.payloads.takeBytes()]));")
+        lines.append("      builder.timestampsMs.clear();")
+        lines.append("    }")
+        lines.append("    replyPort.send(reply);")
+        lines.append("  });")
+        lines.append("}")
+        lines.append("")
+
+        lines.append("/// Decodes notifications on a background isolate")
+        lines.append("///")
+        lines.append("/// Notifications queue up until [maxBatchNotifications] are pending or")
+        lines.append("/// [maxBatchDelay] has passed, then go to the worker as one transfer. Each")
+        lines.append("/// decoded batch is emitted on [batches], and [latest] is updated with the")
+        lines.append("/// newest payload of each message type, so its getters, unread and staleness")
+        lines.append("/// checks behave like a BleDecoder fed on the UI isolate.")
+        lines.append("class BleIsolateDecoder {")
+        lines.append("  final int maxBatchNotifications;")
+        lines.append("  final Duration maxBatchDelay;")
+        lines.append("")
+        lines.append("  /// Latest-value state, updated once per message type per batch")
+        lines.append("  final BleDecoder latest = BleDecoder();")
+        lines.append("")
+        lines.append("  final ReceivePort _replies;")
+        lines.append("  late final SendPort _commands;")
+        lines.append("  final Completer<void> _ready = Completer<void>();")
+        lines.append("  final Completer<void> _closed = Completer<void>();")
+        lines.append("  final StreamController<List<BleMessageBlock>> _batches =")
+        lines.append("      StreamController<List<BleMessageBlock>>.broadcast();")
+        lines.append("")
+        lines.append("  // Queued notifications and their [length, timeMs] pairs")
+        lines.append("  final List<Uint8List> _pending = <Uint8List>[];")
+        lines.append("  final Int64List _pendingMeta;")
+        lines.append("  Timer? _flushTimer;")
+        lines.append("  bool _closing = false;")
+        lines.append("")
+        lines.append("  BleIsolateDecoder._(this._replies, this.maxBatchNotifications, this.maxBatchDelay)")
+        lines.append("      : _pendingMeta = Int64List(2 * maxBatchNotifications) {")
+        lines.append("    _replies.listen(_onReply);")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Start the worker isolate")
+        lines.append("  static Future<BleIsolateDecoder> spawn({")
+        lines.append("    int maxBatchNotifications = 64,")
+        lines.append("    Duration maxBatchDelay = const Duration(milliseconds: 16),")
+        lines.append("  }) async {")
+        lines.append("    final replies = ReceivePort();")
+        lines.append("    final decoder = BleIsolateDecoder._(replies, maxBatchNotifications, maxBatchDelay);")
+        lines.append("    await Isolate.spawn(_bleDecodeWorker, replies.sendPort, debugName: 'BleIsolateDecoder');")
+        lines.append("    await decoder._ready.future;")
+        lines.append("    return decoder;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Decoded batches; batches that completed no message are not emitted")
+        lines.append("  Stream<List<BleMessageBlock>> get batches => _batches.stream;")
+        lines.append("")
+        lines.append("  /// Queue a notification; [frame] is referenced, not copied, until the next flush")
+        lines.append("  void addNotification(Uint8List frame, int timeMs) {")
+        lines.append("    if (_closing) throw StateError('BleIsolateDecoder is closed');")
+        lines.append("    final count = _pending.length;")
+        lines.append("    _pendingMeta[2 * count] = frame.length;")
+        lines.append("    _pendingMeta[2 * count + 1] = timeMs;")
+        lines.append("    _pending.add(frame);")
+        lines.append("    if (_pending.length == maxBatchNotifications) {")
+        lines.append("      flush();")
+        lines.append("    } else {")
+        lines.append("      _flushTimer ??= Timer(maxBatchDelay, flush);")
+        lines.append("    }")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Send queued notifications to the worker now")
+        lines.append("  void flush() {")
+        lines.append("    _flushTimer?.cancel();")
+        lines.append("    _flushTimer = null;")
+        lines.append("    if (_pending.isEmpty) return;")
+        lines.append("    final meta = Int64List.sublistView(_pendingMeta, 0, 2 * _pending.length);")
+        lines.append("    _commands.send([TransferableTypedData.fromList(_pending), TransferableTypedData.fromList([meta])]);")
+        lines.append("    _pending.clear();")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  /// Flush, let the worker finish every queued batch, then stop it")
+        lines.append("  Future<void> close() {")
+        lines.append("    if (!_closing) {")
+        lines.append("      _closing = true;")
+        lines.append("      flush();")
+        lines.append("      _commands.send(null);")
+        lines.append("    }")
+        lines.append("    return _closed.future;")
+        lines.append("  }")
+        lines.append("")
+        lines.append("  void _onReply(Object? message) {")
+        lines.append("    if (message is SendPort) {")
+        lines.append("      _commands = message;")
+        lines.append("      _ready.complete();")
+        lines.append("      return;")
+        lines.append("    }")
+        lines.append("    if (message == null) {")
+        lines.append("      _replies.close();")
+        lines.append("      _batches.close();")
+        lines.append("      _closed.complete();")
+        lines.append("      return;")
+        lines.append("    }")
+        lines.append("    final reply = message as List<Object?>;")
+        lines.append("    if (reply.isEmpty) return;")
+        lines.append("")
+        lines.append("    final blocks = <BleMessageBlock>[];")
+        lines.append("    for (var i = 0; i < reply.length; i += 3) {")
+        lines.append("      final block = BleMessageBlock._(")
+        lines.append("        reply[i] as int,")
+        lines.append("        (reply[i + 1] as TransferableTypedData).materialize().asInt64List(),")
+        lines.append("        (reply[i + 2] as TransferableTypedData).materialize().asUint8List(),")
+        lines.append("      );")
+        lines.append("      final last = block.count - 1;")
+        lines.append("      // Only the newest payload is decoded and stored; change streams, history and")
+        lines.append("      // link metrics read every older one straight from the block's bytes")
+        lines.append("      for (var j = 0; j < last; j++) {")
+        lines.append("        latest.replayPayload(block.messageId, block.payloadAt(j), block.timestampsMs[j]);")
+        lines.append("      }")
+        lines.append("      latest.acceptPayload(block.messageId, block.payloadAt(last), block.timestampsMs[last]);")
+        lines.append("      blocks.add(block);")
+        lines.append("    }")
+        lines.append("    _batches.add(blocks);")
+        lines.append("  }")
+        lines.append("}")
+        lines.append("")
+
+        return '\n'.join(lines)
+
 
-def generate_dart_code(protocol_schema_path: str, messages_schema_path: str, output_dir: str = '.'):
+def generate_dart_code(protocol_schema_path: str, messages_schema_path: str, output_dir: str = '.',
+                       enabled_messages: Optional[Iterable[str]] = None):
     """Main function to generate Dart code
 
     Args:
         protocol_schema_path: Path to protocol.json (frame format, types)
         messages_schema_path: Path to messages.json (message definitions)
         output_dir: Output directory for generated files
+        enabled_messages: Only generate these messages (default: all)
     """
     with open(protocol_schema_path, 'r') as f:
         protocol_schema = json.load(f)
 
     with open(messages_schema_path, 'r') as f:
-        messages_schema = json.load(f)
+        all_messages_schema = json.load(f)
+    messages_schema = select_messages(all_messages_schema, enabled_messages)
 
-    generator = DartGenerator(protocol_schema, messages_schema)
+    generator = DartGenerator(protocol_schema, messages_schema,
+                              schema_hash=schema_hash32(protocol_schema, all_messages_schema))
 
     # Generate messages
     messages_content = generator.generate_messages()
@@ -600,6 +2009,13 @@ def generate_dart_code(protocol_schema_path: str, messages_schema_path: str, out
         f.write(codec_content)
     print(f"Generated: {codec_path}")
 
+    # Generate background-isolate decoder
+    isolate_content = generator.generate_isolate()
+    isolate_path = f"{output_dir}/ble_isolate.dart"
+    with open(isolate_path, 'w') as f:
+        f.write(isolate_content)
+    print(f"Generated: {isolate_path}")
+
 
 if __name__ == '__main__':
     import sys
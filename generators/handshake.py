@@ -0,0 +1,109 @@
+"""
+Connection-time handshake for BLE Protocol code generation
+
+One client message is marked as the handshake request and one server message
+as the response:
+
+    "handshake_request": {"id": "0x7F", "handshake": "request", "fields": {...}}
+    "handshake_response": {"id": "0x7E", "handshake": "response", "fields": {...}}
+
+Both carry HANDSHAKE_FIELDS. The generated runtimes fill them from the values
+below and negotiate the per-connection mode from the peer's copy; the feature
+bits and baseline MTU come from "handshake" in protocol.json.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+HANDSHAKE_FIELDS = ('protocol_version', 'schema_hash', 'max_reassembly', 'mtu', 'features')
+
+
+def find_handshake(messages_schema: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """(request, response) message names, or None if the schema defines no handshake"""
+    messages = messages_schema['messages']
+    requests = [name for name, info in messages['client'].items() if info.get('handshake') == 'request']
+    responses = [name for name, info in messages['server'].items() if info.get('handshake') == 'response']
+    if not requests and not responses:
+        return None
+    if len(requests) != 1 or len(responses) != 1:
+        raise ValueError("Handshake needs exactly one client 'request' and one server 'response' message")
+    for direction, name in (('client', requests[0]), ('server', responses[0])):
+        missing = [field for field in HANDSHAKE_FIELDS if field not in messages[direction][name]['fields']]
+        if missing:
+            raise ValueError(f"{name}: handshake message is missing field(s) {', '.join(missing)}")
+    return requests[0], responses[0]
+
+
+def _wire_field(types: Dict[str, Any], field_value) -> List[Any]:
+    """Type name and size of a message field (strings: their fixed max_length)"""
+    if isinstance(field_value, dict):
+        type_name = field_value['type']
+        max_length = field_value.get('max_length', 64)
+    else:
+        type_name, max_length = field_value, 64
+    size = types[type_name]['size']
+    return [type_name, max_length if size == 'variable' else size]
+
+
+def wire_format(protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of the schemas that decide the bytes on the wire
+
+    Frame layout, byte order, checksum, stream framing, and per message its ID,
+    stream ID, header extension flag and field types in order. Names,
+    descriptions, maxAge, priorities and build options (decode, stats) are left
+    out, so they do not change the handshake schema hash.
+    """
+    frame = protocol_schema['frame']
+    stream = frame.get('stream', {})
+    types = protocol_schema['types']
+
+    def frame_fields(part: str) -> List[List[Any]]:
+        return [[field['name'], field['type'], field.get('value')] for field in frame.get(part, {}).get('fields', [])]
+
+    messages = {}
+    for direction in ('server', 'client'):
+        messages[direction] = sorted(
+            [int(info['id'], 16), info.get('stream') if stream.get('enabled') else None,
+             bool(info.get('header_extension')),
+             [_wire_field(types, value) for value in info['fields'].values()]]
+            for info in messages_schema['messages'][direction].values()
+        )
+    extension = protocol_schema.get('header_extension', {})
+    return {
+        'byte_order': frame.get('byte_order'),
+        'checksum': frame.get('checksum', {}).get('algorithm'),
+        'frame': {part: frame_fields(part) for part in ('first', 'continuation', 'final')},
+        'stream': [stream.get('continuation_sync', '0x55')] if stream.get('enabled') else None,
+        'header_extension': [[field['name'], field['type']] for field in extension.get('fields', [])],
+        'messages': messages,
+    }
+
+
+def wire_format_sha256(protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any]) -> bytes:
+    """SHA-256 over the canonical JSON of the wire format (the schema hash of capture files)"""
+    canonical = json.dumps(wire_format(protocol_schema, messages_schema), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).digest()
+
+
+def schema_hash32(protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any]) -> int:
+    """First 4 bytes (little endian) of the wire format SHA-256"""
+    return int.from_bytes(wire_format_sha256(protocol_schema, messages_schema)[:4], 'little')
+
+
+def protocol_version16(version: str) -> int:
+    """Pack 'major.minor.patch' as major << 8 | minor (patch releases stay wire compatible)"""
+    major, minor = (int(part) for part in version.split('.')[:2])
+    return (major << 8) | minor
+
+
+def get_features(protocol_schema: Dict[str, Any]) -> Dict[str, int]:
+    """Feature name -> bit number"""
+    features = protocol_schema.get('handshake', {}).get('features', {})
+    return {name: info['bit'] for name, info in features.items()}
+
+
+def get_default_mtu(protocol_schema: Dict[str, Any]) -> int:
+    """MTU both ends use until the handshake completes"""
+    return protocol_schema.get('handshake', {}).get('default_mtu', 20)
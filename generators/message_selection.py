@@ -0,0 +1,53 @@
+"""
+Message subset selection for BLE Protocol code generation
+
+A build can be limited to a subset of messages, either by an explicit
+allowlist or by a named profile from messages.json:
+
+    "profiles": {
+        "dashboard_lite": {
+            "description": "...",
+            "messages": ["heartbeat", "bms_status", "config_set"],
+            "dart": ["heartbeat", "bms_status", "motor_data", "config_set"]
+        }
+    }
+
+"messages" applies to every language; a language key (c, dart, python)
+overrides it for that language. Unselected messages are removed from the
+schema before generation, so they produce no code at all. Handshake messages
+(marked "handshake") are always kept, so every build can negotiate.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def get_profile_messages(messages_schema: Dict[str, Any], profile: str, lang: str) -> List[str]:
+    """Get the messages a profile enables for a language"""
+    profiles = messages_schema.get('profiles', {})
+    if profile not in profiles:
+        available = ', '.join(sorted(profiles)) or 'none defined'
+        raise ValueError(f"Unknown profile '{profile}' (available: {available})")
+    profile_info = profiles[profile]
+    return list(profile_info.get(lang, profile_info['messages']))
+
+
+def select_messages(messages_schema: Dict[str, Any], enabled: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Return a copy of messages_schema with only the enabled messages (schema order kept)"""
+    if enabled is None:
+        return messages_schema
+    enabled = set(enabled)
+    messages = messages_schema['messages']
+    unknown = enabled - set(messages['server']) - set(messages['client'])
+    if unknown:
+        raise ValueError(f"Unknown message(s): {', '.join(sorted(unknown))}")
+
+    selected = dict(messages_schema)
+    selected['messages'] = {
+        direction: {name: info for name, info in messages[direction].items()
+                    if name in enabled or 'handshake' in info}
+        for direction in ('server', 'client')
+    }
+    for direction in ('server', 'client'):
+        if not selected['messages'][direction]:
+            raise ValueError(f"Message selection must keep at least one {direction} message")
+    return selected
@@ -0,0 +1,769 @@
+"""
+Python Code Generator for BLE Protocol
+Generates a host-side codec and asyncio gateway from schema.json
+Host-side implementation: Encodes and decodes both server and client messages,
+so gateways, log tools and simulators can sit on either end of the link
+
+Frame format:
+- First frame: [0xAA][Length][MsgID][Payload...]
+- Continuation: [Payload...]
+- Final frame ends with: [Checksum] (covers entire payload)
+
+With frame.stream enabled, first frames carry a [StreamID] after MsgID and
+continuation frames become [0x55][StreamID][Payload...].
+"""
+
+import json
+from typing import Dict, List, Any, Iterable, Optional
+
+from handshake import find_handshake, get_default_mtu, get_features, protocol_version16, schema_hash32
+from message_selection import select_messages
+
+
+class PythonGenerator:
+    def __init__(self, protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any],
+                 schema_hash: Optional[int] = None):
+        """
+        Initialize generator with separate protocol and message schemas
+
+        Args:
+            protocol_schema: Contains protocol, frame, and types definitions
+            messages_schema: Contains message definitions (server and client)
+            schema_hash: Handshake schema hash (default: hash of the given schemas;
+                pass the hash of the unselected schema when generating a subset)
+        """
+        self.protocol = protocol_schema['protocol']
+        self.frame = protocol_schema['frame']
+        self.types = protocol_schema['types']
+        self.server_messages = messages_schema['messages']['server']
+        self.client_messages = messages_schema['messages']['client']
+        self.stream = self.frame.get('stream', {})
+        self.streams_enabled = self.stream.get('enabled', False)
+        self.handshake = find_handshake(messages_schema)
+        self.features = get_features(protocol_schema)
+        self.default_mtu = get_default_mtu(protocol_schema)
+        self.schema_hash = schema_hash32(protocol_schema, messages_schema) if schema_hash is None else schema_hash
+        for msg_name, msg_info in self.client_messages.items():
+            if self.has_header_extension(msg_info):
+                raise ValueError(f"{msg_name}: header_extension is only supported on server messages")
+
+    # ========================================================================
+    # Protocol Layer - Frame format and encoding/decoding logic
+    # ========================================================================
+
+    def _get_first_header_size(self) -> int:
+        """Bytes before the payload in a first frame ([Sync][Length][MsgID][StreamID?])"""
+        return 4 if self.streams_enabled else 3
+
+    def _get_continuation_header_size(self) -> int:
+        """Bytes before the payload in a continuation frame ([Sync][StreamID] or none)"""
+        return 2 if self.streams_enabled else 0
+
+    def _get_reassembly_slot_count(self) -> int:
+        """Concurrent reassembly slots (one unless stream IDs are on the wire)"""
+        return self.stream.get('reassembly_slots', 4) if self.streams_enabled else 1
+
+    def _get_protocol_constants(self) -> List[str]:
+        """Generate protocol-level constants (sync bytes, etc.)"""
+        lines = []
+        lines.append("# Protocol constants")
+        first_sync = next(f['value'] for f in self.frame['first']['fields'] if f['name'] == 'sync')
+        lines.append(f"PROTOCOL_VERSION = '{self.protocol['version']}'")
+        lines.append(f"SYNC_FIRST = {first_sync}")
+        if self.streams_enabled:
+            lines.append(f"SYNC_CONTINUATION = {self.stream.get('continuation_sync', '0x55')}")
+        lines.append(f"STREAMS_ENABLED = {self.streams_enabled}")
+        lines.append(f"FIRST_HEADER_SIZE = {self._get_first_header_size()}")
+        lines.append(f"CONTINUATION_HEADER_SIZE = {self._get_continuation_header_size()}")
+        lines.append("")
+        lines.append("# Multi-frame reassembly")
+        lines.append(f"REASSEMBLY_SLOTS = {self._get_reassembly_slot_count()}")
+        lines.append(f"REASSEMBLY_TIMEOUT_MS = {self.stream.get('reassembly_timeout_ms', 1000)}")
+        lines.append("")
+        lines.append("# Header extension [Seq][SendTimeMs] at the start of extended payloads")
+        lines.append("_HEADER_EXTENSION_STRUCT = struct.Struct('<BH')")
+        lines.append("HEADER_EXTENSION_SIZE = _HEADER_EXTENSION_STRUCT.size")
+        lines.append("")
+        if self.handshake:
+            # decode_frame returns one message per notification, so this codec
+            # announces no receive features (packed frames are not split)
+            lines.append("# Connection handshake")
+            lines.append(f"HANDSHAKE_VERSION = 0x{protocol_version16(self.protocol['version']):04X}  # major << 8 | minor")
+            lines.append(f"SCHEMA_HASH = 0x{self.schema_hash:08X}")
+            lines.append(f"DEFAULT_MTU = {self.default_mtu}")
+            for feature, bit in self.features.items():
+                lines.append(f"FEATURE_{feature.upper()} = 1 << {bit}")
+            lines.append("")
+        return lines
+
+    def _generate_frame_functions(self) -> List[str]:
+        """Generate checksum, frame building and fragmentation helpers"""
+        lines = []
+        lines.append("def calculate_checksum(data) -> int:")
+        lines.append("    \"\"\"Calculate sum-mod-256 checksum\"\"\"")
+        lines.append("    return sum(data) & 0xFF")
+        lines.append("")
+        lines.append("")
+        lines.append("def build_frame(msg_id: int, payload: bytes, stream_id: int = 0) -> bytes:")
+        lines.append("    \"\"\"Build a complete frame: [0xAA][Length][MsgID][StreamID?][Payload][Checksum]\"\"\"")
+        if self.streams_enabled:
+            lines.append("    header = bytes((SYNC_FIRST, len(payload), msg_id, stream_id))")
+        else:
+            lines.append("    header = bytes((SYNC_FIRST, len(payload), msg_id))")
+        lines.append("    return header + payload + bytes((calculate_checksum(payload),))")
+        lines.append("")
+        lines.append("")
+        lines.append("def fragment_frame(frame: bytes, mtu: int) -> List[bytes]:")
+        lines.append("    \"\"\"Split a complete frame into MTU-sized fragments\"\"\"")
+        lines.append("    fragments = [frame[:mtu]]")
+        lines.append("    offset = len(fragments[0])")
+        if self.streams_enabled:
+            lines.append("    header = bytes((SYNC_CONTINUATION, frame[3]))")
+        else:
+            lines.append("    # Continuation frames are raw payload, so every fragment is a plain slice")
+            lines.append("    header = b''")
+        lines.append("    chunk = mtu - len(header)")
+        lines.append("    if chunk <= 0:")
+        lines.append("        raise ValueError(f'MTU {mtu} too small for continuation frames')")
+        lines.append("    while offset < len(frame):")
+        lines.append("        fragments.append(header + frame[offset:offset + chunk])")
+        lines.append("        offset += chunk")
+        lines.append("    return fragments")
+        lines.append("")
+        lines.append("")
+        lines.append("def read_header_extension(payload) -> Tuple[int, int]:")
+        lines.append("    \"\"\"(seq, send_time_ms) of a payload whose message has HEADER_EXTENSION\"\"\"")
+        lines.append("    return _HEADER_EXTENSION_STRUCT.unpack_from(payload)")
+        lines.append("")
+        lines.append("")
+        lines.append("def _decode_string(raw: bytes) -> str:")
+        lines.append("    \"\"\"Decode a null-terminated string field\"\"\"")
+        lines.append("    return raw.split(b'\\0', 1)[0].decode('latin-1')")
+        lines.append("")
+        lines.append("")
+        lines.append("def _encode_string(value: str, size: int) -> bytes:")
+        lines.append("    \"\"\"Encode a string field, truncated to leave room for the null terminator\"\"\"")
+        lines.append("    return value.encode('latin-1', 'replace')[:size - 1]")
+        lines.append("")
+        lines.append("")
+        return lines
+
+    def _generate_decoder_class(self) -> List[str]:
+        """Generate frame decoder with multi-slot reassembly (mirrors the C/Dart decoders)"""
+        lines = []
+        lines.append("class _ReassemblySlot:")
+        lines.append("    __slots__ = ('stream_id', 'msg_id', 'expected_size', 'payload', 'last_frame_ms')")
+        lines.append("")
+        lines.append("    def __init__(self, stream_id: int, msg_id: int, expected_size: int, time_ms: int):")
+        lines.append("        self.stream_id = stream_id")
+        lines.append("        self.msg_id = msg_id")
+        lines.append("        self.expected_size = expected_size")
+        lines.append("        self.payload = bytearray()")
+        lines.append("        self.last_frame_ms = time_ms")
+        lines.append("")
+        lines.append("")
+        lines.append("class BleDecoder:")
+        lines.append("    \"\"\"Frame decoder for packet transports (one BLE notification per frame)\"\"\"")
+        lines.append("")
+        lines.append("    def __init__(self):")
+        lines.append("        self._slots: Dict[int, _ReassemblySlot] = {}")
+        lines.append("")
+        lines.append("    def decode_frame(self, frame: bytes, time_ms: int = 0):")
+        lines.append("        \"\"\"Decode a frame (supports multi-frame reassembly)")
+        lines.append("")
+        lines.append("        Returns the decoded message once complete and validated, otherwise None")
+        lines.append("        \"\"\"")
+        lines.append("        if not frame:")
+        lines.append("            return None")
+        lines.append("")
+        lines.append("        # Release partial messages that have not progressed within the timeout")
+        lines.append("        for stream_id, slot in list(self._slots.items()):")
+        lines.append("            if time_ms - slot.last_frame_ms > REASSEMBLY_TIMEOUT_MS:")
+        lines.append("                del self._slots[stream_id]")
+        lines.append("")
+        lines.append("        if frame[0] == SYNC_FIRST:")
+        lines.append("            if len(frame) < FIRST_HEADER_SIZE + 1:")
+        lines.append("                return None")
+        lines.append("            expected_size = frame[1]")
+        lines.append("            msg_id = frame[2]")
+        if self.streams_enabled:
+            lines.append("            stream_id = frame[3]")
+        else:
+            lines.append("            stream_id = 0")
+        lines.append("            payload = frame[FIRST_HEADER_SIZE:]")
+        lines.append("")
+        lines.append("            if len(payload) == expected_size + 1:")
+        lines.append("                # Single-frame message - other slots are left untouched")
+        lines.append("                if payload[expected_size] != calculate_checksum(payload[:expected_size]):")
+        lines.append("                    return None")
+        lines.append("                return decode_payload(msg_id, payload[:expected_size])")
+        lines.append("")
+        lines.append("            if len(payload) > expected_size:")
+        lines.append("                return None")
+        lines.append("            if stream_id not in self._slots and len(self._slots) >= REASSEMBLY_SLOTS:")
+        lines.append("                # Evict the least recently updated slot")
+        lines.append("                oldest = min(self._slots.values(), key=lambda s: s.last_frame_ms)")
+        lines.append("                del self._slots[oldest.stream_id]")
+        lines.append("            slot = _ReassemblySlot(stream_id, msg_id, expected_size, time_ms)")
+        lines.append("            slot.payload += payload")
+        lines.append("            self._slots[stream_id] = slot")
+        lines.append("            return None")
+        lines.append("")
+        if self.streams_enabled:
+            lines.append("        # Continuation frame: [Sync][StreamID][Payload...]")
+            lines.append("        if frame[0] != SYNC_CONTINUATION or len(frame) < CONTINUATION_HEADER_SIZE + 1:")
+            lines.append("            return None")
+            lines.append("        slot = self._slots.get(frame[1])")
+        else:
+            lines.append("        # Continuation frame (no sync byte, just payload)")
+            lines.append("        slot = self._slots.get(0)")
+        lines.append("        if slot is None:")
+        lines.append("            return None")
+        lines.append("        data = frame[CONTINUATION_HEADER_SIZE:]")
+        lines.append("        remaining = slot.expected_size - len(slot.payload)")
+        lines.append("")
+        lines.append("        if len(data) == remaining + 1:")
+        lines.append("            # Final frame - verify checksum and release the slot")
+        lines.append("            del self._slots[slot.stream_id]")
+        lines.append("            slot.payload += data[:remaining]")
+        lines.append("            if data[remaining] != calculate_checksum(slot.payload):")
+        lines.append("                return None")
+        lines.append("            return decode_payload(slot.msg_id, bytes(slot.payload))")
+        lines.append("")
+        lines.append("        if len(data) <= remaining:")
+        lines.append("            slot.payload += data")
+        lines.append("            slot.last_frame_ms = time_ms")
+        lines.append("        return None")
+        lines.append("")
+        lines.append("")
+        return lines
+
+    def _generate_stream_parser_class(self) -> List[str]:
+        """Generate parser that extracts whole frames from a byte stream"""
+        lines = []
+        lines.append("class BleStreamParser:")
+        lines.append("    \"\"\"Extracts whole frames from a byte stream (UART bridge, TCP socket)")
+        lines.append("")
+        lines.append("    The stream carries complete frames back to back. The parser hunts for the")
+        lines.append("    sync byte, validates length and checksum, and resynchronises one byte")
+        lines.append("    later when a candidate frame fails validation.")
+        lines.append("    \"\"\"")
+        lines.append("")
+        lines.append("    def __init__(self):")
+        lines.append("        self._buffer = bytearray()")
+        lines.append("        self.frames = 0")
+        lines.append("        self.checksum_failures = 0")
+        lines.append("        self.unknown_messages = 0")
+        lines.append("        self.resyncs = 0")
+        lines.append("")
+        lines.append("    def feed(self, data: bytes) -> List[Any]:")
+        lines.append("        \"\"\"Append received bytes and return the messages completed by them\"\"\"")
+        lines.append("        buffer = self._buffer")
+        lines.append("        buffer += data")
+        lines.append("        messages = []")
+        lines.append("        position = 0")
+        lines.append("        while True:")
+        lines.append("            start = buffer.find(_SYNC_FIRST_BYTES, position)")
+        lines.append("            if start < 0:")
+        lines.append("                if position < len(buffer):")
+        lines.append("                    self.resyncs += 1")
+        lines.append("                position = len(buffer)")
+        lines.append("                break")
+        lines.append("            if start > position:")
+        lines.append("                self.resyncs += 1")
+        lines.append("            if len(buffer) - start < FIRST_HEADER_SIZE:")
+        lines.append("                position = start")
+        lines.append("                break")
+        lines.append("            length = buffer[start + 1]")
+        lines.append("            end = start + FIRST_HEADER_SIZE + length + 1")
+        lines.append("            if end > len(buffer):")
+        lines.append("                position = start")
+        lines.append("                break")
+        lines.append("            payload = bytes(buffer[start + FIRST_HEADER_SIZE:end - 1])")
+        lines.append("            if buffer[end - 1] != calculate_checksum(payload):")
+        lines.append("                self.checksum_failures += 1")
+        lines.append("                position = start + 1")
+        lines.append("                continue")
+        lines.append("            self.frames += 1")
+        lines.append("            message = decode_payload(buffer[start + 2], payload)")
+        lines.append("            if message is None:")
+        lines.append("                self.unknown_messages += 1")
+        lines.append("            else:")
+        lines.append("                messages.append(message)")
+        lines.append("            position = end")
+        lines.append("        del buffer[:position]")
+        lines.append("        return messages")
+        lines.append("")
+        lines.append("")
+        return lines
+
+    # ========================================================================
+    # Message Layer - Type handling and message-specific logic
+    # ========================================================================
+
+    def get_struct_code(self, field_value) -> str:
+        """Convert schema field to a struct format code"""
+        type_map = {
+            'uint8': 'B',
+            'int8': 'b',
+            'uint16': 'H',
+            'int16': 'h',
+            'uint32': 'I',
+            'int32': 'i',
+            'uint64': 'Q',
+            'int64': 'q',
+        }
+        field_type = self.get_field_type_name(field_value)
+        if self.is_variable_size(field_type):
+            return f"{self.get_field_size(field_value)}s"
+        return type_map[field_type]
+
+    def is_variable_size(self, type_name: str) -> bool:
+        """Check if a type has variable size"""
+        return self.types.get(type_name, {}).get('size') == 'variable'
+
+    def get_field_type_name(self, field_value) -> str:
+        """Extract type name from field value (handles both string and dict formats)"""
+        if isinstance(field_value, dict):
+            return field_value.get('type', field_value)
+        return field_value
+
+    def get_field_max_length(self, field_value, default: int = 64) -> int:
+        """Get max_length for a string field"""
+        if isinstance(field_value, dict):
+            return field_value.get('max_length', default)
+        return default
+
+    def get_field_size(self, field_value, max_string_length: int = 64) -> int:
+        """Get size of a field in bytes"""
+        field_type = self.get_field_type_name(field_value)
+        if self.is_variable_size(field_type):
+            # For null-terminated strings, use max length from field or default
+            return self.get_field_max_length(field_value, max_string_length)
+        return self.types[field_type]['size']
+
+    def to_pascal_case(self, snake_str: str) -> str:
+        """Convert snake_case to PascalCase"""
+        return ''.join(x.title() for x in snake_str.split('_'))
+
+    def get_stream_id(self, msg_info: Dict) -> str:
+        """Get the stream ID a message is sent on (defaults to its message ID)"""
+        return str(msg_info.get('stream', msg_info['id']))
+
+    def has_header_extension(self, msg_info: Dict) -> bool:
+        """Whether a message carries the [Seq][SendTimeMs] header extension"""
+        return bool(msg_info.get('header_extension', False))
+
+    def _generate_message_class(self, msg_name: str, msg_info: Dict, direction: str) -> List[str]:
+        """Generate an immutable message class with payload encode/decode"""
+        lines = []
+        class_name = self.to_pascal_case(msg_name)
+        struct_name = f"_{msg_name.upper()}_STRUCT"
+        fields = msg_info['fields']
+        extended = self.has_header_extension(msg_info)
+        # Extended payloads start with [Seq:B][SendTimeMs:H]; the struct covers both
+        struct_format = '<' + ('BH' if extended else '') + ''.join(self.get_struct_code(v) for v in fields.values())
+        first_field = 2 if extended else 0
+
+        lines.append(f"{struct_name} = struct.Struct('{struct_format}')")
+        lines.append("")
+        lines.append("")
+        lines.append(f"class {class_name}(NamedTuple):")
+        lines.append(f"    \"\"\"{msg_name} message - {direction}\"\"\"")
+        for field_name, field_value in fields.items():
+            field_type = self.get_field_type_name(field_value)
+            if self.is_variable_size(field_type):
+                lines.append(f"    {field_name}: str = ''")
+            else:
+                lines.append(f"    {field_name}: int = 0")
+        lines.append("")
+        lines.append(f"    MSG_ID = {msg_info['id']}")
+        lines.append(f"    STREAM_ID = {self.get_stream_id(msg_info)}")
+        lines.append(f"    MAX_AGE_MS = {msg_info.get('maxAge', 1000)}")
+        lines.append(f"    PAYLOAD_SIZE = {struct_name}.size")
+        lines.append(f"    HEADER_EXTENSION = {extended}")
+        lines.append("")
+
+        # Encode
+        values = []
+        for field_name, field_value in fields.items():
+            if self.is_variable_size(self.get_field_type_name(field_value)):
+                values.append(f"_encode_string(self.{field_name}, {self.get_field_size(field_value)})")
+            else:
+                values.append(f"self.{field_name}")
+        if extended:
+            lines.append("    def encode_payload(self, seq: int = 0, send_time_ms: int = 0) -> bytes:")
+            lines.append(f"        return {struct_name}.pack(seq & 0xFF, send_time_ms & 0xFFFF, {', '.join(values)})")
+            lines.append("")
+            lines.append("    def encode_frame(self, seq: int = 0, send_time_ms: int = 0) -> bytes:")
+            lines.append("        \"\"\"Encode message into a BLE frame, stamping the header extension\"\"\"")
+            lines.append("        return build_frame(self.MSG_ID, self.encode_payload(seq, send_time_ms), self.STREAM_ID)")
+        else:
+            lines.append("    def encode_payload(self) -> bytes:")
+            lines.append(f"        return {struct_name}.pack({', '.join(values)})")
+            lines.append("")
+            lines.append("    def encode_frame(self) -> bytes:")
+            lines.append("        \"\"\"Encode message into a BLE frame\"\"\"")
+            lines.append("        return build_frame(self.MSG_ID, self.encode_payload(), self.STREAM_ID)")
+        lines.append("")
+
+        # Decode
+        lines.append("    @classmethod")
+        lines.append(f"    def decode(cls, payload) -> '{class_name}':")
+        has_strings = any(self.is_variable_size(self.get_field_type_name(v)) for v in fields.values())
+        if has_strings:
+            lines.append(f"        values = {struct_name}.unpack_from(payload)")
+            args = []
+            for index, field_value in enumerate(fields.values(), first_field):
+                if self.is_variable_size(self.get_field_type_name(field_value)):
+                    args.append(f"_decode_string(values[{index}])")
+                else:
+                    args.append(f"values[{index}]")
+            lines.append(f"        return cls({', '.join(args)})")
+        elif extended:
+            lines.append(f"        return cls._make({struct_name}.unpack_from(payload)[2:])")
+        else:
+            lines.append(f"        return cls._make({struct_name}.unpack_from(payload))")
+        lines.append("")
+        lines.append("")
+        return lines
+
+    def generate_protocol(self) -> str:
+        """Generate Python codec module"""
+        lines = []
+        lines.append("\"\"\"")
+        lines.append(f"BLE Telemetry Protocol v{self.protocol['version']}")
+        lines.append("Auto-generated from schema.json")
+        lines.append("DO NOT EDIT MANUALLY")
+        lines.append("")
+        lines.append("Host-side codec: encodes and decodes both server and client messages.")
+        lines.append("\"\"\"")
+        lines.append("")
+        lines.append("import struct")
+        lines.append("from typing import Any, Dict, List, NamedTuple, Optional, Tuple")
+        lines.append("")
+        lines.extend(self._get_protocol_constants())
+        lines.append("_SYNC_FIRST_BYTES = bytes((SYNC_FIRST,))")
+        lines.append("")
+
+        # Message IDs
+        lines.append("# Message IDs")
+        for msg_name, msg_info in {**self.server_messages, **self.client_messages}.items():
+            lines.append(f"MSG_ID_{msg_name.upper()} = {msg_info['id']}")
+        lines.append("")
+        lines.append("")
+
+        lines.extend(self._generate_frame_functions())
+
+        lines.append("# " + "=" * 76)
+        lines.append("# Server messages (server to client)")
+        lines.append("# " + "=" * 76)
+        lines.append("")
+        for msg_name, msg_info in self.server_messages.items():
+            lines.extend(self._generate_message_class(msg_name, msg_info, 'Server to Client'))
+
+        lines.append("# " + "=" * 76)
+        lines.append("# Client messages (client to server)")
+        lines.append("# " + "=" * 76)
+        lines.append("")
+        for msg_name, msg_info in self.client_messages.items():
+            lines.extend(self._generate_message_class(msg_name, msg_info, 'Client to Server'))
+
+        lines.append("SERVER_MESSAGES = {")
+        for msg_name in self.server_messages:
+            lines.append(f"    {self.to_pascal_case(msg_name)}.MSG_ID: {self.to_pascal_case(msg_name)},")
+        lines.append("}")
+        lines.append("")
+        lines.append("CLIENT_MESSAGES = {")
+        for msg_name in self.client_messages:
+            lines.append(f"    {self.to_pascal_case(msg_name)}.MSG_ID: {self.to_pascal_case(msg_name)},")
+        lines.append("}")
+        lines.append("")
+        lines.append("MESSAGE_TYPES = {**SERVER_MESSAGES, **CLIENT_MESSAGES}")
+        lines.append("")
+        lines.append("")
+        lines.append("def decode_payload(msg_id: int, payload) -> Optional[Any]:")
+        lines.append("    \"\"\"Decode a validated payload, or None for unknown IDs or wrong sizes\"\"\"")
+        lines.append("    message_type = MESSAGE_TYPES.get(msg_id)")
+        lines.append("    if message_type is None or len(payload) != message_type.PAYLOAD_SIZE:")
+        lines.append("        return None")
+        lines.append("    return message_type.decode(payload)")
+        lines.append("")
+        lines.append("")
+
+        lines.extend(self._generate_decoder_class())
+        lines.extend(self._generate_stream_parser_class())
+
+        return '\n'.join(lines).rstrip('\n') + '\n'
+
+    def generate_gateway(self) -> str:
+        """Generate asyncio gateway module for host-side telemetry ingestion"""
+        lines = []
+        lines.append("\"\"\"")
+        lines.append(f"BLE Telemetry Gateway v{self.protocol['version']}")
+        lines.append("Auto-generated from schema.json")
+        lines.append("DO NOT EDIT MANUALLY")
+        lines.append("")
+        lines.append("Reads complete frames from serial/UART bridges or TCP sockets, validates")
+        lines.append("them and fans decoded messages out to async subscribers per message type.")
+        lines.append("Subscriber queues are bounded: by default a full queue pauses the device")
+        lines.append("stream feeding it; with drop_oldest=True the oldest queued event is dropped.")
+        lines.append("\"\"\"")
+        lines.append("")
+        lines.append("import asyncio")
+        lines.append("import collections")
+        lines.append("import logging")
+        lines.append("from typing import Any, Dict, List, NamedTuple, Optional, Set")
+        lines.append("")
+        lines.append("from ble_protocol import BleStreamParser")
+        lines.append("")
+        lines.append("logger = logging.getLogger(__name__)")
+        lines.append("")
+        lines.append("")
+        lines.append("class BleEvent(NamedTuple):")
+        lines.append("    \"\"\"Decoded message received from a device\"\"\"")
+        lines.append("    device_id: str")
+        lines.append("    time_ms: int")
+        lines.append("    message: Any")
+        lines.append("")
+        lines.append("")
+        lines.append("class BleSubscription:")
+        lines.append("    \"\"\"Bounded queue of events for one subscriber (async iterable)\"\"\"")
+        lines.append("")
+        lines.append("    def __init__(self, gateway: 'BleGateway', msg_id: Optional[int], queue_size: int):")
+        lines.append("        self._gateway = gateway")
+        lines.append("        self.msg_id = msg_id")
+        lines.append("        self.queue: asyncio.Queue = asyncio.Queue(queue_size)")
+        lines.append("        self.dropped = 0")
+        lines.append("")
+        lines.append("    def __aiter__(self):")
+        lines.append("        return self")
+        lines.append("")
+        lines.append("    async def __anext__(self) -> BleEvent:")
+        lines.append("        return await self.queue.get()")
+        lines.append("")
+        lines.append("    async def get(self) -> BleEvent:")
+        lines.append("        return await self.queue.get()")
+        lines.append("")
+        lines.append("    def close(self):")
+        lines.append("        self._gateway.unsubscribe(self)")
+        lines.append("")
+        lines.append("")
+        lines.append("class BleGatewayProtocol(asyncio.Protocol):")
+        lines.append("    \"\"\"asyncio protocol for one device stream (TCP, serial pty, pipe)\"\"\"")
+        lines.append("")
+        lines.append("    def __init__(self, gateway: 'BleGateway', device_id: str):")
+        lines.append("        self._gateway = gateway")
+        lines.append("        self.device_id = device_id")
+        lines.append("        self.parser = BleStreamParser()")
+        lines.append("        self._pending: collections.deque = collections.deque()")
+        lines.append("        self._transport: Optional[asyncio.BaseTransport] = None")
+        lines.append("        self._draining = False")
+        lines.append("")
+        lines.append("    def connection_made(self, transport):")
+        lines.append("        self._transport = transport")
+        lines.append("        self._gateway._parsers[self.device_id] = self.parser")
+        lines.append("")
+        lines.append("    def data_received(self, data: bytes):")
+        lines.append("        time_ms = self._gateway.time_ms()")
+        lines.append("        for message in self.parser.feed(data):")
+        lines.append("            self._pending.append(BleEvent(self.device_id, time_ms, message))")
+        lines.append("        if not self._draining:")
+        lines.append("            self._flush()")
+        lines.append("")
+        lines.append("    def connection_lost(self, exc):")
+        lines.append("        self._transport = None")
+        lines.append("        # TCP device IDs change on every reconnect, so drop the counters with the stream")
+        lines.append("        if self._gateway._parsers.get(self.device_id) is self.parser:")
+        lines.append("            del self._gateway._parsers[self.device_id]")
+        lines.append("")
+        lines.append("    def _flush(self):")
+        lines.append("        while self._pending:")
+        lines.append("            event = self._pending.popleft()")
+        lines.append("            blocked = self._gateway._offer(event)")
+        lines.append("            if blocked:")
+        lines.append("                # A subscriber is full - stop reading until it catches up")
+        lines.append("                self._draining = True")
+        lines.append("                if self._transport is not None:")
+        lines.append("                    self._transport.pause_reading()")
+        lines.append("                self._gateway._spawn(self._drain(event, blocked))")
+        lines.append("                return")
+        lines.append("")
+        lines.append("    async def _drain(self, event: BleEvent, blocked: List[BleSubscription]):")
+        lines.append("        for subscription in blocked:")
+        lines.append("            await subscription.queue.put(event)")
+        lines.append("        self._draining = False")
+        lines.append("        self._flush()")
+        lines.append("        if not self._draining and self._transport is not None and not self._transport.is_closing():")
+        lines.append("            self._transport.resume_reading()")
+        lines.append("")
+        lines.append("")
+        lines.append("class BleGateway:")
+        lines.append("    \"\"\"Fans decoded messages from many device streams out to subscribers\"\"\"")
+        lines.append("")
+        lines.append("    def __init__(self, queue_size: int = 256, drop_oldest: bool = False):")
+        lines.append("        self.queue_size = queue_size")
+        lines.append("        self.drop_oldest = drop_oldest")
+        lines.append("        self._subscribers: Dict[Optional[int], List[BleSubscription]] = {}")
+        lines.append("        self._parsers: Dict[str, BleStreamParser] = {}")
+        lines.append("        self._tasks: Set[asyncio.Task] = set()")
+        lines.append("")
+        lines.append("    @staticmethod")
+        lines.append("    def time_ms() -> int:")
+        lines.append("        \"\"\"Event loop clock in ms (call from a coroutine or loop callback)\"\"\"")
+        lines.append("        return int(asyncio.get_running_loop().time() * 1000)")
+        lines.append("")
+        lines.append("    def subscribe(self, msg_id: Optional[int] = None, queue_size: Optional[int] = None) -> BleSubscription:")
+        lines.append("        \"\"\"Subscribe to one message type (MSG_ID_*), or to all with msg_id=None\"\"\"")
+        lines.append("        subscription = BleSubscription(self, msg_id, queue_size or self.queue_size)")
+        lines.append("        self._subscribers.setdefault(msg_id, []).append(subscription)")
+        lines.append("        return subscription")
+        lines.append("")
+        lines.append("    def unsubscribe(self, subscription: BleSubscription):")
+        lines.append("        subscribers = self._subscribers.get(subscription.msg_id, [])")
+        lines.append("        if subscription in subscribers:")
+        lines.append("            subscribers.remove(subscription)")
+        lines.append("")
+        lines.append("    def stats(self) -> Dict[str, Dict[str, int]]:")
+        lines.append("        \"\"\"Per-device frame, checksum failure and resync counters\"\"\"")
+        lines.append("        return {")
+        lines.append("            device_id: {")
+        lines.append("                'frames': parser.frames,")
+        lines.append("                'checksum_failures': parser.checksum_failures,")
+        lines.append("                'unknown_messages': parser.unknown_messages,")
+        lines.append("                'resyncs': parser.resyncs,")
+        lines.append("            }")
+        lines.append("            for device_id, parser in self._parsers.items()")
+        lines.append("        }")
+        lines.append("")
+        lines.append("    def _spawn(self, coroutine) -> asyncio.Task:")
+        lines.append("        \"\"\"Run a background task, keeping it referenced until done and logging failures\"\"\"")
+        lines.append("        task = asyncio.ensure_future(coroutine)")
+        lines.append("        self._tasks.add(task)")
+        lines.append("        task.add_done_callback(self._task_done)")
+        lines.append("        return task")
+        lines.append("")
+        lines.append("    def _task_done(self, task: asyncio.Task):")
+        lines.append("        self._tasks.discard(task)")
+        lines.append("        if not task.cancelled() and task.exception() is not None:")
+        lines.append("            logger.error('Gateway task failed', exc_info=task.exception())")
+        lines.append("")
+        lines.append("    def _targets(self, event: BleEvent) -> List[BleSubscription]:")
+        lines.append("        return self._subscribers.get(event.message.MSG_ID, []) + self._subscribers.get(None, [])")
+        lines.append("")
+        lines.append("    def _offer(self, event: BleEvent) -> List[BleSubscription]:")
+        lines.append("        \"\"\"Queue event without waiting; returns subscribers that are still full\"\"\"")
+        lines.append("        blocked = []")
+        lines.append("        for subscription in self._targets(event):")
+        lines.append("            if subscription.queue.full():")
+        lines.append("                if not self.drop_oldest:")
+        lines.append("                    blocked.append(subscription)")
+        lines.append("                    continue")
+        lines.append("                subscription.queue.get_nowait()")
+        lines.append("                subscription.dropped += 1")
+        lines.append("            subscription.queue.put_nowait(event)")
+        lines.append("        return blocked")
+        lines.append("")
+        lines.append("    async def publish(self, event: BleEvent):")
+        lines.append("        \"\"\"Deliver an event, waiting for space unless drop_oldest is set\"\"\"")
+        lines.append("        for subscription in self._offer(event):")
+        lines.append("            await subscription.queue.put(event)")
+        lines.append("")
+        lines.append("    def protocol(self, device_id: str) -> BleGatewayProtocol:")
+        lines.append("        \"\"\"Protocol instance for loop.create_connection / connect_read_pipe\"\"\"")
+        lines.append("        return BleGatewayProtocol(self, device_id)")
+        lines.append("")
+        lines.append("    async def serve_reader(self, reader: asyncio.StreamReader, device_id: str):")
+        lines.append("        \"\"\"Consume a StreamReader until EOF\"\"\"")
+        lines.append("        parser = BleStreamParser()")
+        lines.append("        self._parsers[device_id] = parser")
+        lines.append("        try:")
+        lines.append("            while True:")
+        lines.append("                data = await reader.read(4096)")
+        lines.append("                if not data:")
+        lines.append("                    break")
+        lines.append("                time_ms = self.time_ms()")
+        lines.append("                for message in parser.feed(data):")
+        lines.append("                    await self.publish(BleEvent(device_id, time_ms, message))")
+        lines.append("        finally:")
+        lines.append("            if self._parsers.get(device_id) is parser:")
+        lines.append("                del self._parsers[device_id]")
+        lines.append("")
+        lines.append("    async def start_server(self, host: str = '127.0.0.1', port: int = 0, **kwargs) -> asyncio.AbstractServer:")
+        lines.append("        \"\"\"Accept TCP device streams; each peer address is a device ID\"\"\"")
+        lines.append("        loop = asyncio.get_running_loop()")
+        lines.append("")
+        lines.append("        def factory():")
+        lines.append("            return _AddressedProtocol(self)")
+        lines.append("")
+        lines.append("        return await loop.create_server(factory, host, port, **kwargs)")
+        lines.append("")
+        lines.append("    async def connect_serial(self, path: str, device_id: Optional[str] = None):")
+        lines.append("        \"\"\"Read a serial device or pty (already configured for raw mode)")
+        lines.append("")
+        lines.append("        The returned transport owns the file: closing the transport closes it")
+        lines.append("        \"\"\"")
+        lines.append("        loop = asyncio.get_running_loop()")
+        lines.append("        pipe = open(path, 'rb', buffering=0)")
+        lines.append("        try:")
+        lines.append("            return await loop.connect_read_pipe(lambda: self.protocol(device_id or path), pipe)")
+        lines.append("        except BaseException:")
+        lines.append("            pipe.close()")
+        lines.append("            raise")
+        lines.append("")
+        lines.append("")
+        lines.append("class _AddressedProtocol(BleGatewayProtocol):")
+        lines.append("    \"\"\"Gateway protocol that names the device after the TCP peer\"\"\"")
+        lines.append("")
+        lines.append("    def __init__(self, gateway: BleGateway):")
+        lines.append("        super().__init__(gateway, '')")
+        lines.append("")
+        lines.append("    def connection_made(self, transport):")
+        lines.append("        peer = transport.get_extra_info('peername')")
+        lines.append("        self.device_id = f'{peer[0]}:{peer[1]}' if isinstance(peer, tuple) else str(peer)")
+        lines.append("        super().connection_made(transport)")
+
+        return '\n'.join(lines) + '\n'
+
+
+def generate_python_code(protocol_schema_path: str, messages_schema_path: str, output_dir: str = '.',
+                         enabled_messages: Optional[Iterable[str]] = None):
+    """Main function to generate Python code
+
+    Args:
+        protocol_schema_path: Path to protocol.json (frame format, types)
+        messages_schema_path: Path to messages.json (message definitions)
+        output_dir: Output directory for generated files
+        enabled_messages: Only generate these messages (default: all)
+    """
+    with open(protocol_schema_path, 'r') as f:
+        protocol_schema = json.load(f)
+
+    with open(messages_schema_path, 'r') as f:
+        all_messages_schema = json.load(f)
+    messages_schema = select_messages(all_messages_schema, enabled_messages)
+
+    generator = PythonGenerator(protocol_schema, messages_schema,
+                                schema_hash=schema_hash32(protocol_schema, all_messages_schema))
+
+    # Generate codec
+    protocol_content = generator.generate_protocol()
+    protocol_path = f"{output_dir}/ble_protocol.py"
+    with open(protocol_path, 'w') as f:
+        f.write(protocol_content)
+    print(f"Generated: {protocol_path}")
+
+    # Generate gateway
+    gateway_content = generator.generate_gateway()
+    gateway_path = f"{output_dir}/ble_gateway.py"
+    with open(gateway_path, 'w') as f:
+        f.write(gateway_content)
+    print(f"Generated: {gateway_path}")
+
+
+if __name__ == '__main__':
+    import sys
+    protocol_path = sys.argv[1] if len(sys.argv) > 1 else 'schema/protocol.json'
+    messages_path = sys.argv[2] if len(sys.argv) > 2 else 'schema/messages.json'
+    output_dir = sys.argv[3] if len(sys.argv) > 3 else 'generated/python'
+    generate_python_code(protocol_path, messages_path, output_dir)
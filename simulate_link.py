@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+BLE Loopback Link Simulator
+Drives the generated encoders and decoders over a simulated BLE link and
+reports goodput, latency and staleness per message
+"""
+
+import argparse
+import ctypes
+import heapq
+import importlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+# Add tools directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+
+from schema_layout import MessageLayout, SchemaLayout
+
+
+CTYPES_TYPES = {
+    'uint8': ctypes.c_uint8,
+    'int8': ctypes.c_int8,
+    'uint16': ctypes.c_uint16,
+    'int16': ctypes.c_int16,
+    'uint32': ctypes.c_uint32,
+    'int32': ctypes.c_int32,
+    'uint64': ctypes.c_uint64,
+    'int64': ctypes.c_int64,
+}
+
+
+class _PythonTxEntry:
+    __slots__ = ('message_type', 'priority', 'fragments', 'next_fragment', 'pending')
+
+    def __init__(self, message_type, priority: int):
+        self.message_type = message_type
+        self.priority = priority
+        self.fragments: List[bytes] = []
+        self.next_fragment = 0
+        self.pending = False
+
+
+class PythonSender:
+    """Transmit queue built on the generated Python codec
+
+    Mirrors the C queue: one latest-value buffer per message, a re-enqueue
+    restarts the message, and a message that has not started only interleaves
+    with partially sent ones if it fits in a single notification.
+    """
+
+    name = 'python'
+
+    def __init__(self, codec, priorities: Dict[str, int], mtu: int):
+        self.codec = codec
+        self.mtu = mtu
+        self._entries = {
+            msg_id: _PythonTxEntry(message_type, priorities.get(msg_id, 0))
+            for msg_id, message_type in codec.SERVER_MESSAGES.items()
+        }
+        self._order = list(self._entries.values())
+
+    def enqueue(self, layout: MessageLayout, values: tuple):
+        entry = self._entries[layout.msg_id]
+        frame = entry.message_type(*values).encode_frame()
+        entry.fragments = self.codec.fragment_frame(frame, self.mtu)
+        entry.next_fragment = 0
+        entry.pending = True
+
+    def next_fragment(self) -> bytes:
+        in_flight = sum(1 for e in self._order if e.pending and e.next_fragment > 0)
+        selected = None
+        for entry in self._order:
+            if not entry.pending:
+                continue
+            if entry.next_fragment == 0 and in_flight > 0 and len(entry.fragments) > 1:
+                continue
+            if selected is None or entry.priority > selected.priority:
+                selected = entry
+        if selected is None:
+            return b''
+        fragment = selected.fragments[selected.next_fragment]
+        selected.next_fragment += 1
+        if selected.next_fragment >= len(selected.fragments):
+            selected.pending = False
+        return fragment
+
+    def close(self):
+        pass
+
+
+class CSender:
+    """Transmit queue of the generated C code, compiled into a shared library"""
+
+    name = 'c'
+
+    def __init__(self, c_dir: str, layout: SchemaLayout, mtu: int, compiler: str = 'cc'):
+        self.mtu = mtu
+        self._build_dir = tempfile.mkdtemp(prefix='ble_sim_')
+        library_path = os.path.join(self._build_dir, 'libble_protocol.so')
+        subprocess.run(
+            [compiler, '-std=c99', '-O2', '-shared', '-fPIC', '-o', library_path,
+             os.path.join(c_dir, 'ble_protocol.c')],
+            check=True
+        )
+        self._lib = ctypes.CDLL(library_path)
+        self._lib.ble_tx_next_fragment.argtypes = [ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16]
+        self._lib.ble_tx_next_fragment.restype = ctypes.c_uint16
+        self._out = (ctypes.c_uint8 * mtu)()
+
+        # Resolve begin/set/enqueue entry points once per message
+        self._encoders = {}
+        for message in layout.messages.values():
+            if message.direction != 'server':
+                continue
+            setters = []
+            for field in message.fields:
+                setter = getattr(self._lib, f"ble_encode_{message.name}_set_{field.name}")
+                setter.argtypes = [ctypes.c_char_p if field.is_string else CTYPES_TYPES[field.type]]
+                setter.restype = None
+                setters.append((setter, field.is_string))
+            self._encoders[message.msg_id] = (
+                getattr(self._lib, f"ble_encode_{message.name}_begin"),
+                setters,
+                getattr(self._lib, f"ble_encode_{message.name}_enqueue"),
+            )
+
+    def enqueue(self, layout: MessageLayout, values: tuple):
+        begin, setters, enqueue = self._encoders[layout.msg_id]
+        begin()
+        for (setter, is_string), value in zip(setters, values):
+            setter(value.encode('latin-1') if is_string else value)
+        enqueue()
+
+    def next_fragment(self) -> bytes:
+        length = self._lib.ble_tx_next_fragment(self._out, self.mtu)
+        return bytes(self._out[:length])
+
+    def close(self):
+        shutil.rmtree(self._build_dir, ignore_errors=True)
+
+
+class _MessageStats:
+    __slots__ = ('layout', 'period_ms', 'enqueued', 'delivered', 'last_enqueue_ms',
+                 'last_receive_ms', 'latencies', 'stale_violations', 'stale_ms')
+
+    def __init__(self, layout: MessageLayout, period_ms: float):
+        self.layout = layout
+        self.period_ms = period_ms
+        self.enqueued = 0
+        self.delivered = 0
+        self.last_enqueue_ms = 0.0
+        self.last_receive_ms = 0.0
+        self.latencies: List[float] = []
+        self.stale_violations = 0
+        self.stale_ms = 0.0
+
+    def receive_gap(self, gap_ms: float):
+        """Account the time since the previous delivery against maxAge"""
+        if gap_ms > self.layout.max_age_ms:
+            self.stale_violations += 1
+            self.stale_ms += gap_ms - self.layout.max_age_ms
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def _corrupt(fragment: bytes, bit_error_rate: float, rng: random.Random) -> bytes:
+    """Flip each bit independently with probability bit_error_rate"""
+    if bit_error_rate <= 0:
+        return fragment
+    bits = len(fragment) * 8
+    position = int(rng.expovariate(bit_error_rate))
+    if position >= bits:
+        return fragment
+    data = bytearray(fragment)
+    while position < bits:
+        data[position >> 3] ^= 1 << (position & 7)
+        position += 1 + int(rng.expovariate(bit_error_rate))
+    return bytes(data)
+
+
+def simulate(sender, codec, layout: SchemaLayout, rates_hz: Dict[str, float], duration_s: float,
+             interval_ms: float, notifications_per_interval: int, bit_error_rate: float,
+             packet_loss: float, seed: int) -> Dict[str, Any]:
+    """Run the link for duration_s and return the report"""
+    rng = random.Random(seed)
+    decoder = codec.BleDecoder()
+    duration_ms = duration_s * 1000.0
+
+    stats: Dict[int, _MessageStats] = {}
+    schedule = []
+    for message in layout.messages.values():
+        if message.direction != 'server':
+            continue
+        # Handshake messages answer a request once per connection; they are not telemetry
+        if message.handshake and message.name not in rates_hz:
+            continue
+        rate = rates_hz.get(message.name, 2000.0 / message.max_age_ms)
+        if rate <= 0:
+            continue
+        stats[message.msg_id] = _MessageStats(message, 1000.0 / rate)
+        # Stagger first samples so messages do not all start in phase
+        heapq.heappush(schedule, (rng.uniform(0, stats[message.msg_id].period_ms), message.msg_id))
+
+    notifications = dropped = corrupted = link_bytes = 0
+    events = int(duration_ms // interval_ms)
+    for event in range(events + 1):
+        now_ms = event * interval_ms
+
+        # Application produces samples between connection events
+        while schedule and schedule[0][0] <= now_ms:
+            due_ms, msg_id = heapq.heappop(schedule)
+            entry = stats[msg_id]
+            sample = entry.layout.unpack(bytes(rng.getrandbits(8) for _ in range(entry.layout.payload_size)))
+            sender.enqueue(entry.layout, sample)
+            entry.enqueued += 1
+            entry.last_enqueue_ms = due_ms
+            heapq.heappush(schedule, (due_ms + entry.period_ms, msg_id))
+
+        for _ in range(notifications_per_interval):
+            fragment = sender.next_fragment()
+            if not fragment:
+                break
+            notifications += 1
+            link_bytes += len(fragment)
+            if rng.random() < packet_loss:
+                dropped += 1
+                continue
+            received = _corrupt(fragment, bit_error_rate, rng)
+            if received is not fragment:
+                corrupted += 1
+            message = decoder.decode_frame(received, now_ms)
+            entry = stats.get(getattr(message, 'MSG_ID', None))
+            if entry is None:
+                continue
+            # A re-enqueue restarts the message, so a completed frame is always
+            # the latest sample enqueued for it
+            entry.delivered += 1
+            entry.latencies.append(now_ms - entry.last_enqueue_ms)
+            entry.receive_gap(now_ms - entry.last_receive_ms)
+            entry.last_receive_ms = now_ms
+
+    end_ms = events * interval_ms
+    elapsed_s = end_ms / 1000.0 if end_ms > 0 else 1.0
+    messages = {}
+    goodput_bytes = 0
+    for entry in sorted(stats.values(), key=lambda e: e.layout.msg_id):
+        entry.receive_gap(end_ms - entry.last_receive_ms)
+        goodput_bytes += entry.delivered * entry.layout.payload_size
+        latencies = sorted(entry.latencies)
+        messages[entry.layout.name] = {
+            'rate_hz': 1000.0 / entry.period_ms,
+            'max_age_ms': entry.layout.max_age_ms,
+            'enqueued': entry.enqueued,
+            'delivered': entry.delivered,
+            'latency_ms': {
+                'p50': _percentile(latencies, 0.50),
+                'p90': _percentile(latencies, 0.90),
+                'p99': _percentile(latencies, 0.99),
+                'max': latencies[-1],
+            } if latencies else None,
+            'stale_violations': entry.stale_violations,
+            'stale_ms': entry.stale_ms,
+        }
+
+    capacity = (events + 1) * notifications_per_interval
+    return {
+        'backend': sender.name,
+        'link': {
+            'mtu': sender.mtu,
+            'interval_ms': interval_ms,
+            'notifications_per_interval': notifications_per_interval,
+            'bit_error_rate': bit_error_rate,
+            'packet_loss': packet_loss,
+            'duration_s': elapsed_s,
+        },
+        'notifications': notifications,
+        'utilisation': notifications / capacity if capacity else 0.0,
+        'dropped': dropped,
+        'corrupted': corrupted,
+        'link_bytes_per_s': link_bytes / elapsed_s,
+        'goodput_bytes_per_s': goodput_bytes / elapsed_s,
+        'messages': messages,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    link = report['link']
+    print(f"Backend: {report['backend']}, MTU {link['mtu']}, interval {link['interval_ms']} ms, "
+          f"{link['notifications_per_interval']} notifications/interval, BER {link['bit_error_rate']}, "
+          f"loss {link['packet_loss']}")
+    print(f"Notifications: {report['notifications']} ({report['utilisation']:.1%} of capacity), "
+          f"{report['dropped']} dropped, {report['corrupted']} corrupted")
+    print(f"Link: {report['link_bytes_per_s']:.0f} B/s, goodput: {report['goodput_bytes_per_s']:.0f} B/s")
+    print(f"{'message':<20} {'rate':>7} {'sent':>7} {'recv':>7} {'p50':>8} {'p90':>8} {'p99':>8} "
+          f"{'max':>8} {'stale':>6} {'stale_ms':>9}")
+    for name, entry in report['messages'].items():
+        latency = entry['latency_ms'] or {'p50': 0, 'p90': 0, 'p99': 0, 'max': 0}
+        print(f"{name:<20} {entry['rate_hz']:>7.2f} {entry['enqueued']:>7} {entry['delivered']:>7} "
+              f"{latency['p50']:>8.1f} {latency['p90']:>8.1f} {latency['p99']:>8.1f} {latency['max']:>8.1f} "
+              f"{entry['stale_violations']:>6} {entry['stale_ms']:>9.0f}")
+
+
+def parse_rates(values: List[str]) -> Dict[str, float]:
+    rates = {}
+    for value in values:
+        name, _, rate = value.partition('=')
+        if not rate:
+            raise argparse.ArgumentTypeError(f"Expected NAME=HZ, got '{value}'")
+        rates[name] = float(rate)
+    return rates
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(
+        description='Simulate a BLE link end to end with the generated codecs',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Default link budget (20-byte notifications, 30 ms interval, 4 per interval)
+  python simulate_link.py
+
+  # Larger MTU, noisy link, 1% loss, driven by the C transmit queue
+  python simulate_link.py --backend c --mtu 244 --ber 1e-5 --loss 0.01
+
+  # Override message rates (Hz, 0 disables a message) and write JSON
+  python simulate_link.py --rate motor_data=50 --rate server_message=0 --json link.json
+        """
+    )
+
+    parser.add_argument(
+        '--backend',
+        choices=['python', 'c'],
+        default='python',
+        help='Encoder driving the link (default: python)'
+    )
+
+    parser.add_argument(
+        '--generated',
+        default=os.path.join(script_dir, 'generated'),
+        help='Generated code directory (default: generated)'
+    )
+
+    parser.add_argument(
+        '--protocol-schema',
+        default=os.path.join(script_dir, 'schema', 'protocol.json'),
+        help='Path to protocol schema (default: schema/protocol.json)'
+    )
+
+    parser.add_argument(
+        '--messages-schema',
+        default=os.path.join(script_dir, 'schema', 'messages.json'),
+        help='Path to messages schema (default: schema/messages.json)'
+    )
+
+    parser.add_argument('--mtu', type=int, default=20,
+                        help='Bytes per notification (default: 20)')
+    parser.add_argument('--interval-ms', type=float, default=30.0,
+                        help='Connection interval in ms (default: 30)')
+    parser.add_argument('--notifications', type=int, default=4,
+                        help='Notifications per connection interval (default: 4)')
+    parser.add_argument('--ber', type=float, default=0.0,
+                        help='Bit error rate (default: 0)')
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help='Notification loss probability (default: 0)')
+    parser.add_argument('--duration', type=float, default=60.0,
+                        help='Simulated seconds (default: 60)')
+    parser.add_argument('--rate', action='append', default=[], metavar='NAME=HZ',
+                        help='Message send rate (default: twice per maxAge)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Random seed (default: 1)')
+    parser.add_argument('--cc', default='cc',
+                        help='C compiler for the c backend (default: cc)')
+    parser.add_argument('--json', help='Write the report as JSON to this path')
+
+    args = parser.parse_args()
+
+    layout = SchemaLayout.from_files(args.protocol_schema, args.messages_schema)
+    for name in parse_rates(args.rate):
+        if name not in layout.by_name:
+            print(f"Error: Unknown message: {name}")
+            sys.exit(1)
+
+    sys.path.insert(0, os.path.join(args.generated, 'python'))
+    codec = importlib.import_module('ble_protocol')
+
+    if args.backend == 'c':
+        sender = CSender(os.path.join(args.generated, 'c'), layout, args.mtu, args.cc)
+    else:
+        priorities = {
+            layout.by_name[name].msg_id: msg_info.get('priority', 0)
+            for name, msg_info in layout.messages_schema['messages']['server'].items()
+        }
+        sender = PythonSender(codec, priorities, args.mtu)
+
+    try:
+        report = simulate(sender, codec, layout, parse_rates(args.rate), args.duration, args.interval_ms,
+                          args.notifications, args.ber, args.loss, args.seed)
+    finally:
+        sender.close()
+
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Round-trip test helpers
+Generates the C and Python codecs for a variant of the shipped schemas, builds
+the C code as a shared library and loads both, so tests can pass frames
+between the firmware side (C via ctypes) and the host side (Python codec).
+"""
+
+import copy
+import ctypes
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'generators'))
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+from c_generator import CGenerator
+from python_generator import PythonGenerator
+from schema_layout import SchemaLayout
+
+
+CTYPES_TYPES = {
+    'uint8': ctypes.c_uint8,
+    'int8': ctypes.c_int8,
+    'uint16': ctypes.c_uint16,
+    'int16': ctypes.c_int16,
+    'uint32': ctypes.c_uint32,
+    'int32': ctypes.c_int32,
+    'uint64': ctypes.c_uint64,
+    'int64': ctypes.c_int64,
+}
+
+
+class FrameView(ctypes.Structure):
+    """ble_frame_t"""
+    _fields_ = [('data', ctypes.POINTER(ctypes.c_uint8)), ('length', ctypes.c_uint16)]
+
+
+def load_schemas() -> tuple:
+    """Shipped protocol and message schemas"""
+    with open(os.path.join(ROOT, 'schema', 'protocol.json')) as f:
+        protocol_schema = json.load(f)
+    with open(os.path.join(ROOT, 'schema', 'messages.json')) as f:
+        messages_schema = json.load(f)
+    return protocol_schema, messages_schema
+
+
+class Codecs:
+    """Generated C library and Python codec of one schema variant"""
+
+    def __init__(self, build_dir: str, protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any],
+                 compiler: str, cflags: List[str]):
+        self.layout = SchemaLayout(protocol_schema, messages_schema)
+
+        generator = CGenerator(protocol_schema, messages_schema)
+        with open(os.path.join(build_dir, 'ble_protocol.h'), 'w') as f:
+            f.write(generator.generate_header())
+        with open(os.path.join(build_dir, 'ble_protocol.c'), 'w') as f:
+            f.write(generator.generate_implementation())
+        library_path = os.path.join(build_dir, 'libble_protocol.so')
+        subprocess.run([compiler, '-std=c99', '-O1', '-shared', '-fPIC', *cflags, '-o', library_path,
+                        os.path.join(build_dir, 'ble_protocol.c')], check=True)
+        self.lib = ctypes.CDLL(library_path)
+
+        codec_path = os.path.join(build_dir, 'ble_protocol.py')
+        with open(codec_path, 'w') as f:
+            f.write(PythonGenerator(protocol_schema, messages_schema).generate_protocol())
+        spec = importlib.util.spec_from_file_location(f"ble_protocol_{os.path.basename(build_dir)}", codec_path)
+        self.codec = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.codec)
+
+        self._function('ble_decode_frame', ctypes.c_bool, ctypes.c_char_p, ctypes.c_uint16, ctypes.c_uint32)
+        self._function('ble_tx_next_fragment', ctypes.c_uint16, ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint16)
+
+    def _function(self, name: str, restype, *argtypes) -> Callable:
+        function = getattr(self.lib, name)
+        function.restype = restype
+        function.argtypes = list(argtypes)
+        return function
+
+    def function(self, name: str, restype=None, *argtypes) -> Callable:
+        """C function with its signature set"""
+        return self._function(name, restype, *argtypes)
+
+    def encode(self, message: str, **values) -> None:
+        """begin + set_<field> for a server message in the C encoder"""
+        layout = self.layout.by_name[message]
+        self._function(f"ble_encode_{message}_begin", None)()
+        for field in layout.fields:
+            argtype = ctypes.c_char_p if field.is_string else CTYPES_TYPES[field.type]
+            setter = self._function(f"ble_encode_{message}_set_{field.name}", None, argtype)
+            value = values.get(field.name, '' if field.is_string else 0)
+            setter(value.encode('latin-1') if field.is_string else value)
+
+    def enqueue(self, message: str, **values) -> bool:
+        """Encode a server message in C and queue it for transmission"""
+        self.encode(message, **values)
+        return self._function(f"ble_encode_{message}_enqueue", ctypes.c_bool)()
+
+    def get_frame(self, message: str, **values) -> bytes:
+        """Encode a server message in C and return its complete frame"""
+        self.encode(message, **values)
+        frame = self._function(f"ble_encode_{message}_get_frame", FrameView)()
+        return ctypes.string_at(frame.data, frame.length)
+
+    def next_fragment(self, mtu: int) -> bytes:
+        out = (ctypes.c_uint8 * mtu)()
+        length = self.lib.ble_tx_next_fragment(out, mtu)
+        return bytes(out[:length])
+
+    def drain(self, mtu: int, limit: int = 1000) -> List[bytes]:
+        """Every fragment the C transmit queue still owes"""
+        fragments = []
+        while len(fragments) < limit:
+            fragment = self.next_fragment(mtu)
+            if not fragment:
+                return fragments
+            fragments.append(fragment)
+        raise AssertionError(f"transmit queue still busy after {limit} fragments")
+
+    def decode_frame(self, frame: bytes, time_ms: int = 0) -> bool:
+        """Feed one notification to the C decoder"""
+        return self.lib.ble_decode_frame(frame, len(frame), time_ms)
+
+
+@pytest.fixture
+def build_codecs(tmp_path) -> Callable[..., Codecs]:
+    """Factory: build_codecs(configure=None, cflags=()) -> Codecs
+
+    configure(protocol_schema, messages_schema) edits copies of the shipped
+    schemas before generation. Each call builds a separate library, so C
+    state is never shared between builds.
+    """
+    compiler = os.environ.get('CC', 'cc')
+    if shutil.which(compiler) is None:
+        pytest.skip(f"C compiler '{compiler}' not found")
+    builds = []
+
+    def build(configure: Optional[Callable[[dict, dict], None]] = None, cflags=()) -> Codecs:
+        protocol_schema, messages_schema = copy.deepcopy(load_schemas())
+        if configure is not None:
+            configure(protocol_schema, messages_schema)
+        build_dir = tmp_path / f"build{len(builds)}"
+        build_dir.mkdir()
+        codecs = Codecs(str(build_dir), protocol_schema, messages_schema, compiler, list(cflags))
+        builds.append(codecs)
+        return codecs
+
+    return build
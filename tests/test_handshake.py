@@ -0,0 +1,140 @@
+"""
+Connection handshake between the Python codec (client) and the C runtime (server)
+"""
+
+import ctypes
+
+import pytest
+
+
+class LinkView(ctypes.Structure):
+    """ble_link_t"""
+    _fields_ = [
+        ('negotiated', ctypes.c_bool),
+        ('compatible', ctypes.c_bool),
+        ('schema_match', ctypes.c_bool),
+        ('mtu', ctypes.c_uint16),
+        ('peer_max_reassembly', ctypes.c_uint16),
+        ('features', ctypes.c_uint32),
+    ]
+
+
+LOCAL_MTU = 244
+
+
+class Server:
+    """C side of the handshake"""
+
+    def __init__(self, codecs):
+        self.codecs = codecs
+        self.service = codecs.function('ble_link_service', ctypes.c_bool, ctypes.c_uint16)
+        self.reset = codecs.function('ble_link_reset', None)
+        self._get = codecs.function('ble_link_get', ctypes.POINTER(LinkView))
+
+    @property
+    def link(self) -> LinkView:
+        return self._get().contents
+
+    def connect(self, request) -> bool:
+        """Reset the link, decode the client's request and answer it"""
+        self.reset()
+        for fragment in self.codecs.codec.fragment_frame(request.encode_frame(), self.codecs.codec.DEFAULT_MTU):
+            self.codecs.decode_frame(fragment)
+        return self.service(LOCAL_MTU)
+
+    def notifications(self) -> list:
+        return self.codecs.drain(self.link.mtu)
+
+
+def split_packed(codec, notification: bytes) -> list:
+    """Whole frames of a packed notification (split at each frame's checksum)"""
+    frames = []
+    while notification:
+        frame_len = codec.FIRST_HEADER_SIZE + notification[1] + 1
+        frames.append(notification[:frame_len])
+        notification = notification[frame_len:]
+    return frames
+
+
+def decode_all(codec, notifications) -> list:
+    decoder = codec.BleDecoder()
+    return [message for message in (decoder.decode_frame(frame) for frame in notifications) if message]
+
+
+@pytest.fixture
+def codecs(build_codecs):
+    return build_codecs()
+
+
+@pytest.fixture
+def server(codecs):
+    return Server(codecs)
+
+
+def test_handshake_negotiates_common_mode(codecs, server):
+    codec = codecs.codec
+    assert server.link.mtu == codec.DEFAULT_MTU and not server.link.negotiated
+
+    request = codec.HandshakeRequest(codec.HANDSHAKE_VERSION, codec.SCHEMA_HASH, 1024, 185, 0)
+    assert server.connect(request)
+    link = server.link
+    assert (link.negotiated, link.compatible, link.schema_match) == (True, True, True)
+    assert (link.mtu, link.peer_max_reassembly, link.features) == (185, 1024, 0)
+
+    decoded = decode_all(codec, server.notifications())
+    assert len(decoded) == 1
+    response = decoded[0]
+    assert isinstance(response, codec.HandshakeResponse)
+    assert response.protocol_version == codec.HANDSHAKE_VERSION
+    assert response.schema_hash == codec.SCHEMA_HASH
+    assert response.mtu == LOCAL_MTU
+    assert response.max_reassembly == max(message.PAYLOAD_SIZE for message in codec.CLIENT_MESSAGES.values())
+
+    server.reset()
+    assert server.link.mtu == codec.DEFAULT_MTU and not server.link.negotiated
+
+
+def test_handshake_reports_mismatches(codecs, server):
+    codec = codecs.codec
+    other_major = codec.HANDSHAKE_VERSION + 0x0100
+    request = codec.HandshakeRequest(other_major, codec.SCHEMA_HASH ^ 1, 1024, 8, codec.FEATURE_PACKED_FRAMES)
+    assert server.connect(request)
+    link = server.link
+    assert (link.negotiated, link.compatible, link.schema_match) == (True, False, False)
+    # Never below the baseline MTU, and no features across major versions
+    assert (link.mtu, link.features) == (codec.DEFAULT_MTU, 0)
+
+
+def test_peer_reassembly_limit_skips_large_messages(codecs, server):
+    codec = codecs.codec
+    heartbeat_size = codec.Heartbeat.PAYLOAD_SIZE
+    assert codec.HandshakeResponse.PAYLOAD_SIZE > heartbeat_size
+    request = codec.HandshakeRequest(codec.HANDSHAKE_VERSION, codec.SCHEMA_HASH, heartbeat_size, 185, 0)
+    assert server.connect(request)
+
+    assert not codecs.enqueue('server_message', data='too large for this peer')
+    assert codecs.enqueue('heartbeat', uptime_ms=1234)
+
+    # The response is larger than the limit too, but is always sent
+    decoded = decode_all(codec, server.notifications())
+    assert [type(message) for message in decoded] == [codec.HandshakeResponse, codec.Heartbeat]
+    assert decoded[1].uptime_ms == 1234
+
+
+def test_packed_frames_after_handshake(codecs, server):
+    codec = codecs.codec
+    request = codec.HandshakeRequest(codec.HANDSHAKE_VERSION, codec.SCHEMA_HASH, 1024, 185,
+                                     codec.FEATURE_PACKED_FRAMES)
+    assert server.connect(request)
+    assert server.link.features == codec.FEATURE_PACKED_FRAMES
+    assert codecs.enqueue('heartbeat', uptime_ms=1)
+    assert codecs.enqueue('safety_status')
+
+    notifications = server.notifications()
+    assert len(notifications) == 1
+    frames = split_packed(codec, notifications[0])
+    decoded = decode_all(codec, frames)
+    assert len(decoded) == len(frames) == 3
+    # Highest priority first: handshake_response and safety_status, then heartbeat
+    assert {type(message) for message in decoded[:2]} == {codec.HandshakeResponse, codec.SafetyStatus}
+    assert isinstance(decoded[2], codec.Heartbeat)
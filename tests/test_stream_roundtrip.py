@@ -0,0 +1,93 @@
+"""
+Stream mode round trips between the Python codec and the C runtime
+"""
+
+import ctypes
+
+import pytest
+
+
+def enable_streams(protocol_schema, messages_schema):
+    protocol_schema['frame']['stream']['enabled'] = True
+
+
+def stream_id(fragment: bytes, codec) -> int:
+    return fragment[3] if fragment[0] == codec.SYNC_FIRST else fragment[1]
+
+
+def field_values(codecs, message: str) -> dict:
+    return {field.name: index + 1 for index, field in enumerate(codecs.layout.by_name[message].fields)
+            if not field.is_string}
+
+
+@pytest.fixture
+def codecs(build_codecs):
+    return build_codecs(enable_streams)
+
+
+def test_c_decoder_reassembles_interleaved_client_streams(codecs):
+    codec = codecs.codec
+    request = codec.HandshakeRequest(codec.HANDSHAKE_VERSION, codec.SCHEMA_HASH, 512, 185, 0)
+    config = codec.ConfigSet(param_id=7, value=0xDEADBEEF)
+    request_fragments = codec.fragment_frame(request.encode_frame(), 8)
+    config_fragments = codec.fragment_frame(config.encode_frame(), 8)
+    assert len(request_fragments) > 2 and len(config_fragments) > 1
+
+    # Alternate fragments of both messages, as two host tasks writing at once would
+    interleaved = []
+    for index in range(max(len(request_fragments), len(config_fragments))):
+        interleaved += request_fragments[index:index + 1] + config_fragments[index:index + 1]
+    results = [codecs.decode_frame(fragment) for fragment in interleaved]
+
+    assert results.count(True) == 2
+    assert results[-1]
+    get_param_id = codecs.function('ble_decode_config_set_get_param_id', ctypes.c_uint8)
+    get_value = codecs.function('ble_decode_config_set_get_value', ctypes.c_uint32)
+    assert (get_param_id(), get_value()) == (7, 0xDEADBEEF)
+    for name in request._fields:
+        getter = codecs.function(f'ble_decode_handshake_request_get_{name}', ctypes.c_uint32)
+        assert getter() == getattr(request, name), name
+
+
+def test_c_decoder_drops_corrupted_stream_only(codecs):
+    codec = codecs.codec
+    request_fragments = codec.fragment_frame(codec.HandshakeRequest(mtu=100).encode_frame(), 8)
+    config_fragments = codec.fragment_frame(codec.ConfigSet(param_id=3, value=42).encode_frame(), 8)
+    corrupted = bytearray(request_fragments[-1])
+    corrupted[-1] ^= 0xFF
+    request_fragments[-1] = bytes(corrupted)
+
+    results = [codecs.decode_frame(fragment) for fragment in request_fragments[:-1] + config_fragments]
+    assert results[-1]
+    assert not codecs.decode_frame(request_fragments[-1])
+    get_value = codecs.function('ble_decode_config_set_get_value', ctypes.c_uint32)
+    assert get_value() == 42
+
+
+def test_python_decoder_reassembles_interleaved_c_streams(codecs):
+    codec = codecs.codec
+    mtu = 20
+    text = 'stream mode keeps bulk text from blocking telemetry'
+    bms_values = field_values(codecs, 'bms_data')
+
+    assert codecs.enqueue('server_message', data=text)
+    fragments = [codecs.next_fragment(mtu)]
+    assert codecs.enqueue('bms_data', **bms_values)
+    fragments += codecs.drain(mtu)
+
+    # bms_data (priority 1) starts while server_message (priority 0) is in flight
+    streams = [stream_id(fragment, codec) for fragment in fragments]
+    first_bms = streams.index(codec.BmsData.STREAM_ID)
+    assert codec.ServerMessage.STREAM_ID in streams[first_bms:]
+
+    decoder = codec.BleDecoder()
+    decoded = [message for message in (decoder.decode_frame(fragment) for fragment in fragments) if message]
+    assert [type(message) for message in decoded] == [codec.BmsData, codec.ServerMessage]
+    assert decoded[0]._asdict() == bms_values
+    assert decoded[1].data == text
+
+
+def test_c_frames_match_python_frames(codecs):
+    codec = codecs.codec
+    values = field_values(codecs, 'motor_data')
+    assert codecs.get_frame('motor_data', **values) == codec.MotorData(**values).encode_frame()
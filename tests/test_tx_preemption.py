@@ -0,0 +1,73 @@
+"""
+Transmit queue preemption without streams, decoded by the Python codec
+"""
+
+import pytest
+
+
+MTU = 20
+
+
+def field_values(codecs, message: str) -> dict:
+    return {field.name: index + 1 for index, field in enumerate(codecs.layout.by_name[message].fields)
+            if not field.is_string}
+
+
+def decode_all(codec, fragments) -> list:
+    decoder = codec.BleDecoder()
+    return [message for message in (decoder.decode_frame(fragment) for fragment in fragments) if message]
+
+
+@pytest.fixture
+def codecs(build_codecs):
+    return build_codecs()
+
+
+def test_single_frame_message_preempts_partial_message(codecs):
+    codec = codecs.codec
+    text = 'a long server message that needs many 20-byte notifications'
+    safety_values = field_values(codecs, 'safety_status')
+
+    assert codecs.enqueue('server_message', data=text)
+    first = codecs.next_fragment(MTU)
+    assert first[0] == codec.SYNC_FIRST and first[2] == codec.MSG_ID_SERVER_MESSAGE
+    assert codecs.enqueue('safety_status', **safety_values)
+
+    # safety_status fits one notification, so it goes out between two continuations
+    safety_frame = codec.SafetyStatus(**safety_values).encode_frame()
+    assert len(safety_frame) <= MTU
+    assert codecs.next_fragment(MTU) == safety_frame
+
+    fragments = [first, safety_frame] + codecs.drain(MTU)
+    decoded = decode_all(codec, fragments)
+    assert [type(message) for message in decoded] == [codec.SafetyStatus, codec.ServerMessage]
+    assert decoded[0]._asdict() == safety_values
+    assert decoded[1].data == text
+
+
+def test_multi_frame_message_waits_for_partial_message(codecs):
+    codec = codecs.codec
+    bms_values = field_values(codecs, 'bms_data')
+
+    assert codecs.enqueue('server_message', data='in flight')
+    fragments = [codecs.next_fragment(MTU)]
+    assert codecs.enqueue('bms_data', **bms_values)
+    fragments += codecs.drain(MTU)
+
+    # Without stream IDs a continuation cannot be attributed, so bms_data
+    # (higher priority but several frames) only starts after server_message
+    server_fragments = codec.fragment_frame(codec.ServerMessage('in flight').encode_frame(), MTU)
+    assert fragments[:len(server_fragments)] == server_fragments
+    decoded = decode_all(codec, fragments)
+    assert [type(message) for message in decoded] == [codec.ServerMessage, codec.BmsData]
+    assert decoded[1]._asdict() == bms_values
+
+
+def test_idle_queue_sends_highest_priority_first(codecs):
+    codec = codecs.codec
+    assert codecs.enqueue('server_message', data='low')
+    assert codecs.enqueue('heartbeat', **field_values(codecs, 'heartbeat'))
+    assert codecs.enqueue('safety_status', **field_values(codecs, 'safety_status'))
+
+    decoded = decode_all(codec, codecs.drain(MTU))
+    assert [type(message) for message in decoded] == [codec.SafetyStatus, codec.Heartbeat, codec.ServerMessage]
@@ -0,0 +1,101 @@
+"""
+Zero-copy receive pool fed with frames from the Python codec
+"""
+
+import ctypes
+
+import pytest
+
+
+def enable_zero_copy(protocol_schema, messages_schema):
+    protocol_schema['decode']['zero_copy'] = True
+
+
+class Pool:
+    """acquire/release and slot getters of the zero-copy C decoder"""
+
+    def __init__(self, codecs):
+        self.codecs = codecs
+        self.release = codecs.function('ble_decode_release', None, ctypes.c_void_p)
+
+    def acquire(self, message: str):
+        return self.codecs.function(f'ble_decode_{message}_acquire', ctypes.c_void_p)()
+
+    def read(self, message: str, slot) -> dict:
+        values = {}
+        for field in self.codecs.layout.by_name[message].fields:
+            getter = self.codecs.function(f'ble_decode_{message}_get_{field.name}', ctypes.c_uint32, ctypes.c_void_p)
+            values[field.name] = getter(slot)
+        return values
+
+    def send(self, message, mtu: int = 244) -> None:
+        results = [self.codecs.decode_frame(fragment)
+                   for fragment in self.codecs.codec.fragment_frame(message.encode_frame(), mtu)]
+        assert results[-1], message
+
+
+@pytest.fixture
+def codecs(build_codecs):
+    return build_codecs(enable_zero_copy)
+
+
+@pytest.fixture
+def pool(codecs):
+    return Pool(codecs)
+
+
+def test_repeated_message_keeps_other_payloads(codecs, pool):
+    codec = codecs.codec
+    request = codec.HandshakeRequest(codec.HANDSHAKE_VERSION, codec.SCHEMA_HASH, 512, 185, 0)
+    pool.send(request)
+    pool.send(codec.ConfigSet(param_id=1, value=100))
+    pool.send(codec.ConfigSet(param_id=2, value=200))
+    pool.send(codec.ConfigSet(param_id=3, value=300))
+
+    slot = pool.acquire('handshake_request')
+    assert slot is not None
+    assert pool.read('handshake_request', slot) == request._asdict()
+    pool.release(slot)
+    slot = pool.acquire('config_set')
+    assert pool.read('config_set', slot) == {'param_id': 3, 'value': 300}
+    pool.release(slot)
+
+
+def test_pinned_payload_survives_updates(codecs, pool):
+    codec = codecs.codec
+    pool.send(codec.HandshakeRequest(mtu=185))
+    pool.send(codec.ConfigSet(param_id=1, value=100))
+    pinned = pool.acquire('config_set')
+
+    for value in range(101, 110):
+        pool.send(codec.ConfigSet(param_id=2, value=value))
+        assert pool.read('config_set', pinned) == {'param_id': 1, 'value': 100}
+        latest = pool.acquire('config_set')
+        assert latest != pinned
+        assert pool.read('config_set', latest) == {'param_id': 2, 'value': value}
+        pool.release(latest)
+
+    assert pool.acquire('handshake_request') is not None
+    pool.release(pinned)
+    slot = pool.acquire('config_set')
+    assert pool.read('config_set', slot) == {'param_id': 2, 'value': 109}
+    pool.release(slot)
+
+
+def test_reassembly_with_pinned_payloads(codecs, pool):
+    codec = codecs.codec
+    pool.send(codec.ConfigSet(param_id=1, value=100))
+    pinned = pool.acquire('config_set')
+
+    # Multi-frame payloads still find a slot while the application holds one
+    request = codec.HandshakeRequest(codec.HANDSHAKE_VERSION, codec.SCHEMA_HASH, 256, 64, 0)
+    pool.send(request, mtu=8)
+    slot = pool.acquire('handshake_request')
+    assert pool.read('handshake_request', slot) == request._asdict()
+    assert pool.read('config_set', pinned) == {'param_id': 1, 'value': 100}
+    pool.release(slot)
+    pool.release(pinned)
+
+
+def test_missing_payload_acquires_null(pool):
+    assert pool.acquire('config_set') is None
@@ -0,0 +1,155 @@
+"""
+Link bandwidth and airtime budget of a schema
+
+Every message is assumed to be sent at least once per maxAge (optionally more
+often), fragmented to the MTU the same way the generated encoders do it. The
+totals are compared against the notification capacity of a connection
+profile: notifications per connection interval x intervals per second.
+"""
+
+import math
+from typing import Any, Dict, List, NamedTuple
+
+from schema_layout import MessageLayout, SchemaLayout
+
+
+MAX_PAYLOAD_SIZE = 255  # Frame length field is one byte
+
+
+class LinkProfile(NamedTuple):
+    mtu: int                         # Bytes per notification
+    interval_ms: float               # Connection interval
+    notifications_per_interval: int
+
+    @property
+    def notifications_per_s(self) -> float:
+        return self.notifications_per_interval * 1000.0 / self.interval_ms
+
+    @property
+    def bytes_per_s(self) -> float:
+        return self.notifications_per_s * self.mtu
+
+
+class MessageBudget(NamedTuple):
+    name: str
+    direction: str
+    payload_size: int
+    frame_size: int
+    frames: int                # Notifications per message
+    overhead_bytes: int        # Headers and checksum across all frames
+    rate_hz: float
+    bytes_per_s: float
+    notifications_per_s: float
+    delivery_ms: float         # Connection time needed to send one message alone
+
+
+def frame_count(frame_size: int, layout: SchemaLayout, mtu: int) -> int:
+    """Notifications needed for one frame, matching the generated fragmenters"""
+    if frame_size <= mtu:
+        return 1
+    chunk = mtu - layout.continuation_header_size
+    return 1 + math.ceil((frame_size - mtu) / chunk)
+
+
+def message_budget(layout: SchemaLayout, message: MessageLayout, profile: LinkProfile,
+                   sends_per_max_age: float = 1.0) -> MessageBudget:
+    frame_size = layout.first_header_size + message.payload_size + 1
+    frames = frame_count(frame_size, layout, profile.mtu)
+    overhead = layout.first_header_size + 1 + (frames - 1) * layout.continuation_header_size
+    rate_hz = sends_per_max_age * 1000.0 / message.max_age_ms
+    wire_bytes = frame_size + (frames - 1) * layout.continuation_header_size
+    intervals = math.ceil(frames / profile.notifications_per_interval)
+    return MessageBudget(
+        name=message.name,
+        direction=message.direction,
+        payload_size=message.payload_size,
+        frame_size=frame_size,
+        frames=frames,
+        overhead_bytes=overhead,
+        rate_hz=rate_hz,
+        bytes_per_s=wire_bytes * rate_hz,
+        notifications_per_s=frames * rate_hz,
+        delivery_ms=(intervals - 1) * profile.interval_ms,
+    )
+
+
+def bandwidth_report(layout: SchemaLayout, profile: LinkProfile, sends_per_max_age: float = 1.0,
+                     warn_utilisation: float = 0.8) -> Dict[str, Any]:
+    """Per-message budgets, per-direction totals, warnings and errors"""
+    if profile.mtu <= layout.first_header_size + 1 or profile.mtu <= layout.continuation_header_size:
+        raise ValueError(f"MTU {profile.mtu} is too small for the frame headers")
+    if profile.interval_ms <= 0 or profile.notifications_per_interval <= 0:
+        raise ValueError("Connection interval and notifications per interval must be positive")
+    if sends_per_max_age <= 0:
+        raise ValueError("Sends per maxAge must be positive")
+
+    budgets = [message_budget(layout, message, profile, sends_per_max_age)
+               for message in sorted(layout.messages.values(), key=lambda m: (m.direction != 'server', m.msg_id))]
+    warnings: List[str] = []
+    errors: List[str] = []
+
+    for budget in budgets:
+        max_age_ms = layout.by_name[budget.name].max_age_ms
+        if budget.payload_size > MAX_PAYLOAD_SIZE:
+            errors.append(f"{budget.name}: {budget.payload_size}-byte payload exceeds the "
+                          f"{MAX_PAYLOAD_SIZE}-byte length field")
+        if budget.delivery_ms >= max_age_ms:
+            errors.append(f"{budget.name}: {budget.frames} frames need {budget.delivery_ms:.0f} ms of connection "
+                          f"events, more than maxAge {max_age_ms} ms")
+        elif budget.frames > 1:
+            warnings.append(f"{budget.name}: {budget.frame_size}-byte frame is split into {budget.frames} "
+                            f"notifications at MTU {profile.mtu}")
+
+    directions = {}
+    for direction in ('server', 'client'):
+        selected = [b for b in budgets if b.direction == direction]
+        notifications_per_s = sum(b.notifications_per_s for b in selected)
+        bytes_per_s = sum(b.bytes_per_s for b in selected)
+        utilisation = notifications_per_s / profile.notifications_per_s
+        directions[direction] = {
+            'notifications_per_s': notifications_per_s,
+            'bytes_per_s': bytes_per_s,
+            'payload_bytes_per_s': sum(b.payload_size * b.rate_hz for b in selected),
+            'utilisation': utilisation,
+        }
+        label = 'server to client' if direction == 'server' else 'client to server'
+        if utilisation > 1.0:
+            errors.append(f"{label}: {notifications_per_s:.1f} notifications/s exceeds the link capacity of "
+                          f"{profile.notifications_per_s:.1f}/s ({utilisation:.0%})")
+        elif utilisation > warn_utilisation:
+            warnings.append(f"{label}: link utilisation {utilisation:.0%} is above {warn_utilisation:.0%}")
+
+    return {
+        'profile': profile,
+        'sends_per_max_age': sends_per_max_age,
+        'messages': budgets,
+        'directions': directions,
+        'warnings': warnings,
+        'errors': errors,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    profile = report['profile']
+    lines = []
+    lines.append(f"Link profile: MTU {profile.mtu} B, interval {profile.interval_ms:g} ms, "
+                 f"{profile.notifications_per_interval} notifications/interval "
+                 f"-> {profile.notifications_per_s:.1f} notifications/s, {profile.bytes_per_s:.0f} B/s")
+    lines.append(f"Send rate: {report['sends_per_max_age']:g} per maxAge")
+    lines.append("")
+    lines.append(f"{'message':<20} {'dir':<6} {'payload':>7} {'frame':>6} {'frames':>6} {'ovhd':>5} "
+                 f"{'rate Hz':>8} {'B/s':>9} {'notif/s':>8}")
+    for b in report['messages']:
+        lines.append(f"{b.name:<20} {b.direction:<6} {b.payload_size:>7} {b.frame_size:>6} {b.frames:>6} "
+                     f"{b.overhead_bytes:>5} {b.rate_hz:>8.2f} {b.bytes_per_s:>9.1f} {b.notifications_per_s:>8.2f}")
+    lines.append("")
+    for direction, totals in report['directions'].items():
+        overhead = 1.0 - totals['payload_bytes_per_s'] / totals['bytes_per_s'] if totals['bytes_per_s'] else 0.0
+        lines.append(f"{direction:<6}: {totals['notifications_per_s']:.2f} notifications/s, "
+                     f"{totals['bytes_per_s']:.1f} B/s ({overhead:.1%} framing overhead), "
+                     f"utilisation {totals['utilisation']:.1%}")
+    for warning in report['warnings']:
+        lines.append(f"Warning: {warning}")
+    for error in report['errors']:
+        lines.append(f"Error: {error}")
+    return lines
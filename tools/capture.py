@@ -0,0 +1,298 @@
+"""
+Indexed binary capture log for BLE protocol frames
+
+Capture file (<name>.blecap), append-only:
+- File header: [Magic 'BLECAP1\\0'][HeaderLen u32][Metadata JSON]
+  Metadata holds the protocol version, the schema hash and the full protocol
+  and message schemas, so old captures decode with the layout they were
+  recorded under.
+- Segments: [Magic 'SEG\\0'][RecordCount u32][DataLen u32][Records...]
+  Record: [TimestampMs u64][Source u16][Length u16][Frame...]
+
+Sidecar index (<name>.blecap.idx), append-only, one block per segment:
+- File header: [Magic 'BLEIDX2\\0'][SchemaHash 32 bytes]
+- Block: [SegmentOffset u64][RecordCount u32][MinTimestampMs u64][MaxTimestampMs u64]
+  followed by RecordCount entries sorted by (msg_id, timestamp):
+  [RecordID u16][Length u16][TimestampMs u64][FrameOffset u64]
+  RecordID is the message ID, or 0x100 for continuation fragments, so every
+  8-bit message ID stays available.
+
+The index is authoritative: data past the last indexed segment (for example
+after a crash) is ignored by readers and truncated when the writer reopens.
+Readers mmap both files and return memoryviews straight into the capture.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from schema_layout import SchemaLayout
+
+
+CAPTURE_MAGIC = b'BLECAP1\0'
+SEGMENT_MAGIC = b'SEG\0'
+INDEX_MAGIC = b'BLEIDX2\0'
+CAPTURE_FORMAT_VERSION = 1
+
+# Record ID used for frames that carry no message ID (continuation fragments);
+# outside the 8-bit message ID range, and sorted after every message
+CONTINUATION_MSG_ID = 0x100
+
+_HEADER_LEN = struct.Struct('<I')
+_SEGMENT_HEADER = struct.Struct('<4sII')
+_RECORD_HEADER = struct.Struct('<QHH')
+_INDEX_BLOCK = struct.Struct('<QIQQ')
+_INDEX_ENTRY = struct.Struct('<HHQQ')
+
+
+def index_path_for(capture_path: str) -> str:
+    return capture_path + '.idx'
+
+
+class CaptureRecord(NamedTuple):
+    timestamp_ms: int
+    msg_id: int
+    source: int
+    frame: memoryview
+
+
+class _SegmentIndex(NamedTuple):
+    segment_offset: int
+    record_count: int
+    min_timestamp_ms: int
+    max_timestamp_ms: int
+    entries_offset: int
+
+
+class CaptureWriter:
+    """Append frames to a capture file, one indexed segment at a time"""
+
+    def __init__(self, path: str, layout: SchemaLayout, segment_records: int = 4096):
+        self.path = path
+        self.layout = layout
+        self.segment_records = segment_records
+        self._records: List[tuple] = []
+        self._data = bytearray()
+
+        index_path = index_path_for(path)
+        if os.path.exists(path) and os.path.exists(index_path):
+            self._open_existing(index_path)
+        else:
+            self._create(index_path)
+
+    def _create(self, index_path: str):
+        metadata = {
+            'format_version': CAPTURE_FORMAT_VERSION,
+            'protocol_version': self.layout.version,
+            'schema_hash': self.layout.hash.hex(),
+            'protocol': self.layout.protocol_schema,
+            'messages': self.layout.messages_schema,
+        }
+        metadata_bytes = json.dumps(metadata, separators=(',', ':')).encode('utf-8')
+        self._file = open(self.path, 'wb+')
+        self._file.write(CAPTURE_MAGIC + _HEADER_LEN.pack(len(metadata_bytes)) + metadata_bytes)
+        self._index = open(index_path, 'wb+')
+        self._index.write(INDEX_MAGIC + self.layout.hash)
+        self._file.flush()
+        self._index.flush()
+
+    def _open_existing(self, index_path: str):
+        with CaptureReader(self.path) as reader:
+            # Compare the wire format hash of the embedded schema, so captures written
+            # before the hash covered only the wire format can still be appended to
+            if reader.layout.hash != self.layout.hash:
+                raise ValueError(f"Capture {self.path} was recorded with a different schema "
+                                 f"(v{reader.metadata['protocol_version']}, hash {reader.schema_hash.hex()[:12]})")
+            data_end = reader.data_end
+            index_end = reader.index_end
+        self._file = open(self.path, 'rb+')
+        self._file.truncate(data_end)
+        self._file.seek(data_end)
+        self._index = open(index_path, 'rb+')
+        self._index.truncate(index_end)
+        self._index.seek(index_end)
+
+    def write_frame(self, timestamp_ms: int, frame: bytes, source: int = 0):
+        """Append one frame received at timestamp_ms from source (vehicle/device number)"""
+        if frame and frame[0] == self.layout.sync_first and len(frame) >= 3:
+            msg_id = frame[2]
+        else:
+            msg_id = CONTINUATION_MSG_ID
+        offset = len(self._data) + _RECORD_HEADER.size
+        self._data += _RECORD_HEADER.pack(timestamp_ms, source, len(frame))
+        self._data += frame
+        self._records.append((msg_id, len(frame), timestamp_ms, offset))
+        if len(self._records) >= self.segment_records:
+            self.flush()
+
+    def flush(self):
+        """Write buffered frames as a segment, then its index block"""
+        if not self._records:
+            return
+        segment_offset = self._file.seek(0, os.SEEK_END)
+        data_start = segment_offset + _SEGMENT_HEADER.size
+        self._file.write(_SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(self._records), len(self._data)))
+        self._file.write(self._data)
+        self._file.flush()
+
+        timestamps = [record[2] for record in self._records]
+        block = bytearray(_INDEX_BLOCK.pack(segment_offset, len(self._records), min(timestamps), max(timestamps)))
+        for msg_id, length, timestamp_ms, offset in sorted(self._records):
+            block += _INDEX_ENTRY.pack(msg_id, length, timestamp_ms, data_start + offset)
+        self._index.write(block)
+        self._index.flush()
+
+        self._records = []
+        self._data = bytearray()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CaptureReader:
+    """Memory-mapped capture reader with msg_id/time-range queries
+
+    Returned frames are memoryviews into the mapping; release them (or copy
+    with bytes()) before closing the reader.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._index_file = open(index_path_for(path), 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._data[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a BLE capture file")
+        (metadata_len,) = _HEADER_LEN.unpack_from(self._data, len(CAPTURE_MAGIC))
+        metadata_start = len(CAPTURE_MAGIC) + _HEADER_LEN.size
+        self.metadata = json.loads(bytes(self._data[metadata_start:metadata_start + metadata_len]))
+        self.schema_hash = bytes.fromhex(self.metadata['schema_hash'])
+        self.layout = SchemaLayout(self.metadata['protocol'], self.metadata['messages'])
+        self.data_end = metadata_start + metadata_len
+
+        if self._index[:len(INDEX_MAGIC)] == b'BLEIDX1\0':
+            raise ValueError(f"Index for {path} uses the old 8-bit record ID format (BLEIDX1)")
+        if self._index[:len(INDEX_MAGIC)] != INDEX_MAGIC or \
+                self._index[len(INDEX_MAGIC):len(INDEX_MAGIC) + 32] != self.schema_hash:
+            raise ValueError(f"Index for {path} is missing or belongs to another capture")
+        self.segments = self._read_segments()
+
+    def _read_segments(self) -> List[_SegmentIndex]:
+        segments = []
+        position = len(INDEX_MAGIC) + 32
+        while position + _INDEX_BLOCK.size <= len(self._index):
+            offset, count, min_ms, max_ms = _INDEX_BLOCK.unpack_from(self._index, position)
+            entries_offset = position + _INDEX_BLOCK.size
+            block_end = entries_offset + count * _INDEX_ENTRY.size
+            if block_end > len(self._index):
+                break  # Partially written block
+            _, _, data_len = _SEGMENT_HEADER.unpack_from(self._data, offset)
+            segments.append(_SegmentIndex(offset, count, min_ms, max_ms, entries_offset))
+            self.data_end = offset + _SEGMENT_HEADER.size + data_len
+            position = block_end
+        self.index_end = position
+        return segments
+
+    @property
+    def record_count(self) -> int:
+        return sum(segment.record_count for segment in self.segments)
+
+    def _entry(self, segment: _SegmentIndex, i: int) -> tuple:
+        return _INDEX_ENTRY.unpack_from(self._index, segment.entries_offset + i * _INDEX_ENTRY.size)
+
+    def _lower_bound(self, segment: _SegmentIndex, key: tuple) -> int:
+        """First entry in the segment whose (msg_id, timestamp) is >= key"""
+        low, high = 0, segment.record_count
+        while low < high:
+            middle = (low + high) // 2
+            msg_id, _, timestamp_ms, _ = self._entry(segment, middle)
+            if (msg_id, timestamp_ms) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _record(self, msg_id: int, length: int, timestamp_ms: int, offset: int) -> CaptureRecord:
+        (_, source, _) = _RECORD_HEADER.unpack_from(self._data, offset - _RECORD_HEADER.size)
+        return CaptureRecord(timestamp_ms, msg_id, source, memoryview(self._data)[offset:offset + length])
+
+    def query(self, message=None, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Iterator[CaptureRecord]:
+        """Yield records for a message (ID or name; None for all) with start_ms <= t <= end_ms
+
+        Segments are visited in file order; within a segment records are
+        ordered by message ID, then timestamp.
+        """
+        msg_id = self.layout.resolve_msg_id(message) if message is not None else None
+        low_ms = start_ms if start_ms is not None else 0
+        high_ms = end_ms if end_ms is not None else (1 << 64) - 1
+        for segment in self.segments:
+            if segment.max_timestamp_ms < low_ms or segment.min_timestamp_ms > high_ms:
+                continue
+            if msg_id is None:
+                first, last_id = 0, CONTINUATION_MSG_ID
+            else:
+                first, last_id = self._lower_bound(segment, (msg_id, low_ms)), msg_id
+            for i in range(first, segment.record_count):
+                entry_id, length, timestamp_ms, offset = self._entry(segment, i)
+                if entry_id > last_id:
+                    break
+                if timestamp_ms < low_ms:
+                    continue
+                if timestamp_ms > high_ms:
+                    if msg_id is not None:
+                        break
+                    continue
+                yield self._record(entry_id, length, timestamp_ms, offset)
+
+    def segment_records(self, segment_number: int) -> Iterator[CaptureRecord]:
+        """Yield the records of one segment in index order (msg_id, then timestamp)"""
+        segment = self.segments[segment_number]
+        for i in range(segment.record_count):
+            yield self._record(*self._entry(segment, i))
+
+    def frames(self) -> Iterator[CaptureRecord]:
+        """Yield every record in recording order"""
+        for segment in self.segments:
+            position = segment.segment_offset + _SEGMENT_HEADER.size
+            for _ in range(segment.record_count):
+                timestamp_ms, source, length = _RECORD_HEADER.unpack_from(self._data, position)
+                start = position + _RECORD_HEADER.size
+                frame = memoryview(self._data)[start:start + length]
+                if length >= 3 and frame[0] == self.layout.sync_first:
+                    msg_id = frame[2]
+                else:
+                    msg_id = CONTINUATION_MSG_ID
+                yield CaptureRecord(timestamp_ms, msg_id, source, frame)
+                position = start + length
+
+    def decode(self, record: CaptureRecord) -> Optional[Dict]:
+        """Decode a complete single-frame record with the capture's own schema"""
+        layout = self.layout.messages.get(record.msg_id)
+        payload = self.layout.frame_payload(record.frame)
+        if layout is None or payload is None or len(payload) != layout.payload_size:
+            return None
+        return layout.decode(payload)
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+        self._file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
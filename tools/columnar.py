@@ -0,0 +1,156 @@
+"""
+Columnar per-field export of decoded messages
+
+Writes one .npy file per field (plus timestamp_ms.npy) for every message:
+    <output>/<message>/<field>.npy
+Each column uses the field's native width from the schema types, so a single
+field can be loaded, or memory-mapped with numpy.load(mmap_mode='r'), without
+touching any other data. Rows are buffered per message and appended in
+chunks; the .npy header reserves room for the row count so files can keep
+growing across runs.
+"""
+
+import array
+import os
+import struct
+import sys
+from typing import Dict, List
+
+from schema_layout import MessageLayout
+
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+NPY_HEADER_SIZE = 128  # Total header bytes, padded so the shape can be rewritten in place
+
+# Schema type -> (.npy descr, array typecode)
+COLUMN_TYPES = {
+    'uint8': ('|u1', 'B'),
+    'int8': ('|i1', 'b'),
+    'uint16': ('<u2', 'H'),
+    'int16': ('<i2', 'h'),
+    'uint32': ('<u4', 'I'),
+    'int32': ('<i4', 'i'),
+    'uint64': ('<u8', 'Q'),
+    'int64': ('<i8', 'q'),
+}
+
+TIMESTAMP_COLUMN = 'timestamp_ms'
+
+
+def _npy_header(descr: str, rows: int) -> bytes:
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({rows},), }}"
+    padding = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2 - len(header) - 1
+    return NPY_MAGIC + struct.pack('<H', NPY_HEADER_SIZE - len(NPY_MAGIC) - 2) + \
+        (header + ' ' * padding + '\n').encode('latin-1')
+
+
+class NpyColumnWriter:
+    """Append-only 1-D .npy file"""
+
+    def __init__(self, path: str, descr: str, item_size: int):
+        self.path = path
+        self.descr = descr
+        self.item_size = item_size
+        if os.path.exists(path):
+            self._file = open(path, 'r+b')
+            header = self._file.read(NPY_HEADER_SIZE)
+            expected = _npy_header(descr, 0)
+            if header[:len(NPY_MAGIC)] != NPY_MAGIC or f"'descr': '{descr}'".encode() not in header \
+                    or len(header) != len(expected):
+                raise ValueError(f"{path} is not a {descr} column written by this exporter")
+            data_size = self._file.seek(0, os.SEEK_END) - NPY_HEADER_SIZE
+            self.rows = data_size // item_size
+        else:
+            self._file = open(path, 'w+b')
+            self._file.write(_npy_header(descr, 0))
+            self.rows = 0
+
+    def append(self, data: bytes, rows: int):
+        self._file.seek(NPY_HEADER_SIZE + self.rows * self.item_size)
+        self._file.write(data)
+        self.rows += rows
+        self._file.seek(0)
+        self._file.write(_npy_header(self.descr, self.rows))
+
+    def close(self):
+        self._file.close()
+
+
+class _MessageColumns:
+    """Row buffer and column files for one message"""
+
+    def __init__(self, directory: str, layout: MessageLayout):
+        os.makedirs(directory, exist_ok=True)
+        self.layout = layout
+        self.timestamps = array.array('q')
+        self.timestamp_writer = NpyColumnWriter(os.path.join(directory, f"{TIMESTAMP_COLUMN}.npy"), '<i8', 8)
+        self.buffers: List = []
+        self.writers: List[NpyColumnWriter] = []
+        for field in layout.fields:
+            if field.is_string:
+                # Fixed-width null-padded bytes
+                descr, buffer = f"|S{field.size}", bytearray()
+            else:
+                descr, typecode = COLUMN_TYPES[field.type]
+                buffer = array.array(typecode)
+                if buffer.itemsize != field.size:
+                    raise ValueError(f"array typecode '{typecode}' is not {field.size} bytes on this platform")
+            self.buffers.append(buffer)
+            self.writers.append(NpyColumnWriter(os.path.join(directory, f"{field.name}.npy"), descr, field.size))
+
+    def append(self, timestamp_ms: int, payload) -> int:
+        self.timestamps.append(timestamp_ms)
+        for field, buffer, value in zip(self.layout.fields, self.buffers, self.layout.struct.unpack_from(payload)):
+            if field.is_string:
+                buffer += value
+            else:
+                buffer.append(value)
+        return len(self.timestamps)
+
+    def flush(self):
+        rows = len(self.timestamps)
+        if rows == 0:
+            return
+        for buffer, writer in zip([self.timestamps] + self.buffers, [self.timestamp_writer] + self.writers):
+            if isinstance(buffer, array.array) and sys.byteorder == 'big':
+                buffer.byteswap()
+            writer.append(bytes(buffer), rows)
+            del buffer[:]
+
+    def close(self):
+        self.flush()
+        for writer in [self.timestamp_writer] + self.writers:
+            writer.close()
+
+
+class ColumnarExporter:
+    """Streams decoded payloads into per-field column files"""
+
+    def __init__(self, output_dir: str, chunk_rows: int = 65536):
+        self.output_dir = output_dir
+        self.chunk_rows = chunk_rows
+        self._messages: Dict[str, _MessageColumns] = {}
+
+    def append(self, layout: MessageLayout, timestamp_ms: int, payload):
+        """Append one validated payload of the given message"""
+        columns = self._messages.get(layout.name)
+        if columns is None:
+            columns = _MessageColumns(os.path.join(self.output_dir, layout.name), layout)
+            self._messages[layout.name] = columns
+        if columns.append(timestamp_ms, payload) >= self.chunk_rows:
+            columns.flush()
+
+    def flush(self):
+        for columns in self._messages.values():
+            columns.flush()
+
+    def close(self):
+        for columns in self._messages.values():
+            columns.close()
+        self._messages = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
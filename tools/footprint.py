@@ -0,0 +1,181 @@
+"""
+RAM/flash footprint of the generated C code
+
+Compiles ble_protocol.c with the target compiler and reads the object with
+`size` and `nm`. Symbols are attributed to messages and fields by the names
+the C generator gives them; everything else (frame decoder, reassembly slots,
+transmit queue) is reported as shared.
+
+Flash = text + rodata + data (initial values), RAM = data + bss. A field's
+RAM is its share of the message's frame buffer or decoded copy; its flash is
+its setter or getter.
+"""
+
+import os
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+from schema_layout import SchemaLayout
+
+
+SHARED = '(shared)'
+
+
+def _tool(compiler: str, name: str) -> str:
+    """Binutils tool matching a (cross) compiler, e.g. arm-none-eabi-gcc -> arm-none-eabi-nm"""
+    base = os.path.basename(compiler)
+    if base.endswith('gcc'):
+        return os.path.join(os.path.dirname(compiler), base[:-3] + name)
+    return name
+
+
+def compile_object(source_dir: str, compiler: str = 'gcc', cflags: Optional[List[str]] = None) -> str:
+    """Compile ble_protocol.c to an object next to it and return its path"""
+    object_path = os.path.join(source_dir, 'ble_protocol.o')
+    subprocess.run(
+        [compiler, '-std=c99', '-Os', '-ffunction-sections', '-fdata-sections', *(cflags or []),
+         '-c', os.path.join(source_dir, 'ble_protocol.c'), '-o', object_path],
+        check=True
+    )
+    return object_path
+
+
+def read_sections(object_path: str, compiler: str = 'gcc') -> Dict[str, int]:
+    """Berkeley totals from `size`: text, data, bss"""
+    output = subprocess.run([_tool(compiler, 'size'), object_path], check=True,
+                            capture_output=True, text=True).stdout
+    text, data, bss = output.splitlines()[1].split()[:3]
+    return {'text': int(text), 'data': int(data), 'bss': int(bss)}
+
+
+def read_symbols(object_path: str, compiler: str = 'gcc') -> List[Tuple[str, str, int]]:
+    """(name, kind, size) for every sized symbol; kind is flash, ram or both"""
+    output = subprocess.run([_tool(compiler, 'nm'), '-S', '--size-sort', object_path], check=True,
+                            capture_output=True, text=True).stdout
+    symbols = []
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) != 4:
+            continue
+        _, size, symbol_type, name = parts
+        symbol_type = symbol_type.lower()
+        if symbol_type in ('t', 'r'):
+            kind = 'flash'
+        elif symbol_type == 'b':
+            kind = 'ram'
+        elif symbol_type == 'd':
+            kind = 'both'
+        else:
+            continue
+        # Local statics may carry compiler suffixes such as .0 or .lto_priv.0
+        symbols.append((name.split('.', 1)[0], kind, int(size, 16)))
+    return symbols
+
+
+def _symbol_owners(layout: SchemaLayout) -> Dict[str, Tuple[str, Optional[str]]]:
+    """Map generated symbol names to (message, field or None)"""
+    owners = {}
+    for message in layout.messages.values():
+        name = message.name
+        if message.direction == 'server':
+            for symbol in (f"ble_encode_{name}_begin", f"ble_encode_{name}_get_frame",
+                           f"ble_encode_{name}_enqueue", f"ble_encode_{name}_is_queued",
+                           f"{name}_encode_buffer", f"{name}_encode_len"):
+                owners[symbol] = (name, None)
+            for field in message.fields:
+                owners[f"ble_encode_{name}_set_{field.name}"] = (name, field.name)
+        else:
+            for symbol in (f"ble_decode_{name}_check_is_unread", f"ble_decode_{name}_check_data_is_stale",
+                           f"ble_decode_{name}_acquire", f"ble_decode_{name}_read_snapshot", f"{name}_decoded"):
+                owners[symbol] = (name, None)
+            for field in message.fields:
+                owners[f"ble_decode_{name}_get_{field.name}"] = (name, field.name)
+    return owners
+
+
+def _new_usage() -> Dict[str, Any]:
+    return {'flash': 0, 'ram': 0, 'fields': {}}
+
+
+def footprint_report(layout: SchemaLayout, object_path: str, compiler: str = 'gcc') -> Dict[str, Any]:
+    """Totals from `size` plus flash/RAM attributed per message and field"""
+    owners = _symbol_owners(layout)
+    messages: Dict[str, Dict[str, Any]] = {SHARED: _new_usage()}
+    for message in layout.messages.values():
+        usage = _new_usage()
+        usage['fields'] = {field.name: {'flash': 0, 'ram': 0} for field in message.fields}
+        messages[message.name] = usage
+
+    # Per-message frame buffers and decoded copies hold every field's bytes
+    buffers = {f"{message.name}_encode_buffer" if message.direction == 'server' else f"{message.name}_decoded": message
+               for message in layout.messages.values()}
+
+    for name, kind, size in read_symbols(object_path, compiler):
+        message_name, field_name = owners.get(name, (SHARED, None))
+        usage = messages[message_name]
+        if name in buffers:
+            for field in buffers[name].fields:
+                usage['fields'][field.name]['ram'] += field.size
+        flash = size if kind in ('flash', 'both') else 0
+        ram = size if kind in ('ram', 'both') else 0
+        usage['flash'] += flash
+        usage['ram'] += ram
+        if field_name is not None:
+            usage['fields'][field_name]['flash'] += flash
+            usage['fields'][field_name]['ram'] += ram
+
+    sections = read_sections(object_path, compiler)
+    return {
+        'protocol_version': layout.version,
+        'schema_hash': layout.hash.hex(),
+        'compiler': compiler,
+        'sections': sections,
+        'flash': sections['text'] + sections['data'],
+        'ram': sections['data'] + sections['bss'],
+        'messages': messages,
+    }
+
+
+def _delta(value: int) -> str:
+    return f"{value:+d}" if value else "0"
+
+
+def format_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Per-message table; with a baseline, every number gets a delta column"""
+    lines = []
+    sections = report['sections']
+    lines.append(f"Compiler: {report['compiler']} -Os")
+    lines.append(f"Sections: text {sections['text']} B, data {sections['data']} B, bss {sections['bss']} B")
+    totals = f"Total: flash {report['flash']} B, RAM {report['ram']} B"
+    if baseline:
+        totals += (f" (flash {_delta(report['flash'] - baseline['flash'])} B, "
+                   f"RAM {_delta(report['ram'] - baseline['ram'])} B vs baseline)")
+    lines.append(totals)
+    lines.append("")
+
+    header = f"{'message / field':<36} {'flash':>7} {'RAM':>7}"
+    if baseline:
+        header += f" {'Δflash':>7} {'ΔRAM':>7}"
+    lines.append(header)
+
+    base_messages = baseline['messages'] if baseline else {}
+    names = list(report['messages'])
+    names += [name for name in base_messages if name not in report['messages']]
+    for name in names:
+        usage = report['messages'].get(name, _new_usage())
+        base = base_messages.get(name, _new_usage())
+        line = f"{name:<36} {usage['flash']:>7} {usage['ram']:>7}"
+        if baseline:
+            status = '' if name in base_messages else '  (new)'
+            if name not in report['messages']:
+                status = '  (removed)'
+            line += f" {_delta(usage['flash'] - base['flash']):>7} {_delta(usage['ram'] - base['ram']):>7}{status}"
+        lines.append(line)
+        for field_name, field_usage in usage['fields'].items():
+            line = f"  .{field_name:<33} {field_usage['flash']:>7} {field_usage['ram']:>7}"
+            if baseline:
+                base_field = base['fields'].get(field_name, {'flash': 0, 'ram': 0})
+                line += (f" {_delta(field_usage['flash'] - base_field['flash']):>7} "
+                         f"{_delta(field_usage['ram'] - base_field['ram']):>7}")
+            lines.append(line)
+    return lines
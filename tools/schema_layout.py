@@ -0,0 +1,168 @@
+"""
+Schema-derived message layouts for host tools
+Builds struct layouts directly from protocol.json/messages.json at runtime, so
+tools can decode data recorded under any schema version (for example the schema
+embedded in a capture file) without regenerating code.
+"""
+
+import json
+import os
+import struct
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'generators'))
+
+from handshake import wire_format_sha256
+
+
+STRUCT_CODES = {
+    'uint8': 'B',
+    'int8': 'b',
+    'uint16': 'H',
+    'int16': 'h',
+    'uint32': 'I',
+    'int32': 'i',
+    'uint64': 'Q',
+    'int64': 'q',
+}
+
+
+def load_schemas(protocol_schema_path: str, messages_schema_path: str):
+    """Load protocol and message schemas from disk"""
+    with open(protocol_schema_path, 'r') as f:
+        protocol_schema = json.load(f)
+
+    with open(messages_schema_path, 'r') as f:
+        messages_schema = json.load(f)
+
+    return protocol_schema, messages_schema
+
+
+def schema_hash(protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any]) -> bytes:
+    """SHA-256 of the wire format, so description and build-option edits keep the hash
+
+    Its first 4 bytes (little endian) are the handshake's BLE_SCHEMA_HASH.
+    """
+    return wire_format_sha256(protocol_schema, messages_schema)
+
+
+class FieldLayout(NamedTuple):
+    name: str
+    type: str
+    offset: int
+    size: int
+    struct_code: str
+    is_string: bool
+
+
+# Optional [Seq:uint8][SendTimeMs:uint16] prefix of messages with 'header_extension'
+HEADER_EXTENSION = struct.Struct('<BH')
+
+
+class MessageLayout:
+    """Payload layout of one message, derived from its schema definition"""
+
+    def __init__(self, name: str, msg_info: Dict[str, Any], direction: str, types: Dict[str, Any]):
+        self.name = name
+        self.msg_id = int(msg_info['id'], 0)
+        self.direction = direction
+        self.max_age_ms = msg_info.get('maxAge', 1000)
+        self.handshake = msg_info.get('handshake')  # 'request', 'response' or None
+        self.header_extension = bool(msg_info.get('header_extension', False))
+        self.header_extension_size = HEADER_EXTENSION.size if self.header_extension else 0
+        self.fields: List[FieldLayout] = []
+
+        # Fields follow the header extension; the struct skips it with pad bytes
+        offset = self.header_extension_size
+        for field_name, field_value in msg_info['fields'].items():
+            field_type = field_value.get('type') if isinstance(field_value, dict) else field_value
+            if types.get(field_type, {}).get('size') == 'variable':
+                # Null-terminated string with fixed max length
+                size = field_value.get('max_length', 64) if isinstance(field_value, dict) else 64
+                code = f"{size}s"
+                is_string = True
+            else:
+                size = types[field_type]['size']
+                code = STRUCT_CODES[field_type]
+                is_string = False
+            self.fields.append(FieldLayout(field_name, field_type, offset, size, code, is_string))
+            offset += size
+
+        self.payload_size = offset
+        padding = f"{self.header_extension_size}x" if self.header_extension else ''
+        self.struct = struct.Struct('<' + padding + ''.join(f.struct_code for f in self.fields))
+        self.field_names = [f.name for f in self.fields]
+        self._string_indices = [i for i, f in enumerate(self.fields) if f.is_string]
+
+    def unpack(self, payload) -> tuple:
+        """Unpack payload into a tuple of field values in schema order"""
+        values = self.struct.unpack_from(payload)
+        if not self._string_indices:
+            return values
+        values = list(values)
+        for index in self._string_indices:
+            values[index] = values[index].split(b'\0', 1)[0].decode('latin-1')
+        return tuple(values)
+
+    def decode(self, payload) -> Dict[str, Any]:
+        """Decode payload into a {field: value} dict"""
+        return dict(zip(self.field_names, self.unpack(payload)))
+
+    def unpack_header_extension(self, payload) -> Optional[tuple]:
+        """(seq, send_time_ms) from an extended payload, or None without the extension"""
+        if not self.header_extension:
+            return None
+        return HEADER_EXTENSION.unpack_from(payload)
+
+
+class SchemaLayout:
+    """All message layouts of a schema, indexed by message ID and name"""
+
+    def __init__(self, protocol_schema: Dict[str, Any], messages_schema: Dict[str, Any]):
+        self.protocol_schema = protocol_schema
+        self.messages_schema = messages_schema
+        self.version = protocol_schema['protocol']['version']
+        self.hash = schema_hash(protocol_schema, messages_schema)
+
+        frame = protocol_schema['frame']
+        self.sync_first = int(next(f['value'] for f in frame['first']['fields'] if f['name'] == 'sync'), 0)
+        self.streams_enabled = frame.get('stream', {}).get('enabled', False)
+        self.first_header_size = 4 if self.streams_enabled else 3
+        self.continuation_header_size = 2 if self.streams_enabled else 0
+
+        types = protocol_schema['types']
+        self.messages: Dict[int, MessageLayout] = {}
+        for direction in ('server', 'client'):
+            for name, msg_info in messages_schema['messages'][direction].items():
+                layout = MessageLayout(name, msg_info, direction, types)
+                self.messages[layout.msg_id] = layout
+        self.by_name = {layout.name: layout for layout in self.messages.values()}
+
+    @classmethod
+    def from_files(cls, protocol_schema_path: str, messages_schema_path: str) -> 'SchemaLayout':
+        return cls(*load_schemas(protocol_schema_path, messages_schema_path))
+
+    def resolve_msg_id(self, message) -> int:
+        """Accept a message ID, a decimal or 0x-prefixed ID string, or a message name"""
+        if isinstance(message, str):
+            if message in self.by_name:
+                return self.by_name[message].msg_id
+            try:
+                return int(message, 16) if message.lower().startswith('0x') else int(message)
+            except ValueError:
+                raise ValueError(f"Unknown message '{message}'") from None
+        return message
+
+    def frame_payload(self, frame) -> Optional[memoryview]:
+        """Validate a complete single frame and return a view of its payload"""
+        header = self.first_header_size
+        if len(frame) < header + 1 or frame[0] != self.sync_first:
+            return None
+        length = frame[1]
+        if len(frame) != header + length + 1:
+            return None
+        payload = memoryview(frame)[header:header + length]
+        if sum(payload) & 0xFF != frame[header + length]:
+            return None
+        return payload
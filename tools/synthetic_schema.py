@@ -0,0 +1,74 @@
+"""
+Synthetic schemas for generator benchmarks
+
+Builds protocol/messages schemas with a chosen number of messages and fields
+per message. Field types are drawn deterministically from a seed and kept
+within the 255-byte payload limit of the frame length byte.
+"""
+
+import json
+import os
+import random
+from typing import Any, Dict, Tuple
+
+
+MAX_PAYLOAD_SIZE = 255
+MAX_MESSAGES = 250  # 8-bit message IDs, keeping 0x00 and the top IDs free
+
+FIELD_TYPES = ['uint8', 'int8', 'uint16', 'int16', 'uint32', 'int32']
+
+
+def synthetic_schemas(protocol_schema: Dict[str, Any], messages: int, fields: int,
+                      client_fraction: float = 0.2, seed: int = 1) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Return (protocol_schema, messages_schema) with synthetic messages
+
+    The protocol schema (frame format, types) is taken as-is; only the
+    message definitions are synthetic.
+    """
+    if not 0 < messages <= MAX_MESSAGES:
+        raise ValueError(f"messages must be between 1 and {MAX_MESSAGES}")
+    if fields > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"fields must be at most {MAX_PAYLOAD_SIZE} (one byte each)")
+
+    rng = random.Random(seed)
+    types = protocol_schema['types']
+    client_count = max(1, int(messages * client_fraction)) if messages > 1 else 0
+    schema = {'messages': {'server': {}, 'client': {}}}
+
+    for index in range(messages):
+        direction = 'client' if index >= messages - client_count else 'server'
+        message_fields = {}
+        size = 0
+        for field_index in range(fields):
+            # Widest type that still leaves one byte for every remaining field
+            budget = MAX_PAYLOAD_SIZE - size - (fields - field_index - 1)
+            field_type = rng.choice([t for t in FIELD_TYPES if types[t]['size'] <= budget])
+            message_fields[f"field{field_index}_{field_type}"] = field_type
+            size += types[field_type]['size']
+        msg_info = {
+            'id': f"0x{index + 1:02X}",
+            'maxAge': rng.choice([100, 250, 500, 1000, 2000, 5000]),
+            'fields': message_fields,
+        }
+        if direction == 'server':
+            msg_info['priority'] = rng.randrange(4)
+        schema['messages'][direction][f"synthetic_{index}"] = msg_info
+
+    return protocol_schema, schema
+
+
+def write_synthetic_schemas(protocol_schema_path: str, output_dir: str, messages: int, fields: int,
+                            seed: int = 1) -> Tuple[str, str]:
+    """Write synthetic protocol.json/messages.json to output_dir and return their paths"""
+    with open(protocol_schema_path, 'r') as f:
+        protocol_schema = json.load(f)
+    protocol_schema, messages_schema = synthetic_schemas(protocol_schema, messages, fields, seed=seed)
+
+    os.makedirs(output_dir, exist_ok=True)
+    protocol_path = os.path.join(output_dir, 'protocol.json')
+    messages_path = os.path.join(output_dir, 'messages.json')
+    with open(protocol_path, 'w') as f:
+        json.dump(protocol_schema, f, indent=2)
+    with open(messages_path, 'w') as f:
+        json.dump(messages_schema, f, indent=2)
+    return protocol_path, messages_path